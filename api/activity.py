@@ -0,0 +1,244 @@
+"""
+Buffered activity log.
+
+Viewsets record activity entries into an in-process buffer instead of inserting
+them one by one. The buffer is written with a single bulk_create when it reaches
+ACTIVITY_FLUSH_SIZE entries, when the background timer fires, and at the end of
+every request. If the database write fails, the batch is appended to a JSONL
+spool file and replayed on the next successful flush, so entries are not lost.
+
+The spool is shared by the worker processes. To replay it, a process first
+renames it to a replay file of its own (named after its pid), so no two
+processes replay the same entries, and deletes that file only once its entries
+are committed. A replay file left by a failed flush is retried before the spool
+is claimed again, and one left by a process that has died is adopted by the
+next process that flushes. A crash between the commit and the delete replays
+the entries twice; entries are never lost.
+"""
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Activity, Project, User
+
+logger = logging.getLogger(__name__)
+
+SPOOL_FIELDS = ['project_id', 'actor_id', 'action', 'target_type', 'target_id', 'changes']
+
+
+class ActivityBuffer:
+    """
+    Bounded, thread-safe buffer of unsaved Activity instances.
+    """
+
+    def __init__(self, flush_size, max_size, interval, spool_path):
+        self.flush_size = flush_size
+        self.max_size = max_size
+        self.interval = interval
+        self.spool_path = spool_path
+        self._entries = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def add(self, activity):
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                # Flushing is failing or falling behind: spill to disk rather than grow without bound.
+                overflow = True
+            else:
+                overflow = False
+                self._entries.append(activity)
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+            full = len(self._entries) >= self.flush_size
+        if overflow:
+            with self._flush_lock:
+                self._spool([activity])
+        elif full:
+            self.flush()
+        self._ensure_timer()
+
+    def flush(self):
+        """
+        Write all buffered entries (and any spooled ones) with bulk_create.
+        Returns the number of entries written to the database.
+        """
+        with self._flush_lock:
+            with self._lock:
+                entries, self._entries, self._oldest = self._entries, [], None
+            replayed = self._load_spool()
+            if not replayed and not entries:
+                return 0
+            try:
+                with transaction.atomic():
+                    written = self._drop_dangling(replayed + entries)
+                    Activity.objects.bulk_create(written, batch_size=self.flush_size)
+            except DatabaseError:
+                logger.exception("Flushing %d activity entries failed; spooling to %s",
+                                 len(replayed) + len(entries), self.spool_path)
+                # The replayed entries are still in the replay file.
+                if entries:
+                    self._spool(entries)
+                return 0
+            if replayed:
+                os.remove(self.replay_path())
+            return len(written)
+
+    def pending(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _drop_dangling(self, entries):
+        # A project or user may have been deleted while its activity sat in the buffer.
+        project_ids = {entry.project_id for entry in entries if entry.project_id}
+        actor_ids = {entry.actor_id for entry in entries if entry.actor_id}
+        live_projects = set(Project.objects.filter(id__in=project_ids).values_list('id', flat=True))
+        live_actors = set(User.objects.filter(id__in=actor_ids).values_list('id', flat=True))
+        kept = []
+        for entry in entries:
+            if entry.project_id and entry.project_id not in live_projects:
+                continue
+            if entry.actor_id and entry.actor_id not in live_actors:
+                entry.actor_id = None
+            kept.append(entry)
+        return kept
+
+    def _spool(self, entries):
+        with open(self.spool_path, 'a', encoding='utf-8') as spool:
+            for entry in entries:
+                row = {field: getattr(entry, field) for field in SPOOL_FIELDS}
+                row['created_at'] = entry.created_at
+                spool.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+
+    def replay_path(self, pid=None):
+        return f"{self.spool_path}.{pid or os.getpid()}.replay"
+
+    def _load_spool(self):
+        """
+        Entries of this process's replay file, claiming an orphaned replay file
+        or the spool for it first if there is none.
+        """
+        replay_path = self.replay_path()
+        if not os.path.exists(replay_path) and not self._adopt_orphan(replay_path):
+            try:
+                os.replace(self.spool_path, replay_path)
+            except FileNotFoundError:
+                # No spool, or another process claimed it first.
+                return []
+        entries = []
+        with open(replay_path, encoding='utf-8') as spool:
+            for line in spool:
+                row = json.loads(line)
+                row['created_at'] = parse_datetime(row['created_at'])
+                entries.append(Activity(**row))
+        return entries
+
+    def _adopt_orphan(self, replay_path):
+        for path in glob.glob(glob.escape(self.spool_path) + '.*.replay'):
+            try:
+                pid = int(path[len(self.spool_path) + 1:-len('.replay')])
+            except ValueError:
+                continue
+            if pid == os.getpid() or _is_running(pid):
+                continue
+            try:
+                os.replace(path, replay_path)
+            except FileNotFoundError:
+                continue  # Adopted by another process.
+            return True
+        return False
+
+    def _ensure_timer(self):
+        if self.interval <= 0 or self._timer is not None:
+            return
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Thread(target=self._run_timer, name='activity-flush', daemon=True)
+                self._timer.start()
+
+    def _run_timer(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.interval
+            if due:
+                try:
+                    self.flush()
+                finally:
+                    connection.close()
+
+
+def _is_running(pid):
+    if os.name == 'nt':
+        return True  # os.kill would terminate the process; never adopt there.
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Running, as another user.
+    return True
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ActivityBuffer(
+                    flush_size=settings.ACTIVITY_FLUSH_SIZE,
+                    max_size=settings.ACTIVITY_BUFFER_MAX,
+                    interval=settings.ACTIVITY_FLUSH_INTERVAL,
+                    spool_path=settings.ACTIVITY_SPOOL_PATH,
+                )
+    return _buffer
+
+
+def record(actor, action, target_type, target_id, project_id, changes, using='default'):
+    """
+    Queue an activity entry once the caller's transaction on `using` commits.
+    """
+    activity = Activity(
+        project_id=project_id,
+        actor_id=actor.id if actor is not None and actor.is_authenticated else None,
+        action=action,
+        target_type=target_type,
+        target_id=target_id,
+        changes=changes,
+        created_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: get_buffer().add(activity), using=using)
+
+
+def diff(before, after):
+    """
+    Field-level diff of two serialized representations, as {field: [old, new]}.
+    """
+    changes = {}
+    for field in set(before) | set(after):
+        if field == 'updated_at':
+            continue
+        old, new = before.get(field), after.get(field)
+        if old != new:
+            changes[field] = [old, new]
+    return json.loads(json.dumps(changes, cls=DjangoJSONEncoder))
+
+
+def flush_on_request_finished(sender, **kwargs):
+    if _buffer is not None and _buffer.pending():
+        _buffer.flush()
@@ -1,9 +1,177 @@
-from django.contrib import admin
+"""
+Admin for tables with millions of rows.
+
+- Changelists count with EstimatedCountPaginator and never run the second,
+  unfiltered COUNT(*) the admin shows next to filtered results.
+- Foreign keys shown in changelists are joined with list_select_related, so
+  rendering a page takes one query whatever it shows.
+- Foreign keys and many-to-many fields on edit pages use autocomplete widgets,
+  which search on demand instead of loading every user or project.
+- Task filters on status and priority are served by (status, id) and
+  (priority, id) indexes, which also return the rows in the changelist's
+  default -id order. The project filter uses the project foreign key index and
+  lists at most PROJECT_FILTER_CHOICES projects.
+- Task status actions update the selected tasks in batches of
+  ADMIN_ACTION_BATCH_SIZE and record their status history.
+
+With TASK_SHARDS set, the admin shows the tasks and comments stored on the
+default database.
+"""
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .graph import invalidate_schedule
 from .models import User, Task, Comment, Project
-# Register your models here.
-admin.site.register(User)
-admin.site.register(Task)
-admin.site.register(Comment)
-admin.site.register(Project)
+from .status_history import record_status_changes
+
+PROJECT_FILTER_CHOICES = 100
+
+
+def estimated_rows(queryset):
+    """
+    The database's estimate of the number of rows in the queryset's table, from
+    its statistics, or None if it has none. Never scans the table.
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    queries = {
+        'postgresql': ("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [connection.ops.quote_name(table)]),
+        'mysql': ("SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s", [table]),
+        # Filled in by ANALYZE; the first number of each row is the table's row count.
+        'sqlite': ("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table]),
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with transaction.atomic(using=queryset.db), connection.cursor() as cursor:
+            cursor.execute(*queries[connection.vendor])
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    estimates = [int(str(row[0]).split()[0]) for row in rows if row[0] is not None]
+    estimate = max(estimates, default=-1)
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts exactly up to ADMIN_COUNT_LIMIT rows. Past that, an unfiltered list
+    shows the database's estimate of the table size, and a filtered list stops
+    counting at the limit, so a page never costs a full COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = settings.ADMIN_COUNT_LIMIT
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    ordering = ('-id',)
+
+
+class ProjectListFilter(admin.SimpleListFilter):
+    """
+    Filter by project, offering the newest PROJECT_FILTER_CHOICES projects
+    (and the selected one) instead of every project.
+    """
+    title = 'project'
+    parameter_name = 'project__id__exact'
+
+    def lookups(self, request, model_admin):
+        choices = list(Project.objects.order_by('-id').values_list('id', 'name')[:PROJECT_FILTER_CHOICES])
+        selected = self.value()
+        if selected and selected.isdigit() and int(selected) not in {pk for pk, _ in choices}:
+            choices += Project.objects.filter(pk=selected).values_list('id', 'name')
+        return [(str(pk), name) for pk, name in choices]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(project_id=self.value())
+        return queryset
+
+
+def set_status(status):
+    def action(modeladmin, request, queryset):
+        changed = modeladmin.set_status(queryset, status)
+        modeladmin.message_user(request, f"Marked {changed} task(s) as {status}.", messages.SUCCESS)
+
+    action.__name__ = f"mark_{status.lower().replace(' ', '_')}"
+    action.short_description = f"Mark selected tasks as {status}"
+    return action
+
+
+@admin.register(User)
+class UserAdmin(LargeTableAdmin):
+    list_display = ('id', 'email', 'name', 'role', 'is_active', 'is_admin')
+    list_filter = ('role', 'is_active')
+    search_fields = ('email', 'name')
+
+
+@admin.register(Project)
+class ProjectAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'manager', 'start_date', 'end_date')
+    list_select_related = ('manager',)
+    search_fields = ('name',)
+    autocomplete_fields = ('manager', 'members')
+    readonly_fields = ('version',)
+
+
+@admin.register(Task)
+class TaskAdmin(LargeTableAdmin):
+    list_display = ('id', 'title', 'status', 'priority', 'project', 'assigned_to', 'updated_at')
+    list_select_related = ('project', 'assigned_to')
+    list_filter = ('status', 'priority', ProjectListFilter)
+    # Exact ids and title prefixes, which an index can answer, rather than a LIKE scan of every title.
+    search_fields = ('=id', '^title')
+    autocomplete_fields = ('project', 'assigned_to')
+    readonly_fields = ('rank', 'recurrence', 'occurrence_at', 'created_at', 'updated_at')
+    actions = [set_status('Pending'), set_status('In Progress'), set_status('Completed')]
+
+    def save_model(self, request, obj, form, change):
+        old_status = form.initial.get('status') if change else None
+        super().save_model(request, obj, form, change)
+        if obj.status != old_status:
+            record_status_changes([(obj, old_status, obj.status)])
+            invalidate_schedule(obj.project_id)
+
+    def set_status(self, queryset, status):
+        """
+        Move the tasks of `queryset` that are not yet in `status` to it, a batch
+        at a time, recording each transition. Returns the number changed.
+        """
+        changed, last_id = 0, 0
+        pending = queryset.exclude(status=status).select_related(None).order_by('id')
+        while True:
+            with transaction.atomic():
+                batch = list(pending.filter(id__gt=last_id).select_for_update()
+                             .only('id', 'project_id', 'status')[:settings.ADMIN_ACTION_BATCH_SIZE])
+                if not batch:
+                    break
+                Task.objects.filter(id__in=[task.id for task in batch]).update(status=status, updated_at=timezone.now())
+                record_status_changes([(task, task.status, status) for task in batch])
+            for project_id in {task.project_id for task in batch}:
+                invalidate_schedule(project_id)
+            changed += len(batch)
+            last_id = batch[-1].id
+        return changed
 
 
+@admin.register(Comment)
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('id', 'author', 'task', 'project', 'created_at')
+    list_select_related = ('author', 'task', 'project')
+    search_fields = ('=id',)
+    autocomplete_fields = ('author', 'task', 'project')
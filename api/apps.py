@@ -1,6 +1,34 @@
+import atexit
+
 from django.apps import AppConfig
+from django.core.signals import request_finished
+from django.db.models.signals import post_save, pre_delete, pre_save
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import activity, notifications, ranking, sharding, tokens
+        from .models import Comment, Project, Task, User
+
+        # Flush buffered activity once the response has been handed to the client,
+        # and once more when the worker exits.
+        request_finished.connect(activity.flush_on_request_finished, dispatch_uid='api.activity.flush')
+        atexit.register(activity.flush_on_request_finished, sender=None)
+
+        # Sharded rows get global ids and mirrored references; deleting a user or
+        # project removes its mirrors (and what cascades from them) on every shard.
+        for model in sharding.SHARDED_MODELS:
+            pre_save.connect(sharding.prepare_write, sender=model, dispatch_uid=f'api.sharding.prepare_write.{model.__name__}')
+        for model in (User, Project):
+            pre_delete.connect(sharding.delete_mirrors, sender=model, dispatch_uid=f'api.sharding.delete_mirrors.{model.__name__}')
+
+        # New tasks go to the end of their project's manual order.
+        pre_save.connect(ranking.assign_rank, sender=Task, dispatch_uid='api.ranking.assign_rank')
+
+        post_save.connect(tokens.forget_token_version, sender=User, dispatch_uid='api.tokens.forget_token_version')
+
+        # Unread notifications of a deleted project come off their recipients' counters.
+        pre_delete.connect(notifications.forget_project, sender=Project, dispatch_uid='api.notifications.forget_project')
@@ -0,0 +1,166 @@
+"""
+Archival of completed tasks.
+
+Completed tasks that have not been touched for a while are moved, together with
+their comments, tags and dependencies, from the hot tables into the archive
+tables. Moves happen in batches, each batch inside its own transaction, so a
+long run never holds locks on the whole table and can be interrupted safely.
+
+Tasks are archived from every shard; the archive tables live on the default
+database. A batch writes the archive copies before it deletes the live rows,
+so a failure between the two commits leaves a task in both places (and the
+next run replaces the copy), never in neither.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import sharding
+from .models import (
+    Task, Comment, TaskTag, TaskDependency, ArchivedTask, ArchivedComment, ArchivedTaskTag, ArchivedTaskDependency,
+)
+from .ranking import assign_ranks
+from .graph import CycleError, add_dependency, invalidate_graph
+
+TASK_FIELDS = ['id', 'title', 'description', 'status', 'priority', 'project_id', 'assigned_to_id', 'created_at', 'updated_at']
+COMMENT_FIELDS = ['id', 'content', 'author_id', 'task_id', 'project_id', 'created_at', 'updated_at']
+TAG_FIELDS = ['id', 'task_id', 'project_id', 'name', 'created_at']
+DEPENDENCY_FIELDS = ['id', 'project_id', 'task_id', 'depends_on_id', 'created_at']
+
+
+def archive_completed_tasks(older_than_days=None, batch_size=None, max_batches=None):
+    """
+    Move completed tasks last updated more than `older_than_days` ago into the archive.
+    Returns the number of tasks archived.
+    """
+    if older_than_days is None:
+        older_than_days = settings.TASK_ARCHIVE_AFTER_DAYS
+    if batch_size is None:
+        batch_size = settings.TASK_ARCHIVE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+
+    archived = 0
+    batches = 0
+    for alias in sharding.aliases():
+        last_id = 0
+        while max_batches is None or batches < max_batches:
+            ids = list(
+                Task.objects.using(alias).filter(status='Completed', updated_at__lt=cutoff, id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            archived += _archive_batch(alias, ids, cutoff)
+            last_id = ids[-1]
+            batches += 1
+    return archived
+
+
+def _archive_batch(alias, ids, cutoff):
+    # The archive commits first (see the module docstring).
+    with transaction.atomic(using=alias), transaction.atomic(using='default'):
+        # Re-check the filter under the transaction: a task may have been reopened
+        # between picking the batch and moving it.
+        tasks = list(
+            Task.objects.using(alias).select_for_update()
+            .filter(id__in=ids, status='Completed', updated_at__lt=cutoff)
+            .values(*TASK_FIELDS)
+        )
+        if not tasks:
+            return 0
+        task_ids = [row['id'] for row in tasks]
+        comments = list(Comment.objects.using(alias).filter(task_id__in=task_ids).values(*COMMENT_FIELDS))
+        tags = list(TaskTag.objects.using(alias).filter(task_id__in=task_ids).values(*TAG_FIELDS))
+        # Dependencies only exist on the default database (see sharding.movable).
+        edges = TaskDependency.objects.using('default').filter(Q(task_id__in=task_ids) | Q(depends_on_id__in=task_ids))
+        dependencies = list(edges.values(*DEPENDENCY_FIELDS))
+
+        # The archive models use plain datetime fields, so timestamps are copied verbatim.
+        ArchivedTask.objects.filter(id__in=task_ids).delete()
+        ArchivedTaskDependency.objects.filter(id__in=[row['id'] for row in dependencies]).delete()
+        ArchivedTask.objects.bulk_create([ArchivedTask(**row) for row in tasks])
+        ArchivedComment.objects.bulk_create([ArchivedComment(**row) for row in comments])
+        ArchivedTaskTag.objects.bulk_create([ArchivedTaskTag(**row) for row in tags])
+        ArchivedTaskDependency.objects.bulk_create([ArchivedTaskDependency(**row) for row in dependencies])
+        edges.delete()
+        Comment.objects.using(alias).filter(task_id__in=task_ids).delete()
+        Task.objects.using(alias).filter(id__in=task_ids).delete()
+    for project_id in {row['project_id'] for row in tasks}:
+        invalidate_graph(project_id)
+    return len(tasks)
+
+
+def restore_task(task_id):
+    """
+    Move an archived task and its comments, tags and dependencies back into
+    the hot tables, on its project's shard.
+    Returns the restored Task, or None if the task is not in the archive.
+    """
+    row = ArchivedTask.objects.filter(id=task_id).values('project_id').first()
+    if row is None:
+        return None
+    alias = sharding.shard_for_project(row['project_id'])
+    # The live rows commit first, so a failure in between leaves the task in both places.
+    with transaction.atomic(using='default'), transaction.atomic(using=alias):
+        row = (
+            ArchivedTask.objects.select_for_update()
+            .filter(id=task_id)
+            .values(*TASK_FIELDS)
+            .first()
+        )
+        if row is None:
+            return None
+        comments = list(ArchivedComment.objects.filter(task_id=task_id).values(*COMMENT_FIELDS))
+        tags = list(ArchivedTaskTag.objects.filter(task_id=task_id).values(*TAG_FIELDS))
+
+        # The archive does not keep ranks; a restored task goes to the end of its project.
+        task = Task(**row)
+        assign_ranks([task])
+        # copy_rows keeps ids and the original timestamps, and mirrors what the rows point at.
+        sharding.copy_rows(Task, [{**row, 'rank': task.rank}], alias)
+        sharding.copy_rows(Comment, comments, alias)
+        sharding.copy_rows(TaskTag, tags, alias)
+        ArchivedTask.objects.filter(id=task_id).delete()
+        task = Task.objects.using(alias).get(id=task_id)
+        _restore_dependencies(task)
+    invalidate_graph(task.project_id)
+    return task
+
+
+def _restore_dependencies(task):
+    """
+    Put back the archived dependencies of `task` whose other end is a live task
+    of the same project. Those whose other end is still archived stay in the
+    archive until it is restored; the rest (the other end was deleted or moved
+    away, or the edge would now close a cycle) are dropped.
+    """
+    edges = ArchivedTaskDependency.objects.filter(Q(task_id=task.id) | Q(depends_on_id=task.id))
+    rows = list(edges.values(*DEPENDENCY_FIELDS))
+    if not rows:
+        return
+    others = {row['depends_on_id'] if row['task_id'] == task.id else row['task_id'] for row in rows}
+    live = set(Task.objects.filter(id__in=others, project_id=task.project_id).values_list('id', flat=True))
+    archived = set(ArchivedTask.objects.filter(id__in=others, project_id=task.project_id).values_list('id', flat=True))
+    invalidate_graph(task.project_id)  # The cached graph does not know the restored task yet.
+    done, restored = [], []
+    for row in rows:
+        other = row['depends_on_id'] if row['task_id'] == task.id else row['task_id']
+        if other in archived:
+            continue
+        done.append(row['id'])
+        if other not in live:
+            continue
+        try:
+            add_dependency(task.project_id, row['depends_on_id'], row['task_id'],
+                           lambda row=row: TaskDependency.objects.create(**row))
+        except CycleError:
+            continue
+        restored.append(row)
+    edges.filter(id__in=done).delete()
+    # Inserting fires auto_now_add, so put the original creation times back.
+    for row in restored:
+        TaskDependency.objects.filter(id=row['id']).update(created_at=row['created_at'])
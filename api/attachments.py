@@ -0,0 +1,294 @@
+"""
+Attachment storage.
+
+Uploads are resumable: the client declares the file size, then PUTs chunks
+with a Content-Range. Each chunk is streamed from the request into a partial
+file under ATTACHMENT_ROOT/uploads in ATTACHMENT_BUFFER_SIZE pieces, so neither
+a chunk nor the file is ever held in memory. After an interrupted chunk, the
+client asks for the offset and resends from there. When the last byte arrives,
+the partial file is hashed. If a Blob with that SHA-256 already exists, the
+partial file is dropped and the new Attachment points at the existing Blob.
+Otherwise the partial file is renamed into ATTACHMENT_ROOT/blobs.
+
+Downloads hand the open blob file to FileResponse. Under a WSGI server that
+provides wsgi.file_wrapper, the kernel then copies it to the socket with
+sendfile(). A Range request gets the same treatment through RangeFile, which
+bounds reads without hiding the file descriptor. With ATTACHMENT_ACCEL_REDIRECT
+set, the response carries only an X-Accel-Redirect header, and the front-end
+server streams the blob itself.
+"""
+import hashlib
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+from . import sharding
+from .models import Attachment, Blob, Comment, Task, Upload
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class UploadError(ValueError):
+    """
+    A chunk that cannot be accepted. `offset` is the upload's current offset.
+    """
+
+    def __init__(self, message, offset=None):
+        super().__init__(message)
+        self.offset = offset
+
+
+class OffsetMismatch(UploadError):
+    """
+    The chunk does not start where the upload left off.
+    """
+
+
+def blob_name(sha256):
+    return os.path.join('blobs', sha256[:2], sha256)
+
+
+def blob_path(sha256):
+    return os.path.join(settings.ATTACHMENT_ROOT, blob_name(sha256))
+
+
+def upload_path(upload):
+    return os.path.join(settings.ATTACHMENT_ROOT, 'uploads', f'{upload.pk}.part')
+
+
+def resolve_target(task_id=None, comment_id=None):
+    """
+    The (project_id, task, comment) an attachment would belong to, or None if
+    the task or comment does not exist.
+    """
+    if comment_id:
+        alias = sharding.locate(Comment, comment_id)
+        comment = Comment.objects.using(alias).select_related('task').filter(pk=comment_id).first() if alias else None
+        if comment is None:
+            return None
+        return comment.project_id or comment.task.project_id, None, comment
+    alias = sharding.locate(Task, task_id)
+    task = Task.objects.using(alias).filter(pk=task_id).first() if alias else None
+    if task is None:
+        return None
+    return task.project_id, task, None
+
+
+def start_upload(user, project_id, task, comment, filename, size, content_type):
+    if size > settings.ATTACHMENT_MAX_SIZE:
+        raise UploadError(f"Attachments are limited to {settings.ATTACHMENT_MAX_SIZE} bytes.")
+    upload = Upload.objects.create(
+        project_id=project_id,
+        task_id=task.pk if task else None,
+        comment_id=comment.pk if comment else None,
+        filename=os.path.basename(filename)[:255],
+        content_type=content_type or 'application/octet-stream',
+        size=size,
+        uploaded_by=user,
+    )
+    os.makedirs(os.path.dirname(upload_path(upload)), exist_ok=True)
+    open(upload_path(upload), 'wb').close()
+    return upload
+
+
+def write_chunk(upload, content_range, content_length, stream):
+    """
+    Append one chunk, read from `stream`, at the offset given by its Content-Range.
+    Returns the Attachment when this was the last chunk, otherwise None.
+    """
+    match = CONTENT_RANGE.match(content_range or '')
+    if not match:
+        raise UploadError("Content-Range must be 'bytes start-end/total'.", upload.received)
+    start, end, total = (int(value) for value in match.groups())
+    length = end - start + 1
+    if total != upload.size or end >= upload.size or length <= 0:
+        raise UploadError("Content-Range does not fit the declared size.", upload.received)
+    if content_length != length:
+        raise UploadError("Content-Length does not match Content-Range.", upload.received)
+    if start != upload.received:
+        raise OffsetMismatch(f"Expected a chunk starting at byte {upload.received}.", upload.received)
+
+    written = 0
+    with open(upload_path(upload), 'r+b') as part:
+        part.seek(start)
+        while written < length:
+            block = stream.read(min(settings.ATTACHMENT_BUFFER_SIZE, length - written))
+            if not block:
+                break
+            part.write(block)
+            written += len(block)
+    if written != length:
+        raise UploadError("The chunk ended early; resend it from the current offset.", upload.received)
+    # Of two clients sending the same chunk, only one moves the offset on.
+    if not Upload.objects.filter(pk=upload.pk, received=start).update(received=end + 1, updated_at=timezone.now()):
+        upload.refresh_from_db(fields=['received'])
+        raise OffsetMismatch("The upload moved on while this chunk was written.", upload.received)
+    upload.received = end + 1
+    if upload.received == upload.size:
+        return complete(upload)
+    return None
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(settings.ATTACHMENT_BUFFER_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete(upload):
+    """
+    Turn a fully received upload into an Attachment, storing its content once per hash.
+    """
+    part = upload_path(upload)
+    sha256 = file_sha256(part)
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                Blob.objects.create(sha256=sha256, size=upload.size)
+        except IntegrityError:
+            os.remove(part)
+        else:
+            target = blob_path(sha256)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(part, target)
+        attachment = Attachment.objects.create(
+            project_id=upload.project_id,
+            task_id=upload.task_id,
+            comment_id=upload.comment_id,
+            blob_id=sha256,
+            filename=upload.filename,
+            content_type=upload.content_type,
+            uploaded_by_id=upload.uploaded_by_id,
+        )
+        upload.delete()
+    return attachment
+
+
+def detach(task=None, comment=None):
+    """
+    Delete the attachments of a task (including those on its comments) or of a
+    comment that is about to be deleted. Their blobs go with the next purge.
+    """
+    if task is not None:
+        comment_ids = list(Comment.objects.using(task._state.db).filter(task_id=task.pk).values_list('id', flat=True))
+        Attachment.objects.filter(Q(task_id=task.pk) | Q(comment_id__in=comment_ids)).delete()
+    else:
+        Attachment.objects.filter(comment_id=comment.pk).delete()
+
+
+def abort(upload):
+    part = upload_path(upload)
+    upload.delete()
+    if os.path.exists(part):
+        os.remove(part)
+
+
+class RangeFile:
+    """
+    Read-only view of `length` bytes of an open file starting at `start`.
+    It keeps fileno() so servers can still sendfile() the range: the file
+    position is set to `start`, and Content-Length bounds the copy.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single 'bytes=' range, None to send the whole file, or
+    False if the range cannot be satisfied.
+    """
+    match = RANGE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def download(attachment, range_header=None):
+    size = attachment.blob.size
+    disposition = {'as_attachment': True, 'filename': attachment.filename}
+    if settings.ATTACHMENT_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=attachment.content_type)
+        response['X-Accel-Redirect'] = settings.ATTACHMENT_ACCEL_REDIRECT.rstrip('/') + '/' + blob_name(attachment.blob_id)
+        response['Content-Disposition'] = content_disposition_header(True, attachment.filename)
+        return response
+
+    byte_range = parse_range(range_header, size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    file = open(blob_path(attachment.blob_id), 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=attachment.content_type, **disposition)
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end - start + 1), status=206,
+                                content_type=attachment.content_type, **disposition)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response.block_size = settings.ATTACHMENT_BUFFER_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = f'"{attachment.blob_id}"'
+    return response
+
+
+def purge(max_age_seconds=None):
+    """
+    Remove blobs no attachment refers to, and uploads untouched for longer than
+    ATTACHMENT_UPLOAD_EXPIRY_SECONDS. Returns (blobs, uploads) removed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=max_age_seconds or settings.ATTACHMENT_UPLOAD_EXPIRY_SECONDS)
+    uploads = 0
+    for upload in Upload.objects.filter(updated_at__lt=cutoff).iterator():
+        abort(upload)
+        uploads += 1
+    blobs = 0
+    orphans = Blob.objects.filter(~Exists(Attachment.objects.filter(blob=OuterRef('pk'))))
+    for sha256 in orphans.values_list('sha256', flat=True).iterator():
+        with transaction.atomic():
+            # Delete the row first: an upload completing with this hash now creates a new blob.
+            deleted, _ = Blob.objects.filter(pk=sha256).filter(
+                ~Exists(Attachment.objects.filter(blob=OuterRef('pk')))).delete()
+            if deleted and os.path.exists(blob_path(sha256)):
+                os.remove(blob_path(sha256))
+        blobs += deleted
+    return blobs, uploads
@@ -0,0 +1,168 @@
+"""
+Batch requests.
+
+POST /api/batch/ carries a list of sub-requests against the API's router routes
+and runs them in-process. The batch is authenticated once, and every
+sub-request reuses that user and token instead of authenticating again.
+Activity and other end-of-request work is done once, when the batch response
+finishes. The sub-requests also share the routing lookups (shard map, replica
+pin; see db_routers.share_lookups), so those hit the cache once per batch.
+Streamed responses (attachment downloads, project snapshots) cannot be returned
+in a batch body; such a sub-request gets a 400 and should be sent on its own.
+
+Sub-requests run in order, with one exception: consecutive GETs do not depend
+on each other, so they run concurrently on up to BATCH_MAX_WORKERS threads,
+each with its own database connection. A write is a barrier: the reads listed
+after it see its effects. Read-your-writes also holds under replica routing,
+because a successful write pins the user to the primary.
+"""
+import contextvars
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from . import db_routers
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+# Request headers that belong to the batch itself and are not passed on to sub-requests.
+BATCH_ONLY_HEADERS = ('CONTENT_TYPE', 'CONTENT_LENGTH', 'HTTP_ACCEPT', 'HTTP_IF_MATCH', 'HTTP_IF_NONE_MATCH')
+
+
+class BatchError(ValueError):
+    pass
+
+
+def parse(items, routable):
+    """
+    Validate the sub-requests, returning (method, path, query, body, headers, resolver match) tuples.
+    `routable` says whether a resolved view may be called from a batch.
+    """
+    if not isinstance(items, list) or not items:
+        raise BatchError("Expected a non-empty list of requests.")
+    if len(items) > settings.BATCH_MAX_REQUESTS:
+        raise BatchError(f"A batch may contain at most {settings.BATCH_MAX_REQUESTS} requests.")
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('url'), str):
+            raise BatchError(f"Request {index}: expected an object with a 'url'.")
+        method = str(item.get('method', 'GET')).upper()
+        if method not in ALLOWED_METHODS:
+            raise BatchError(f"Request {index}: method {method} is not allowed.")
+        headers = item.get('headers') or {}
+        if not isinstance(headers, dict):
+            raise BatchError(f"Request {index}: 'headers' must be an object.")
+        url = urlsplit(item['url'])
+        try:
+            match = resolve(url.path)
+        except Resolver404:
+            match = None
+        if match is not None and not routable(match.func):
+            raise BatchError(f"Request {index}: {url.path} cannot be called from a batch.")
+        parsed.append((method, url.path, url.query, item.get('body'), headers, match))
+    return parsed
+
+
+def build_request(outer, method, path, query, body, headers):
+    """
+    A WSGI request for one sub-request, sharing the outer request's connection
+    details and authenticated user.
+    """
+    payload = json.dumps(body).encode() if body is not None else b''
+    environ = {key: value for key, value in outer.META.items() if key not in BATCH_ONLY_HEADERS}
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(payload)),
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.input': io.BytesIO(payload),
+    })
+    for name, value in headers.items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = str(value)
+    request = WSGIRequest(environ)
+    # Picked up by rest_framework.request.Request, the same hook as DRF's force_authenticate.
+    request._force_auth_user = outer.user
+    request._force_auth_token = outer.auth
+    return request
+
+
+def dispatch(outer, method, path, query, body, headers, match):
+    """
+    Run one sub-request and return {'status': ..., 'headers': ..., 'body': ...}.
+    """
+    if match is None:
+        return {'status': 404, 'headers': {}, 'body': {'error': 'Not found.'}}
+    try:
+        response = match.func(build_request(outer, method, path, query, body, headers), *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+    except Exception:
+        logger.exception("Batch sub-request %s %s failed", method, path)
+        return {'status': 500, 'headers': {}, 'body': {'error': 'An unexpected error occurred.'}}
+    if response.streaming:
+        response.close()
+        return {'status': 400, 'headers': {},
+                'body': {'error': 'This response is streamed and cannot be batched; send the request on its own.'}}
+    content_type = response.get('Content-Type', '')
+    if not response.content:
+        content = None
+    elif content_type.startswith('application/json'):
+        content = json.loads(response.content)
+    else:
+        content = response.content.decode(response.charset or 'utf-8')
+    response_headers = {name: value for name, value in response.items() if name not in ('Content-Length', 'Vary', 'Allow')}
+    return {'status': response.status_code, 'headers': response_headers, 'body': content}
+
+
+def _dispatch_in_thread(context, args):
+    try:
+        return context.run(dispatch, *args)
+    finally:
+        connections.close_all()
+
+
+def run(outer, parsed):
+    """
+    Run the parsed sub-requests, reads concurrently between writes, and return
+    their results in request order.
+    """
+    token = db_routers.share_lookups()
+    try:
+        return _run(outer, parsed)
+    finally:
+        db_routers.reset_lookups(token)
+
+
+def _run(outer, parsed):
+    results = []
+    reads = []
+
+    def flush_reads():
+        if len(reads) > 1 and settings.BATCH_MAX_WORKERS > 1:
+            with ThreadPoolExecutor(max_workers=min(settings.BATCH_MAX_WORKERS, len(reads))) as pool:
+                # Each thread runs in its own copy of the batch's context, so its log records carry the batch's request id.
+                results.extend(pool.map(_dispatch_in_thread, [contextvars.copy_context() for _ in reads],
+                                        [(outer, *item) for item in reads]))
+        else:
+            results.extend(dispatch(outer, *item) for item in reads)
+        reads.clear()
+
+    for item in parsed:
+        if item[0] == 'GET':
+            reads.append(item)
+            continue
+        flush_reads()
+        results.append(dispatch(outer, *item))
+    flush_reads()
+    return results
@@ -0,0 +1,92 @@
+"""
+Kanban board of a project.
+
+The board returns the first tasks of every status column, the size of each
+column, and a cursor for loading more. All of this comes from one query. In
+that query, ROW_NUMBER() OVER (PARTITION BY status ...) numbers the tasks
+within their column, and COUNT() OVER the same partition gives the column
+totals. The outer query keeps the rows whose number is within the limit.
+
+Columns follow the manual order (rank, then id). A cursor names the last task
+a column has shown. Loading more counts, in the same window, the tasks up to
+and including that one, then keeps the next `limit` rows after them. Columns keep their full totals when paged, and a
+cursor stays valid when tasks are added or removed elsewhere in the column.
+"""
+import base64
+import binascii
+
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Task
+
+STATUSES = [value for value, _ in Task._meta.get_field('status').choices]
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class BoardError(ValueError):
+    pass
+
+
+def encode_cursor(task):
+    return base64.urlsafe_b64encode(f'{task.rank}.{task.id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    The (rank, id) of the last task shown.
+    """
+    try:
+        rank, pk = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('.')
+        return rank, int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise BoardError("Invalid cursor.")
+
+
+def parse_limit(value):
+    if value is None:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise BoardError("limit must be an integer.")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise BoardError(f"limit must be between 1 and {MAX_LIMIT}.")
+    return limit
+
+
+def board(tasks, limit=DEFAULT_LIMIT, status=None, cursor=None):
+    """
+    Group `tasks` (a queryset already scoped to one project and to what the user
+    may see) into status columns of at most `limit` tasks each, in rank order.
+    With `status`, only that column is returned, continuing after `cursor`.
+    """
+    if status is not None and status not in STATUSES:
+        raise BoardError(f"status must be one of: {', '.join(STATUSES)}.")
+    if cursor is not None and status is None:
+        raise BoardError("A cursor applies to one column; pass its status as well.")
+    partition = [F('status')]
+    if status is not None:
+        tasks = tasks.filter(status=status)
+    rows = tasks.annotate(
+        position=Window(RowNumber(), partition_by=partition, order_by=[F('rank').asc(), F('id').asc()]),
+        total=Window(Count('id'), partition_by=partition),
+    )
+    if cursor is None:
+        rows = rows.filter(position__lte=limit)
+    else:
+        rank, pk = decode_cursor(cursor)
+        shown = Q(rank__lt=rank) | Q(rank=rank, id__lte=pk)
+        rows = rows.annotate(skipped=Window(Count('id', filter=shown), partition_by=partition)).filter(
+            position__gt=F('skipped'), position__lte=F('skipped') + limit)
+    rows = rows.order_by('status', 'position')
+
+    columns = {name: {'status': name, 'total': 0, 'tasks': [], 'next': None}
+               for name in ([status] if status is not None else STATUSES)}
+    for task in rows:
+        column = columns[task.status]
+        column['total'] = task.total
+        column['tasks'].append(task)
+        column['next'] = encode_cursor(task) if task.position < task.total else None
+    return list(columns.values())
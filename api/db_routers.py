@@ -0,0 +1,173 @@
+"""
+Database routing for project shards and read replicas.
+
+ShardRouter sends tasks and comments to the shard of their project (see
+sharding.py), taken from the instance involved or from the shard a viewset has
+selected for the request; rows related to a sharded row but not sharded
+themselves are read from the default database.
+
+Reads are only sent to a replica while a viewset has marked the current request
+as a replica-safe read (see ReplicaReadMixin in views.py), and all of them to the
+replica chosen when it was marked, so a page and its count, or a row and its
+related rows, come from one consistent copy. Everything else,
+including all writes, goes to the default database. After a successful write a
+user is pinned to the primary for REPLICA_PIN_SECONDS so they always read their
+own writes, even if the replicas lag behind.
+
+Routing looks the shard map and the user's pin up in the cache on every request.
+Within share_lookups() (a batch request, see api/batch.py) the answers are kept
+for the rest of the context, so the sub-requests of a batch look each one up once.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+_replica = ContextVar('replica', default=None)
+_current_shard = ContextVar('current_shard', default=None)
+_lookups = ContextVar('routing_lookups', default=None)
+_random = random.Random()
+
+
+def use_replica(alias=None):
+    """
+    Send the replica-safe reads of the current request (context) to `alias`, or
+    to a replica chosen now by weight. Returns a token for reset_replica().
+    """
+    if alias is None:
+        alias = choose_replica(settings.DATABASE_REPLICAS)
+    return _replica.set(alias)
+
+
+def reset_replica(token):
+    _replica.reset(token)
+
+
+def use_shard(alias):
+    """
+    Send task and comment queries without a more specific hint to `alias`.
+    Returns a token for reset_shard().
+    """
+    return _current_shard.set(alias)
+
+
+def reset_shard(token):
+    _current_shard.reset(token)
+
+
+def share_lookups():
+    """
+    Keep routing lookups made in the current context (and in copies of it) until
+    reset_lookups(). Returns a token for reset_lookups().
+    """
+    return _lookups.set({})
+
+
+def reset_lookups(token):
+    _lookups.reset(token)
+
+
+def lookup(key, compute):
+    """
+    compute(), or its answer from earlier in a share_lookups() context.
+    """
+    lookups = _lookups.get()
+    if lookups is None:
+        return compute()
+    if key not in lookups:
+        lookups[key] = compute()
+    return lookups[key]
+
+
+def forget(key, value=None):
+    """
+    Drop (or, with `value`, replace) a shared lookup after the value it cached changed.
+    """
+    lookups = _lookups.get()
+    if lookups is not None:
+        lookups.pop(key, None)
+        if value is not None:
+            lookups[key] = value
+
+
+def pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_to_primary(user):
+    if user is not None and user.is_authenticated and settings.REPLICA_PIN_SECONDS:
+        cache.set(pin_key(user.pk), True, settings.REPLICA_PIN_SECONDS)
+        forget(pin_key(user.pk), True)
+
+
+def is_pinned(user):
+    if user is None or not user.is_authenticated:
+        return False
+    key = pin_key(user.pk)
+    return lookup(key, lambda: bool(cache.get(key)))
+
+
+def choose_replica(replicas):
+    """
+    Pick an alias from {alias: weight}, proportionally to its weight.
+    """
+    aliases = [alias for alias, weight in replicas.items() if weight > 0]
+    if not aliases:
+        return None
+    return _random.choices(aliases, weights=[replicas[alias] for alias in aliases])[0]
+
+
+class ShardRouter:
+    """
+    Route tasks and comments to their project's shard.
+    """
+
+    def _db(self, model, hints):
+        from . import sharding
+        from .models import Project
+
+        if not sharding.enabled():
+            return None
+        instance = hints.get('instance')
+        if not sharding.is_sharded(model):
+            if instance is not None and instance._state.db in settings.TASK_SHARDS:
+                # Users and projects on a shard are mirrors; read the real rows.
+                return 'default'
+            return None
+        if instance is not None:
+            if sharding.is_sharded(type(instance)) and instance._state.db:
+                return instance._state.db
+            project_id = instance.pk if isinstance(instance, Project) else getattr(instance, 'project_id', None)
+            if project_id is not None:
+                return sharding.shard_for_project(project_id)
+        return _current_shard.get()
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, hints)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every shard carries the full schema so mirrored rows can back foreign keys.
+        return None
+
+
+class ReplicaRouter:
+    """
+    Send replica-safe reads to the replica chosen for the request.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
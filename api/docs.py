@@ -0,0 +1,19 @@
+"""
+API documentation hooks that do not import drf_yasg.
+
+Views describe their extra query parameters with @query_parameters; the
+descriptions are turned into drf_yasg parameters by api/swagger.py, which is
+only imported when the docs are enabled and first requested.
+"""
+
+STRING, INTEGER, BOOLEAN = 'string', 'integer', 'boolean'
+
+
+def query_parameters(*parameters):
+    """
+    Attach (name, description, type) query parameters to a view method for the API docs.
+    """
+    def decorator(view_method):
+        view_method._query_parameters = parameters
+        return view_method
+    return decorator
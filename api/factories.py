@@ -0,0 +1,48 @@
+"""
+Factories for test data.
+
+Each factory saves one object and fills every required field with a unique
+default, so a test only spells out the fields it asserts on. Related objects
+that are not passed in are created on the fly.
+"""
+from itertools import count
+
+from .models import User, Project, Task, Comment
+
+_sequence = count(1)
+
+
+def make_user(role='Developer', password='password', **fields):
+    n = next(_sequence)
+    fields.setdefault('email', f'user{n}@example.com')
+    fields.setdefault('name', f'{role} {n}')
+    return User.objects.create_user(password=password, role=role, **fields)
+
+
+def make_project(manager=None, members=(), **fields):
+    n = next(_sequence)
+    fields.setdefault('name', f'Project {n}')
+    fields.setdefault('description', f'Description for project {n}')
+    fields.setdefault('start_date', '2025-04-01')
+    fields.setdefault('end_date', '2025-04-30')
+    project = Project.objects.create(manager=manager or make_user('Project Manager'), **fields)
+    if members:
+        project.members.add(*members)
+    return project
+
+
+def make_task(project=None, **fields):
+    n = next(_sequence)
+    fields.setdefault('title', f'Task {n}')
+    fields.setdefault('description', f'Description for task {n}')
+    return Task.objects.create(project=project or make_project(), **fields)
+
+
+def make_comment(author=None, task=None, project=None, **fields):
+    """
+    A comment on `task`, or on `project` if given instead; a new task when neither is.
+    """
+    if task is None and project is None:
+        task = make_task()
+    fields.setdefault('content', f'Comment {next(_sequence)}')
+    return Comment.objects.create(author=author or make_user(), task=task, project=project, **fields)
@@ -0,0 +1,79 @@
+"""
+Filter sets for the list endpoints.
+"""
+from django import forms
+from django.core.exceptions import ValidationError
+from django_filters import rest_framework as filters
+
+from . import tags
+from .models import ArchivedTask, Task
+
+
+class TagListField(forms.CharField):
+    """
+    Comma-separated tag names, cleaned to a list; invalid names fail form validation (400).
+    """
+
+    def clean(self, value):
+        value = super().clean(value)
+        if not value:
+            return value
+        try:
+            return tags.parse_filter(value)
+        except tags.TagError as e:
+            raise ValidationError(str(e))
+
+
+class TagsFilter(filters.Filter):
+    field_class = TagListField
+
+
+class TaskFilter(filters.FilterSet):
+    """
+    The plain field filters of the task list, plus ?tags=a,b (tasks with every
+    tag) and ?tags_any=a,b (tasks with at least one). With ?project=, the tag
+    lookups are confined to that project's index range.
+    """
+    tags = TagsFilter(method='filter_tags_all')
+    tags_any = TagsFilter(method='filter_tags_any')
+
+    class Meta:
+        model = Task
+        fields = ['status', 'priority', 'project', 'assigned_to']
+
+    def project_id(self):
+        project = self.form.cleaned_data.get('project')
+        return project.pk if project is not None else None
+
+    def filter_tags_all(self, queryset, name, value):
+        return tags.filter_all(queryset, value, self.project_id())
+
+    def filter_tags_any(self, queryset, name, value):
+        return tags.filter_any(queryset, value, self.project_id())
+
+
+class ArchivedTaskFilter(filters.FilterSet):
+    """
+    The task list filters applied to archived tasks (?include_archived=true).
+    Archived tags are only kept for restoring, so a tag filter matches no archived task.
+    """
+    tags = TagsFilter(method='filter_none')
+    tags_any = TagsFilter(method='filter_none')
+
+    class Meta:
+        model = ArchivedTask
+        fields = ['status', 'priority', 'project', 'assigned_to']
+
+    def filter_none(self, queryset, name, value):
+        return queryset.none()
+
+
+class TaskFilterBackend(filters.DjangoFilterBackend):
+    """
+    Filters live tasks with TaskFilter and archived ones with ArchivedTaskFilter.
+    """
+
+    def get_filterset_class(self, view, queryset=None):
+        if queryset is not None and queryset.model is ArchivedTask:
+            return ArchivedTaskFilter
+        return super().get_filterset_class(view, queryset)
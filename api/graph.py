@@ -0,0 +1,268 @@
+"""
+Task dependency graph with an incrementally maintained topological order.
+
+Edges point from a prerequisite to the task that depends on it. New edges are
+checked for cycles with the Pearce-Kelly algorithm: when the edge already agrees
+with the current order nothing needs to be searched, otherwise only the tasks
+whose position lies between the two endpoints are visited and reordered.
+
+Schedules are served from a graph cached per process. New edges are checked
+against the graph as stored in the database, under a lock on the project row,
+so that concurrent workers cannot between them create a cycle.
+"""
+import threading
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Project, Task, TaskDependency
+from .sharding import shard_for_project
+
+
+class CycleError(ValueError):
+    """Raised when adding an edge would make the dependency graph cyclic."""
+
+
+class DependencyGraph:
+    """
+    In-memory DAG over task ids.
+    """
+
+    def __init__(self, nodes=(), edges=()):
+        self.succ = defaultdict(set)
+        self.pred = defaultdict(set)
+        self.position = {}
+        for node in nodes:
+            self.position[node] = len(self.position)
+        for source, target in edges:
+            self.succ[source].add(target)
+            self.pred[target].add(source)
+        self._rebuild_order()
+
+    def __contains__(self, node):
+        return node in self.position
+
+    def _rebuild_order(self):
+        """
+        Full topological sort (Kahn's algorithm), used only when the graph is built.
+        """
+        indegree = {node: len(self.pred[node]) for node in self.position}
+        ready = [node for node in sorted(self.position, key=self.position.get) if not indegree[node]]
+        order = []
+        while ready:
+            node = ready.pop()
+            order.append(node)
+            for successor in self.succ[node]:
+                indegree[successor] -= 1
+                if not indegree[successor]:
+                    ready.append(successor)
+        if len(order) != len(self.position):
+            raise CycleError("The dependency graph contains a cycle.")
+        self.position = {node: index for index, node in enumerate(order)}
+        self._next_position = len(order)
+
+    def add_node(self, node):
+        if node not in self.position:
+            self.position[node] = self._next_position
+            self._next_position += 1
+
+    def remove_node(self, node):
+        for successor in self.succ.pop(node, ()):
+            self.pred[successor].discard(node)
+        for predecessor in self.pred.pop(node, ()):
+            self.succ[predecessor].discard(node)
+        self.position.pop(node, None)
+
+    def add_edge(self, source, target):
+        """
+        Add source -> target, keeping the order valid. Raises CycleError and
+        leaves the graph untouched if target already reaches source.
+        """
+        self.add_node(source)
+        self.add_node(target)
+        if source == target:
+            raise CycleError("A task cannot depend on itself.")
+        if target in self.succ[source]:
+            return
+        lower, upper = self.position[target], self.position[source]
+        if lower > upper:
+            self.succ[source].add(target)
+            self.pred[target].add(source)
+            return
+
+        # Only nodes positioned inside [lower, upper] can be affected.
+        forward = self._search(target, self.succ, lambda node: self.position[node] <= upper, stop=source)
+        backward = self._search(source, self.pred, lambda node: self.position[node] >= lower)
+        self._reorder(backward, forward)
+        self.succ[source].add(target)
+        self.pred[target].add(source)
+
+    def remove_edge(self, source, target):
+        # Removing an edge never invalidates a topological order.
+        self.succ[source].discard(target)
+        self.pred[target].discard(source)
+
+    def _search(self, start, neighbours, in_region, stop=None):
+        seen = {start}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for neighbour in neighbours[node]:
+                if neighbour == stop:
+                    raise CycleError("This dependency would create a cycle.")
+                if neighbour not in seen and in_region(neighbour):
+                    seen.add(neighbour)
+                    stack.append(neighbour)
+        return seen
+
+    def _reorder(self, backward, forward):
+        """
+        Give the backward set the lowest of the affected positions and the
+        forward set the rest, keeping each set's internal order.
+        """
+        backward = sorted(backward, key=self.position.get)
+        forward = sorted(forward, key=self.position.get)
+        slots = sorted(self.position[node] for node in backward + forward)
+        for node, slot in zip(backward + forward, slots):
+            self.position[node] = slot
+
+    def topological_order(self):
+        return sorted(self.position, key=self.position.get)
+
+    def critical_path(self, weights):
+        """
+        Heaviest dependency chain, where `weights` maps a node to its cost
+        (nodes missing from `weights` cost nothing).
+        Returns (total weight, list of nodes along the path).
+        """
+        best = {}
+        via = {}
+        for node in self.topological_order():
+            incoming = max(self.pred[node], key=best.__getitem__, default=None)
+            best[node] = weights.get(node, 0) + (best[incoming] if incoming is not None else 0)
+            via[node] = incoming
+        if not best:
+            return 0, []
+        node = max(best, key=best.__getitem__)
+        length = best[node]
+        path = []
+        while node is not None:
+            path.append(node)
+            node = via[node]
+        path.reverse()
+        return length, path
+
+
+# Graphs are kept per process and tagged with a version token stored in the
+# shared cache; another process changing the graph replaces the token, which
+# forces a rebuild here on next use.
+_graphs = {}
+_locks = defaultdict(threading.Lock)
+
+
+def version_key(project_id):
+    return f'task-graph-version:{project_id}'
+
+
+def schedule_key(project_id, version):
+    return f'task-graph-schedule:{project_id}:{version}'
+
+
+def current_version(project_id):
+    version = cache.get(version_key(project_id))
+    if version is None:
+        cache.add(version_key(project_id), uuid.uuid4().hex, None)
+        version = cache.get(version_key(project_id))
+    return version
+
+
+def invalidate_graph(project_id):
+    """
+    Drop every cached graph and schedule for the project (tasks or edges changed).
+    """
+    cache.set(version_key(project_id), uuid.uuid4().hex, None)
+    _graphs.pop(project_id, None)
+
+
+def invalidate_schedule(project_id):
+    """
+    Drop the cached schedule only (a task status changed, the structure did not).
+    """
+    cache.delete(schedule_key(project_id, current_version(project_id)))
+
+
+def load_graph(project_id):
+    """
+    Return (version, graph) for the project, rebuilding it from the database if stale.
+    """
+    version = current_version(project_id)
+    cached = _graphs.get(project_id)
+    if cached is not None and cached[0] == version:
+        return cached
+    graph = build_graph(project_id)
+    _graphs[project_id] = (version, graph)
+    return version, graph
+
+
+def build_graph(project_id):
+    """
+    The project's dependency graph as stored in the database.
+    """
+    nodes = list(Task.objects.using(shard_for_project(project_id)).filter(project_id=project_id).order_by('id').values_list('id', flat=True))
+    members = set(nodes)
+    edges = TaskDependency.objects.filter(project_id=project_id).values_list('depends_on_id', 'task_id')
+    # Skip edges to tasks that are no longer in the project rather than fail on them.
+    return DependencyGraph(nodes=nodes, edges=[edge for edge in edges if edge[0] in members and edge[1] in members])
+
+
+def add_dependency(project_id, depends_on_id, task_id, save):
+    """
+    Check depends_on -> task for cycles, then call `save()` to persist the edge
+    and publish the updated graph under a new version.
+
+    The check and the save run under a lock on the project row, against the
+    graph reloaded from the database, so that workers in other processes cannot
+    each add one half of a cycle.
+    """
+    with _locks[project_id]:
+        with transaction.atomic(using='default'):
+            list(Project.objects.using('default').select_for_update().filter(pk=project_id).values_list('pk'))
+            graph = build_graph(project_id)
+            graph.add_edge(depends_on_id, task_id)
+            result = save()
+        version = uuid.uuid4().hex
+        cache.set(version_key(project_id), version, None)
+        _graphs[project_id] = (version, graph)
+        return result
+
+
+def remove_dependency(project_id, depends_on_id, task_id):
+    with _locks[project_id]:
+        _, graph = load_graph(project_id)
+        graph.remove_edge(depends_on_id, task_id)
+        version = uuid.uuid4().hex
+        cache.set(version_key(project_id), version, None)
+        _graphs[project_id] = (version, graph)
+
+
+def project_schedule(project_id):
+    """
+    Topological order and critical path of the project's open tasks, cached until
+    the graph or a task status changes.
+    """
+    version, graph = load_graph(project_id)
+    key = schedule_key(project_id, version)
+    schedule = cache.get(key)
+    if schedule is None:
+        # Completed tasks no longer hold anything up, so they add nothing to the path.
+        open_tasks = Task.objects.using(shard_for_project(project_id)).filter(project_id=project_id).exclude(status='Completed').values_list('id', flat=True)
+        length, path = graph.critical_path(dict.fromkeys(open_tasks, 1))
+        schedule = {
+            'order': graph.topological_order(),
+            'critical_path': path,
+            'critical_path_length': length,
+        }
+        cache.set(key, schedule, 60 * 60)
+    return schedule
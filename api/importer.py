@@ -0,0 +1,305 @@
+"""
+Streaming bulk import of projects, tasks and comments.
+
+Rows are read one at a time from CSV or JSONL and handled in fixed-size batches:
+the foreign keys of a whole batch are resolved with one query per model through
+a lookup cache, every row is validated in memory against the model fields, and
+the valid rows are written with bulk_create in one transaction per batch. The
+same transaction advances the ImportJob checkpoint, so an interrupted import
+resumes exactly after the last committed row.
+"""
+import abc
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import ranking, sharding
+from .graph import invalidate_graph
+from .models import Comment, Project, Task, User
+from .status_history import record_status_changes
+
+
+class RowError(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+class LookupCache:
+    """
+    Maps natural keys (ids, emails) to values for one model, loading unknown keys
+    in bulk and remembering misses so each key is queried at most once.
+    """
+
+    def __init__(self, model, key_field, value_field='id', limit=100000):
+        self.model = model
+        self.key_field = key_field
+        self.value_field = value_field
+        self.limit = limit
+        self.values = {}
+        self.known = set()
+
+    def prime(self, keys):
+        keys = {key for key in keys if key is not None}
+        missing = keys - self.known
+        if missing:
+            if len(self.known) + len(missing) > self.limit:
+                # Keep memory bounded on very large imports; keys are simply looked up again,
+                # including the known ones this batch still needs.
+                self.values.clear()
+                self.known.clear()
+                missing = keys
+            for queryset in sharding.scatter(self.model.objects.filter(**{f'{self.key_field}__in': missing})):
+                if self.key_field == self.value_field:
+                    self.values.update((key, key) for key in queryset.values_list(self.key_field, flat=True))
+                else:
+                    self.values.update(queryset.values_list(self.key_field, self.value_field))
+            self.known |= missing
+
+    def get(self, key):
+        return self.values.get(key)
+
+
+def read_rows(path, fmt):
+    """
+    Yield (row number, row dict) pairs; a row that cannot be parsed is yielded as a RowError.
+    Blank JSONL lines are skipped; row numbers stay line numbers.
+    """
+    with open(path, newline='', encoding='utf-8') as source:
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(source), start=1):
+                yield number, {key: (value if value != '' else None) for key, value in row.items()}
+        else:
+            for number, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except ValueError as exc:
+                    yield number, RowError({'row': [f"Invalid JSON: {exc}"]})
+
+
+def _int(value, field):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError({field: ["A valid integer is required."]})
+
+
+def _emails(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(';')
+    return [email.strip() for email in value if email and email.strip()]
+
+
+def _validate(instance, exclude):
+    try:
+        instance.clean_fields(exclude=exclude)
+    except ValidationError as exc:
+        raise RowError(exc.message_dict)
+    return instance
+
+
+class BaseImporter(abc.ABC):
+    model = None
+
+    def __init__(self):
+        self.users = LookupCache(User, 'email')
+
+    def prime(self, rows):
+        """Resolve the foreign keys of a whole batch at once."""
+
+    @abc.abstractmethod
+    def build(self, row):
+        """Return the unsaved model instance for a row, or raise RowError."""
+
+    def before_insert(self, objects):
+        """Fill in fields that depend on the whole batch."""
+
+    def after_insert(self, objects, rows):
+        """Write rows that depend on the inserted objects."""
+
+    def project_of(self, obj):
+        """Project whose shard the object is written to."""
+        return getattr(obj, 'project_id', None)
+
+    def user_id(self, row, field, required=True):
+        email = row.get(field)
+        if email is None:
+            if required:
+                raise RowError({field: ["This field is required."]})
+            return None
+        user_id = self.users.get(email)
+        if user_id is None:
+            raise RowError({field: [f"No user with email {email}."]})
+        return user_id
+
+
+class ProjectImporter(BaseImporter):
+    model = Project
+
+    def prime(self, rows):
+        self.users.prime(email for row in rows for email in [row.get('manager'), *_emails(row.get('members'))])
+
+    def build(self, row):
+        project = Project(
+            name=row.get('name'),
+            description=row.get('description') or '',
+            start_date=row.get('start_date'),
+            end_date=row.get('end_date'),
+            manager_id=self.user_id(row, 'manager'),
+        )
+        project._member_ids = [self.user_id({'members': email}, 'members') for email in _emails(row.get('members'))]
+        return _validate(project, exclude=['manager'])
+
+    def after_insert(self, objects, rows):
+        Membership = Project.members.through
+        Membership.objects.bulk_create([
+            Membership(project_id=project.id, user_id=user_id)
+            for project in objects
+            for user_id in set(project._member_ids)
+        ])
+
+
+class TaskImporter(BaseImporter):
+    model = Task
+
+    def __init__(self):
+        super().__init__()
+        self.projects = LookupCache(Project, 'id')
+
+    def prime(self, rows):
+        self.users.prime(row.get('assigned_to') for row in rows)
+        project_ids = set()
+        for row in rows:
+            try:
+                project_ids.add(_int(row.get('project'), 'project'))
+            except RowError:
+                pass
+        self.projects.prime(project_ids)
+
+    def build(self, row):
+        project_id = _int(row.get('project'), 'project')
+        if project_id is None or self.projects.get(project_id) is None:
+            raise RowError({'project': ["A valid project id is required."]})
+        task = Task(
+            title=row.get('title'),
+            description=row.get('description') or '',
+            status=row.get('status') or 'Pending',
+            priority=row.get('priority') or 'Medium',
+            project_id=project_id,
+            assigned_to_id=self.user_id(row, 'assigned_to', required=False),
+        )
+        return _validate(task, exclude=['project', 'assigned_to'])
+
+    def before_insert(self, objects):
+        # bulk_create skips the pre_save handler, so rank the batch here, in file order.
+        ranking.assign_ranks(objects)
+
+    def after_insert(self, objects, rows):
+        record_status_changes([(task, None, task.status) for task in objects])
+        for project_id in {task.project_id for task in objects}:
+            invalidate_graph(project_id)
+
+
+class CommentImporter(BaseImporter):
+    model = Comment
+
+    def __init__(self):
+        super().__init__()
+        self.projects = LookupCache(Project, 'id')
+        self.tasks = LookupCache(Task, 'id', 'project_id')
+
+    def prime(self, rows):
+        self.users.prime(row.get('author') for row in rows)
+        task_ids, project_ids = set(), set()
+        for row in rows:
+            try:
+                task_ids.add(_int(row.get('task'), 'task'))
+                project_ids.add(_int(row.get('project'), 'project'))
+            except RowError:
+                pass
+        self.tasks.prime(task_ids)
+        self.projects.prime(project_ids)
+
+    def build(self, row):
+        task_id = _int(row.get('task'), 'task')
+        project_id = _int(row.get('project'), 'project')
+        if task_id is None and project_id is None:
+            raise RowError({'non_field_errors': ["A comment must be associated with either a task or a project."]})
+        if task_id is not None and self.tasks.get(task_id) is None:
+            raise RowError({'task': [f"No task with id {task_id}."]})
+        if project_id is not None and self.projects.get(project_id) is None:
+            raise RowError({'project': [f"No project with id {project_id}."]})
+        comment = Comment(
+            content=row.get('content'),
+            author_id=self.user_id(row, 'author'),
+            task_id=task_id,
+            project_id=project_id,
+        )
+        return _validate(comment, exclude=['author', 'task', 'project'])
+
+    def project_of(self, comment):
+        return self.tasks.get(comment.task_id) if comment.task_id else comment.project_id
+
+
+IMPORTERS = {
+    'project': ProjectImporter,
+    'task': TaskImporter,
+    'comment': CommentImporter,
+}
+
+
+def import_rows(rows, importer, batch_size, job, on_batch=None, on_error=None):
+    """
+    Import (row number, row) pairs in batches, skipping rows the job has already processed.
+    """
+    batch = []
+    for number, row in rows:
+        if number <= job.rows:
+            continue
+        batch.append((number, row))
+        if len(batch) >= batch_size:
+            _import_batch(batch, importer, job, on_batch, on_error)
+            batch = []
+    if batch:
+        _import_batch(batch, importer, job, on_batch, on_error)
+    return job
+
+
+def _import_batch(batch, importer, job, on_batch, on_error):
+    parsed = [row for _, row in batch if isinstance(row, dict)]
+    importer.prime(parsed)
+    objects, errors = [], []
+    for number, row in batch:
+        try:
+            if isinstance(row, RowError):
+                raise row
+            if not isinstance(row, dict):
+                raise RowError({'row': ["Each row must be an object."]})
+            objects.append(importer.build(row))
+        except RowError as exc:
+            errors.append({'row': number, 'errors': exc.errors})
+
+    # With shards enabled, rows on a shard commit in a nested transaction on that
+    # shard just before the checkpoint commits on the default database.
+    with transaction.atomic():
+        importer.before_insert(objects)
+        created = sharding.bulk_create(importer.model, objects, importer.project_of)
+        importer.after_insert(created, parsed)
+        job.rows = batch[-1][0]
+        job.imported += len(created)
+        job.failed += len(errors)
+        job.save()
+
+    if on_error:
+        for error in errors:
+            on_error(error)
+    if on_batch:
+        on_batch(job)
@@ -0,0 +1,210 @@
+"""
+Logging off the request path.
+
+The `api` loggers write to a BackgroundHandler, which only puts records on a
+bounded in-memory queue. A QueueListener thread takes them from the queue and
+does the formatting and the I/O through the real handlers (by default JSON
+lines on stderr). If the queue is full, the record is dropped and counted
+rather than blocking the request.
+
+Each record is tagged with the id of the request that logged it. The id comes
+from the incoming X-Request-ID header when it is well formed, or is generated.
+It is sent back in the response header of the same name.
+
+Messages use %-style arguments, so a record that is below the logger's level
+or filtered out is never formatted. High-volume INFO loggers are sampled per
+LOG_SAMPLE_RATES: at a rate of 0.1, one record in ten is kept and carries
+`sample_rate` so that counts can be scaled back up.
+
+The listener thread starts with the first record in each process, so a server
+that forks workers after loading the settings gets one listener per worker.
+"""
+import atexit
+import copy
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+_request_id = ContextVar('request_id', default=None)
+REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+# Attributes every LogRecord has; anything else was passed with extra= and is logged as a field.
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+request_logger = logging.getLogger('api.requests')
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Adds the current request's id to every record as `request_id`.
+    """
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in every 1/rate INFO-or-lower records of the loggers in `rates`
+    ({logger name: rate}; a name also covers its children). Warnings and
+    errors always pass.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self.counters = {}
+
+    def rate(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        rate = self.rate(record.name)
+        if rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        counter = self.counters.get(record.name) or self.counters.setdefault(record.name, itertools.count())
+        if next(counter) % round(1 / rate):
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, logger, message, request_id, any
+    extra= fields and the exception, if there is one.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        entry.update((key, value) for key, value in vars(record).items()
+                     if key not in STANDARD_ATTRIBUTES and key not in entry)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class BackgroundHandler(QueueHandler):
+    """
+    Queues records for a QueueListener that passes them to `handlers` on a
+    background thread. In LOGGING, name them as 'cfg://handlers.<name>';
+    dictConfig configures handlers in name order, so their names must sort
+    before this handler's.
+    """
+
+    def __init__(self, handlers=(), queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        # Indexing (not iterating) makes dictConfig resolve the cfg:// references.
+        self.handlers = [handlers[i] for i in range(len(handlers))]
+        if not all(isinstance(handler, logging.Handler) for handler in self.handlers):
+            raise ValueError("BackgroundHandler targets must be configured handlers named before it.")
+        self.queue_size = queue_size
+        self.listener = None
+        self.pid = None
+        self.dropped = 0
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            # A forked child inherits the queue, possibly with its lock held, but not the thread.
+            self.queue = queue.Queue(self.queue_size)
+            self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self.listener.start()
+            if self.pid is None:
+                atexit.register(self.stop)
+            self.pid = os.getpid()
+
+    def stop(self):
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self.pid = None
+
+    def flush(self):
+        """Wait until the listener has handled every queued record."""
+        if self.listener is not None and self.pid == os.getpid():
+            self.queue.join()
+
+    def emit(self, record):
+        if self.pid != os.getpid():
+            self.start()
+        super().emit(record)
+
+    def prepare(self, record):
+        """
+        Interpolate the message now, since its arguments may change once the
+        call returns, and render any traceback while its frames exist. All
+        other formatting is left to the listener thread.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RequestLogMiddleware:
+    """
+    Gives each request an id for its log records and the X-Request-ID response
+    header, and logs one `api.requests` line per request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        incoming = request.headers.get('X-Request-ID', '')
+        request_id = incoming if REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        token = _request_id.set(request_id)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            duration = (time.perf_counter() - started) * 1000
+            level = logging.INFO if response.status_code < 500 else logging.WARNING
+            if request_logger.isEnabledFor(level):
+                request_logger.log(level, "%s %s %s %.1fms", request.method, request.path, response.status_code, duration,
+                                   extra={'method': request.method, 'path': request.path,
+                                          'status': response.status_code, 'duration_ms': round(duration, 1)})
+            response['X-Request-ID'] = request_id
+            return response
+        finally:
+            _request_id.reset(token)
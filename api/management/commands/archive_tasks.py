@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.archive import archive_completed_tasks
+
+
+class Command(BaseCommand):
+    help = "Move completed tasks (and their comments) older than N days into the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.TASK_ARCHIVE_AFTER_DAYS,
+                            help="Archive tasks completed and untouched for at least this many days.")
+        parser.add_argument('--batch-size', type=int, default=settings.TASK_ARCHIVE_BATCH_SIZE,
+                            help="Number of tasks moved per transaction.")
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep running and archive every INTERVAL seconds (0 runs once).")
+
+    def handle(self, *args, **options):
+        while True:
+            archived = archive_completed_tasks(
+                older_than_days=options['days'],
+                batch_size=options['batch_size'],
+            )
+            self.stdout.write(f"Archived {archived} task(s).")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
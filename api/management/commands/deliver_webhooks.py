@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import webhooks
+
+
+class Command(BaseCommand):
+    help = "Turn outbox events into webhook deliveries and send the deliveries that are due."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep running and deliver every INTERVAL seconds (0 runs once).")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            dispatched = webhooks.dispatch()
+            sent, failed = webhooks.deliver()
+            purged = webhooks.purge()
+            self.stdout.write(
+                f"Dispatched {dispatched} event(s), sent {sent} delivery(ies) of which {failed} failed, "
+                f"purged {purged} in {time.monotonic() - started:.1f}s."
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,39 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import snapshots
+from api.models import Project
+
+
+class Command(BaseCommand):
+    help = "Write a compressed snapshot of a project, its members, tasks, tags and comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', type=int, help="Id of the project to export.")
+        parser.add_argument('path', help="Snapshot file to write, or - for standard output.")
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="Rows per record (default SNAPSHOT_CHUNK_SIZE).")
+        parser.add_argument('--level', type=int, default=6, choices=range(1, 10),
+                            help="gzip compression level.")
+
+    def handle(self, *args, **options):
+        project = Project.objects.filter(pk=options['project']).first()
+        if project is None:
+            raise CommandError(f"Project {options['project']} does not exist.")
+        started = time.monotonic()
+        to_stdout = options['path'] == '-'
+        target = sys.stdout.buffer if to_stdout else open(options['path'], 'wb')
+        size = 0
+        try:
+            for data in snapshots.export(project, options['chunk_size'], options['level']):
+                target.write(data)
+                size += len(data)
+        finally:
+            if not to_stdout:
+                target.close()
+        if not to_stdout:
+            self.stdout.write(self.style.SUCCESS(
+                f"Exported project {project.pk} to {options['path']} ({size:,} bytes) in {time.monotonic() - started:.1f}s."
+            ))
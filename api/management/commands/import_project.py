@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import snapshots
+
+
+class Command(BaseCommand):
+    help = "Create a new project from a snapshot written by export_project."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Snapshot file to read, or - for standard input.")
+        parser.add_argument('--name', help="Name of the new project (defaults to the exported project's name).")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path != '-' and not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+        started = time.monotonic()
+        source = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            project, counts = snapshots.restore(source, options['name'])
+        except snapshots.SnapshotError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if path != '-':
+                source.close()
+        restored = ', '.join(f"{counts.get(kind, 0)} {kind}" for kind in ('users', 'tasks', 'tags', 'comments'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Created project {project.pk} ({project.name}) with {restored} in {time.monotonic() - started:.1f}s."
+        ))
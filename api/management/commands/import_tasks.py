@@ -0,0 +1,68 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import IMPORTERS, import_rows, read_rows
+from api.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = "Stream projects, tasks or comments from a CSV or JSONL file into the database in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (with a header row) or JSONL file to import.")
+        parser.add_argument('--type', choices=sorted(IMPORTERS), default='task',
+                            help="Kind of rows in the file.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Input format (defaults to the file extension).")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows validated and written per transaction.")
+        parser.add_argument('--errors', help="Write rejected rows to this JSONL file.")
+        parser.add_argument('--job', help="Checkpoint name (defaults to the type and absolute path).")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore an existing checkpoint and import from the first row.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        name = options['job'] or f"{options['type']}:{os.path.abspath(path)}"
+
+        job, created = ImportJob.objects.get_or_create(name=name)
+        if options['restart'] and not created:
+            job.rows = job.imported = job.failed = 0
+            job.save()
+        elif job.rows:
+            self.stdout.write(f"Resuming {name} after row {job.rows}.")
+
+        errors_file = open(options['errors'], 'a', encoding='utf-8') if options['errors'] else None
+        started = time.monotonic()
+        start_rows = job.rows
+
+        def on_error(error):
+            if errors_file:
+                errors_file.write(json.dumps(error) + '\n')
+            elif options['verbosity'] >= 2:
+                self.stderr.write(f"Row {error['row']}: {error['errors']}")
+
+        def on_batch(job):
+            if options['verbosity'] >= 1:
+                elapsed = time.monotonic() - started
+                rate = (job.rows - start_rows) / elapsed if elapsed else 0
+                self.stdout.write(f"{job.rows} rows processed, {job.imported} imported, {job.failed} failed ({rate:,.0f} rows/s)")
+
+        try:
+            import_rows(read_rows(path, fmt), IMPORTERS[options['type']](), options['batch_size'], job,
+                        on_batch=on_batch, on_error=on_error)
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        elapsed = time.monotonic() - started
+        rate = (job.rows - start_rows) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {job.imported} imported, {job.failed} failed in {elapsed:.1f}s ({rate:,.0f} rows/s)."
+        ))
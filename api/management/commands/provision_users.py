@@ -0,0 +1,74 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import RowError, read_rows
+from api.models import User
+from api.provisioning import provision
+
+
+class Command(BaseCommand):
+    help = "Create users from a CSV or JSONL file, hashing their passwords on all cores."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (with a header row) or JSONL file of email, name, role and password.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Input format (defaults to the file extension).")
+        parser.add_argument('--role', choices=[value for value, _ in User.ROLE_CHOICES],
+                            help="Role of the rows that do not name one.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows hashed and inserted together.")
+        parser.add_argument('--workers', type=int,
+                            help="Processes hashing passwords (defaults to PROVISION_HASH_WORKERS, then one per core).")
+        parser.add_argument('--errors', help="Write rejected rows to this JSONL file.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+
+        errors_file = open(options['errors'], 'a', encoding='utf-8') if options['errors'] else None
+        started = time.monotonic()
+        created = failed = rows = 0
+
+        def run(batch):
+            nonlocal created, failed, rows
+            # Rows that could not be parsed stand in as placeholders so row numbers stay aligned.
+            results = provision([{} if isinstance(row, RowError) else row for _, row in batch],
+                                options['role'], options['workers'])
+            for (number, row), result in zip(batch, results):
+                result['row'] = number
+                if isinstance(row, RowError):
+                    result.update(status='invalid', errors=row.errors)
+                if result['status'] == 'created':
+                    created += 1
+                    continue
+                failed += 1
+                if errors_file:
+                    errors_file.write(json.dumps(result) + '\n')
+                elif options['verbosity'] >= 2:
+                    self.stderr.write(f"Row {number}: {result['errors']}")
+            rows += len(batch)
+            if options['verbosity'] >= 1:
+                elapsed = time.monotonic() - started
+                rate = rows / elapsed if elapsed else 0
+                self.stdout.write(f"{rows} rows processed, {created} created, {failed} failed ({rate:,.0f} rows/s)")
+
+        try:
+            batch = []
+            for number, row in read_rows(path, fmt):
+                batch.append((number, row))
+                if len(batch) >= options['batch_size']:
+                    run(batch)
+                    batch = []
+            if batch:
+                run(batch)
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Done: {created} created, {failed} failed in {elapsed:.1f}s."))
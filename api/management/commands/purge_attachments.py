@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.attachments import purge
+
+
+class Command(BaseCommand):
+    help = "Delete abandoned uploads and attachment content no attachment refers to."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=None,
+                            help="Abandon uploads idle for this many seconds (default ATTACHMENT_UPLOAD_EXPIRY_SECONDS).")
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep running and purge every INTERVAL seconds (0 runs once).")
+
+    def handle(self, *args, **options):
+        while True:
+            blobs, uploads = purge(max_age_seconds=options['max_age'])
+            self.stdout.write(f"Purged {blobs} unused blob(s) and {uploads} abandoned upload(s).")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
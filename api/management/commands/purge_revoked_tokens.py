@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.tokens import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete revoked refresh tokens that have expired."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help="Rows deleted per query.")
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep running and purge every INTERVAL seconds (0 runs once).")
+
+    def handle(self, *args, **options):
+        while True:
+            purged = purge_expired(batch_size=options['batch_size'])
+            self.stdout.write(f"Purged {purged} expired revoked token(s).")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
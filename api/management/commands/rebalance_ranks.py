@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import ranking
+
+
+class Command(BaseCommand):
+    help = "Rewrite the task ranks of projects whose keys have grown too long to short, evenly spaced keys."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, help="Rebalance only this project, whatever its key length.")
+        parser.add_argument('--max-length', type=int, default=None,
+                            help="Rebalance projects with a longer rank (default TASK_RANK_REBALANCE_LENGTH).")
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep running and check every INTERVAL seconds (0 runs once).")
+
+    def handle(self, *args, **options):
+        while True:
+            if options['project'] is not None:
+                project_ids = [options['project']]
+            else:
+                project_ids = ranking.projects_to_rebalance(options['max_length'])
+            for project_id in project_ids:
+                changed = ranking.rebalance(project_id)
+                self.stdout.write(f"Rebalanced project {project_id} ({changed} task(s) re-ranked).")
+            if not project_ids:
+                self.stdout.write("No project needs rebalancing.")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import sharding
+
+
+class Command(BaseCommand):
+    help = "Move projects' tasks and comments between shards, one project or an automatic rebalance by task count."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, help="Move only this project (requires --to).")
+        parser.add_argument('--to', help="Target database alias for --project.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows copied per query.")
+        parser.add_argument('--dry-run', action='store_true', help="Print the moves without making them.")
+
+    def handle(self, *args, **options):
+        if not settings.TASK_SHARDS:
+            raise CommandError("Sharding is disabled; set TASK_SHARDS first.")
+        if options['project'] is not None:
+            if not options['to']:
+                raise CommandError("--project requires --to.")
+            src = sharding.shard_for_project(options['project'])
+            moves = [(options['project'], src, options['to'])]
+        else:
+            loads = sharding.shard_loads()
+            for alias, projects in loads.items():
+                self.stdout.write(f"{alias}: {sum(projects.values())} task(s) in {len(projects)} project(s)")
+            moves = sharding.plan_rebalance(loads)
+            if not moves:
+                self.stdout.write("Shards are balanced.")
+
+        for project_id, src, dst in moves:
+            if options['dry_run']:
+                self.stdout.write(f"Would move project {project_id}: {src} -> {dst}")
+                continue
+            try:
+                moved = sharding.move_project(project_id, dst, batch_size=options['batch_size'])
+            except sharding.ShardError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(f"Moved project {project_id} ({moved} task(s)): {src} -> {dst}")
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import timetracking
+
+
+class Command(BaseCommand):
+    help = "Recompute the weekly time rollups from the time entries and report, or fix, any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, action='append',
+                            help="Check only this project (may be repeated).")
+        parser.add_argument('--fix', action='store_true', help="Rewrite the rollups that drifted.")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Projects recomputed per transaction.")
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep running and check every INTERVAL seconds (0 runs once).")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            drift = timetracking.reconcile(options['project'], fix=options['fix'], batch_size=options['batch_size'])
+            for row in drift:
+                self.stdout.write(
+                    f"Project {row['project']}, user {row['user']}, week of {row['week']}: "
+                    f"{row['stored_minutes']} min in {row['stored_entries']} entries stored, "
+                    f"{row['actual_minutes']} min in {row['actual_entries']} entries logged."
+                )
+            verb = "fixed" if options['fix'] else "found"
+            self.stdout.write(f"{len(drift)} drifted rollup(s) {verb} in {time.monotonic() - started:.1f}s.")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-19 09:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('to_status', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('changed_at', models.BigIntegerField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_changes', to='api.project')),
+                ('task', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='status_changes', to='api.task')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', 'changed_at'], name='statuschange_project_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-19 10:23
+
+from django.db import migrations, models
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def rank_existing_tasks(apps, schema_editor):
+    """
+    Rank each project's tasks in id order with evenly spaced fixed-width keys,
+    the same layout as api.ranking.spread().
+    """
+    Task = apps.get_model('api', 'Task')
+    alias = schema_editor.connection.alias
+    tasks = Task.objects.using(alias).order_by('project_id', 'id').only('id', 'project_id')
+    by_project = {}
+    for task in tasks:
+        by_project.setdefault(task.project_id, []).append(task)
+    for group in by_project.values():
+        width = 1
+        while len(DIGITS) ** width < 4 * (len(group) + 1):
+            width += 1
+        step = len(DIGITS) ** width // 2 // (len(group) + 1)
+        for n, task in enumerate(group, start=1):
+            value, digits = n * step, []
+            for _ in range(width):
+                value, digit = divmod(value, len(DIGITS))
+                digits.append(DIGITS[digit])
+            task.rank = ''.join(reversed(digits)).rstrip('0')
+        Task.objects.using(alias).bulk_update(group, ['rank'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_blob_attachment_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='rank',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(rank_existing_tasks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'rank'], name='task_project_rank_idx'),
+        ),
+    ]
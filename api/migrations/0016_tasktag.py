@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-19 10:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_task_rank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.project')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tags', to='api.task')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', 'name', 'task'], name='tasktag_project_name_idx'), models.Index(fields=['name', 'task'], name='tasktag_name_idx')],
+                'constraints': [models.UniqueConstraint(fields=('task', 'name'), name='unique_task_tag')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2 on 2026-10-19 11:50
+
+from django.db import migrations
+
+STATUS_CODES = {'Pending': 0, 'In Progress': 1, 'Completed': 2}
+BATCH_SIZE = 1000
+
+
+def backfill_task_creations(apps, schema_editor):
+    """
+    Record a creation transition (None -> status) at `created_at` for every
+    task, live or archived, that has none: tasks created before status history
+    existed would otherwise leave a transition out of a status they were never
+    counted into, and the flow report would go negative. A task's creation
+    status is the status it left in its first recorded transition, or its
+    current status if it has none.
+
+    The history lives on the default database whichever shard holds the task,
+    so it is written there.
+    """
+    Task = apps.get_model('api', 'Task')
+    ArchivedTask = apps.get_model('api', 'ArchivedTask')
+    TaskStatusChange = apps.get_model('api', 'TaskStatusChange')
+    alias = schema_editor.connection.alias
+    history = TaskStatusChange.objects.using('default')
+    for model in (Task, ArchivedTask):
+        last_id = 0
+        while True:
+            rows = list(
+                model.objects.using(alias).filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'project_id', 'status', 'created_at')[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            ids = [row[0] for row in rows]
+            created = set(history.filter(task_id__in=ids, from_status=None).values_list('task_id', flat=True))
+            first_status = {}
+            for task_id, from_status in (history.filter(task_id__in=ids).exclude(from_status=None)
+                                         .order_by('-changed_at', '-id').values_list('task_id', 'from_status')):
+                first_status[task_id] = from_status  # Ordered latest first, so the earliest wins.
+            history.bulk_create([
+                TaskStatusChange(
+                    task_id=task_id,
+                    project_id=project_id,
+                    from_status=None,
+                    to_status=first_status.get(task_id, STATUS_CODES.get(status)),
+                    changed_at=int(created_at.timestamp()),
+                )
+                for task_id, project_id, status, created_at in rows
+                if task_id not in created and first_status.get(task_id, STATUS_CODES.get(status)) is not None
+            ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_archive_tags_and_dependencies'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_task_creations, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,8 @@
+import secrets
+import uuid
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 
 class UserManager(BaseUserManager):
@@ -38,6 +42,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     role = models.CharField(max_length=50, choices=ROLE_CHOICES)
     is_active = models.BooleanField(default=True)
     is_admin = models.BooleanField(default=False)
+    # Embedded in issued tokens; bumping it revokes all of the user's sessions.
+    token_version = models.PositiveIntegerField(default=0)
     groups = models.ManyToManyField(
         'auth.Group',
         verbose_name='groups',
@@ -81,10 +87,19 @@ class Project(models.Model):
     end_date = models.DateField()
     manager = models.ForeignKey(User, on_delete=models.CASCADE, related_name='managed_projects')
     members = models.ManyToManyField(User, related_name='projects')
+    # Bumped on every save; the project's ETag is derived from it.
+    version = models.PositiveIntegerField(default=1)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+
 
 class Task(models.Model):
     """
@@ -105,13 +120,95 @@ class Task(models.Model):
     )
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='tasks')
     assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='tasks')
+    # Manual order within the project (see api/ranking.py); assigned on first save.
+    rank = models.CharField(max_length=255, blank=True, default='')
+    # Set on tasks generated from a recurring template, for the occurrence they stand for.
+    # Templates stay on the default database while tasks may be on a shard, so
+    # the reference is not a database constraint.
+    recurrence = models.ForeignKey('RecurringTask', on_delete=models.DO_NOTHING, null=True, blank=True,
+                                   db_constraint=False, related_name='occurrences')
+    occurrence_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # A template creates at most one task per occurrence, however often the scheduler runs.
+            models.UniqueConstraint(fields=['recurrence', 'occurrence_at'], name='unique_task_occurrence'),
+        ]
+        indexes = [
+            models.Index(fields=['project', 'rank'], name='task_project_rank_idx'),
+            # Status and priority filters, returned newest first (the admin changelist).
+            models.Index(fields=['status', 'id'], name='task_status_idx'),
+            models.Index(fields=['priority', 'id'], name='task_priority_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
 
+class RecurringTask(models.Model):
+    """
+    A template that creates a task in its project on an RRULE-like schedule:
+    every `interval` days, weeks (on `weekdays`, e.g. "MO,WE,FR") or months,
+    from `starts_at` until `until` or `count` occurrences (see api/recurrence.py).
+    `next_run_at` is the next occurrence still to be created, or None once the
+    schedule has ended.
+    """
+    FREQUENCY_CHOICES = [('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')]
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='recurring_tasks')
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True, default='')
+    priority = models.CharField(max_length=50, choices=Task._meta.get_field('priority').choices, default='Medium')
+    assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='recurring_tasks')
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES)
+    interval = models.PositiveSmallIntegerField(default=1)
+    weekdays = models.CharField(max_length=20, blank=True, default='')
+    starts_at = models.DateTimeField()
+    until = models.DateTimeField(null=True, blank=True)
+    count = models.PositiveIntegerField(null=True, blank=True)
+    generated = models.PositiveIntegerField(default=0)
+    next_run_at = models.DateTimeField(null=True, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # The scheduler's "due" query is a range scan of this index; ended schedules are left out of it.
+            models.Index(fields=['next_run_at'], name='recurring_next_run_idx', condition=models.Q(next_run_at__isnull=False)),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.frequency})"
+
+
+class TaskTag(models.Model):
+    """
+    A tag on a task: a short lowercase name (see api/tags.py). Rows carry the
+    task's project so tag filters and per-project counts are answered from the
+    (project, name, task) index, and live on the task's shard.
+    """
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='tags')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='+')
+    name = models.CharField(max_length=50)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'name'], name='unique_task_tag'),
+        ]
+        indexes = [
+            models.Index(fields=['project', 'name', 'task'], name='tasktag_project_name_idx'),
+            models.Index(fields=['name', 'task'], name='tasktag_name_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id}: {self.name}"
+
+
 class Comment(models.Model):
     """
     Model for comments in the Task Management System.
@@ -125,4 +222,422 @@ class Comment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Comment by {self.author.email}"
\ No newline at end of file
+        return f"Comment by {self.author.email}"
+
+class ArchivedTask(models.Model):
+    """
+    Cold-storage copy of a completed task.
+    Rows keep the id they had in the task table so that references stay stable
+    and a restored task comes back under the same id.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    status = models.CharField(max_length=50, default='Completed')
+    priority = models.CharField(max_length=50, default='Medium')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='archived_tasks')
+    assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_tasks')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedComment(models.Model):
+    """
+    Cold-storage copy of a comment that belonged to an archived task.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    content = models.TextField()
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_comments')
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE, related_name='comments')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True, related_name='archived_comments')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Archived comment by {self.author_id}"
+
+
+class ArchivedTaskTag(models.Model):
+    """
+    Cold-storage copy of a tag on an archived task, under the id it had.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE, related_name='tags')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='+')
+    name = models.CharField(max_length=50)
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.task_id}: {self.name}"
+
+
+class ArchivedTaskDependency(models.Model):
+    """
+    Cold-storage copy of a dependency with at least one archived end. The ends
+    are plain ids since either may be a live or an archived task.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='+')
+    task_id = models.BigIntegerField(db_index=True)
+    depends_on_id = models.BigIntegerField(db_index=True)
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.task_id} depends on {self.depends_on_id}"
+
+
+class Activity(models.Model):
+    """
+    Activity history entry: who created, changed or deleted a task, project or comment.
+    `changes` maps each changed field to its [old, new] values.
+    """
+    ACTION_CHOICES = [
+        ('created', 'created'),
+        ('updated', 'updated'),
+        ('deleted', 'deleted'),
+    ]
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True, related_name='activities')
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='activities')
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    target_type = models.CharField(max_length=20)
+    target_id = models.BigIntegerField()
+    changes = models.JSONField(default=dict)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'created_at'], name='activity_project_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.target_type} {self.target_id} {self.action}"
+
+
+class TaskStatusChange(models.Model):
+    """
+    One row per task status transition, stored compactly: statuses are small integer
+    codes and `changed_at` is a Unix timestamp in seconds, so reports can bucket and
+    subtract times in plain SQL on every backend.
+    `from_status` is null when the task was created and `to_status` is null when it was deleted.
+    The task reference carries no database constraint so history survives archival.
+    """
+    STATUS_CODES = {'Pending': 0, 'In Progress': 1, 'Completed': 2}
+
+    task = models.ForeignKey(Task, on_delete=models.DO_NOTHING, db_constraint=False, related_name='status_changes')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='status_changes')
+    from_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    to_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    changed_at = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'changed_at'], name='statuschange_project_idx'),
+        ]
+
+    def __str__(self):
+        return f"Task {self.task_id}: {self.from_status} -> {self.to_status}"
+
+
+class TimeEntry(models.Model):
+    """
+    Time a user logged against a task on `date`. `week` is the Monday of that
+    week; it is what TimeRollup rows are keyed on. Like status history, the
+    task reference carries no database constraint: tasks may live on a shard,
+    and logged time is kept when its task is archived or deleted.
+    """
+    task = models.ForeignKey(Task, on_delete=models.DO_NOTHING, db_constraint=False, related_name='time_entries')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='time_entries')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='time_entries')
+    date = models.DateField()
+    week = models.DateField()
+    minutes = models.PositiveIntegerField()
+    note = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='timeentry_user_date_idx'),
+            models.Index(fields=['project', 'user', 'week'], name='timeentry_rollup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.minutes} min on task {self.task_id} by {self.user_id}"
+
+
+class TimeRollup(models.Model):
+    """
+    Total minutes and number of entries per project, user and week, kept up to
+    date in the same transaction as every time entry write (see
+    api/timetracking.py). Time reports read these rows, never the entries.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='time_rollups')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='time_rollups')
+    week = models.DateField()
+    minutes = models.BigIntegerField(default=0)
+    entries = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'user', 'week'], name='unique_time_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'week'], name='timerollup_user_week_idx'),
+        ]
+
+    def __str__(self):
+        return f"Project {self.project_id}, user {self.user_id}, week of {self.week}: {self.minutes} min"
+
+
+class TaskDependency(models.Model):
+    """
+    `task` cannot start until `depends_on` is done. Both tasks belong to `project`.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='dependencies')
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='dependencies')
+    depends_on = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='dependents')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'depends_on'], name='unique_task_dependency'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id} depends on {self.depends_on_id}"
+
+
+class ImportJob(models.Model):
+    """
+    Progress of a `manage.py import_tasks` run. Updated in the same transaction as
+    each imported batch, so a resumed import continues exactly after the last
+    committed row.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    rows = models.PositiveIntegerField(default=0)
+    imported = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class ProjectShard(models.Model):
+    """
+    Shard map entry: the database alias holding a project's tasks and comments.
+    Projects without an entry live on the default database.
+    """
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True, related_name='shard')
+    alias = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Project {self.project_id} on {self.alias}"
+
+
+class ShardSequence(models.Model):
+    """
+    Last id handed out for a sharded model. Ids of sharded rows come from here
+    so they stay unique across shards and survive moves between them.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_id}"
+
+
+class RevokedToken(models.Model):
+    """
+    A revoked refresh token, kept until it would have expired anyway.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class Notification(models.Model):
+    """
+    Something `recipient` should look at: a task assigned to them, or an update or
+    comment on a task or project they follow. Repeated events of the same kind on
+    the same target are coalesced into one unread notification; `count` is the
+    number of events it stands for and `actor` the latest one's author.
+    The task reference carries no database constraint because tasks may live on a shard.
+    """
+    VERB_CHOICES = [
+        ('assigned', 'assigned'),
+        ('commented', 'commented'),
+        ('updated', 'updated'),
+    ]
+
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    verb = models.CharField(max_length=20, choices=VERB_CHOICES)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='notifications')
+    task = models.ForeignKey(Task, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField()
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', 'read_at', 'updated_at'], name='notification_recipient_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.verb} for {self.recipient_id}"
+
+
+class NotificationCounter(models.Model):
+    """
+    Number of unread notifications per user, kept up to date by the fan-out and
+    mark-as-read paths so the unread badge never needs COUNT(*).
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread}"
+
+
+class Blob(models.Model):
+    """
+    Attachment content, stored once per distinct SHA-256 under ATTACHMENT_ROOT.
+    Blobs no attachment refers to are removed by `manage.py purge_attachments`.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
+
+class Attachment(models.Model):
+    """
+    A file attached to a task or a comment. Identical files share one Blob.
+    Task and comment references carry no database constraint because both may live on a shard.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='attachments')
+    task = models.ForeignKey(Task, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='attachments')
+    comment = models.ForeignKey(Comment, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='attachments')
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, related_name='attachments')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='attachments')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.filename
+
+
+class Upload(models.Model):
+    """
+    A resumable upload in progress. Chunks are appended to a partial file until
+    `received` reaches `size`, then the file becomes a Blob and an Attachment.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='uploads')
+    task = models.ForeignKey(Task, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    comment = models.ForeignKey(Comment, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploads')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
+def webhook_secret():
+    return secrets.token_hex(32)
+
+
+class WebhookSubscription(models.Model):
+    """
+    An endpoint that is sent the task, project and comment events it subscribes
+    to (all of them when `events` is empty), for one project or, for admins,
+    every project. At most `max_concurrency` requests are sent to it at a time.
+    """
+    EVENTS = [f'{target}.{action}' for target in ('project', 'task', 'comment') for action in ('created', 'updated', 'deleted')]
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='webhooks')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True, related_name='webhooks')
+    url = models.URLField(max_length=500)
+    secret = models.CharField(max_length=64, default=webhook_secret)
+    events = models.JSONField(default=list, blank=True)
+    max_concurrency = models.PositiveSmallIntegerField(default=2)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.url
+
+
+class OutboxEvent(models.Model):
+    """
+    A change waiting to be fanned out to webhook subscriptions, written in the
+    same transaction as the change itself, on the database that holds the row.
+    The project reference carries no database constraint because the event may
+    live on a shard and outlive the project.
+    """
+    id = models.BigAutoField(primary_key=True)
+    uid = models.UUIDField(default=uuid.uuid4, editable=False)
+    event = models.CharField(max_length=50)
+    project = models.ForeignKey(Project, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    target_id = models.BigIntegerField()
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.event} {self.target_id}"
+
+
+class WebhookDelivery(models.Model):
+    """
+    One event on its way to one subscription. `payload` is the event as it is
+    sent. Failed deliveries are retried with backoff until WEBHOOK_MAX_ATTEMPTS,
+    then dead-lettered until they are redelivered by hand.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'pending'),
+        ('delivered', 'delivered'),
+        ('dead', 'dead'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    subscription = models.ForeignKey(WebhookSubscription, on_delete=models.CASCADE, related_name='deliveries')
+    event_id = models.UUIDField()
+    event = models.CharField(max_length=50)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['subscription', 'event_id'], name='unique_webhook_delivery'),
+        ]
+        indexes = [
+            models.Index(fields=['subscription', 'status', 'next_attempt_at'], name='webhook_due_idx'),
+            models.Index(fields=['status', 'delivered_at'], name='webhook_delivered_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} to {self.subscription_id} ({self.status})"
@@ -0,0 +1,110 @@
+"""
+Notification fan-out.
+
+Task and comment writes call notify() with the recipients worked out as sets
+(followers()). After the transaction commits, the event is delivered to all
+recipients at once. For recipients who already hold an unread notification of
+the same kind for the same target from the last NOTIFICATION_DIGEST_SECONDS,
+that notification is bumped with one UPDATE. Everyone else gets a new row
+through one bulk_create, and their unread counters go up with one more UPDATE.
+A burst of edits therefore leaves each follower with a single notification,
+and the unread badge is read from NotificationCounter instead of counting rows.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import sharding
+from .models import Comment, Notification, NotificationCounter, Project, User
+
+
+def followers(project_id, task=None):
+    """
+    Ids of active users following a task (its assignee, the project members and
+    everyone who commented on it) or, without a task, a project (its members and
+    everyone who commented on the project itself).
+    """
+    comments = Comment.objects.using(sharding.shard_for_project(project_id))
+    if task is not None:
+        commenters = comments.filter(task_id=task.pk)
+    else:
+        commenters = comments.filter(project_id=project_id, task__isnull=True)
+    ids = set(commenters.values_list('author_id', flat=True))
+    ids |= set(Project.members.through.objects.filter(project_id=project_id).values_list('user_id', flat=True))
+    if task is not None and task.assigned_to_id:
+        ids.add(task.assigned_to_id)
+    return set(User.objects.filter(id__in=ids, is_active=True).values_list('id', flat=True))
+
+
+def notify(actor, verb, recipients, project_id, task_id=None):
+    """
+    Deliver a notification to `recipients` (user ids, the actor is left out)
+    once the surrounding transaction commits.
+    """
+    actor_id = actor.id if actor is not None and actor.is_authenticated else None
+    recipients = set(recipients) - {actor_id}
+    if recipients:
+        transaction.on_commit(lambda: deliver(actor_id, verb, recipients, project_id, task_id))
+
+
+def deliver(actor_id, verb, recipients, project_id, task_id=None):
+    """
+    Coalesce into recent unread notifications where possible and bulk-insert the rest.
+    Returns the number of notifications created.
+    """
+    now = timezone.now()
+    since = now - timedelta(seconds=settings.NOTIFICATION_DIGEST_SECONDS)
+    with transaction.atomic():
+        recent = Notification.objects.filter(
+            recipient_id__in=recipients, verb=verb, project_id=project_id, task_id=task_id,
+            read_at__isnull=True, updated_at__gte=since,
+        )
+        coalesced = set(recent.values_list('recipient_id', flat=True))
+        if coalesced:
+            recent.update(count=F('count') + 1, actor_id=actor_id, updated_at=now)
+        fresh = sorted(recipients - coalesced)
+        if not fresh:
+            return 0
+        Notification.objects.bulk_create([
+            Notification(recipient_id=user_id, actor_id=actor_id, verb=verb, project_id=project_id,
+                         task_id=task_id, updated_at=now)
+            for user_id in fresh
+        ])
+        NotificationCounter.objects.bulk_create(
+            [NotificationCounter(user_id=user_id) for user_id in fresh], ignore_conflicts=True)
+        NotificationCounter.objects.filter(user_id__in=fresh).update(unread=F('unread') + 1)
+    return len(fresh)
+
+
+def unread_count(user):
+    unread = NotificationCounter.objects.filter(user=user).values_list('unread', flat=True).first()
+    return max(unread or 0, 0)
+
+
+def mark_read(user, ids=None):
+    """
+    Mark the user's unread notifications (or only those in `ids`) as read.
+    Returns the number marked.
+    """
+    with transaction.atomic():
+        unread = Notification.objects.filter(recipient=user, read_at__isnull=True)
+        if ids is not None:
+            unread = unread.filter(id__in=ids)
+        marked = unread.update(read_at=timezone.now())
+        if marked:
+            NotificationCounter.objects.filter(user=user).update(unread=F('unread') - marked)
+    return marked
+
+
+def forget_project(sender, instance, using, **kwargs):
+    """
+    pre_delete handler for projects: the project's notifications are about to be
+    cascaded away, so take their unread ones off the counters first.
+    """
+    unread = (Notification.objects.using(using).filter(project=instance, read_at__isnull=True)
+              .values('recipient_id').annotate(n=Count('id')))
+    for row in unread:
+        NotificationCounter.objects.using(using).filter(user_id=row['recipient_id']).update(unread=F('unread') - row['n'])
@@ -0,0 +1,244 @@
+"""
+Opt-in profiling of single requests.
+
+An admin adds `X-Profile: sample` (or `?profile=sample`) to any API request to
+run it under a profiler. The response carries an X-Profile-Id header naming the
+stored profile. For anyone else, and for requests without the flag, the flag is
+ignored. Unflagged requests pay one header and one query-string lookup and
+nothing more.
+
+Two profilers are available:
+
+- `sample` runs a thread that records the request thread's stack every
+  PROFILE_SAMPLE_INTERVAL seconds. The samples are stored as collapsed stacks
+  (`frame;frame;frame count` per line), which flamegraph.pl, speedscope and
+  inferno read directly. The overhead is small and does not depend on how many
+  calls the request makes.
+- `trace` runs the request under cProfile, which sees every call. The result is
+  stored as a pstats file, for `python -m pstats` or snakeviz. Expect the
+  request to take noticeably longer. cProfile is only imported for such a
+  request.
+
+Profiles are written to PROFILE_ROOT as a data file plus a JSON metadata file.
+Each write prunes profiles older than PROFILE_MAX_AGE_SECONDS and the oldest
+beyond PROFILE_MAX_COUNT or PROFILE_MAX_BYTES.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+MODES = {'sample': '.collapsed', 'trace': '.prof'}
+HEADER = 'HTTP_X_PROFILE'
+QUERY_PARAMETER = 'profile'
+PROFILE_ID = re.compile(r'^\d{8}T\d{6}-[0-9a-f]{8}$')
+
+
+def requested_mode(request):
+    """
+    The profiler a request asks for, or None. This is all unflagged requests pay.
+    """
+    mode = request.META.get(HEADER) or request.GET.get(QUERY_PARAMETER)
+    if not mode:
+        return None
+    mode = mode.strip().lower()
+    return mode if mode in MODES else 'sample'
+
+
+class Sampler(threading.Thread):
+    """
+    Counts the collapsed stacks of one thread, sampled every `interval` seconds.
+    Only samples taken inside a call of `target` that `root` made are counted,
+    trimmed to start at that call.
+    """
+
+    def __init__(self, thread_id, root, target, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.root = root
+        self.target = target
+        self.interval = interval
+        self.stacks = Counter()
+        self.labels = {}
+        self.stopped = threading.Event()
+
+    def label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = (
+                f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            )
+        return label
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            code = None
+            while frame is not None and frame is not self.root:
+                code = frame.f_code
+                frames.append(self.label(code))
+                frame = frame.f_back
+            if frame is not None and code is self.target:
+                self.stacks[';'.join(reversed(frames))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def profile(view, dispatch, request, mode, *args, **kwargs):
+    """
+    Run `dispatch` under the profiler named by `mode` if the request is an
+    admin's; otherwise just run it.
+    """
+    user = admin_user(view, request, *args, **kwargs)
+    if user is None:
+        return dispatch(request, *args, **kwargs)
+
+    def run():
+        response = dispatch(request, *args, **kwargs)
+        # Rendering happens after the view returns; profile it as part of the request.
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        return response
+
+    started = time.perf_counter()
+    if mode == 'trace':
+        import cProfile
+
+        profiler = cProfile.Profile()
+        response = profiler.runcall(run)
+        extra = {}
+    else:
+        sampler = Sampler(threading.get_ident(), sys._getframe(), run.__code__, settings.PROFILE_SAMPLE_INTERVAL)
+        sampler.start()
+        try:
+            response = run()
+        finally:
+            sampler.stop()
+        extra = {'samples': sum(sampler.stacks.values())}
+    duration = time.perf_counter() - started
+    meta = {
+        'mode': mode,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': f"{type(view).__name__}.{getattr(view, 'action', None) or request.method.lower()}",
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 2),
+        'user': user.pk,
+        **extra,
+    }
+    if mode == 'trace':
+        meta = save(meta, lambda path: profiler.dump_stats(path))
+    else:
+        meta = save(meta, lambda path: Path(path).write_text(sampler.collapsed(), encoding='utf-8'))
+    response['X-Profile-Id'] = meta['id']
+    return response
+
+
+def admin_user(view, request, *args, **kwargs):
+    """
+    The requesting admin, or None. The request is authenticated the way the view
+    will authenticate it, so the decision is made before the view runs.
+    """
+    try:
+        user = view.initialize_request(request, *args, **kwargs).user
+    except APIException:
+        return None
+    return user if user and user.is_authenticated and user.role == 'Admin' else None
+
+
+def root():
+    return Path(settings.PROFILE_ROOT)
+
+
+def save(meta, write):
+    """
+    Store a profile: `write(path)` writes the data, `meta` describes it.
+    Returns the metadata with its id, file name and size filled in.
+    """
+    directory = root()
+    directory.mkdir(parents=True, exist_ok=True)
+    profile_id = f"{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    data_path = directory / f"{profile_id}{MODES[meta['mode']]}"
+    write(str(data_path))
+    meta = {'id': profile_id, 'created_at': timezone.now().isoformat(), **meta,
+            'file': data_path.name, 'size': data_path.stat().st_size}
+    # The metadata is written last and atomically; a profile without one is not listed.
+    partial = directory / f".{profile_id}.json"
+    partial.write_text(json.dumps(meta), encoding='utf-8')
+    os.replace(partial, directory / f"{profile_id}.json")
+    prune()
+    return meta
+
+
+def list_profiles():
+    """
+    Metadata of the stored profiles, newest first.
+    """
+    directory = root()
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for path in directory.glob('[0-9]*.json'):
+        try:
+            profiles.append(json.loads(path.read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda meta: (meta['created_at'], meta['id']), reverse=True)
+
+
+def delete(profile_id):
+    directory = root()
+    for name in (f"{profile_id}.json", *(f"{profile_id}{suffix}" for suffix in MODES.values())):
+        try:
+            (directory / name).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def prune():
+    """
+    Apply the retention limits; returns the number of profiles removed.
+    """
+    oldest = (timezone.now() - timedelta(seconds=settings.PROFILE_MAX_AGE_SECONDS)).isoformat()
+    kept = total = removed = 0
+    for meta in list_profiles():
+        size = meta.get('size', 0)
+        # The newest profile is always kept, even when it alone is over PROFILE_MAX_BYTES.
+        if meta['created_at'] < oldest or kept >= settings.PROFILE_MAX_COUNT or (
+                kept and total + size > settings.PROFILE_MAX_BYTES):
+            delete(meta['id'])
+            removed += 1
+        else:
+            kept += 1
+            total += size
+    return removed
+
+
+def get(profile_id):
+    """
+    (metadata, data path) of a stored profile, or None.
+    """
+    if not PROFILE_ID.match(profile_id or ''):
+        return None
+    try:
+        meta = json.loads((root() / f"{profile_id}.json").read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    path = root() / meta['file']
+    return (meta, path) if path.is_file() else None
@@ -0,0 +1,149 @@
+"""
+Bulk user provisioning.
+
+Creating users one at a time is dominated by password hashing, which is slow on
+purpose (PBKDF2 runs hundreds of thousands of rounds per password). A batch of
+users is therefore provisioned in three steps:
+
+- Every row is validated in memory. Roles are checked against one set of valid
+  roles, and duplicate emails are found with one set of the batch's emails and
+  one query for the emails that already exist.
+- The passwords of the valid rows are hashed on a pool of worker processes,
+  one per core by default, so hashing scales with the cores instead of the GIL.
+  Workers are spawned rather than forked, so they do not inherit the threads
+  of a web worker (such as the log listener). A daemonic process cannot start
+  children, so there the pool is made of threads, which still hash in parallel
+  because PBKDF2 releases the GIL.
+- The users are written with one bulk_create.
+
+The result has one entry per input row, in input order.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .models import User
+
+ROLES = {value for value, _ in User.ROLE_CHOICES}
+FIELDS = ('email', 'name', 'role', 'password')
+
+
+class ProvisioningError(ValueError):
+    pass
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    make_password() of every password, in order. With more than one worker and
+    password, the hashing is spread over a process pool.
+    """
+    workers = workers or settings.PROVISION_HASH_WORKERS or os.cpu_count() or 1
+    workers = min(workers, len(passwords))
+    if workers <= 1:
+        return [make_password(password) for password in passwords]
+    # A few chunks per worker keeps the workers evenly loaded without one task per password.
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with _executor(workers) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def _executor(workers):
+    if multiprocessing.current_process().daemon:
+        return ThreadPoolExecutor(max_workers=workers)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def _build(row, default_role):
+    """
+    (unsaved User, password) for a row, or the row's errors as a dict.
+    """
+    if not isinstance(row, dict):
+        return {'row': ["Expected an object."]}
+    unknown = set(row) - set(FIELDS)
+    if unknown:
+        return {field: ["Unknown field."] for field in sorted(unknown)}
+    email = row.get('email')
+    if not isinstance(email, str) or not email.strip():
+        return {'email': ["This field is required."]}
+    role = row.get('role') or default_role
+    if role not in ROLES:
+        return {'role': [f"Must be one of: {', '.join(value for value, _ in User.ROLE_CHOICES)}."]}
+    password = row.get('password')
+    if password is not None and not isinstance(password, str):
+        return {'password': ["Must be a string."]}
+    user = User(email=User.objects.normalize_email(email.strip()), name=row.get('name') or 'Unknown', role=role)
+    try:
+        user.clean_fields(exclude=['password'])
+    except ValidationError as exc:
+        return exc.message_dict
+    return user, password
+
+
+def provision(rows, default_role=None, workers=None):
+    """
+    Create users from `rows` (dicts with email, name, role and password; role
+    falls back to `default_role`, a missing password leaves the user without a
+    usable one). Returns one result per row:
+    {'row', 'email', 'status': 'created', 'id'} or {'row', 'email', 'status': 'duplicate' | 'invalid', 'errors'}.
+    """
+    if default_role is not None and default_role not in ROLES:
+        raise ProvisioningError(f"Unknown role {default_role!r}.")
+    results, users = [], []
+    for number, row in enumerate(rows, start=1):
+        built = _build(row, default_role)
+        if isinstance(built, dict):
+            results.append({'row': number, 'email': row.get('email') if isinstance(row, dict) else None,
+                            'status': 'invalid', 'errors': built})
+        else:
+            results.append({'row': number, 'email': built[0].email})
+            users.append((results[-1], *built))
+
+    # Duplicates, set-wise: the first row with an email wins within the batch,
+    # and emails already in the database are rejected with one query.
+    seen = set()
+    existing = set(User.objects.filter(email__in={user.email for _, user, _ in users})
+                   .values_list('email', flat=True))
+    unique = []
+    for result, user, password in users:
+        if user.email in existing:
+            result.update(status='duplicate', errors={'email': ["A user with this email already exists."]})
+        elif user.email in seen:
+            result.update(status='duplicate', errors={'email': ["Repeats the email of an earlier row."]})
+        else:
+            seen.add(user.email)
+            unique.append((result, user, password))
+
+    hashed = hash_passwords([password for _, _, password in unique], workers)
+    for (_, user, _), password in zip(unique, hashed):
+        user.password = password
+    created = _insert([user for _, user, _ in unique])
+    for result, user, _ in unique:
+        if user.email in created:
+            result.update(status='created', id=user.pk)
+        else:
+            result.update(status='duplicate', errors={'email': ["A user with this email already exists."]})
+    return results
+
+
+def _insert(users):
+    """
+    bulk_create the users; returns the emails written. If another request
+    created some of the emails since they were checked, those are left out and
+    the rest is written.
+    """
+    if not users:
+        return set()
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+    except IntegrityError:
+        taken = set(User.objects.filter(email__in=[user.email for user in users]).values_list('email', flat=True))
+        users = [user for user in users if user.email not in taken]
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+    return {user.email for user in users}
@@ -0,0 +1,182 @@
+"""
+Manual task order.
+
+Every task carries a rank, a lowercase base-36 string. Within a project, tasks
+are listed in rank order, and a board column is that same order filtered by
+status. Ranks compare as fractions (0.<digits>), so a rank strictly between
+any two others always exists. Moving a task therefore updates only its own row,
+and no other row has to be renumbered. Digits and lowercase letters sort the
+same way under every database collation.
+
+Each move into a gap makes the keys in that gap a little longer. Once a
+project's longest rank passes TASK_RANK_REBALANCE_LENGTH,
+`manage.py rebalance_ranks` rewrites the project's ranks to short, evenly
+spaced keys, keeping the same order.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Length
+
+from . import sharding
+from .models import Task
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+MAX_LENGTH = Task._meta.get_field('rank').max_length
+
+
+def between(lo='', hi=None):
+    """
+    A rank strictly between `lo` ('' for the start) and `hi` (None for the end).
+    Ranks never end in '0', so a gap between two of them is never empty.
+    """
+    if hi is not None and not lo < hi:
+        raise ValueError(f"No rank between {lo!r} and {hi!r}.")
+    if hi is None:
+        # Appending: bump the first digit that can go up, so repeated appends stay short.
+        for i, digit in enumerate(lo):
+            if digit != DIGITS[-1]:
+                return lo[:i] + DIGITS[DIGITS.index(digit) + 1]
+        return lo + DIGITS[BASE // 2]
+    if not lo:
+        # Prepending: lower the first digit that can go down, the mirror image of appending.
+        for i, digit in enumerate(hi):
+            if digit != DIGITS[0]:
+                lowered = DIGITS.index(digit) - 1
+                return hi[:i] + (DIGITS[lowered] if lowered else DIGITS[0] + DIGITS[-1])
+    key, i = '', 0
+    while True:
+        low = DIGITS.index(lo[i]) if i < len(lo) else 0
+        high = DIGITS.index(hi[i]) if hi is not None and i < len(hi) else BASE
+        i += 1
+        if low == high:
+            key += DIGITS[low]
+            continue
+        middle = (low + high) // 2
+        if middle > low:
+            return key + DIGITS[middle]
+        # Adjacent digits: keep the lower one, and anything after it is below `hi`.
+        key += DIGITS[low]
+        hi = None
+
+
+def sequence(lo, hi, count):
+    """
+    `count` ascending ranks between `lo` and `hi`, found by bisection so they
+    grow by about one digit per 36-fold increase in `count`.
+    """
+    if count <= 0:
+        return []
+    middle = between(lo, hi)
+    left = (count - 1) // 2
+    return sequence(lo, middle, left) + [middle] + sequence(middle, hi, count - 1 - left)
+
+
+def spread(count):
+    """
+    `count` evenly spaced ranks of equal width in the lower half of the key space,
+    leaving the upper half for appends.
+    """
+    width = 1
+    while BASE ** width < 4 * (count + 1):
+        width += 1
+    step = BASE ** width // 2 // (count + 1)
+    ranks = []
+    for n in range(1, count + 1):
+        value, digits = n * step, []
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        ranks.append(''.join(reversed(digits)).rstrip(DIGITS[0]))
+    return ranks
+
+
+def last_rank(project_id):
+    alias = sharding.shard_for_project(project_id)
+    return Task.objects.using(alias).filter(project_id=project_id).aggregate(last=Max('rank'))['last'] or ''
+
+
+def last_ranks(project_ids):
+    """
+    {project id: last rank} with one grouped query per shard.
+    """
+    by_alias = {}
+    for project_id in project_ids:
+        by_alias.setdefault(sharding.shard_for_project(project_id), []).append(project_id)
+    last = {project_id: '' for project_id in project_ids}
+    for alias, ids in by_alias.items():
+        last.update(Task.objects.using(alias).filter(project_id__in=ids).order_by()
+                    .values('project_id').annotate(last=Max('rank')).values_list('project_id', 'last'))
+    return last
+
+
+def assign_rank(sender, instance, raw=False, **kwargs):
+    """
+    pre_save handler for tasks: a task without a rank goes to the end of its project.
+    """
+    if not raw and not instance.rank:
+        instance.rank = between(last_rank(instance.project_id), None)
+
+
+def assign_ranks(tasks):
+    """
+    Give unranked tasks (not yet saved, e.g. for bulk_create) ranks at the end
+    of their projects, in list order.
+    """
+    by_project = {}
+    for task in tasks:
+        if not task.rank:
+            by_project.setdefault(task.project_id, []).append(task)
+    last = last_ranks(by_project)
+    for project_id, group in by_project.items():
+        for task, rank in zip(group, sequence(last[project_id] or '', None, len(group))):
+            task.rank = rank
+
+
+def rank_for_move(task, after=None, before=None):
+    """
+    The rank that puts `task` directly below `after` and above `before` (either may be None).
+    Returns None when no rank fits: the neighbours tie or are out of order, or
+    the key would be too long. Rebalance the project and ask again.
+    """
+    lo = after.rank if after is not None else ''
+    hi = before.rank if before is not None else None
+    if after is None and before is None:
+        return task.rank
+    if hi is not None and not lo < hi:
+        return None
+    rank = between(lo, hi)
+    return rank if len(rank) <= MAX_LENGTH else None
+
+
+def projects_to_rebalance(max_length=None):
+    """
+    Ids of projects whose longest rank is over `max_length` (TASK_RANK_REBALANCE_LENGTH).
+    """
+    max_length = max_length or settings.TASK_RANK_REBALANCE_LENGTH
+    project_ids = set()
+    for queryset in sharding.scatter(Task.objects.all()):
+        project_ids.update(
+            queryset.values('project_id').annotate(longest=Max(Length('rank')))
+            .filter(longest__gt=max_length).values_list('project_id', flat=True)
+        )
+    return sorted(project_ids)
+
+
+def rebalance(project_id, batch_size=500):
+    """
+    Rewrite a project's ranks to evenly spaced keys, keeping the current order.
+    Returns the number of tasks whose rank changed.
+    """
+    alias = sharding.shard_for_project(project_id)
+    with transaction.atomic(using=alias):
+        tasks = list(Task.objects.using(alias).select_for_update().filter(project_id=project_id)
+                     .order_by('rank', 'id').only('id', 'rank'))
+        changed = []
+        for task, rank in zip(tasks, spread(len(tasks))):
+            if task.rank != rank:
+                task.rank = rank
+                changed.append(task)
+        Task.objects.using(alias).bulk_update(changed, ['rank'], batch_size=batch_size)
+    return len(changed)
@@ -0,0 +1,183 @@
+"""
+Recurring tasks.
+
+A RecurringTask is a template with an RRULE-like schedule: FREQ (daily, weekly
+or monthly), INTERVAL, BYDAY for weekly schedules, and an end given by UNTIL or
+COUNT. Monthly schedules fall on the start date's day of the month, or on the
+month's last day when the month is shorter.
+
+Each template stores its next occurrence in `next_run_at`, which is indexed, so
+a scheduler tick finds the due templates with a range scan and never reads the
+rest. The tick takes the due templates in batches of RECURRING_BATCH_SIZE. For
+each batch, it creates one task per template with bulk_create, advances the
+templates with bulk_update and commits both together. Tasks record the
+template and occurrence they stand for, and (recurrence, occurrence_at) is
+unique. A task that already exists for an occurrence is therefore never
+created again, even after a crash between writing a shard and committing the
+templates.
+
+A template that was due several times while no scheduler ran gets one task,
+for its oldest missed occurrence, and then continues with the next occurrence
+after now.
+"""
+import calendar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from . import ranking, sharding
+from .graph import invalidate_graph
+from .models import RecurringTask, Task
+from .status_history import record_status_changes
+
+WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+SCHEDULE_FIELDS = ('frequency', 'interval', 'weekdays', 'starts_at', 'until', 'count')
+
+
+def parse_weekdays(value):
+    """
+    Weekday numbers (Monday is 0) from "MO,WE,FR".
+    """
+    return sorted({WEEKDAYS.index(code) for code in value.split(',') if code})
+
+
+def add_months(moment, months):
+    month = moment.month - 1 + months
+    year, month = moment.year + month // 12, month % 12 + 1
+    return moment.replace(year=year, month=month, day=min(moment.day, calendar.monthrange(year, month)[1]))
+
+
+def following(template, after, inclusive=False):
+    """
+    The template's first occurrence after `after` (at or after, with
+    `inclusive`), ignoring UNTIL and COUNT.
+    """
+    start, interval = template.starts_at, template.interval or 1
+    if after < start:
+        after, inclusive = start, True
+
+    def fits(moment):
+        return moment > after or (inclusive and moment == after)
+
+    if template.frequency == 'daily':
+        step = timedelta(days=interval)
+        moment = start + step * ((after - start) // step)
+        return moment if fits(moment) else moment + step
+    if template.frequency == 'weekly':
+        days = parse_weekdays(template.weekdays) or [start.weekday()]
+        week_start = start - timedelta(days=start.weekday())
+        first = (after - week_start).days
+        for offset in range(first, first + 7 * interval + 8):
+            moment = week_start + timedelta(days=offset)
+            if (offset // 7) % interval == 0 and moment.weekday() in days and moment >= start and fits(moment):
+                return moment
+        raise AssertionError("A weekly schedule always has an occurrence within one period.")
+    months = (after.year - start.year) * 12 + after.month - start.month
+    months -= months % interval
+    while True:
+        moment = add_months(start, months)
+        if fits(moment):
+            return moment
+        months += interval
+
+
+def within_limits(template, moment):
+    if template.until is not None and moment > template.until:
+        return None
+    if template.count is not None and template.generated >= template.count:
+        return None
+    return moment
+
+
+def reschedule(template, now=None):
+    """
+    Point `next_run_at` at the first occurrence from now on, e.g. after the schedule changed.
+    """
+    now = now or timezone.now()
+    template.next_run_at = within_limits(template, following(template, max(template.starts_at, now), inclusive=True))
+    return template
+
+
+def advance(template, now):
+    """
+    Move a template that has just run past `now` to its next occurrence.
+    """
+    template.generated += 1
+    template.last_run_at = now
+    template.next_run_at = within_limits(template, following(template, max(template.next_run_at, now)))
+
+
+def occurrence_task(template):
+    return Task(
+        title=template.title,
+        description=template.description,
+        priority=template.priority,
+        project_id=template.project_id,
+        assigned_to_id=template.assigned_to_id,
+        recurrence_id=template.id,
+        occurrence_at=template.next_run_at,
+    )
+
+
+def existing_occurrences(templates):
+    """
+    (template id, occurrence) pairs of the batch that already have their task,
+    read through the unique (recurrence, occurrence_at) index on every shard.
+    """
+    ids = [template.id for template in templates]
+    earliest = min(template.next_run_at for template in templates)
+    found = set()
+    for queryset in sharding.scatter(Task.objects.filter(recurrence_id__in=ids, occurrence_at__gte=earliest)):
+        found.update(queryset.values_list('recurrence_id', 'occurrence_at'))
+    return found
+
+
+def run_due(now=None, batch_size=None):
+    """
+    Create the tasks of every template due at `now`, a batch at a time.
+    Returns the number of tasks created.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.RECURRING_BATCH_SIZE
+    created = 0
+    while True:
+        count, processed = _run_batch(now, batch_size)
+        created += count
+        if processed < batch_size:
+            return created
+
+
+def _run_batch(now, batch_size):
+    """
+    Returns (tasks created, templates processed).
+    """
+    with transaction.atomic():
+        # Concurrent schedulers skip each other's locked batches (on databases with row locks).
+        templates = list(
+            RecurringTask.objects.select_for_update(skip_locked=True)
+            .filter(next_run_at__lte=now).order_by('next_run_at', 'id')[:batch_size]
+        )
+        if not templates:
+            return 0, 0
+        existing = existing_occurrences(templates)
+        tasks = [occurrence_task(template) for template in templates
+                 if (template.id, template.next_run_at) not in existing]
+        ranking.assign_ranks(tasks)
+        created = sharding.bulk_create(Task, tasks)
+        record_status_changes([(task, None, task.status) for task in created])
+        for template in templates:
+            advance(template, now)
+        RecurringTask.objects.bulk_update(templates, ['next_run_at', 'generated', 'last_run_at'])
+    for project_id in {task.project_id for task in created}:
+        invalidate_graph(project_id)
+    return len(created), len(templates)
+
+
+def next_due():
+    """
+    When the earliest template is due, or None.
+    """
+    return RecurringTask.objects.filter(next_run_at__isnull=False).aggregate(next=Min('next_run_at'))['next']
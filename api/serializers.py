@@ -1,8 +1,22 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import User
 from .models import Project
 from .models import Task
 from .models import Comment
+from .models import ArchivedTask
+from .models import Activity
+from .models import TaskDependency
+from .models import Notification
+from .models import Attachment
+from .models import Upload
+from .models import RecurringTask
+from .models import TimeEntry
+from .models import WebhookSubscription
+from .models import WebhookDelivery
+from . import tags as task_tags
+from . import recurrence
+from . import timetracking
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -41,15 +55,186 @@ class ProjectSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'start_date', 'end_date', 'manager', 'members']
         read_only_fields = ['id']
 
+class TagsField(serializers.Field):
+    """
+    A task's tag names, read from the (usually prefetched) tags relation.
+    """
+
+    def to_representation(self, value):
+        return sorted(tag.name for tag in value.all())
+
+    def to_internal_value(self, data):
+        try:
+            return task_tags.normalize(data)
+        except task_tags.TagError as e:
+            raise serializers.ValidationError(str(e))
+
+
 class TaskSerializer(serializers.ModelSerializer):
     """
     Serializer for the Task model.
     Handles validation and serialization for task data.
     """
+    tags = TagsField(required=False)
+
     class Meta:
         model = Task
-        fields = ['id', 'title', 'description', 'status', 'priority', 'project', 'assigned_to', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'description', 'status', 'priority', 'project', 'assigned_to', 'tags', 'rank',
+                  'recurrence', 'occurrence_at', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'rank', 'recurrence', 'occurrence_at', 'created_at', 'updated_at']
+
+    def create(self, validated_data):
+        names = validated_data.pop('tags', None)
+        task = super().create(validated_data)
+        if names:
+            task_tags.set_tags(task, names)
+        return task
+
+    def update(self, instance, validated_data):
+        names = validated_data.pop('tags', None)
+        task = super().update(instance, validated_data)
+        if names is not None:
+            task_tags.set_tags(task, names)
+        return task
+
+
+class BulkTagSerializer(serializers.Serializer):
+    """
+    Tags to add to and remove from a list of tasks.
+    """
+    tasks = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=1000)
+    add = TagsField(required=False, default=list)
+    remove = TagsField(required=False, default=list)
+
+    def validate(self, data):
+        if not data['add'] and not data['remove']:
+            raise serializers.ValidationError("Give tags to add or remove.")
+        if set(data['add']) & set(data['remove']):
+            raise serializers.ValidationError("A tag cannot be added and removed at once.")
+        return data
+
+
+class BulkUserSerializer(serializers.Serializer):
+    """
+    Users to provision at once; `role` applies to the rows that do not name one.
+    Each row is validated on its own by api.provisioning.
+    """
+    users = serializers.ListField(child=serializers.JSONField(), min_length=1)
+    role = serializers.ChoiceField(choices=User.ROLE_CHOICES, required=False)
+
+    def validate_users(self, users):
+        if len(users) > settings.PROVISION_MAX_USERS:
+            raise serializers.ValidationError(f"At most {settings.PROVISION_MAX_USERS} users per request.")
+        return users
+
+
+class WeekdaysField(serializers.Field):
+    """
+    Weekly schedule days as a list of RRULE codes (["MO", "WE"]), stored as "MO,WE".
+    """
+
+    def to_representation(self, value):
+        return value.split(',') if value else []
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list) or not all(isinstance(code, str) for code in data):
+            raise serializers.ValidationError("Expected a list of weekday codes.")
+        codes = {code.upper() for code in data}
+        unknown = codes - set(recurrence.WEEKDAYS)
+        if unknown:
+            raise serializers.ValidationError(f"Unknown weekdays: {', '.join(sorted(unknown))}. Use {', '.join(recurrence.WEEKDAYS)}.")
+        return ','.join(code for code in recurrence.WEEKDAYS if code in codes)
+
+
+class RecurringTaskSerializer(serializers.ModelSerializer):
+    """
+    Serializer for recurring task templates. `next_run_at` is computed from the
+    schedule whenever it changes.
+    """
+    weekdays = WeekdaysField(required=False)
+
+    class Meta:
+        model = RecurringTask
+        fields = ['id', 'project', 'title', 'description', 'priority', 'assigned_to', 'frequency', 'interval',
+                  'weekdays', 'starts_at', 'until', 'count', 'generated', 'next_run_at', 'last_run_at',
+                  'created_by', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'generated', 'next_run_at', 'last_run_at', 'created_by', 'created_at', 'updated_at']
+        extra_kwargs = {'interval': {'min_value': 1}, 'count': {'min_value': 1}}
+
+    def validate(self, data):
+        def get(field):
+            return data.get(field, getattr(self.instance, field, None))
+
+        if get('weekdays') and get('frequency') != 'weekly':
+            raise serializers.ValidationError("Weekdays only apply to weekly schedules.")
+        if get('until') is not None and get('starts_at') is not None and get('until') < get('starts_at'):
+            raise serializers.ValidationError("The schedule must end after it starts.")
+        return data
+
+    def create(self, validated_data):
+        template = recurrence.reschedule(RecurringTask(**validated_data))
+        template.save()
+        return template
+
+    def update(self, instance, validated_data):
+        if any(field in validated_data for field in recurrence.SCHEDULE_FIELDS):
+            for field, value in validated_data.items():
+                setattr(instance, field, value)
+            recurrence.reschedule(instance)
+        return super().update(instance, validated_data)
+
+
+class TimeEntrySerializer(serializers.ModelSerializer):
+    """
+    Serializer for time entries. Writes go through api.timetracking so the
+    rollups change in the same transaction.
+    """
+    task = serializers.IntegerField(source='task_id')
+    minutes = serializers.IntegerField(min_value=1, max_value=24 * 60)
+
+    class Meta:
+        model = TimeEntry
+        fields = ['id', 'task', 'project', 'user', 'date', 'week', 'minutes', 'note', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'project', 'user', 'week', 'created_at', 'updated_at']
+
+    def validate_task(self, value):
+        if self.instance is not None and value != self.instance.task_id:
+            raise serializers.ValidationError("Time cannot be moved to another task.")
+        return value
+
+    def create(self, validated_data):
+        return timetracking.create_entries([TimeEntry(**validated_data)])[0]
+
+    def update(self, instance, validated_data):
+        return timetracking.update_entry(instance, **validated_data)
+
+
+class TimeReportSerializer(serializers.Serializer):
+    """
+    Query parameters of the time report.
+    """
+    by = serializers.MultipleChoiceField(choices=timetracking.REPORT_FIELDS, required=False)
+    project = serializers.IntegerField(required=False)
+    user = serializers.IntegerField(required=False)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def to_internal_value(self, data):
+        data = data.copy()
+        if 'by' in data:
+            data.setlist('by', [field for value in data.getlist('by') for field in value.split(',') if field])
+        return super().to_internal_value(data)
+
+
+class ArchivedTaskSerializer(serializers.ModelSerializer):
+    """
+    Read-only serializer for archived tasks.
+    Mirrors TaskSerializer so archived rows can be listed next to live ones.
+    """
+    class Meta:
+        model = ArchivedTask
+        fields = ['id', 'title', 'description', 'status', 'priority', 'project', 'assigned_to', 'created_at', 'updated_at', 'archived_at']
+        read_only_fields = fields
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -68,4 +253,116 @@ class CommentSerializer(serializers.ModelSerializer):
         """
         if not data.get('task') and not data.get('project'):
             raise serializers.ValidationError("A comment must be associated with either a task or a project.")
-        return data
\ No newline at end of file
+        return data
+
+
+class ActivitySerializer(serializers.ModelSerializer):
+    """
+    Serializer for activity log entries.
+    """
+    class Meta:
+        model = Activity
+        fields = ['id', 'actor', 'action', 'target_type', 'target_id', 'changes', 'created_at']
+        read_only_fields = fields
+
+
+
+class TaskDependencySerializer(serializers.ModelSerializer):
+    """
+    Serializer for task dependencies.
+    Both tasks must belong to the same project; the project is filled in from them.
+    """
+    class Meta:
+        model = TaskDependency
+        fields = ['id', 'task', 'depends_on', 'project', 'created_at']
+        read_only_fields = ['id', 'project', 'created_at']
+
+    def validate(self, data):
+        if data['task'].project_id != data['depends_on'].project_id:
+            raise serializers.ValidationError("A task can only depend on tasks in the same project.")
+        if data['task'] == data['depends_on']:
+            raise serializers.ValidationError("A task cannot depend on itself.")
+        return data
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    """
+    Serializer for notifications. `count` is the number of events coalesced into one.
+    """
+    class Meta:
+        model = Notification
+        fields = ['id', 'verb', 'actor', 'project', 'task', 'count', 'created_at', 'updated_at', 'read_at']
+        read_only_fields = fields
+
+
+class WebhookSubscriptionSerializer(serializers.ModelSerializer):
+    """
+    Serializer for webhook subscriptions. An empty `events` list subscribes to
+    every event; the generated `secret` signs every request sent to `url`.
+    """
+    events = serializers.ListField(child=serializers.ChoiceField(choices=WebhookSubscription.EVENTS), required=False)
+    max_concurrency = serializers.IntegerField(min_value=1, max_value=settings.WEBHOOK_MAX_CONCURRENCY, required=False)
+
+    class Meta:
+        model = WebhookSubscription
+        fields = ['id', 'url', 'project', 'events', 'max_concurrency', 'is_active', 'secret', 'owner', 'created_at']
+        read_only_fields = ['id', 'secret', 'owner', 'created_at']
+
+    def validate_url(self, value):
+        from . import webhooks
+        try:
+            webhooks.check_url(value)
+        except webhooks.BlockedURL as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+    def validate_events(self, value):
+        return sorted(set(value))
+
+
+class WebhookDeliverySerializer(serializers.ModelSerializer):
+    """
+    Serializer for webhook deliveries. `payload` is the event as it is sent.
+    """
+    class Meta:
+        model = WebhookDelivery
+        fields = ['id', 'event_id', 'event', 'status', 'attempts', 'next_attempt_at', 'last_error', 'created_at',
+                  'delivered_at', 'payload']
+        read_only_fields = fields
+
+
+class AttachmentSerializer(serializers.ModelSerializer):
+    """
+    Serializer for attachments. Identical files share content, so `sha256` may repeat.
+    """
+    task = serializers.IntegerField(source='task_id', read_only=True)
+    comment = serializers.IntegerField(source='comment_id', read_only=True)
+    size = serializers.IntegerField(source='blob.size', read_only=True)
+    sha256 = serializers.CharField(source='blob_id', read_only=True)
+
+    class Meta:
+        model = Attachment
+        fields = ['id', 'filename', 'content_type', 'size', 'sha256', 'project', 'task', 'comment', 'uploaded_by', 'created_at']
+        read_only_fields = fields
+
+
+class UploadSerializer(serializers.ModelSerializer):
+    """
+    Serializer for starting an upload. Exactly one of `task` and `comment` is required;
+    `offset` is the number of bytes received so far.
+    """
+    task = serializers.IntegerField(source='task_id', required=False, allow_null=True)
+    comment = serializers.IntegerField(source='comment_id', required=False, allow_null=True)
+    offset = serializers.IntegerField(source='received', read_only=True)
+    size = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = Upload
+        fields = ['id', 'task', 'comment', 'project', 'filename', 'content_type', 'size', 'offset', 'created_at']
+        read_only_fields = ['id', 'project', 'offset', 'created_at']
+        extra_kwargs = {'content_type': {'required': False}}
+
+    def validate(self, data):
+        if bool(data.get('task_id')) == bool(data.get('comment_id')):
+            raise serializers.ValidationError("An attachment belongs to either a task or a comment.")
+        return data
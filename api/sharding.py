@@ -0,0 +1,391 @@
+"""
+Project-keyed horizontal sharding of tasks and comments.
+
+Every project's tasks, comments and task tags live together on one database
+alias: the default database, or one of TASK_SHARDS when the shard map says so.
+Users and projects stay on the default database; each shard keeps a minimal
+mirror of the user and project rows its tasks point at, so foreign keys hold on
+every shard.
+Ids of sharded rows are handed out from a sequence on the default database, so
+an id identifies a row on every shard and is kept when a project is moved.
+
+Queries that cannot be pinned to one project (a developer's assigned tasks, the
+admin task list) are scattered over all shards and merged in id order.
+"""
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from . import db_routers
+from .models import (
+    ArchivedComment, ArchivedTask, ArchivedTaskTag, Comment, Project, ProjectShard, ShardSequence, Task, TaskDependency, TaskTag, User,
+)
+
+SHARDED_MODELS = (Task, Comment, TaskTag)
+# Ids of these models are also taken by rows that moved to the archive tables.
+ID_FLOORS = {Task: (Task, ArchivedTask), Comment: (Comment, ArchivedComment), TaskTag: (TaskTag, ArchivedTaskTag)}
+# The user each sharded row points at, which must be mirrored next to it.
+USER_FIELDS = {Task: 'assigned_to_id', Comment: 'author_id', TaskTag: None}
+SHARD_MAP_CACHE_SECONDS = 300
+USER_MIRROR_FIELDS = ['id', 'email', 'name', 'role', 'is_active']
+PROJECT_MIRROR_FIELDS = ['id', 'name', 'description', 'start_date', 'end_date', 'manager_id']
+
+
+class ShardError(Exception):
+    pass
+
+
+def enabled():
+    return bool(settings.TASK_SHARDS)
+
+
+def aliases():
+    """All aliases that can hold tasks and comments, default first."""
+    return ['default', *settings.TASK_SHARDS]
+
+
+def is_sharded(model):
+    return model in SHARDED_MODELS
+
+
+def shard_map_key(project_id):
+    return f'project-shard:{project_id}'
+
+
+def shard_for_project(project_id):
+    """
+    Alias holding the project's tasks and comments.
+    """
+    if not enabled() or project_id is None:
+        return 'default'
+    try:
+        project_id = int(project_id)
+    except (TypeError, ValueError):
+        return 'default'
+    return db_routers.lookup(shard_map_key(project_id), lambda: _load_shard(project_id))
+
+
+def _load_shard(project_id):
+    key = shard_map_key(project_id)
+    alias = cache.get(key)
+    if alias is None:
+        alias = (
+            ProjectShard.objects.using('default').filter(project_id=project_id)
+            .values_list('alias', flat=True).first()
+        ) or 'default'
+        cache.set(key, alias, SHARD_MAP_CACHE_SECONDS)
+    return alias
+
+
+def set_project_shard(project_id, alias):
+    if alias == 'default':
+        ProjectShard.objects.using('default').filter(project_id=project_id).delete()
+    else:
+        ProjectShard.objects.using('default').update_or_create(project_id=project_id, defaults={'alias': alias})
+    cache.delete(shard_map_key(project_id))
+    db_routers.forget(shard_map_key(project_id))
+
+
+def locate(model, pk):
+    """
+    Alias holding the row with this id, or None if no shard has it.
+    """
+    if not enabled():
+        return 'default'
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    for alias in aliases():
+        if model.objects.using(alias).filter(pk=pk).exists():
+            return alias
+    return None
+
+
+def scatter(queryset):
+    """
+    The queryset pinned to each alias that may hold its rows.
+    """
+    if not enabled() or not is_sharded(queryset.model):
+        return [queryset]
+    return [queryset.using(alias) for alias in aliases()]
+
+
+class ScatterGather:
+    """
+    Read-only view of a queryset over every shard, merged on `ordering`.
+    Implements count() and slicing, which is all a paginator needs: a page
+    fetches at most `stop` rows from each shard and merges them.
+    """
+
+    def __init__(self, queryset, ordering=('pk',)):
+        descending = {field.startswith('-') for field in ordering}
+        if len(descending) != 1:
+            raise ValueError("All ordering fields must sort in the same direction.")
+        self.reverse = descending.pop()
+        self.key = attrgetter(*(field.lstrip('-') for field in ordering))
+        self.querysets = [qs.order_by(*ordering) for qs in scatter(queryset)]
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        runs = [queryset[:stop] if stop is not None else queryset for queryset in self.querysets]
+        return list(islice(heapq.merge(*runs, key=self.key, reverse=self.reverse), start, stop))
+
+
+def allocate_ids(model, count):
+    """
+    Reserve `count` consecutive ids for `model` and return them as a range.
+    """
+    name = model._meta.label_lower
+    with transaction.atomic(using='default'):
+        sequence = ShardSequence.objects.using('default').select_for_update().filter(name=name).first()
+        if sequence is None:
+            # First use: continue after the highest id on any database.
+            floor = max(
+                candidate.objects.using(alias).aggregate(top=Max('pk'))['top'] or 0
+                for candidate in ID_FLOORS[model]
+                for alias in aliases()
+            )
+            sequence, _ = ShardSequence.objects.using('default').get_or_create(name=name, defaults={'last_id': floor})
+            sequence = ShardSequence.objects.using('default').select_for_update().get(name=name)
+        first = sequence.last_id + 1
+        sequence.last_id += count
+        sequence.save(using='default')
+    return range(first, first + count)
+
+
+def ensure_mirrors(alias, project_ids=(), user_ids=()):
+    """
+    Copy the project and user rows that sharded rows on `alias` refer to.
+    Mirrored users get an unusable password; they only back foreign keys.
+    """
+    if alias == 'default':
+        return
+    project_ids = {pk for pk in project_ids if pk is not None}
+    user_ids = {pk for pk in user_ids if pk is not None}
+    if project_ids:
+        project_ids -= set(Project.objects.using(alias).filter(pk__in=project_ids).values_list('pk', flat=True))
+    projects = list(Project.objects.using('default').filter(pk__in=project_ids).values(*PROJECT_MIRROR_FIELDS))
+    user_ids |= {row['manager_id'] for row in projects}
+    if user_ids:
+        user_ids -= set(User.objects.using(alias).filter(pk__in=user_ids).values_list('pk', flat=True))
+    if user_ids:
+        password = make_password(None)
+        User.objects.using(alias).bulk_create([
+            User(password=password, **row)
+            for row in User.objects.using('default').filter(pk__in=user_ids).values(*USER_MIRROR_FIELDS)
+        ], ignore_conflicts=True)
+    if projects:
+        Project.objects.using(alias).bulk_create([Project(**row) for row in projects], ignore_conflicts=True)
+
+
+def references(model, rows):
+    """
+    (project ids, user ids) referenced by task or comment rows (dicts).
+    """
+    user_field = USER_FIELDS[model]
+    return {row['project_id'] for row in rows}, {row[user_field] for row in rows} if user_field else set()
+
+
+def prepare_write(sender, instance, using, raw=False, **kwargs):
+    """
+    pre_save handler for sharded models: assign a global id and mirror what the row points at.
+    """
+    if raw or not enabled():
+        return
+    if instance.pk is None:
+        instance.pk = allocate_ids(sender, 1)[0]
+    user_field = USER_FIELDS[sender]
+    ensure_mirrors(using, [instance.project_id], [getattr(instance, user_field)] if user_field else [])
+
+
+def delete_mirrors(sender, instance, using, **kwargs):
+    """
+    pre_delete handler for users and projects: delete the copies on every shard,
+    cascading to the shard's rows the same way as on the default database.
+    """
+    if not enabled() or using != 'default':
+        return
+    for alias in settings.TASK_SHARDS:
+        sender.objects.using(alias).filter(pk=instance.pk).delete()
+        if sender is Project:
+            cache.delete(shard_map_key(instance.pk))
+            db_routers.forget(shard_map_key(instance.pk))
+
+
+def bulk_create(model, objects, project_of=attrgetter('project_id'), **options):
+    """
+    bulk_create for sharded models, writing each object to its project's shard.
+    """
+    if not enabled() or not is_sharded(model) or not objects:
+        return model.objects.bulk_create(objects, **options)
+    for obj, pk in zip(objects, allocate_ids(model, len(objects))):
+        obj.pk = pk
+    groups = {}
+    for obj in objects:
+        groups.setdefault(shard_for_project(project_of(obj)), []).append(obj)
+    user_field = USER_FIELDS[model]
+    created = []
+    for alias, group in groups.items():
+        with transaction.atomic(using=alias):
+            ensure_mirrors(alias, {obj.project_id for obj in group},
+                           {getattr(obj, user_field) for obj in group} if user_field else ())
+            created += model.objects.using(alias).bulk_create(group, **options)
+    return created
+
+
+def _fields(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def copy_rows(model, rows, dst):
+    """
+    Upsert rows (dicts) on `dst`, keeping their ids and timestamps.
+    """
+    if not rows:
+        return
+    project_ids, user_ids = references(model, rows)
+    ensure_mirrors(dst, project_ids, user_ids)
+    objects = [model(**row) for row in rows]
+    fields = [field for field in _fields(model) if field != 'id']
+    model.objects.using(dst).bulk_create(
+        objects, update_conflicts=True, unique_fields=['id'], update_fields=fields,
+    )
+    # Inserting fires auto_now/auto_now_add; put the original times back.
+    timestamps = [field for field in ('created_at', 'updated_at') if field in rows[0]]
+    for obj, row in zip(objects, rows):
+        for field in timestamps:
+            setattr(obj, field, row[field])
+    model.objects.using(dst).bulk_update(objects, timestamps)
+
+
+def movable(project_id):
+    """
+    Dependencies only live on the default database, so projects that use them
+    stay there. (Archived tasks are restored to whichever shard holds their project.)
+    """
+    return not TaskDependency.objects.using('default').filter(project_id=project_id).exists()
+
+
+def move_project(project_id, dst, batch_size=1000):
+    """
+    Move a project's tasks, comments and tags to `dst` and update the shard map.
+    Rows written while the copy runs are caught up after the map switches.
+    Returns the number of tasks moved.
+    """
+    if dst not in aliases():
+        raise ShardError(f"Unknown shard {dst!r}.")
+    cache.delete(shard_map_key(project_id))
+    db_routers.forget(shard_map_key(project_id))
+    src = shard_for_project(project_id)
+    if src == dst:
+        return 0
+    if not movable(project_id):
+        raise ShardError(f"Project {project_id} has dependencies and must stay on the default database.")
+
+    started = timezone.now()
+    tasks = Task.objects.using(src).filter(project_id=project_id)
+    comments = Comment.objects.using(src).filter(Q(project_id=project_id) | Q(task__project_id=project_id))
+    tags = TaskTag.objects.using(src).filter(project_id=project_id)
+    with transaction.atomic(using=dst):
+        _copy_in_batches(Task, tasks, dst, batch_size)
+        _copy_in_batches(Comment, comments, dst, batch_size)
+        _copy_in_batches(TaskTag, tags, dst, batch_size)
+    set_project_shard(project_id, dst)
+    with transaction.atomic(using=dst):
+        _copy_in_batches(Task, tasks.filter(updated_at__gte=started), dst, batch_size)
+        _copy_in_batches(Comment, comments.filter(updated_at__gte=started), dst, batch_size)
+        _copy_in_batches(TaskTag, tags.filter(created_at__gte=started), dst, batch_size)
+
+    moved = tasks.count()
+    with transaction.atomic(using=src):
+        comments.delete()
+        tasks.delete()
+    return moved
+
+
+def move_task(task, dst):
+    """
+    Move one task, its comments and its tags to `dst`, e.g. when it changes to a project on another shard.
+    """
+    src = task._state.db
+    if src == dst:
+        return task
+    rows = list(Task.objects.using(src).filter(pk=task.pk).values(*_fields(Task)))
+    comment_rows = list(Comment.objects.using(src).filter(task_id=task.pk).values(*_fields(Comment)))
+    tag_rows = list(TaskTag.objects.using(src).filter(task_id=task.pk).values(*_fields(TaskTag)))
+    with transaction.atomic(using=dst):
+        copy_rows(Task, rows, dst)
+        copy_rows(Comment, comment_rows, dst)
+        copy_rows(TaskTag, tag_rows, dst)
+    Task.objects.using(src).filter(pk=task.pk).delete()
+    task._state.db = dst
+    return task
+
+
+def _copy_in_batches(model, queryset, dst, batch_size):
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_id).order_by('pk').values(*_fields(model))[:batch_size])
+        if not rows:
+            return
+        copy_rows(model, rows, dst)
+        last_id = rows[-1]['id']
+
+
+def shard_loads():
+    """
+    {alias: {project id: task count}} for every alias.
+    """
+    loads = {}
+    for alias in aliases():
+        counts = Task.objects.using(alias).values('project_id').annotate(n=Count('id')).values_list('project_id', 'n')
+        loads[alias] = {project_id: n for project_id, n in counts if shard_for_project(project_id) == alias}
+    return loads
+
+
+def plan_rebalance(loads, can_move=movable):
+    """
+    Greedy plan of (project id, from alias, to alias) moves that evens out task counts:
+    repeatedly move from the fullest to the emptiest alias the largest project that
+    narrows the gap between them.
+    """
+    totals = {alias: sum(projects.values()) for alias, projects in loads.items()}
+    projects = {alias: dict(counts) for alias, counts in loads.items()}
+    skipped = set()
+    moves = []
+    while True:
+        fullest = max(totals, key=totals.get)
+        emptiest = min(totals, key=totals.get)
+        gap = totals[fullest] - totals[emptiest]
+        candidates = sorted(
+            ((n, project_id) for project_id, n in projects[fullest].items()
+             if 0 < n < gap and project_id not in skipped),
+            reverse=True,
+        )
+        for n, project_id in candidates:
+            if can_move(project_id):
+                break
+            skipped.add(project_id)
+        else:
+            return moves
+        moves.append((project_id, fullest, emptiest))
+        del projects[fullest][project_id]
+        projects[emptiest][project_id] = n
+        totals[fullest] -= n
+        totals[emptiest] += n
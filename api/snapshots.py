@@ -0,0 +1,335 @@
+"""
+Project snapshots: a compact, streamable copy of one project.
+
+A snapshot holds a project with its manager, members, tasks, task tags and
+comments, plus the users they refer to. It is a gzip stream of
+length-prefixed records: the MAGIC bytes, then for each record a 4-byte
+big-endian length and that many bytes of compact JSON. The records are:
+
+- `header`: format version and export time;
+- `users`, `tasks`, `tags`, `comments`: up to SNAPSHOT_CHUNK_SIZE rows each,
+  stored by column (`{"columns": [...], "codecs": [...], "data": [[column 1
+  values], ...]}`), which compresses far better than one object per row;
+- `project`: the project row, with its manager and members as user ids;
+- `end`: the number of rows of each kind, so a truncated file is rejected.
+
+Each column of a chunk has a codec. Integer columns (ids and foreign keys) are
+`delta`: the first value, then the difference from the previous one, so a run
+of consecutive ids is a run of 1s. Timestamps are `time`: microseconds since
+the Unix epoch in UTC, delta-encoded the same way. Other columns (`null`) are
+plain JSON values, with dates as ISO strings.
+
+Users come first and the project before its tasks, so a reader can restore a
+snapshot in one pass. Export reads each table in chunks by id and writes each
+chunk as soon as it is read, so memory use does not depend on the number of
+tasks and comments; only the ids of the users involved are held.
+
+Restoring always creates a new project. Users are matched by email; those
+that do not exist yet are created with an unusable password. Tasks, comments
+and tags are written with bulk_create, a chunk at a time, with their ids
+remapped to the new rows' ids; their timestamps are kept. Each restored task
+gets a creation transition in the status history. The restore runs in
+one transaction, plus one on the project's shard when it is on a shard, so a
+snapshot is restored completely or not at all.
+"""
+import gzip
+import json
+import struct
+import zlib
+from collections import Counter
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from itertools import accumulate
+from operator import attrgetter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import ranking, sharding
+from .models import Comment, Project, Task, TaskTag, User
+from .status_history import record_status_changes
+
+MAGIC = b'TMSNAP\n'
+FORMAT = 1
+LENGTH = struct.Struct('>I')
+
+USER_COLUMNS = ['id', 'email', 'name', 'role', 'is_active']
+TASK_COLUMNS = ['id', 'title', 'description', 'status', 'priority', 'assigned_to_id', 'rank', 'created_at', 'updated_at']
+TAG_COLUMNS = ['id', 'task_id', 'name']
+COMMENT_COLUMNS = ['id', 'content', 'author_id', 'task_id', 'created_at', 'updated_at']
+PROJECT_COLUMNS = ['id', 'name', 'description', 'start_date', 'end_date', 'manager_id']
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _encode(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def frame(record):
+    payload = json.dumps(record, separators=(',', ':'), ensure_ascii=False, default=_encode).encode('utf-8')
+    return LENGTH.pack(len(payload)) + payload
+
+
+def _deltas(values):
+    return [value - previous for previous, value in zip([0] + values, values)]
+
+
+def encode_column(values):
+    """(codec, encoded values) for one column of a chunk."""
+    if values and all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+        return 'delta', _deltas(values)
+    if values and all(isinstance(value, datetime) and value.tzinfo is not None for value in values):
+        return 'time', _deltas([(value - EPOCH) // MICROSECOND for value in values])
+    return None, [_encode(value) for value in values]
+
+
+def decode_column(codec, values):
+    if codec is None:
+        return values
+    if codec == 'delta':
+        return list(accumulate(values))
+    if codec == 'time':
+        return [EPOCH + value * MICROSECOND for value in accumulate(values)]
+    raise SnapshotError(f"Unknown column codec {codec!r}.")
+
+
+def chunk_record(kind, columns, rows):
+    codecs, data = zip(*(encode_column([row[index] for row in rows]) for index in range(len(columns))))
+    return {'type': kind, 'columns': columns, 'codecs': list(codecs), 'data': list(data)}
+
+
+def _chunks(queryset, columns, chunk_size):
+    """Rows of `queryset` as tuples of `columns`, a chunk at a time, in id order."""
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_id).order_by('pk').values_list(*columns)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def records(project, chunk_size=None):
+    """
+    The snapshot records of `project`, read from the database a chunk at a time.
+    """
+    chunk_size = chunk_size or settings.SNAPSHOT_CHUNK_SIZE
+    alias = sharding.shard_for_project(project.pk)
+    tasks = Task.objects.using(alias).filter(project_id=project.pk)
+    tags = TaskTag.objects.using(alias).filter(project_id=project.pk)
+    comments = Comment.objects.using(alias).filter(Q(project_id=project.pk) | Q(task__project_id=project.pk))
+    members = list(Project.members.through.objects.filter(project_id=project.pk).values_list('user_id', flat=True))
+
+    user_ids = {project.manager_id, *members}
+    user_ids.update(tasks.exclude(assigned_to_id=None).values_list('assigned_to_id', flat=True).distinct())
+    user_ids.update(comments.values_list('author_id', flat=True).distinct())
+    user_ids = sorted(user_ids)
+    counts = Counter()
+
+    yield {'type': 'header', 'format': FORMAT, 'exported_at': timezone.now().isoformat()}
+    for start in range(0, len(user_ids), chunk_size):
+        rows = list(User.objects.filter(pk__in=user_ids[start:start + chunk_size]).order_by('pk').values_list(*USER_COLUMNS))
+        counts['users'] += len(rows)
+        yield chunk_record('users', USER_COLUMNS, rows)
+    row = Project.objects.filter(pk=project.pk).values_list(*PROJECT_COLUMNS).get()
+    yield {'type': 'project', **{column: _encode(value) for column, value in zip(PROJECT_COLUMNS, row)}, 'members': members}
+    for kind, queryset, columns in (('tasks', tasks, TASK_COLUMNS), ('tags', tags, TAG_COLUMNS),
+                                    ('comments', comments, COMMENT_COLUMNS)):
+        for rows in _chunks(queryset, columns, chunk_size):
+            counts[kind] += len(rows)
+            yield chunk_record(kind, columns, rows)
+    yield {'type': 'end', 'counts': dict(counts)}
+
+
+def export(project, chunk_size=None, level=6):
+    """
+    The snapshot of `project` as a stream of gzip-compressed byte chunks, for a
+    file or a StreamingHttpResponse.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    data = compressor.compress(MAGIC)
+    for record in records(project, chunk_size):
+        data += compressor.compress(frame(record))
+        if data:
+            yield data
+            data = b''
+    yield data + compressor.flush()
+
+
+def read_records(stream):
+    """
+    The records of a snapshot read from a binary file object, one at a time.
+    """
+    source = gzip.GzipFile(fileobj=stream, mode='rb')
+    try:
+        if source.read(len(MAGIC)) != MAGIC:
+            raise SnapshotError("Not a project snapshot.")
+        while True:
+            prefix = source.read(LENGTH.size)
+            if not prefix:
+                return
+            if len(prefix) < LENGTH.size:
+                raise SnapshotError("The snapshot is truncated.")
+            (length,) = LENGTH.unpack(prefix)
+            payload = source.read(length)
+            if len(payload) < length:
+                raise SnapshotError("The snapshot is truncated.")
+            yield json.loads(payload)
+    except (OSError, EOFError, zlib.error, ValueError) as exc:
+        raise SnapshotError(f"The snapshot is damaged: {exc}") from exc
+
+
+def rows(record):
+    """The rows of a chunk record as dicts, with their columns decoded."""
+    codecs = record.get('codecs') or [None] * len(record['columns'])
+    data = [decode_column(codec, values) for codec, values in zip(codecs, record['data'])]
+    return [dict(zip(record['columns'], values)) for values in zip(*data)]
+
+
+class Restore:
+    """
+    Restores one snapshot; see restore().
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.users = {}
+        self.tasks = {}
+        self.project = None
+        self.counts = Counter()
+        self.transactions = ExitStack()
+
+    def user(self, snapshot_id):
+        if snapshot_id is None:
+            return None
+        if snapshot_id not in self.users:
+            raise SnapshotError(f"User {snapshot_id} is referenced but not included in the snapshot.")
+        return self.users[snapshot_id]
+
+    def restore_users(self, chunk):
+        emails = [row['email'] for row in chunk]
+        existing = dict(User.objects.filter(email__in=emails).values_list('email', 'id'))
+        missing = [row for row in chunk if row['email'] not in existing]
+        if missing:
+            password = make_password(None)
+            User.objects.bulk_create([
+                User(email=row['email'], name=row['name'], role=row['role'], is_active=row['is_active'], password=password)
+                for row in missing
+            ])
+            existing.update(User.objects.filter(email__in=[row['email'] for row in missing]).values_list('email', 'id'))
+        for row in chunk:
+            self.users[row['id']] = existing[row['email']]
+
+    def restore_project(self, record):
+        fields = Project._meta
+        self.project = Project.objects.create(
+            name=self.name or record['name'],
+            description=record['description'],
+            start_date=fields.get_field('start_date').to_python(record['start_date']),
+            end_date=fields.get_field('end_date').to_python(record['end_date']),
+            manager_id=self.user(record['manager_id']),
+        )
+        alias = sharding.shard_for_project(self.project.pk)
+        if alias != 'default':
+            # Tasks, tags and comments go to the shard; roll them back with the project.
+            self.transactions.enter_context(transaction.atomic(using=alias))
+        self.project.members.add(*[self.user(member) for member in record['members']])
+
+    def bulk_create(self, model, objects, chunk, project_of=attrgetter('project_id')):
+        """
+        Create `objects` (built from the `chunk` rows, in order) and put the
+        rows' timestamps back, which bulk_create overwrites with the current
+        time. The timestamps are written with one executemany, which is much
+        cheaper than bulk_update's CASE expressions.
+        """
+        created = sharding.bulk_create(model, objects, project_of)
+        timestamps = [model._meta.get_field(name) for name in ('created_at', 'updated_at') if name in chunk[0]]
+        if timestamps:
+            alias = sharding.shard_for_project(self.project.pk)
+            connection = connections[alias]
+            quote = connection.ops.quote_name
+            assignments = ', '.join(f"{quote(field.column)} = %s" for field in timestamps)
+            sql = f"UPDATE {quote(model._meta.db_table)} SET {assignments} WHERE {quote(model._meta.pk.column)} = %s"
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, [
+                    [field.get_db_prep_value(field.to_python(row[field.name]), connection) for field in timestamps] + [obj.pk]
+                    for obj, row in zip(created, chunk)
+                ])
+        return created
+
+    def restore_tasks(self, chunk):
+        tasks = [
+            Task(project_id=self.project.pk, title=row['title'], description=row['description'], status=row['status'],
+                 priority=row['priority'], assigned_to_id=self.user(row['assigned_to_id']), rank=row['rank'])
+            for row in chunk
+        ]
+        ranking.assign_ranks(tasks)
+        created = self.bulk_create(Task, tasks, chunk)
+        for row, task in zip(chunk, created):
+            self.tasks[row['id']] = task.pk
+        record_status_changes([(task, None, task.status) for task in created])
+
+    def task(self, snapshot_id):
+        if snapshot_id not in self.tasks:
+            raise SnapshotError(f"Task {snapshot_id} is referenced but not included in the snapshot.")
+        return self.tasks[snapshot_id]
+
+    def restore_tags(self, chunk):
+        sharding.bulk_create(TaskTag, [
+            TaskTag(task_id=self.task(row['task_id']), project_id=self.project.pk, name=row['name']) for row in chunk
+        ])
+
+    def restore_comments(self, chunk):
+        self.bulk_create(Comment, [
+            Comment(content=row['content'], author_id=self.user(row['author_id']),
+                    task_id=self.task(row['task_id']) if row['task_id'] is not None else None,
+                    project_id=self.project.pk if row['task_id'] is None else None)
+            for row in chunk
+        ], chunk, project_of=lambda comment: self.project.pk)
+
+    def run(self, records):
+        header = next(records, None)
+        if not header or header.get('type') != 'header':
+            raise SnapshotError("The snapshot has no header.")
+        if header.get('format') != FORMAT:
+            raise SnapshotError(f"Unsupported snapshot format {header.get('format')!r}.")
+        handlers = {'users': self.restore_users, 'tasks': self.restore_tasks, 'tags': self.restore_tags,
+                    'comments': self.restore_comments}
+        for record in records:
+            kind = record.get('type')
+            if kind == 'project':
+                self.restore_project(record)
+            elif kind in handlers:
+                if kind != 'users' and self.project is None:
+                    raise SnapshotError(f"The snapshot has {kind} before its project.")
+                chunk = rows(record)
+                if chunk:
+                    handlers[kind](chunk)
+                self.counts[kind] += len(chunk)
+            elif kind == 'end':
+                if self.project is None or Counter(record.get('counts', {})) != self.counts:
+                    raise SnapshotError("The snapshot is incomplete.")
+                return self.project
+            else:
+                raise SnapshotError(f"Unknown snapshot record {kind!r}.")
+        raise SnapshotError("The snapshot is truncated.")
+
+
+def restore(stream, name=None):
+    """
+    Create a new project from the snapshot in the binary file object `stream`,
+    named `name` or as in the snapshot. Returns (project, {kind: rows restored}).
+    """
+    restorer = Restore(name)
+    with transaction.atomic(), restorer.transactions:
+        project = restorer.run(read_records(stream))
+    return project, dict(restorer.counts)
@@ -0,0 +1,146 @@
+"""
+Task status history and the project flow reports built on it.
+
+Reports never loop over tasks in Python: the database groups transitions per
+day (or per task for lead/cycle times) and NumPy turns the grouped rows into
+daily series and percentiles. Timestamps are stored as integer seconds, so the
+bucketing and subtraction run natively in SQL on every backend. NumPy is
+imported on first use, so workers that never serve a report never load it.
+"""
+from datetime import date, timedelta
+
+from django.db.models import Case, Count, F, IntegerField, Max, Min, When
+from django.utils import timezone
+
+from .models import TaskStatusChange
+
+STATUS_CODES = TaskStatusChange.STATUS_CODES
+STATUS_NAMES = sorted(STATUS_CODES, key=STATUS_CODES.get)
+PERCENTILES = [50, 85, 95]
+SECONDS_PER_DAY = 86400
+EPOCH = date(1970, 1, 1)
+
+
+def status_code(status):
+    return None if status is None else STATUS_CODES[status]
+
+
+def record_status_changes(changes):
+    """
+    Bulk-insert transitions given as (task, from_status, to_status) tuples.
+    Status names are used here; None stands for "created" or "deleted".
+    """
+    now = int(timezone.now().timestamp())
+    TaskStatusChange.objects.bulk_create([
+        TaskStatusChange(
+            task_id=task.id,
+            project_id=task.project_id,
+            from_status=status_code(from_status),
+            to_status=status_code(to_status),
+            changed_at=now,
+        )
+        for task, from_status, to_status in changes
+    ])
+
+
+def record_status_change(task, from_status, to_status):
+    record_status_changes([(task, from_status, to_status)])
+
+
+def project_flow_report(project, start, end):
+    """
+    Burndown, cumulative flow and lead/cycle-time percentiles for `project`
+    over the inclusive date range [start, end] (UTC days).
+    """
+    import numpy as np
+
+    start_day = (start - EPOCH).days
+    n_days = (end - start).days + 1
+    start_ts = start_day * SECONDS_PER_DAY
+    end_ts = (start_day + n_days) * SECONDS_PER_DAY
+    transitions = TaskStatusChange.objects.filter(project=project, changed_at__lt=end_ts)
+
+    # Grouped SQL: number of transitions per (day, from, to). Everything before
+    # `start` collapses into day 0 so the series start from the right baseline.
+    grouped = list(
+        transitions.annotate(day=F('changed_at') / SECONDS_PER_DAY)
+        .values('day', 'from_status', 'to_status')
+        .annotate(n=Count('id'))
+        .values_list('day', 'from_status', 'to_status', 'n')
+    )
+    counts = np.zeros((len(STATUS_NAMES), n_days), dtype=np.int64)
+    if grouped:
+        # -1 stands in for a missing status (task created or deleted).
+        day, from_code, to_code, n = np.array(
+            [(d, -1 if f is None else f, -1 if t is None else t, c) for d, f, t, c in grouped],
+            dtype=np.int64,
+        ).T
+        day_index = np.clip(day - start_day, 0, None)
+        entered = to_code >= 0
+        left = from_code >= 0
+        np.add.at(counts, (to_code[entered], day_index[entered]), n[entered])
+        np.subtract.at(counts, (from_code[left], day_index[left]), n[left])
+    flow = np.cumsum(counts, axis=1)
+
+    completed = flow[STATUS_CODES['Completed']]
+    total = flow.sum(axis=0)
+    days = np.arange(start_day, start_day + n_days).astype('datetime64[D]')
+
+    return {
+        'project': project.id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': [str(day) for day in days],
+        'burndown': {
+            'scope': total.tolist(),
+            'completed': completed.tolist(),
+            'remaining': (total - completed).tolist(),
+        },
+        'cumulative_flow': {name: flow[code].tolist() for name, code in STATUS_CODES.items()},
+        **_flow_times(transitions, start_ts, end_ts),
+    }
+
+
+def _flow_times(transitions, start_ts, end_ts):
+    """
+    Lead time (created -> completed) and cycle time (first started -> completed)
+    for tasks completed within the range, as hour percentiles.
+    """
+    import numpy as np
+
+    per_task = (
+        transitions.values('task_id')
+        .annotate(
+            created=Min(Case(When(from_status__isnull=True, then='changed_at'), output_field=IntegerField())),
+            started=Min(Case(When(to_status=STATUS_CODES['In Progress'], then='changed_at'), output_field=IntegerField())),
+            completed=Max(Case(When(to_status=STATUS_CODES['Completed'], then='changed_at'), output_field=IntegerField())),
+        )
+        .filter(completed__gte=start_ts, completed__lt=end_ts)
+        .values_list('created', 'started', 'completed')
+    )
+    # None (never created/started inside the history) becomes NaN and is ignored.
+    times = np.array(list(per_task), dtype=np.float64).reshape(-1, 3)
+    created, started, finished = times.T
+    return {
+        'lead_time_hours': _percentiles((finished - created) / 3600),
+        'cycle_time_hours': _percentiles((finished - started) / 3600),
+    }
+
+
+def _percentiles(hours):
+    import numpy as np
+
+    hours = hours[~np.isnan(hours)]
+    if not hours.size:
+        return {'count': 0, **{f'p{p}': None for p in PERCENTILES}}
+    values = np.percentile(hours, PERCENTILES)
+    return {'count': int(hours.size), **{f'p{p}': round(float(v), 2) for p, v in zip(PERCENTILES, values)}}
+
+
+def parse_range(start, end, default_days=30):
+    """
+    Fill in a missing end (today) and start (`default_days` before end).
+    """
+    end = end or timezone.now().date()
+    start = start or end - timedelta(days=default_days - 1)
+    return start, end
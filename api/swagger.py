@@ -56,3 +56,17 @@ schema_view = get_schema_view(
     public=True,
     permission_classes=(permissions.AllowAny,),
 )
+
+
+def document_query_parameters(viewsets):
+    """
+    Turn @query_parameters descriptions (see api/docs.py) into drf_yasg manual parameters.
+    """
+    for viewset in viewsets:
+        for view_method in vars(viewset).values():
+            parameters = getattr(view_method, '_query_parameters', None)
+            if parameters:
+                swagger_auto_schema(manual_parameters=[
+                    openapi.Parameter(name, openapi.IN_QUERY, description=description, type=type_)
+                    for name, description, type_ in parameters
+                ])(view_method)
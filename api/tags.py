@@ -0,0 +1,141 @@
+"""
+Task tags.
+
+Tags are stored one row per (task, name) in TaskTag. Each row also holds the
+task's project, so every tag query is a range scan of an index:
+
+- ?tags=a,b (all of them) adds one `id IN (task ids tagged a)` semi-join per
+  name. Each reads only its name's range of the (project, name, task) index,
+  and the database intersects them with the other task filters.
+- ?tags_any=a,b is a single semi-join over the ranges of all the names.
+- Per-project counts group (project, name) without reading any task rows.
+
+Without a ?project= filter, the (name, task) index serves the same queries.
+Tag changes bump the tasks' updated_at, so their ETags change with them.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import sharding
+from .models import Task, TaskTag
+
+MAX_LENGTH = TaskTag._meta.get_field('name').max_length
+MAX_TAGS_PER_REQUEST = 20
+TAG_NAME = re.compile(r'^[a-z0-9][a-z0-9 _.:/-]*$')
+
+
+class TagError(ValueError):
+    pass
+
+
+def normalize(names):
+    """
+    Lowercased, stripped, de-duplicated tag names, in the order given.
+    """
+    if isinstance(names, str) or not isinstance(names, (list, tuple)):
+        raise TagError("Tags must be a list of names.")
+    normalized = []
+    for name in names:
+        if not isinstance(name, str):
+            raise TagError("Tags must be a list of names.")
+        name = ' '.join(name.lower().split())
+        if not name or len(name) > MAX_LENGTH or not TAG_NAME.match(name):
+            raise TagError(f"Invalid tag {name!r}: use up to {MAX_LENGTH} letters, digits, spaces or _.:/- characters.")
+        if name not in normalized:
+            normalized.append(name)
+    return normalized
+
+
+def parse_filter(value):
+    """
+    Tag names from a comma-separated query parameter.
+    """
+    names = normalize([name for name in value.split(',') if name.strip()])
+    if not names:
+        raise TagError("Name at least one tag.")
+    if len(names) > MAX_TAGS_PER_REQUEST:
+        raise TagError(f"At most {MAX_TAGS_PER_REQUEST} tags can be combined.")
+    return names
+
+
+def tagged(names, project_id=None):
+    """
+    TaskTag rows with any of `names`, in the project when one is given.
+    """
+    rows = TaskTag.objects.filter(name__in=names)
+    if project_id is not None:
+        rows = rows.filter(project_id=project_id)
+    return rows
+
+
+def filter_all(queryset, names, project_id=None):
+    """
+    Tasks carrying every one of `names`.
+    """
+    for name in names:
+        queryset = queryset.filter(id__in=tagged([name], project_id).values('task_id'))
+    return queryset
+
+
+def filter_any(queryset, names, project_id=None):
+    """
+    Tasks carrying at least one of `names`.
+    """
+    return queryset.filter(id__in=tagged(names, project_id).values('task_id'))
+
+
+def project_counts(project_id, tasks=None):
+    """
+    [{'name': ..., 'count': ...}] for the project's tags, most used first.
+    With `tasks`, only tags on those tasks are counted.
+    """
+    rows = TaskTag.objects.using(sharding.shard_for_project(project_id)).filter(project_id=project_id)
+    if tasks is not None:
+        rows = rows.filter(task__in=tasks)
+    return list(rows.values('name').annotate(count=Count('id')).order_by('-count', 'name'))
+
+
+def change(tasks, add=(), remove=()):
+    """
+    Add and remove tags on a list of tasks, with one INSERT and one DELETE per
+    shard. Returns the number of tags added and removed.
+    """
+    added = removed = 0
+    by_alias = {}
+    for task in tasks:
+        by_alias.setdefault(task._state.db or 'default', []).append(task)
+    now = timezone.now()
+    for alias, group in by_alias.items():
+        task_ids = [task.pk for task in group]
+        with transaction.atomic(using=alias):
+            if remove:
+                removed += TaskTag.objects.using(alias).filter(task_id__in=task_ids, name__in=remove).delete()[0]
+            if add:
+                existing = set(TaskTag.objects.using(alias).filter(task_id__in=task_ids, name__in=add)
+                               .values_list('task_id', 'name'))
+                new = [TaskTag(task_id=task.pk, project_id=task.project_id, name=name)
+                       for task in group for name in add if (task.pk, name) not in existing]
+                sharding.bulk_create(TaskTag, new, ignore_conflicts=True)
+                added += len(new)
+            if added or removed:
+                Task.objects.using(alias).filter(id__in=task_ids).update(updated_at=now)
+    return added, removed
+
+
+def set_tags(task, names):
+    """
+    Make `names` the task's complete set of tags.
+    """
+    current = set(task.tags.values_list('name', flat=True))
+    change([task], add=[name for name in names if name not in current],
+           remove=[name for name in current if name not in names])
+
+
+def move_to_project(task):
+    """
+    Keep a task's tags with it when it changes project.
+    """
+    TaskTag.objects.using(task._state.db).filter(task_id=task.pk).update(project_id=task.project_id)
@@ -1,58 +1,70 @@
+import json
+import gzip
 import logging
-from django.test import TestCase
+import os
+import subprocess
+import sys
+import tempfile
+import gc
+import hashlib
+import importlib
+import random
+import tracemalloc
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock
+from django.db import DatabaseError
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.db.models import Q, QuerySet
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import User, Project, Task, Comment
+from .factories import make_user, make_project, make_task, make_comment
+from .models import User, Project, Task, Comment, ArchivedTask, ArchivedComment, ArchivedTaskTag, ArchivedTaskDependency, Activity, TaskStatusChange, TaskDependency, ImportJob, ProjectShard, RevokedToken, Notification, NotificationCounter, Attachment, Blob, Upload, TaskTag, RecurringTask, TimeEntry, TimeRollup, OutboxEvent, WebhookSubscription, WebhookDelivery
+from .graph import DependencyGraph, CycleError, project_schedule
+from .importer import LookupCache, TaskImporter
+from .activity import ActivityBuffer, get_buffer as get_activity_buffer
+from .archive import archive_completed_tasks, restore_task
+from .db_routers import choose_replica
+from . import db_routers
+from . import sharding
+from . import tokens
+from . import notifications
+from . import batch
+from . import attachments
+from . import ranking
+from . import provisioning
+from . import profiling
+from . import logs
+from . import recurrence
+from . import timetracking
+from . import snapshots
+from . import webhooks
 from rest_framework_simplejwt.tokens import RefreshToken
 
 logger = logging.getLogger(__name__)
 
 class TaskManagementSystemTests(APITestCase):
 
-    def setUp(self):
-        """Set up test data for the tests."""
-        self.admin_user = User.objects.create_user(
-            email="admin@example.com",
-            password="adminpass",
-            name="Admin User",
-            role="Admin"
-        )
-        self.project_manager = User.objects.create_user(
-            email="manager@example.com",
-            password="managerpass",
-            name="Project Manager",
-            role="Project Manager"
-        )
-        self.developer = User.objects.create_user(
-            email="developer@example.com",
-            password="devpass",
-            name="Developer",
-            role="Developer"
-        )
-
-        self.project = Project.objects.create(
-            name="Test Project",
-            description="A test project",
-            start_date="2025-04-01",
-            end_date="2025-04-30",
-            manager=self.project_manager
-        )
-        self.project.members.add(self.developer)
-
-        self.task = Task.objects.create(
-            title="Test Task",
-            description="A test task",
-            status="Pending",
-            priority="Medium",
-            project=self.project,
-            assigned_to=self.developer
-        )
-
-        self.comment = Comment.objects.create(
-            content="Test Comment",
-            author=self.developer,
-            task=self.task
-        )
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin_user = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin User")
+        cls.project_manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.project = make_project(cls.project_manager, members=[cls.developer], name="Test Project", description="A test project")
+        cls.task = make_task(cls.project, title="Test Task", description="A test task", status="Pending", priority="Medium", assigned_to=cls.developer)
+        cls.comment = make_comment(cls.developer, cls.task, content="Test Comment")
 
     def authenticate(self, user):
         """Authenticate a user and set the authorization header."""
@@ -245,56 +257,16 @@ class RoleBasedAccessTests(APITestCase):
     Test role-based access control for different user roles across all endpoints.
     """
 
-    def setUp(self):
-        """Set up test data for the tests."""
-        self.admin_user = User.objects.create_user(
-            email="admin@example.com",
-            password="adminpass",
-            name="Admin User",
-            role="Admin"
-        )
-        self.project_manager = User.objects.create_user(
-            email="manager@example.com",
-            password="managerpass",
-            name="Project Manager",
-            role="Project Manager"
-        )
-        self.developer = User.objects.create_user(
-            email="developer@example.com",
-            password="devpass",
-            name="Developer",
-            role="Developer"
-        )
-        self.client_user = User.objects.create_user(
-            email="client@example.com",
-            password="clientpass",
-            name="Client User",
-            role="Client"
-        )
-
-        self.project = Project.objects.create(
-            name="Test Project",
-            description="A test project",
-            start_date="2025-04-01",
-            end_date="2025-04-30",
-            manager=self.project_manager
-        )
-        self.project.members.add(self.developer)
-
-        self.task = Task.objects.create(
-            title="Test Task",
-            description="A test task",
-            status="Pending",
-            priority="Medium",
-            project=self.project,
-            assigned_to=self.developer
-        )
-
-        self.comment = Comment.objects.create(
-            content="Test Comment",
-            author=self.developer,
-            task=self.task
-        )
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin_user = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin User")
+        cls.project_manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.client_user = make_user("Client", email="client@example.com", password="clientpass", name="Client User")
+        cls.project = make_project(cls.project_manager, members=[cls.developer], name="Test Project", description="A test project")
+        cls.task = make_task(cls.project, title="Test Task", description="A test task", status="Pending", priority="Medium", assigned_to=cls.developer)
+        cls.comment = make_comment(cls.developer, cls.task, content="Test Comment")
 
     def authenticate(self, user):
         """Authenticate a user and set the authorization header."""
@@ -422,49 +394,15 @@ class TaggingTests(APITestCase):
     Test tagging functionality for projects, tasks, and comments.
     """
 
-    def setUp(self):
-        """Set up test data for the tests."""
-        self.admin_user = User.objects.create_user(
-            email="admin@example.com",
-            password="adminpass",
-            name="Admin User",
-            role="Admin"
-        )
-        self.project_manager = User.objects.create_user(
-            email="manager@example.com",
-            password="managerpass",
-            name="Project Manager",
-            role="Project Manager"
-        )
-        self.developer = User.objects.create_user(
-            email="developer@example.com",
-            password="devpass",
-            name="Developer",
-            role="Developer"
-        )
-
-        self.project = Project.objects.create(
-            name="Test Project",
-            description="A test project",
-            start_date="2025-04-01",
-            end_date="2025-04-30",
-            manager=self.project_manager
-        )
-
-        self.task = Task.objects.create(
-            title="Test Task",
-            description="A test task",
-            status="Pending",
-            priority="Medium",
-            project=self.project,
-            assigned_to=self.developer
-        )
-
-        self.comment = Comment.objects.create(
-            content="Test Comment",
-            author=self.developer,
-            task=self.task
-        )
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin_user = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin User")
+        cls.project_manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.project = make_project(cls.project_manager, name="Test Project", description="A test project")
+        cls.task = make_task(cls.project, title="Test Task", description="A test task", status="Pending", priority="Medium", assigned_to=cls.developer)
+        cls.comment = make_comment(cls.developer, cls.task, content="Test Comment")
 
     def authenticate(self, user):
         """Authenticate a user and set the authorization header."""
@@ -528,47 +466,22 @@ class SearchAndFilterTests(APITestCase):
     Test search and filtering functionality for tasks and projects.
     """
 
-    def setUp(self):
-        """Set up test data for the tests."""
-        self.admin_user = User.objects.create_user(
-            email="admin@example.com",
-            password="adminpass",
-            name="Admin User",
-            role="Admin"
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin_user = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin User")
+        cls.project1 = make_project(cls.admin_user, name="Project Alpha", description="Description for Project Alpha")
+        cls.project2 = make_project(
+            cls.admin_user, name="Project Beta", description="Description for Project Beta",
+            start_date="2025-05-01", end_date="2025-05-31",
         )
-
-        self.project1 = Project.objects.create(
-            name="Project Alpha",
-            description="Description for Project Alpha",
-            start_date="2025-04-01",
-            end_date="2025-04-30",
-            manager=self.admin_user
+        cls.task1 = make_task(
+            cls.project1, title="Task Alpha", description="Description for Task Alpha",
+            status="Pending", priority="High", assigned_to=cls.admin_user,
         )
-
-        self.project2 = Project.objects.create(
-            name="Project Beta",
-            description="Description for Project Beta",
-            start_date="2025-05-01",
-            end_date="2025-05-31",
-            manager=self.admin_user
-        )
-
-        self.task1 = Task.objects.create(
-            title="Task Alpha",
-            description="Description for Task Alpha",
-            status="Pending",
-            priority="High",
-            project=self.project1,
-            assigned_to=self.admin_user
-        )
-
-        self.task2 = Task.objects.create(
-            title="Task Beta",
-            description="Description for Task Beta",
-            status="Completed",
-            priority="Low",
-            project=self.project2,
-            assigned_to=self.admin_user
+        cls.task2 = make_task(
+            cls.project2, title="Task Beta", description="Description for Task Beta",
+            status="Completed", priority="Low", assigned_to=cls.admin_user,
         )
 
     def authenticate(self, user):
@@ -622,3 +535,2672 @@ class SearchAndFilterTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 1)
         self.assertEqual(response.data['results'][0]['title'], "Task Alpha")
+
+
+class TaskArchiveTests(APITestCase):
+    """
+    Test archiving completed tasks, listing them with include_archived and restoring on reopen.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.project_manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.project = make_project(cls.project_manager, name="Test Project", description="A test project")
+        cls.done_task = make_task(
+            cls.project, title="Old Done Task", description="Finished long ago", status="Completed", assigned_to=cls.developer
+        )
+        cls.open_task = make_task(
+            cls.project, title="Open Task", description="Still in progress", status="In Progress", assigned_to=cls.developer
+        )
+        cls.comment = make_comment(cls.developer, cls.done_task, content="Done and dusted")
+        # Age the completed task past the archive threshold.
+        Task.objects.filter(id=cls.done_task.id).update(updated_at=timezone.now() - timedelta(days=120))
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_archive_moves_task_and_comments(self):
+        """Test that the archive command moves completed tasks and their comments."""
+        print("\n--- Testing task archival ---")
+        call_command('archive_tasks', days=90, batch_size=1, stdout=StringIO())
+
+        self.assertFalse(Task.objects.filter(id=self.done_task.id).exists())
+        self.assertFalse(Comment.objects.filter(id=self.comment.id).exists())
+        self.assertTrue(ArchivedTask.objects.filter(id=self.done_task.id).exists())
+        self.assertTrue(ArchivedComment.objects.filter(id=self.comment.id, task_id=self.done_task.id).exists())
+        self.assertTrue(Task.objects.filter(id=self.open_task.id).exists())
+
+    def test_list_include_archived(self):
+        """Test that archived tasks are listed only when include_archived is set."""
+        print("\n--- Testing include_archived listing ---")
+        archive_completed_tasks(older_than_days=90)
+        self.authenticate(self.developer)
+
+        response = self.client.get('/api/tasks/?project=%d' % self.project.id)
+        print("Response:", response.status_code, response.data)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.open_task.id])
+
+        response = self.client.get('/api/tasks/?project=%d&include_archived=true' % self.project.id)
+        print("Response:", response.status_code, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.done_task.id, self.open_task.id])
+
+        response = self.client.get(f'/api/tasks/{self.done_task.id}/?include_archived=true')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], "Old Done Task")
+
+    def test_reopen_restores_archived_task(self):
+        """Test that reopening an archived task moves it back with its comments."""
+        print("\n--- Testing restore on reopen ---")
+        archive_completed_tasks(older_than_days=90)
+        created_at = ArchivedTask.objects.get(id=self.done_task.id).created_at
+        self.authenticate(self.developer)
+
+        response = self.client.patch(f'/api/tasks/{self.done_task.id}/', {'status': 'In Progress'})
+        print(f"Request: PATCH /api/tasks/{self.done_task.id}/")
+        print("Response:", response.status_code, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'In Progress')
+
+        restored = Task.objects.get(id=self.done_task.id)
+        self.assertEqual(restored.created_at, created_at)
+        self.assertTrue(Comment.objects.filter(id=self.comment.id, task=restored).exists())
+        self.assertFalse(ArchivedTask.objects.filter(id=self.done_task.id).exists())
+
+    def test_archive_keeps_tags_and_dependencies(self):
+        """Test that archiving keeps a task's tags and dependencies and restoring puts them back."""
+        print("\n--- Testing archived tags and dependencies ---")
+        later = make_task(self.project, title="Later Task", description="After the done one", assigned_to=self.developer)
+        TaskDependency.objects.create(project=self.project, depends_on=self.done_task, task=later)
+        TaskDependency.objects.create(project=self.project, depends_on=self.done_task, task=self.open_task)
+        TaskTag.objects.create(task=self.done_task, project=self.project, name='release')
+        archive_completed_tasks(older_than_days=90)
+
+        self.assertEqual(list(ArchivedTaskTag.objects.values_list('task_id', 'name')), [(self.done_task.id, 'release')])
+        self.assertEqual(ArchivedTaskDependency.objects.count(), 2)
+        self.assertFalse(TaskDependency.objects.exists())
+        # A dependency whose other task is gone by the time of the restore is dropped.
+        later.delete()
+
+        restore_task(self.done_task.id)
+        self.assertEqual(list(TaskTag.objects.filter(task_id=self.done_task.id).values_list('name', flat=True)), ['release'])
+        self.assertEqual(list(TaskDependency.objects.values_list('depends_on_id', 'task_id')),
+                         [(self.done_task.id, self.open_task.id)])
+        self.assertFalse(ArchivedTaskDependency.objects.exists())
+        self.assertFalse(ArchivedTaskTag.objects.exists())
+        self.assertEqual(project_schedule(self.project.id)['order'], [self.done_task.id, self.open_task.id])
+
+
+class ActivityLogTests(APITestCase):
+    """
+    Test the buffered activity log and the project activity feed.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin_user = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin User")
+        cls.project = make_project(cls.admin_user, name="Test Project", description="A test project")
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_task_changes_appear_in_project_feed(self):
+        """Test that task writes are recorded with field-level diffs."""
+        print("\n--- Testing project activity feed ---")
+        self.authenticate(self.admin_user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/tasks/', {
+                'title': 'Logged Task',
+                'description': 'A task with history',
+                'status': 'Pending',
+                'priority': 'Low',
+                'project': self.project.id,
+            })
+            task_id = response.data['id']
+            self.client.patch(f'/api/tasks/{task_id}/', {'status': 'In Progress'})
+            self.client.delete(f'/api/tasks/{task_id}/')
+        get_activity_buffer().flush()
+
+        response = self.client.get(f'/api/projects/{self.project.id}/activity/')
+        print(f"Request: GET /api/projects/{self.project.id}/activity/")
+        print("Response:", response.status_code, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        deleted, updated, created = response.data['results']
+        self.assertEqual(created['action'], 'created')
+        self.assertEqual(created['changes']['title'], [None, 'Logged Task'])
+        self.assertEqual(updated['changes'], {'status': ['Pending', 'In Progress']})
+        self.assertEqual(updated['actor'], self.admin_user.id)
+        self.assertEqual(deleted['action'], 'deleted')
+        self.assertEqual(deleted['target_id'], task_id)
+
+    def test_failed_flush_is_spooled_and_replayed(self):
+        """Test that entries survive a failed flush via the spool file."""
+        print("\n--- Testing activity spool fallback ---")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            buffer = ActivityBuffer(flush_size=10, max_size=10, interval=0, spool_path=os.path.join(tmpdir, 'spool.jsonl'))
+            buffer.add(Activity(project=self.project, actor=self.admin_user, action='updated',
+                                target_type='project', target_id=self.project.id, changes={}, created_at=timezone.now()))
+
+            with mock.patch.object(Activity.objects, 'bulk_create', side_effect=DatabaseError("down")):
+                self.assertEqual(buffer.flush(), 0)
+            self.assertTrue(os.path.exists(buffer.spool_path))
+            self.assertEqual(Activity.objects.count(), 0)
+
+            self.assertEqual(buffer.flush(), 1)
+            self.assertFalse(os.path.exists(buffer.spool_path))
+            self.assertEqual(Activity.objects.filter(project=self.project).count(), 1)
+
+    def test_replay_file_is_kept_until_committed(self):
+        """Test that replayed entries stay in this process's replay file until they are written, and orphans are adopted."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            buffer = ActivityBuffer(flush_size=10, max_size=10, interval=0, spool_path=os.path.join(tmpdir, 'spool.jsonl'))
+            buffer._spool([Activity(project=self.project, actor=self.admin_user, action='updated', target_type='project',
+                                    target_id=self.project.id, changes={}, created_at=timezone.now())])
+            with mock.patch.object(Activity.objects, 'bulk_create', side_effect=DatabaseError("down")):
+                self.assertEqual(buffer.flush(), 0)
+            self.assertFalse(os.path.exists(buffer.spool_path))
+            self.assertTrue(os.path.exists(buffer.replay_path()))
+
+            # A replay file left by a process that has died is adopted along the way.
+            os.replace(buffer.replay_path(), buffer.replay_path(pid=999999))
+            with mock.patch('api.activity._is_running', return_value=False):
+                self.assertEqual(buffer.flush(), 1)
+            self.assertEqual(os.listdir(tmpdir), [])
+            self.assertEqual(Activity.objects.filter(project=self.project).count(), 1)
+            # Nothing left to claim: another process may have taken the spool.
+            self.assertEqual(buffer.flush(), 0)
+
+
+class StatusHistoryReportTests(APITestCase):
+    """
+    Test status transition recording and the project flow report.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin_user = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin User")
+        cls.project = make_project(cls.admin_user, name="Test Project", description="A test project")
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def add_transition(self, task, from_status, to_status, day, hour=9):
+        TaskStatusChange.objects.create(
+            task_id=task.id,
+            project=self.project,
+            from_status=TaskStatusChange.STATUS_CODES.get(from_status),
+            to_status=TaskStatusChange.STATUS_CODES.get(to_status),
+            changed_at=int(datetime(2025, 4, day, hour, tzinfo=dt_timezone.utc).timestamp()),
+        )
+
+    def test_status_changes_are_recorded(self):
+        """Test that creating and updating a task records its transitions."""
+        print("\n--- Testing status transition recording ---")
+        self.authenticate(self.admin_user)
+
+        response = self.client.post('/api/tasks/', {
+            'title': 'Tracked Task',
+            'description': 'A task with history',
+            'project': self.project.id,
+        })
+        task_id = response.data['id']
+        self.client.patch(f'/api/tasks/{task_id}/', {'status': 'In Progress'})
+        self.client.patch(f'/api/tasks/{task_id}/', {'priority': 'High'})
+
+        transitions = list(TaskStatusChange.objects.filter(task_id=task_id).order_by('id').values_list('from_status', 'to_status'))
+        self.assertEqual(transitions, [(None, 0), (0, 1)])
+
+    def test_project_report(self):
+        """Test burndown, cumulative flow and lead/cycle times from recorded history."""
+        print("\n--- Testing project flow report ---")
+        task_a = Task.objects.create(title="A", description="A", project=self.project)
+        task_b = Task.objects.create(title="B", description="B", project=self.project)
+        self.add_transition(task_a, None, 'Pending', 1)
+        self.add_transition(task_a, 'Pending', 'In Progress', 2)
+        self.add_transition(task_a, 'In Progress', 'Completed', 3)
+        self.add_transition(task_b, None, 'Pending', 2)
+        self.authenticate(self.admin_user)
+
+        response = self.client.get(f'/api/projects/{self.project.id}/report/?start=2025-04-01&end=2025-04-04')
+        print(f"Request: GET /api/projects/{self.project.id}/report/")
+        print("Response:", response.status_code, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['days'], ['2025-04-01', '2025-04-02', '2025-04-03', '2025-04-04'])
+        self.assertEqual(response.data['cumulative_flow'], {
+            'Pending': [1, 1, 1, 1],
+            'In Progress': [0, 1, 0, 0],
+            'Completed': [0, 0, 1, 1],
+        })
+        self.assertEqual(response.data['burndown']['remaining'], [1, 2, 1, 1])
+        self.assertEqual(response.data['burndown']['scope'], [1, 2, 2, 2])
+        self.assertEqual(response.data['lead_time_hours']['p50'], 48.0)
+        self.assertEqual(response.data['cycle_time_hours']['p50'], 24.0)
+
+        response = self.client.get(f'/api/projects/{self.project.id}/report/?start=2025-04-05&end=2025-04-01')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_backfill_of_tasks_without_history(self):
+        """Test that the data migration gives tasks created before status history a creation transition."""
+        print("\n--- Testing status history backfill ---")
+        created_at = datetime(2025, 4, 1, 9, tzinfo=dt_timezone.utc)
+        untracked = Task.objects.create(title="Old", description="Before history", project=self.project, status='Completed')
+        moved_on = Task.objects.create(title="Older", description="Left Pending later", project=self.project, status='Completed')
+        tracked = Task.objects.create(title="New", description="Has history", project=self.project)
+        Task.objects.filter(id__in=[untracked.id, moved_on.id, tracked.id]).update(created_at=created_at)
+        self.add_transition(moved_on, 'Pending', 'Completed', 2)
+        self.add_transition(tracked, None, 'Pending', 1)
+
+        migration = importlib.import_module('api.migrations.0022_backfill_task_creations')
+        migration.backfill_task_creations(django_apps, mock.Mock(connection=connection))
+        creations = TaskStatusChange.objects.filter(from_status=None).order_by('task_id')
+        self.assertEqual(list(creations.values_list('task_id', 'to_status', 'changed_at')), [
+            (untracked.id, TaskStatusChange.STATUS_CODES['Completed'], int(created_at.timestamp())),
+            (moved_on.id, TaskStatusChange.STATUS_CODES['Pending'], int(created_at.timestamp())),
+            (tracked.id, TaskStatusChange.STATUS_CODES['Pending'], int(created_at.timestamp())),
+        ])
+
+        self.authenticate(self.admin_user)
+        response = self.client.get(f'/api/projects/{self.project.id}/report/?start=2025-04-01&end=2025-04-02')
+        self.assertEqual(response.data['cumulative_flow'], {
+            'Pending': [2, 1], 'In Progress': [0, 0], 'Completed': [1, 2],
+        })
+
+
+class DependencyGraphTests(TestCase):
+    """
+    Test incremental cycle detection and ordering in the dependency graph.
+    """
+
+    def test_add_edge_reorders_and_rejects_cycles(self):
+        """Test that out-of-order edges are reordered and cyclic edges are rejected."""
+        graph = DependencyGraph(nodes=[1, 2, 3, 4])
+        graph.add_edge(3, 2)
+        graph.add_edge(4, 3)
+        graph.add_edge(2, 1)
+        order = graph.topological_order()
+        self.assertLess(order.index(4), order.index(3))
+        self.assertLess(order.index(3), order.index(2))
+        self.assertLess(order.index(2), order.index(1))
+
+        with self.assertRaises(CycleError):
+            graph.add_edge(1, 4)
+        with self.assertRaises(CycleError):
+            graph.add_edge(2, 2)
+        self.assertNotIn(4, graph.succ[1])
+
+    def test_critical_path(self):
+        """Test that the critical path is the heaviest chain."""
+        graph = DependencyGraph(nodes=[1, 2, 3, 4, 5], edges=[(1, 2), (2, 3), (1, 4), (4, 5)])
+        weights = {1: 1, 2: 1, 3: 1, 4: 1, 5: 3}
+        self.assertEqual(graph.critical_path(weights), (5, [1, 4, 5]))
+
+
+class TaskDependencyAPITests(APITestCase):
+    """
+    Test dependency endpoints and the cached project schedule.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.project_manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.project = make_project(cls.project_manager, members=[cls.project_manager, cls.developer], name="Test Project", description="A test project")
+        cls.design, cls.build, cls.ship = [
+            make_task(cls.project, title=title, description=title, assigned_to=cls.developer)
+            for title in ("Design", "Build", "Ship")
+        ]
+
+    def setUp(self):
+        """Start every test with an empty cache."""
+        cache.clear()
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_dependencies_and_schedule(self):
+        """Test creating dependencies, rejecting cycles and computing the schedule."""
+        print("\n--- Testing task dependencies ---")
+        self.authenticate(self.project_manager)
+
+        for task, depends_on in ((self.ship, self.build), (self.build, self.design)):
+            response = self.client.post('/api/dependencies/', {'task': task.id, 'depends_on': depends_on.id})
+            print("Request: POST /api/dependencies/")
+            print("Response:", response.status_code, response.data)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.data['project'], self.project.id)
+
+        response = self.client.post('/api/dependencies/', {'task': self.design.id, 'depends_on': self.ship.id})
+        print("Response:", response.status_code, response.data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(TaskDependency.objects.count(), 2)
+
+        response = self.client.get(f'/api/projects/{self.project.id}/schedule/')
+        print(f"Request: GET /api/projects/{self.project.id}/schedule/")
+        print("Response:", response.status_code, response.data)
+        self.assertEqual(response.data['order'], [self.design.id, self.build.id, self.ship.id])
+        self.assertEqual(response.data['critical_path'], [self.design.id, self.build.id, self.ship.id])
+        self.assertEqual(response.data['critical_path_length'], 3)
+
+        # Completing a task must invalidate the cached critical path.
+        self.client.patch(f'/api/tasks/{self.design.id}/', {'status': 'Completed'})
+        response = self.client.get(f'/api/projects/{self.project.id}/schedule/')
+        self.assertEqual(response.data['critical_path_length'], 2)
+
+    def test_moving_a_task_drops_its_dependencies(self):
+        """Test that a task moved to another project leaves its dependencies, and both schedules still load."""
+        self.authenticate(self.project_manager)
+        for task, depends_on in ((self.ship, self.build), (self.build, self.design)):
+            self.client.post('/api/dependencies/', {'task': task.id, 'depends_on': depends_on.id})
+        other = make_project(self.project_manager, members=[self.project_manager], name="Other")
+        self.client.get(f'/api/projects/{self.project.id}/schedule/')
+
+        response = self.client.patch(f'/api/tasks/{self.build.id}/', {'project': other.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(TaskDependency.objects.filter(Q(task=self.build) | Q(depends_on=self.build)).exists())
+        response = self.client.get(f'/api/projects/{self.project.id}/schedule/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(response.data['order']), sorted([self.design.id, self.ship.id]))
+        self.assertEqual(response.data['critical_path_length'], 1)
+        response = self.client.get(f'/api/projects/{other.id}/schedule/')
+        self.assertEqual((response.status_code, response.data['order']), (status.HTTP_200_OK, [self.build.id]))
+
+    def test_cycle_check_sees_edges_saved_elsewhere(self):
+        """Test that a new edge is checked against the stored edges, not this process's cached graph."""
+        self.authenticate(self.project_manager)
+        self.client.get(f'/api/projects/{self.project.id}/schedule/')
+        # Saved by another worker; this process's cached graph does not have it.
+        TaskDependency.objects.create(project=self.project, task=self.build, depends_on=self.design)
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=QuerySet.select_for_update) as lock:
+            response = self.client.post('/api/dependencies/', {'task': self.design.id, 'depends_on': self.build.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(lock.call_args.args[0].model, Project)
+
+    def test_stale_dependencies_are_ignored(self):
+        """Test that edges to tasks no longer in the project do not break the schedule."""
+        TaskDependency.objects.create(project=self.project, task=self.ship, depends_on=self.build)
+        Task.objects.filter(id=self.build.id).update(project=make_project(self.project_manager))
+        self.authenticate(self.project_manager)
+        response = self.client.get(f'/api/projects/{self.project.id}/schedule/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(response.data['order']), sorted([self.design.id, self.ship.id]))
+
+    def test_developer_cannot_change_dependencies(self):
+        """Test that only managers and admins can add dependencies."""
+        print("\n--- Testing dependency permissions ---")
+        self.authenticate(self.developer)
+        response = self.client.post('/api/dependencies/', {'task': self.ship.id, 'depends_on': self.build.id})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ImportTasksCommandTests(TestCase):
+    """
+    Test the streaming import_tasks management command.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.project = make_project(cls.manager, name="Test Project", description="A test project")
+
+    def setUp(self):
+        """Give every test its own directory for input files."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_import_csv_tasks_with_errors(self):
+        """Test that valid rows are imported and invalid rows are reported."""
+        path = self.write('tasks.csv', (
+            "title,description,status,priority,project,assigned_to\n"
+            f"First,One,Pending,High,{self.project.id},developer@example.com\n"
+            f"Second,Two,Done,Low,{self.project.id},\n"
+            "Third,Three,Pending,Low,999,\n"
+            f"Fourth,Four,Completed,Low,{self.project.id},nobody@example.com\n"
+            f"Fifth,Five,,,{self.project.id},\n"
+        ))
+        errors = os.path.join(self.tmpdir.name, 'errors.jsonl')
+        call_command('import_tasks', path, type='task', batch_size=2, errors=errors, stdout=StringIO())
+
+        self.assertEqual(sorted(Task.objects.values_list('title', flat=True)), ['Fifth', 'First'])
+        self.assertEqual(list(Task.objects.order_by('rank').values_list('title', flat=True)), ['First', 'Fifth'])
+        self.assertEqual(Task.objects.get(title='First').assigned_to, self.developer)
+        self.assertEqual(TaskStatusChange.objects.filter(project=self.project).count(), 2)
+        with open(errors, encoding='utf-8') as f:
+            rejected = [json.loads(line) for line in f]
+        self.assertEqual([error['row'] for error in rejected], [2, 3, 4])
+        self.assertIn('status', rejected[0]['errors'])
+        self.assertIn('assigned_to', rejected[2]['errors'])
+
+    def test_resume_after_failure(self):
+        """Test that a failed import resumes after the last committed batch."""
+        path = self.write('tasks.jsonl', "".join(
+            json.dumps({'title': f'Task {n}', 'description': 'd', 'project': self.project.id}) + "\n"
+            for n in range(1, 6)
+        ))
+        with mock.patch.object(TaskImporter, 'after_insert', side_effect=[None, DatabaseError("lost connection")]):
+            with self.assertRaises(DatabaseError):
+                call_command('import_tasks', path, batch_size=2, stdout=StringIO())
+        self.assertEqual(Task.objects.count(), 2)
+
+        out = StringIO()
+        call_command('import_tasks', path, batch_size=2, stdout=out)
+        self.assertIn("Resuming", out.getvalue())
+        self.assertEqual(sorted(Task.objects.values_list('title', flat=True)), [f'Task {n}' for n in range(1, 6)])
+        job = ImportJob.objects.get()
+        self.assertEqual((job.rows, job.imported, job.failed), (5, 5, 0))
+
+    def test_blank_jsonl_lines_are_skipped(self):
+        """Test that blank lines in a JSONL file are not reported as invalid rows."""
+        line = json.dumps({'title': 'Task', 'description': 'd', 'project': self.project.id}) + "\n"
+        path = self.write('tasks.jsonl', line + "\n" + line + "  \n" + line + "\n")
+        call_command('import_tasks', path, batch_size=2, stdout=StringIO())
+        self.assertEqual(Task.objects.count(), 3)
+        job = ImportJob.objects.get()
+        self.assertEqual((job.rows, job.imported, job.failed), (5, 3, 0))
+
+    def test_import_projects_with_members(self):
+        """Test importing projects and their memberships from JSONL."""
+        path = self.write('projects.jsonl', json.dumps({
+            'name': 'Imported', 'description': 'From a file', 'start_date': '2025-06-01', 'end_date': '2025-06-30',
+            'manager': 'manager@example.com', 'members': ['developer@example.com', 'manager@example.com'],
+        }) + "\n")
+        call_command('import_tasks', path, type='project', stdout=StringIO())
+
+        project = Project.objects.get(name='Imported')
+        self.assertEqual(project.manager, self.manager)
+        self.assertEqual(set(project.members.all()), {self.manager, self.developer})
+
+    def test_lookup_cache_reset_keeps_batch_keys(self):
+        """Test that keys of the current batch are still resolved after the lookup cache is reset."""
+        users = LookupCache(User, 'email', limit=2)
+        users.prime(['manager@example.com'])
+        users.prime(['manager@example.com', 'developer@example.com', 'nobody@example.com'])
+        self.assertEqual(users.get('manager@example.com'), self.manager.id)
+        self.assertEqual(users.get('developer@example.com'), self.developer.id)
+        self.assertIsNone(users.get('nobody@example.com'))
+
+
+@override_settings(DATABASE_REPLICAS={'replica': 1})
+class ReadReplicaRoutingTests(APITestCase):
+    """
+    Test that reads go to the replica and recent writers read from the primary.
+    The test replica is a separate, empty database, so a read served by it
+    cannot see rows written to the primary.
+    """
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.project = make_project(cls.developer, members=[cls.developer], name="Test Project", description="A test project")
+        cls.task = make_task(cls.project, title="Task", description="Task", assigned_to=cls.developer)
+
+    def setUp(self):
+        """Start every test with an empty cache."""
+        cache.clear()
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_reads_use_replica_until_user_writes(self):
+        """Test that retrieve reads the replica, and the primary right after a write."""
+        print("\n--- Testing Read Replica Routing ---")
+        self.authenticate(self.developer)
+        url = f'/api/tasks/{self.task.id}/'
+
+        response = self.client.get(url)
+        print(f"Replica read response: {response.status_code}")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.patch(url, {'priority': 'High'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(url)
+        print(f"Pinned read response: {response.status_code}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['priority'], 'High')
+
+    @override_settings(DATABASE_REPLICAS={'replica': 1, 'default': 1})
+    def test_one_replica_per_request(self):
+        """Test that the replica is chosen once per request, not per query."""
+        self.authenticate(self.developer)
+        with mock.patch('api.db_routers.choose_replica', wraps=choose_replica) as choose:
+            for _ in range(20):
+                response = self.client.get('/api/tasks/')
+                # The page and its count come from the same copy: the empty replica or the primary.
+                self.assertEqual(response.data['count'], len(response.data['results']))
+        self.assertEqual(choose.call_count, 20)
+
+    @override_settings(DATABASE_REPLICAS={})
+    def test_no_replicas_reads_primary(self):
+        """Test that reads stay on the primary when no replica is configured."""
+        self.authenticate(self.developer)
+        response = self.client.get(f'/api/tasks/{self.task.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_weighted_choice(self):
+        """Test that replicas are picked in proportion to their weight."""
+        self.assertIsNone(choose_replica({'replica': 0}))
+        picks = [choose_replica({'a': 3, 'b': 1, 'c': 0}) for _ in range(2000)]
+        self.assertNotIn('c', picks)
+        self.assertGreater(picks.count('a'), picks.count('b') * 2)
+
+
+@override_settings(TASK_SHARDS=['shard1', 'shard2'])
+class ShardingTests(APITestCase):
+    """
+    Test project-keyed sharding of tasks and comments over local SQLite shards.
+    """
+    databases = {'default', 'shard1', 'shard2'}
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin User")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.small, cls.large = [make_project(cls.admin, name=name, description=name) for name in ("Small", "Large")]
+        cls.small_task = make_task(cls.small, title="Small 1", description="d", assigned_to=cls.developer)
+        cls.large_tasks = [
+            make_task(cls.large, title=f"Large {n}", description="d", assigned_to=cls.developer)
+            for n in range(3)
+        ]
+        make_comment(cls.developer, cls.large_tasks[0], content="On a task")
+        make_comment(cls.admin, project=cls.large, content="On the project")
+
+    def setUp(self):
+        """Start every test with an empty cache."""
+        cache.clear()
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_move_project(self):
+        """Test that moving a project copies its rows with ids and timestamps, and mirrors references."""
+        print("\n--- Testing Project Shard Move ---")
+        created_at = Task.objects.get(pk=self.large_tasks[0].pk).created_at
+        moved = sharding.move_project(self.large.id, 'shard1')
+
+        self.assertEqual(moved, 3)
+        self.assertEqual(sharding.shard_for_project(self.large.id), 'shard1')
+        self.assertFalse(Task.objects.using('default').filter(project=self.large).exists())
+        self.assertFalse(Comment.objects.using('default').filter(content__startswith="On ").exists())
+        on_shard = Task.objects.using('shard1').order_by('id')
+        self.assertEqual([task.id for task in on_shard], [task.id for task in self.large_tasks])
+        self.assertEqual(on_shard[0].created_at, created_at)
+        self.assertEqual(Comment.objects.using('shard1').count(), 2)
+        self.assertTrue(User.objects.using('shard1').filter(pk=self.developer.pk).exists())
+        self.assertFalse(User.objects.using('shard1').get(pk=self.developer.pk).has_usable_password())
+
+        # Related rows on a shard resolve to the real user on the default database.
+        self.assertEqual(on_shard[0].assigned_to._state.db, 'default')
+        self.assertEqual(list(self.large.tasks.order_by('id')), list(on_shard))
+
+    def test_api_routes_to_shard(self):
+        """Test creating, reading and commenting on tasks of a sharded project through the API."""
+        print("\n--- Testing Sharded Task API ---")
+        sharding.move_project(self.large.id, 'shard2')
+        self.authenticate(self.admin)
+
+        response = self.client.post('/api/tasks/', {
+            'title': 'New', 'description': 'd', 'project': self.large.id, 'assigned_to': self.developer.id,
+        }, format='json')
+        print(f"Response: {response.status_code} {response.data}")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        task_id = response.data['id']
+        self.assertTrue(Task.objects.using('shard2').filter(pk=task_id).exists())
+        self.assertGreater(task_id, max(task.id for task in self.large_tasks))
+
+        response = self.client.patch(f'/api/tasks/{task_id}/', {'status': 'In Progress'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Task.objects.using('shard2').get(pk=task_id).status, 'In Progress')
+
+        response = self.client.post('/api/comments/', {'content': 'Hi', 'task': task_id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Comment.objects.using('shard2').filter(pk=response.data['id']).exists())
+
+        response = self.client.get(f'/api/tasks/?project={self.large.id}')
+        self.assertEqual(response.data['count'], 4)
+
+    def test_activity_waits_for_the_shard_transaction(self):
+        """Test that activity for a sharded write is queued only when the shard transaction commits."""
+        sharding.move_project(self.large.id, 'shard1')
+        self.authenticate(self.admin)
+        with mock.patch('api.activity.get_buffer') as get_buffer:
+            with self.captureOnCommitCallbacks(using='shard1') as callbacks:
+                response = self.client.patch(f'/api/tasks/{self.large_tasks[0].id}/', {'priority': 'Low'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            get_buffer.return_value.add.assert_not_called()
+            for callback in callbacks:
+                callback()
+            get_buffer.return_value.add.assert_called_once()
+
+    def test_scatter_gather_list(self):
+        """Test that cross-project lists merge every shard in id order and paginate."""
+        print("\n--- Testing Scatter-Gather Task List ---")
+        sharding.move_project(self.large.id, 'shard1')
+        self.authenticate(self.developer)
+        expected = sorted([self.small_task.id] + [task.id for task in self.large_tasks])
+
+        first = self.client.get('/api/tasks/?page_size=3')
+        second = self.client.get('/api/tasks/?page_size=3&page=2')
+        print(f"Pages: {[t['id'] for t in first.data['results']]} {[t['id'] for t in second.data['results']]}")
+        self.assertEqual(first.data['count'], 4)
+        self.assertEqual([t['id'] for t in first.data['results'] + second.data['results']], expected)
+
+    def test_scatter_gather_ordering(self):
+        """Test that cross-shard lists honour ?ordering= and refuse mixed directions."""
+        sharding.move_project(self.large.id, 'shard1')
+        Task.objects.using('default').filter(pk=self.small_task.pk).update(rank='m')
+        self.authenticate(self.developer)
+        tasks = [self.small_task, *self.large_tasks]
+        ranks = {task.pk: Task.objects.using(sharding.locate(Task, task.pk)).get(pk=task.pk).rank for task in tasks}
+        by_rank = sorted(ranks, key=lambda pk: (ranks[pk], pk))
+
+        first = self.client.get('/api/tasks/?ordering=rank&page_size=2')
+        second = self.client.get('/api/tasks/?ordering=rank&page_size=2&page=2')
+        self.assertEqual([t['id'] for t in first.data['results'] + second.data['results']], by_rank)
+        response = self.client.get('/api/tasks/?ordering=-id')
+        self.assertEqual([t['id'] for t in response.data['results']], sorted(ranks, reverse=True))
+        response = self.client.get('/api/tasks/?ordering=rank,-id')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('direction', response.data['error'])
+
+    def test_move_task_between_shards(self):
+        """Test that changing a task's project to one on another shard moves the task and its comments."""
+        sharding.move_project(self.large.id, 'shard1')
+        self.authenticate(self.admin)
+        task = self.large_tasks[0]
+        response = self.client.post('/api/tasks/bulk-tag/', {'tasks': [task.id], 'add': ['urgent']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(TaskTag.objects.using('shard1').filter(task_id=task.id, name='urgent').exists())
+
+        response = self.client.patch(f'/api/tasks/{task.id}/', {'project': self.small.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Task.objects.using('shard1').filter(pk=task.id).exists())
+        self.assertEqual(Task.objects.using('default').get(pk=task.id).project, self.small)
+        self.assertTrue(Comment.objects.using('default').filter(task_id=task.id).exists())
+        self.assertEqual(TaskTag.objects.using('default').get(task_id=task.id).project_id, self.small.id)
+        self.assertEqual(response.data['tags'], ['urgent'])
+
+    def test_delete_project_cleans_shard(self):
+        """Test that deleting a sharded project removes its rows on the shard."""
+        sharding.move_project(self.large.id, 'shard1')
+        self.large.delete()
+        self.assertFalse(Task.objects.using('shard1').exists())
+        self.assertFalse(ProjectShard.objects.exists())
+
+    def test_rebalance_command(self):
+        """Test that the rebalance command plans and performs moves by task count."""
+        print("\n--- Testing Shard Rebalance Command ---")
+        out = StringIO()
+        call_command('rebalance_shards', dry_run=True, stdout=out)
+        print(out.getvalue())
+        self.assertIn(f"Would move project {self.large.id}", out.getvalue())
+        self.assertEqual(sharding.shard_for_project(self.large.id), 'default')
+
+        call_command('rebalance_shards', stdout=StringIO())
+        loads = {alias: sum(projects.values()) for alias, projects in sharding.shard_loads().items()}
+        self.assertEqual(sorted(loads.values()), [0, 1, 3])
+
+        call_command('rebalance_shards', project=self.large.id, to='default', stdout=StringIO())
+        self.assertEqual(Task.objects.using('default').count(), 4)
+
+    def test_snapshot_of_sharded_project(self):
+        """Test that a project on a shard is exported from there and restored with fresh global ids."""
+        sharding.move_project(self.large.id, 'shard2')
+        data = b''.join(snapshots.export(self.large))
+        project, counts = snapshots.restore(BytesIO(data))
+        self.assertEqual(counts, {'users': 2, 'tasks': 3, 'comments': 2})
+        alias = sharding.shard_for_project(project.id)
+        restored = Task.objects.using(alias).filter(project_id=project.id)
+        self.assertEqual(sorted(restored.values_list('title', flat=True)), ["Large 0", "Large 1", "Large 2"])
+        self.assertFalse(set(restored.values_list('id', flat=True)) & {task.id for task in self.large_tasks})
+        comments = Comment.objects.using(alias)
+        self.assertEqual(comments.filter(task__project_id=project.id).count() + comments.filter(project_id=project.id).count(), 2)
+
+    def test_webhook_outbox_on_shard(self):
+        """Test that a write on a shard puts its webhook event in that shard's outbox, and dispatch collects it."""
+        sharding.move_project(self.large.id, 'shard1')
+        subscription = WebhookSubscription.objects.create(owner=self.admin, url='http://127.0.0.1:9/hook')
+        self.authenticate(self.admin)
+        response = self.client.patch(f'/api/tasks/{self.large_tasks[1].id}/', {'status': 'Completed'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(OutboxEvent.objects.using('shard1').values_list('event', 'target_id')),
+                         [('task.updated', self.large_tasks[1].id)])
+        self.assertFalse(OutboxEvent.objects.using('default').exists())
+        self.assertEqual(webhooks.dispatch(), 1)
+        self.assertFalse(OutboxEvent.objects.using('shard1').exists())
+        delivery = WebhookDelivery.objects.get(subscription=subscription)
+        self.assertEqual((delivery.event, delivery.payload['project'], delivery.payload['data']['status']),
+                         ('task.updated', self.large.id, 'Completed'))
+
+    def test_archive_and_restore_on_shard(self):
+        """Test that completed tasks are archived from every shard and restored to their project's shard."""
+        sharding.move_project(self.large.id, 'shard1')
+        done = self.large_tasks[0]
+        Task.objects.using('shard1').filter(pk=done.pk).update(
+            status='Completed', updated_at=timezone.now() - timedelta(days=120))
+        TaskTag.objects.using('shard1').create(task_id=done.pk, project_id=self.large.id, name='shipped')
+
+        self.assertEqual(archive_completed_tasks(older_than_days=90), 1)
+        self.assertFalse(Task.objects.using('shard1').filter(pk=done.pk).exists())
+        self.assertEqual(ArchivedComment.objects.filter(task_id=done.pk).count(), 1)
+
+        task = restore_task(done.pk)
+        self.assertEqual(task._state.db, 'shard1')
+        self.assertEqual(Comment.objects.using('shard1').filter(task_id=done.pk).count(), 1)
+        self.assertEqual(list(TaskTag.objects.using('shard1').filter(task_id=done.pk).values_list('name', flat=True)), ['shipped'])
+        self.assertFalse(Task.objects.using('default').filter(pk=done.pk).exists())
+
+
+class TokenRevocationTests(APITestCase):
+    """
+    Test refresh-token rotation, revocation and revoke-all-sessions.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin User")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+
+    def setUp(self):
+        """Start every test with an empty cache."""
+        cache.clear()
+
+    def login(self, email, password):
+        response = self.client.post('/api/auth/login/', {'email': email, 'password': password}, format='json')
+        return response.data['refresh'], response.data['access']
+
+    def test_rotated_token_is_revoked(self):
+        """Test that a refresh token cannot be used again after rotation."""
+        print("\n--- Testing Refresh Token Rotation ---")
+        refresh, _ = self.login("developer@example.com", "devpass")
+
+        response = self.client.post('/api/auth/refresh/', {'refresh': refresh}, format='json')
+        print(f"Response: {response.status_code}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+        self.assertNotEqual(response.data['refresh'], refresh)
+
+        response = self.client.post('/api/auth/refresh/', {'refresh': refresh}, format='json')
+        print(f"Reused token response: {response.status_code} {response.data}")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(RevokedToken.objects.count(), 1)
+
+    def test_unrevoked_lookup_needs_no_query(self):
+        """Test that checking a token that was never revoked is answered by the Bloom filter."""
+        refresh, _ = self.login("developer@example.com", "devpass")
+        self.client.post('/api/auth/refresh/', {'refresh': refresh}, format='json')
+        tokens.is_revoked('warm-up')
+        with self.assertNumQueries(0):
+            self.assertFalse(tokens.is_revoked('never-revoked'))
+
+    def test_logout_all_revokes_access_and_refresh(self):
+        """Test that revoking all sessions rejects existing access and refresh tokens."""
+        print("\n--- Testing Revoke All Sessions ---")
+        refresh, access = self.login("developer@example.com", "devpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get('/api/tasks/').status_code, status.HTTP_200_OK)
+
+        response = self.client.post('/api/auth/logout-all/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(self.client.get('/api/projects/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        response = self.client.post('/api/auth/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        refresh, access = self.login("developer@example.com", "devpass")
+        response = self.client.post('/api/auth/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_admin_revokes_user_sessions(self):
+        """Test that an admin can revoke another user's sessions."""
+        refresh, _ = self.login("developer@example.com", "devpass")
+        _, admin_access = self.login("admin@example.com", "adminpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {admin_access}')
+        response = self.client.post(f'/api/users/{self.developer.id}/revoke-sessions/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.client.credentials()
+        response = self.client.post('/api/auth/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_purge_expired(self):
+        """Test that expired revoked tokens are purged and live ones kept."""
+        RevokedToken.objects.create(jti='expired', expires_at=timezone.now() - timedelta(days=1))
+        RevokedToken.objects.create(jti='live', expires_at=timezone.now() + timedelta(days=1))
+        out = StringIO()
+        call_command('purge_revoked_tokens', stdout=out)
+        self.assertIn("Purged 1", out.getvalue())
+        self.assertFalse(tokens.is_revoked('expired'))
+        self.assertTrue(tokens.is_revoked('live'))
+
+    def test_revocation_committed_out_of_order_is_synced(self):
+        """Test that a revocation with a lower id that becomes visible after a sync is still picked up."""
+        expires_at = timezone.now() + timedelta(days=1)
+        RevokedToken.objects.create(id=100, jti='later', expires_at=expires_at)
+        with mock.patch.object(tokens, '_revoked', tokens.RevocationList()):
+            self.assertTrue(tokens.is_revoked('later'))
+
+            RevokedToken.objects.create(id=50, jti='earlier', expires_at=expires_at)
+            RevokedToken.objects.filter(jti='earlier').update(revoked_at=timezone.now() - timedelta(seconds=5))
+            cache.set(tokens.GENERATION_KEY, 1, None)
+            with override_settings(TOKEN_REVOCATION_SYNC_SECONDS=0):
+                self.assertTrue(tokens.is_revoked('earlier'))
+
+
+class ConditionalRequestTests(APITestCase):
+    """
+    Test ETags, If-None-Match and If-Match on tasks, projects and comments.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.project_manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.project = make_project(cls.project_manager, members=[cls.project_manager], name="Test Project", description="A test project")
+        cls.task = make_task(cls.project, title="Task", description="Task", assigned_to=cls.project_manager)
+        cls.comment = make_comment(cls.project_manager, cls.task, content="Comment")
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_not_modified(self):
+        """Test that a matching If-None-Match returns 304 without a body."""
+        print("\n--- Testing If-None-Match ---")
+        self.authenticate(self.project_manager)
+        for url in (f'/api/tasks/{self.task.id}/', f'/api/projects/{self.project.id}/', f'/api/comments/{self.comment.id}/'):
+            response = self.client.get(url)
+            etag = response['ETag']
+            print(f"{url} ETag: {etag}")
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertFalse(response.content)
+
+        url = f'/api/tasks/{self.task.id}/'
+        etag = self.client.get(url)['ETag']
+        self.client.patch(url, {'priority': 'High'}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_lost_update_is_rejected(self):
+        """Test that an update based on a stale ETag fails with 412 and changes nothing."""
+        print("\n--- Testing If-Match ---")
+        self.authenticate(self.project_manager)
+        url = f'/api/projects/{self.project.id}/'
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.patch(url, {'name': 'First'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        new_etag = response['ETag']
+        self.assertNotEqual(new_etag, etag)
+
+        response = self.client.patch(url, {'name': 'Second'}, format='json', HTTP_IF_MATCH=etag)
+        print(f"Stale update response: {response.status_code}")
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(response['ETag'], new_etag)
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.name, 'First')
+
+        url = f'/api/tasks/{self.task.id}/'
+        response = self.client.delete(url, HTTP_IF_MATCH='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        response = self.client.delete(url, HTTP_IF_MATCH=self.client.get(url)['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_not_modified_uses_one_query(self):
+        """Test that a 304 is decided with a single query on top of authentication."""
+        self.authenticate(self.project_manager)
+        url = f'/api/comments/{self.comment.id}/'
+        etag = self.client.get(url)['ETag']
+        # One query loads the user for authentication, one reads updated_at.
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class LazyLoadingTests(TestCase):
+    """
+    Test that optional integrations stay out of worker startup.
+    """
+
+    def test_startup_skips_optional_modules(self):
+        """Test that loading the WSGI app and URLs with docs disabled imports neither drf_yasg nor numpy."""
+        print("\n--- Testing Lazy Startup Imports ---")
+        code = (
+            "import sys, task_management_system.wsgi\n"
+            "from django.urls import get_resolver\n"
+            "get_resolver().url_patterns\n"
+            "print([name for name in ('drf_yasg', 'numpy') if name in sys.modules])\n"
+        )
+        env = dict(os.environ, API_DOCS_ENABLED='0', DJANGO_SETTINGS_MODULE='task_management_system.settings')
+        result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        print(f"Loaded at startup: {result.stdout.strip()}")
+        self.assertEqual(result.stdout.strip(), "[]")
+
+    def test_swagger_schema_includes_documented_parameters(self):
+        """Test that the lazily built schema still carries the documented query parameters."""
+        response = self.client.get('/api/swagger/?format=openapi')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        parameters = json.loads(response.content)['paths']['/tasks/']['get']['parameters']
+        self.assertIn('include_archived', [parameter['name'] for parameter in parameters])
+
+
+class NotificationTests(APITestCase):
+    """
+    Test notification fan-out, coalescing of bursts and the unread counter.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.project_manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.member = make_user("Developer", email="member@example.com", name="Member")
+        cls.project = make_project(cls.project_manager, members=[cls.developer, cls.member], name="Test Project")
+        cls.task = make_task(cls.project, title="Task", assigned_to=cls.developer)
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def unread(self, user):
+        self.authenticate(user)
+        return self.client.get('/api/notifications/unread-count/').data['unread']
+
+    def test_assignment_and_comment_fan_out(self):
+        """Test that the assignee and the task's followers are notified, but not the actor."""
+        print("\n--- Testing Notification Fan-out ---")
+        self.authenticate(self.project_manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/tasks/', {
+                'title': 'New Task', 'description': 'd', 'project': self.project.id, 'assigned_to': self.developer.id,
+            }, format='json')
+        task_id = response.data['id']
+        self.assertEqual(self.unread(self.developer), 1)
+        response = self.client.get('/api/notifications/')
+        print(f"Developer notifications: {response.data['results']}")
+        self.assertEqual([(n['verb'], n['task']) for n in response.data['results']], [('assigned', task_id)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/comments/', {'content': 'On it', 'task': task_id}, format='json')
+        self.assertEqual(self.unread(self.developer), 1)
+        self.assertEqual(self.unread(self.member), 1)
+        self.assertEqual(Notification.objects.get(recipient=self.member).verb, 'commented')
+        self.assertFalse(Notification.objects.filter(recipient=self.project_manager).exists())
+
+    def test_burst_of_edits_is_coalesced(self):
+        """Test that repeated edits leave one unread notification per follower, counted once."""
+        print("\n--- Testing Notification Digest ---")
+        self.authenticate(self.project_manager)
+        for priority in ('High', 'Low', 'Medium'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f'/api/tasks/{self.task.id}/', {'priority': priority}, format='json')
+        notification = Notification.objects.get(recipient=self.developer)
+        print(f"Coalesced notification: {notification.verb} x{notification.count}")
+        self.assertEqual((notification.verb, notification.count), ('updated', 3))
+        self.assertEqual(self.unread(self.developer), 1)
+
+        self.client.post(f'/api/notifications/{notification.id}/read/')
+        self.assertEqual(self.unread(self.developer), 0)
+        self.authenticate(self.project_manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/tasks/{self.task.id}/', {'priority': 'High'}, format='json')
+        self.assertEqual(Notification.objects.filter(recipient=self.developer).count(), 2)
+        self.assertEqual(self.unread(self.developer), 1)
+
+        response = self.client.post('/api/notifications/read-all/')
+        self.assertEqual(response.data, {'marked': 1, 'unread': 0})
+        self.assertEqual(self.client.get('/api/notifications/?unread=true').data['count'], 0)
+
+    def test_unread_count_reads_the_counter(self):
+        """Test that the unread count costs one query after authentication, whatever the backlog."""
+        for _ in range(3):
+            notifications.deliver(self.project_manager.id, 'commented', {self.developer.id}, self.project.id, self.task.id)
+            # Age it past the digest window so the next event adds a notification.
+            Notification.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(NotificationCounter.objects.get(user=self.developer).unread, 3)
+        self.authenticate(self.developer)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/notifications/unread-count/')
+        self.assertEqual(response.data['unread'], 3)
+
+    def test_fan_out_is_set_wise(self):
+        """Test that delivering to many recipients takes as many queries as delivering to a few."""
+        few = {self.developer.id, self.member.id}
+        many = few | {make_user().id for _ in range(20)}
+        with CaptureQueriesContext(connection) as small:
+            notifications.deliver(self.project_manager.id, 'updated', few, self.project.id, self.task.id)
+        with CaptureQueriesContext(connection) as large:
+            notifications.deliver(self.project_manager.id, 'commented', many, self.project.id, self.task.id)
+        print(f"Queries for {len(few)} and {len(many)} recipients: {len(small)}, {len(large)}")
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Notification.objects.count(), len(few) + len(many))
+
+    def test_deleting_project_updates_counters(self):
+        """Test that unread notifications of a deleted project come off the counters."""
+        notifications.deliver(self.project_manager.id, 'updated', {self.developer.id}, self.project.id, self.task.id)
+        self.assertEqual(notifications.unread_count(self.developer), 1)
+        self.project.delete()
+        self.assertEqual(notifications.unread_count(self.developer), 0)
+
+
+@override_settings(BATCH_MAX_WORKERS=1)
+class BatchRequestTests(APITestCase):
+    """
+    Test POST /api/batch/: per-item results, ordering around writes, shared authentication and validation.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin_user = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin User")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.project = make_project(cls.admin_user, members=[cls.developer], name="Test Project")
+        cls.task = make_task(cls.project, title="Task", assigned_to=cls.developer)
+        cls.comment = make_comment(cls.developer, cls.task, content="Comment")
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_project_page_in_one_round_trip(self):
+        """Test that a batch returns the same bodies as separate calls, authenticating once."""
+        print("\n--- Testing Batch Requests ---")
+        self.authenticate(self.admin_user)
+        urls = [
+            f'/api/projects/{self.project.id}/',
+            f'/api/tasks/?project={self.project.id}',
+            f'/api/comments/?task={self.task.id}',
+            f'/api/users/{self.admin_user.id}/',
+        ]
+        expected = [json.loads(self.client.get(url).content) for url in urls]
+        cache.clear()
+
+        authenticate = tokens.VersionedJWTAuthentication.authenticate
+        with mock.patch.object(tokens.VersionedJWTAuthentication, 'authenticate', autospec=True, side_effect=authenticate) as auth:
+            response = self.client.post('/api/batch/', {'requests': [{'url': url} for url in urls]}, format='json')
+        print(f"Batch statuses: {[item['status'] for item in response.data['responses']]}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['status'] for item in response.data['responses']], [200] * 4)
+        self.assertEqual([item['body'] for item in response.data['responses']], expected)
+        self.assertIn('ETag', response.data['responses'][0]['headers'])
+        self.assertEqual(auth.call_count, 1)
+
+    def test_reads_after_a_write_see_it(self):
+        """Test that sub-requests run in order around writes and fail independently."""
+        self.authenticate(self.developer)
+        url = f'/api/tasks/{self.task.id}/'
+        response = self.client.post('/api/batch/', {'requests': [
+            {'method': 'GET', 'url': url},
+            {'method': 'PATCH', 'url': url, 'body': {'priority': 'High'}},
+            {'method': 'GET', 'url': url},
+            {'method': 'DELETE', 'url': f'/api/projects/{self.project.id}/'},
+            {'method': 'GET', 'url': '/api/tasks/999999/'},
+            {'method': 'GET', 'url': '/api/nowhere/'},
+        ]}, format='json')
+        results = response.data['responses']
+        print(f"Batch statuses: {[item['status'] for item in results]}")
+        self.assertEqual([item['status'] for item in results], [200, 200, 200, 403, 404, 404])
+        self.assertEqual(results[0]['body']['priority'], 'Medium')
+        self.assertEqual(results[2]['body']['priority'], 'High')
+        self.assertTrue(Project.objects.filter(id=self.project.id).exists())
+
+    def test_invalid_batches_are_rejected(self):
+        """Test that malformed, oversized and nested batches are refused as a whole."""
+        self.authenticate(self.developer)
+        for requests in (None, [], [{'method': 'GET'}], [{'method': 'TRACE', 'url': '/api/tasks/'}],
+                         [{'method': 'POST', 'url': '/api/batch/', 'body': {'requests': []}}],
+                         [{'url': '/api/tasks/'}] * 26):
+            response = self.client.post('/api/batch/', {'requests': requests}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, requests)
+        self.client.credentials()
+        response = self.client.post('/api/batch/', {'requests': [{'url': '/api/tasks/'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_streamed_responses_are_refused(self):
+        """Test that a sub-request whose response is streamed gets a 400 and leaves the others alone."""
+        self.authenticate(self.admin_user)
+        response = self.client.post('/api/batch/', {'requests': [
+            {'url': f'/api/projects/{self.project.id}/snapshot/'},
+            {'url': f'/api/projects/{self.project.id}/'},
+        ]}, format='json')
+        results = response.data['responses']
+        self.assertEqual([item['status'] for item in results], [400, 200])
+        self.assertIn('streamed', results[0]['body']['error'])
+
+    def test_routing_lookups_are_shared(self):
+        """Test that the sub-requests look the replica pin up once, and reads after a write see the pin."""
+        cache.clear()
+        self.authenticate(self.developer)
+        url = f'/api/tasks/{self.task.id}/'
+        key = db_routers.pin_key(self.developer.id)
+        with mock.patch('api.db_routers.cache', wraps=cache) as routing_cache:
+            self.client.post('/api/batch/', {'requests': [{'url': url}] * 3}, format='json')
+            self.assertEqual([call for call in routing_cache.get.call_args_list if call.args[0] == key], [mock.call(key)])
+
+            with mock.patch.object(db_routers, 'use_replica', wraps=db_routers.use_replica) as use_replica:
+                self.client.post('/api/batch/', {'requests': [
+                    {'url': url}, {'method': 'PATCH', 'url': url, 'body': {'priority': 'Low'}}, {'url': url},
+                ]}, format='json')
+            self.assertEqual(use_replica.call_count, 1)
+
+
+@override_settings(BATCH_MAX_WORKERS=4)
+class BatchConcurrencyTests(TransactionTestCase):
+    """
+    Test that consecutive reads in a batch run on several threads.
+    Uses committed data, since worker threads have their own database connections.
+    """
+
+    def test_reads_run_concurrently(self):
+        """Test that independent GETs are spread over worker threads and results keep request order."""
+        print("\n--- Testing Concurrent Batch Reads ---")
+        admin = make_user("Admin", email="admin@example.com")
+        project = make_project(admin)
+        tasks = [make_task(project, title=f"Task {n}") for n in range(4)]
+        refresh = RefreshToken.for_user(admin)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {refresh.access_token}'
+
+        threads = []
+        dispatch = batch.dispatch
+
+        def record_thread(*args):
+            threads.append(threading.get_ident())
+            time.sleep(0.05)
+            return dispatch(*args)
+
+        with mock.patch.object(batch, 'dispatch', side_effect=record_thread):
+            response = self.client.post('/api/batch/', {'requests': [
+                {'url': f'/api/tasks/{task.id}/'} for task in tasks
+            ]}, content_type='application/json')
+        print(f"Threads used: {len(set(threads))}")
+        self.assertEqual([item['body']['id'] for item in response.json()['responses']], [task.id for task in tasks])
+        self.assertGreater(len(set(threads)), 1)
+
+
+class AttachmentTests(APITestCase):
+    """
+    Test resumable uploads, deduplication, ranged downloads and memory use on large files.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.project_manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.outsider = make_user("Client", email="client@example.com", name="Client")
+        cls.project = make_project(cls.project_manager, members=[cls.developer], name="Test Project")
+        cls.task = make_task(cls.project, title="Task", assigned_to=cls.developer)
+        cls.comment = make_comment(cls.developer, cls.task, content="See attached")
+
+    def setUp(self):
+        """Store attachments in a directory of the test's own."""
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.root = tmpdir.name
+        override = self.settings(ATTACHMENT_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def start(self, size, **target):
+        response = self.client.post('/api/uploads/', {'filename': 'notes.txt', 'size': size, 'content_type': 'text/plain', **target}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response.data['id']
+
+    def put_chunk(self, upload_id, data, start, total):
+        return self.client.generic('PUT', f'/api/uploads/{upload_id}/', data, content_type='application/octet-stream',
+                                   HTTP_CONTENT_RANGE=f'bytes {start}-{start + len(data) - 1}/{total}')
+
+    def upload(self, content, chunk_size, **target):
+        upload_id = self.start(len(content), **target)
+        for start in range(0, len(content), chunk_size):
+            response = self.put_chunk(upload_id, content[start:start + chunk_size], start, len(content))
+        return response
+
+    def test_resumable_upload_and_ranged_download(self):
+        """Test that chunks must arrive in order, an upload resumes from its offset and ranges are served."""
+        print("\n--- Testing Attachment Upload ---")
+        self.authenticate(self.developer)
+        content = b"0123456789" * 100
+        upload_id = self.start(len(content), task=self.task.id)
+
+        self.assertEqual(self.put_chunk(upload_id, content[:400], 0, len(content)).data['offset'], 400)
+        response = self.put_chunk(upload_id, content[600:], 600, len(content))
+        print(f"Out-of-order chunk: {response.status_code} {response.data}")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], 400)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').data['offset'], 400)
+        response = self.put_chunk(upload_id, content[400:], 400, len(content))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['sha256'], hashlib.sha256(content).hexdigest())
+        attachment_id = response.data['id']
+        self.assertFalse(Upload.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.root, 'uploads')), [])
+
+        url = f'/api/attachments/{attachment_id}/download/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        print(f"Range response: {response.status_code} {response['Content-Range']}")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(content)}')
+        self.assertEqual(b''.join(response.streaming_content), content[10:20])
+        self.assertEqual(b''.join(self.client.get(url, HTTP_RANGE='bytes=-5').streaming_content), content[-5:])
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=5000-').status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+        self.assertEqual([a['id'] for a in self.client.get(f'/api/attachments/?task={self.task.id}').data['results']], [attachment_id])
+        self.authenticate(self.outsider)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post('/api/uploads/', {'filename': 'x', 'size': 1, 'task': self.task.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_identical_files_share_a_blob(self):
+        """Test that the same content uploaded twice is stored once and purged when unused."""
+        print("\n--- Testing Attachment Deduplication ---")
+        self.authenticate(self.developer)
+        content = os.urandom(5000)
+        first = self.upload(content, 2048, task=self.task.id).data
+        second = self.upload(content, 4096, comment=self.comment.id).data
+        print(f"Blobs: {Blob.objects.count()}, attachments: {Attachment.objects.count()}")
+        self.assertEqual(first['sha256'], second['sha256'])
+        self.assertEqual(Blob.objects.count(), 1)
+        blob_file = attachments.blob_path(first['sha256'])
+        self.assertTrue(os.path.exists(blob_file))
+
+        self.assertEqual(self.client.delete(f'/api/attachments/{first["id"]}/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(attachments.purge(), (0, 0))
+        self.client.delete(f'/api/comments/{self.comment.id}/')
+        self.assertFalse(Attachment.objects.exists())
+        self.assertEqual(attachments.purge(), (1, 0))
+        self.assertFalse(os.path.exists(blob_file))
+
+    def test_large_file_is_streamed(self):
+        """Test that a 64 MB upload and download never hold the file in memory."""
+        print("\n--- Testing Attachment Memory Use ---")
+        self.authenticate(self.developer)
+        chunk_size, chunks = 4 * 1024 ** 2, 16
+        total = chunk_size * chunks
+        upload_id = self.start(total, task=self.task.id)
+        digest = hashlib.sha256()
+        tracemalloc.start()
+        try:
+            for n in range(chunks):
+                chunk = os.urandom(chunk_size)
+                digest.update(chunk)
+                response = self.put_chunk(upload_id, chunk, n * chunk_size, total)
+                del chunk
+                # The test client's request objects sit in reference cycles; free their payload copies.
+                gc.collect()
+            downloaded = hashlib.sha256()
+            for block in self.client.get(f'/api/attachments/{response.data["id"]}/download/').streaming_content:
+                downloaded.update(block)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        print(f"Peak traced memory for {total // 1024 ** 2} MB: {peak / 1024 ** 2:.1f} MB")
+        self.assertEqual(response.data['sha256'], digest.hexdigest())
+        self.assertEqual(downloaded.hexdigest(), digest.hexdigest())
+        # The test client keeps a few copies of the chunk in flight; the file as a whole must never be in memory.
+        self.assertLess(peak, total // 3)
+
+
+class KanbanBoardTests(APITestCase):
+    """
+    Test the project board: grouping by status, per-column limits and cursors, and role scoping.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.project_manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.outsider = make_user("Developer", email="outsider@example.com", name="Outsider")
+        cls.project = make_project(cls.project_manager, members=[cls.project_manager, cls.developer], name="Board Project")
+        cls.pending = [make_task(cls.project, status='Pending') for _ in range(5)]
+        cls.in_progress = [make_task(cls.project, status='In Progress', assigned_to=cls.developer) for _ in range(2)]
+        make_task(status='Pending')  # Another project's task stays off the board.
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def board(self, **params):
+        return self.client.get(f'/api/projects/{self.project.id}/board/', params)
+
+    def test_columns_are_limited_and_paged_with_cursors(self):
+        """Test that each column is cut at the limit, reports its total and pages on with its cursor."""
+        print("\n--- Testing Board Columns and Cursors ---")
+        self.authenticate(self.project_manager)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.board(limit=2)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        task_queries = [query for query in queries.captured_queries if '"api_task"' in query['sql']]
+        self.assertEqual(len(task_queries), 1)
+        self.assertIn('ROW_NUMBER() OVER', task_queries[0]['sql'])
+        columns = {column['status']: column for column in response.data['columns']}
+        self.assertEqual(list(columns), ['Pending', 'In Progress', 'Completed'])
+        self.assertEqual(columns['Pending']['total'], 5)
+        self.assertEqual([task['id'] for task in columns['Pending']['tasks']], [task.id for task in self.pending[:2]])
+        self.assertEqual(columns['In Progress']['total'], 2)
+        self.assertIsNone(columns['In Progress']['next'])
+        self.assertEqual(columns['Completed'], {'status': 'Completed', 'total': 0, 'tasks': [], 'next': None})
+
+        seen, cursor = [task['id'] for task in columns['Pending']['tasks']], columns['Pending']['next']
+        while cursor:
+            page = self.board(limit=2, status='Pending', cursor=cursor).data['columns']
+            self.assertEqual([column['status'] for column in page], ['Pending'])
+            self.assertEqual(page[0]['total'], 5)
+            seen += [task['id'] for task in page[0]['tasks']]
+            cursor = page[0]['next']
+        self.assertEqual(seen, [task.id for task in self.pending])
+
+    def test_board_is_scoped_like_the_task_list(self):
+        """Test that developers see only their tasks and non-members cannot open the board."""
+        print("\n--- Testing Board Scoping ---")
+        self.authenticate(self.developer)
+        columns = {column['status']: column for column in self.board().data['columns']}
+        self.assertEqual(columns['Pending']['total'], 0)
+        self.assertEqual([task['id'] for task in columns['In Progress']['tasks']], [task.id for task in self.in_progress])
+
+        self.authenticate(self.outsider)
+        self.assertEqual(self.board().status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_parameters(self):
+        """Test that bad limits, statuses and cursors are rejected."""
+        print("\n--- Testing Board Parameters ---")
+        self.authenticate(self.project_manager)
+        for params in ({'limit': 0}, {'limit': 'x'}, {'status': 'Done'}, {'cursor': 'MQ'},
+                       {'status': 'Pending', 'cursor': '!!'}):
+            response = self.board(**params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+            self.assertIn('error', response.data)
+
+
+class TaskRankingTests(APITestCase):
+    """
+    Test fractional ranks: key generation, single-row moves and rebalancing.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.project_manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.project = make_project(cls.project_manager, members=[cls.developer], name="Ranked Project")
+        cls.tasks = [make_task(cls.project, title=f"Task {n}") for n in range(1, 5)]
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def ordered_titles(self):
+        cache.clear()  # The task list is cached per URL.
+        response = self.client.get('/api/tasks/', {'project': self.project.id, 'ordering': 'rank'})
+        return [task['title'] for task in response.data['results']]
+
+    def test_keys_stay_ordered_and_short(self):
+        """Test that random insertions always find a key in between, and bulk keys stay short."""
+        print("\n--- Testing Rank Keys ---")
+        rng = random.Random(41)
+        ranks = [ranking.between()]
+        for _ in range(2000):
+            index = rng.randint(0, len(ranks))
+            lo = ranks[index - 1] if index > 0 else ''
+            hi = ranks[index] if index < len(ranks) else None
+            rank = ranking.between(lo, hi)
+            self.assertTrue(lo < rank and (hi is None or rank < hi))
+            self.assertNotEqual(rank[-1], '0')
+            ranks.insert(index, rank)
+        self.assertEqual(ranks, sorted(ranks))
+
+        keys = ranking.sequence('', None, 10000)
+        self.assertEqual(keys, sorted(set(keys)))
+        self.assertLessEqual(max(map(len, keys)), 8)
+        spread = ranking.spread(10000)
+        self.assertEqual(spread, sorted(set(spread)))
+        self.assertLess(spread[-1], 'i')  # The upper half is left free for appends.
+
+    def test_move_updates_one_row(self):
+        """Test that moving a task writes only its own row and changes the order."""
+        print("\n--- Testing Task Move ---")
+        self.authenticate(self.project_manager)
+        first, second, third, fourth = self.tasks
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'/api/tasks/{fourth.id}/move/', {'after': first.id, 'before': second.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue('ETag' in response)
+        task_writes = [query for query in queries.captured_queries
+                       if query['sql'].startswith('UPDATE "api_task"')]
+        self.assertEqual(len(task_writes), 1)
+        self.assertEqual(self.ordered_titles(), ['Task 1', 'Task 4', 'Task 2', 'Task 3'])
+
+        response = self.client.post(f'/api/tasks/{third.id}/move/', {'before': first.id, 'status': 'In Progress'}, format='json')
+        self.assertEqual(response.data['status'], 'In Progress')
+        self.assertEqual(self.ordered_titles(), ['Task 3', 'Task 1', 'Task 4', 'Task 2'])
+        self.assertTrue(TaskStatusChange.objects.filter(task_id=third.id, to_status=TaskStatusChange.STATUS_CODES['In Progress']).exists())
+
+        other = make_task()
+        response = self.client.post(f'/api/tasks/{first.id}/move/', {'after': other.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.authenticate(self.developer)
+        response = self.client.post(f'/api/tasks/{first.id}/move/', {'after': second.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tied_neighbours_and_rebalance(self):
+        """Test that ties are resolved by rebalancing and the job shortens long keys in order."""
+        print("\n--- Testing Rank Rebalancing ---")
+        self.authenticate(self.project_manager)
+        first, second, third, fourth = self.tasks
+        Task.objects.filter(pk__in=[first.pk, second.pk]).update(rank='i')
+        response = self.client.post(f'/api/tasks/{fourth.id}/move/', {'after': first.id, 'before': second.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.ordered_titles(), ['Task 1', 'Task 4', 'Task 2', 'Task 3'])
+
+        for n, task in enumerate([third, second, fourth, first]):
+            Task.objects.filter(pk=task.pk).update(rank='z' * 40 + str(n + 1))
+        out = StringIO()
+        call_command('rebalance_ranks', stdout=out)
+        self.assertIn(f"Rebalanced project {self.project.id}", out.getvalue())
+        self.assertEqual(self.ordered_titles(), ['Task 3', 'Task 2', 'Task 4', 'Task 1'])
+        self.assertTrue(all(len(rank) <= 2 for rank in Task.objects.filter(project=self.project).values_list('rank', flat=True)))
+        self.assertEqual(ranking.projects_to_rebalance(), [])
+
+
+class TaskTagTests(APITestCase):
+    """
+    Test task tags: tag filters, bulk tagging and per-project counts.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.project_manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.project = make_project(cls.project_manager, members=[cls.project_manager, cls.developer], name="Tagged Project")
+        cls.other_project = make_project(cls.project_manager, name="Other Project")
+        cls.bug = make_task(cls.project, title="Bug", assigned_to=cls.developer)
+        cls.urgent_bug = make_task(cls.project, title="Urgent bug", status='In Progress')
+        cls.feature = make_task(cls.project, title="Feature")
+        cls.elsewhere = make_task(cls.other_project, title="Elsewhere")
+        for task, names in ((cls.bug, ['bug']), (cls.urgent_bug, ['bug', 'urgent']), (cls.feature, ['feature']),
+                            (cls.elsewhere, ['bug', 'urgent'])):
+            for name in names:
+                TaskTag.objects.create(task=task, project_id=task.project_id, name=name)
+
+    def setUp(self):
+        """Start every test with an empty cache."""
+        cache.clear()
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def titles(self, **params):
+        cache.clear()  # The task list is cached per URL.
+        response = self.client.get('/api/tasks/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return sorted(task['title'] for task in response.data['results'])
+
+    def test_tag_filters(self):
+        """Test ?tags= (all) and ?tags_any= (any), alone and with project and status filters."""
+        print("\n--- Testing Tag Filters ---")
+        self.authenticate(self.project_manager)
+        self.assertEqual(self.titles(tags='bug'), ['Bug', 'Elsewhere', 'Urgent bug'])
+        self.assertEqual(self.titles(tags='Bug, urgent'), ['Elsewhere', 'Urgent bug'])
+        self.assertEqual(self.titles(tags='bug,urgent', project=self.project.id), ['Urgent bug'])
+        self.assertEqual(self.titles(tags_any='urgent,feature', project=self.project.id), ['Feature', 'Urgent bug'])
+        self.assertEqual(self.titles(tags='bug', status='Pending', project=self.project.id), ['Bug'])
+        self.assertEqual(self.titles(tags='bug', include_archived='true', project=self.project.id), ['Bug', 'Urgent bug'])
+        response = self.client.get('/api/tasks/', {'tags': 'no,way!'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.authenticate(self.developer)
+        self.assertEqual(self.titles(tags='bug'), ['Bug'])
+
+    def test_tags_on_create_update_and_bulk(self):
+        """Test writing tags with a task and tagging many tasks at once."""
+        print("\n--- Testing Task Tagging ---")
+        self.authenticate(self.project_manager)
+        response = self.client.post('/api/tasks/', {
+            'title': 'Tagged', 'description': 'd', 'project': self.project.id, 'tags': ['Backend', 'backend', 'api'],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['tags'], ['api', 'backend'])
+        response = self.client.patch(f"/api/tasks/{response.data['id']}/", {'tags': ['api']}, format='json')
+        self.assertEqual(response.data['tags'], ['api'])
+
+        etag = self.client.get(f'/api/tasks/{self.feature.id}/')['ETag']
+        response = self.client.post('/api/tasks/bulk-tag/', {
+            'tasks': [self.bug.id, self.feature.id], 'add': ['triaged'], 'remove': ['bug'],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'tasks': 2, 'added': 2, 'removed': 1})
+        self.assertEqual(self.titles(tags='triaged'), ['Bug', 'Feature'])
+        self.assertNotEqual(self.client.get(f'/api/tasks/{self.feature.id}/')['ETag'], etag)
+
+        self.authenticate(self.developer)
+        response = self.client.post('/api/tasks/bulk-tag/', {'tasks': [self.bug.id, self.feature.id], 'add': ['mine']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['tasks'], [self.feature.id])
+        self.assertFalse(TaskTag.objects.filter(name='mine').exists())
+
+    def test_project_tag_counts(self):
+        """Test per-project tag counts, scoped to the tasks the user can see."""
+        print("\n--- Testing Project Tag Counts ---")
+        self.authenticate(self.project_manager)
+        response = self.client.get(f'/api/projects/{self.project.id}/tags/')
+        self.assertEqual(response.data['tags'], [
+            {'name': 'bug', 'count': 2}, {'name': 'feature', 'count': 1}, {'name': 'urgent', 'count': 1},
+        ])
+        self.authenticate(self.developer)
+        response = self.client.get(f'/api/projects/{self.project.id}/tags/')
+        self.assertEqual(response.data['tags'], [{'name': 'bug', 'count': 1}])
+
+
+class BulkProvisioningTests(APITestCase):
+    """
+    Test bulk user provisioning through the API and the provision_users command.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin User")
+        cls.manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_bulk_create_with_per_row_results(self):
+        """Test that valid rows are created in one insert and bad rows are reported per row."""
+        print("\n--- Testing Bulk User Provisioning ---")
+        self.authenticate(self.admin)
+        rows = [
+            {'email': 'dev1@example.com', 'name': 'Dev One', 'password': 'secret-1'},
+            {'email': 'lead@example.com', 'name': 'Lead', 'role': 'Project Lead', 'password': 'secret-2'},
+            {'email': 'manager@example.com', 'name': 'Taken'},
+            {'email': 'dev1@example.com', 'name': 'Repeat'},
+            {'email': 'bad@example.com', 'role': 'Owner'},
+            {'email': 'not-an-email'},
+            {'email': 'nopass@example.com'},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/users/bulk/', {'users': rows, 'role': 'Developer'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['failed']), (3, 4))
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results],
+                         ['created', 'created', 'duplicate', 'duplicate', 'invalid', 'invalid', 'created'])
+        self.assertIn('role', results[4]['errors'])
+        self.assertIn('email', results[5]['errors'])
+        self.assertEqual(len([q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "api_user"')]), 1)
+
+        dev = User.objects.get(email='dev1@example.com')
+        self.assertEqual((dev.id, dev.name, dev.role), (results[0]['id'], 'Dev One', 'Developer'))
+        self.assertTrue(dev.check_password('secret-1'))
+        self.assertEqual(User.objects.get(email='lead@example.com').role, 'Project Lead')
+        self.assertFalse(User.objects.get(email='nopass@example.com').has_usable_password())
+        self.assertEqual(User.objects.get(email='manager@example.com').name, 'Project Manager')
+
+    def test_bulk_create_requires_admin(self):
+        """Test that only admins can provision users, and that the batch size is capped."""
+        self.authenticate(self.manager)
+        response = self.client.post('/api/users/bulk/', {'users': [{'email': 'x@example.com'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.authenticate(self.admin)
+        with override_settings(PROVISION_MAX_USERS=1):
+            response = self.client.post('/api/users/bulk/', {'users': [{'email': 'x@example.com'}, {'email': 'y@example.com'}],
+                                                              'role': 'Client'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(User.objects.filter(email='x@example.com').exists())
+
+    def test_passwords_hashed_on_process_pool(self):
+        """Test that hashing over worker processes gives the same usable hashes, in order."""
+        passwords = [f'password-{n}' for n in range(6)]
+        hashed = provisioning.hash_passwords(passwords, workers=2)
+        self.assertEqual(len(hashed), 6)
+        self.assertEqual(len(set(hashed)), 6)
+        for password, encoded in zip(passwords, hashed):
+            self.assertTrue(User(password=encoded).check_password(password))
+
+    def test_daemonic_process_hashes_on_threads(self):
+        """Test that a daemonic process, which cannot start children, hashes on a thread pool instead."""
+        with mock.patch.object(provisioning.multiprocessing, 'current_process', return_value=mock.Mock(daemon=True)), \
+                mock.patch.object(provisioning, 'ProcessPoolExecutor') as processes:
+            hashed = provisioning.hash_passwords(['one', 'two', 'three'], workers=2)
+        processes.assert_not_called()
+        self.assertTrue(all(User(password=encoded).check_password(password)
+                            for password, encoded in zip(['one', 'two', 'three'], hashed)))
+
+    def test_provision_users_command(self):
+        """Test provisioning users from a CSV file with rejected rows written out."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'users.csv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("email,name,role,password\n"
+                        "one@example.com,One,Developer,pw-one\n"
+                        "two@example.com,Two,,pw-two\n"
+                        "admin@example.com,Again,Admin,pw\n"
+                        "three@example.com,Three,Wizard,pw\n")
+            errors = os.path.join(tmpdir, 'errors.jsonl')
+            call_command('provision_users', path, role='Client', batch_size=2, workers=1, errors=errors, stdout=StringIO())
+            with open(errors, encoding='utf-8') as f:
+                rejected = [json.loads(line) for line in f]
+
+        self.assertEqual(dict(User.objects.filter(email__in=['one@example.com', 'two@example.com']).values_list('email', 'role')),
+                         {'one@example.com': 'Developer', 'two@example.com': 'Client'})
+        self.assertTrue(User.objects.get(email='two@example.com').check_password('pw-two'))
+        self.assertEqual([(error['row'], error['status']) for error in rejected], [(3, 'duplicate'), (4, 'invalid')])
+
+
+class RequestProfilingTests(APITestCase):
+    """
+    Test opt-in request profiling and the stored profile endpoints.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin User")
+        cls.manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.project = make_project(cls.manager, name="Profiled Project")
+        make_task(cls.project, title="Profiled Task")
+
+    def setUp(self):
+        """Store profiles in a fresh directory and start with an empty cache."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        settings_override = override_settings(PROFILE_ROOT=self.tmpdir.name, PROFILE_SAMPLE_INTERVAL=0.0005)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_sampled_profile_is_stored_and_downloadable(self):
+        """Test that an admin's flagged request stores collapsed stacks that can be listed and downloaded."""
+        print("\n--- Testing Request Profiling ---")
+        self.authenticate(self.admin)
+        response = self.client.get('/api/tasks/', HTTP_X_PROFILE='sample')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        profile_id = response['X-Profile-Id']
+
+        listed = self.client.get('/api/profiles/')
+        self.assertEqual([meta['id'] for meta in listed.data], [profile_id])
+        meta = self.client.get(f'/api/profiles/{profile_id}/').data
+        self.assertEqual((meta['mode'], meta['method'], meta['path'], meta['view'], meta['status'], meta['user']),
+                         ('sample', 'GET', '/api/tasks/', 'TaskViewSet.list', 200, self.admin.id))
+
+        download = self.client.get(f'/api/profiles/{profile_id}/download/')
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        collapsed = b''.join(download.streaming_content).decode()
+        for line in collapsed.splitlines():
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+            # Stacks start at the profiled call, not at the server or test client frames above it.
+            self.assertTrue(stack.startswith('profile.<locals>.run (profiling.py:'))
+        self.assertEqual(sum(int(line.rsplit(' ', 1)[1]) for line in collapsed.splitlines()), meta['samples'])
+
+        self.assertEqual(self.client.delete(f'/api/profiles/{profile_id}/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(f'/api/profiles/{profile_id}/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_traced_profile_is_a_pstats_file(self):
+        """Test that trace mode stores a cProfile dump readable by pstats."""
+        import pstats
+        self.authenticate(self.admin)
+        response = self.client.get(f'/api/projects/{self.project.id}/?profile=trace')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        meta, path = profiling.get(response['X-Profile-Id'])
+        self.assertEqual(meta['mode'], 'trace')
+        functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+        self.assertIn('retrieve', functions)
+
+    def test_flag_ignored_for_non_admins(self):
+        """Test that only admins can profile requests or read profiles."""
+        self.authenticate(self.manager)
+        response = self.client.get('/api/tasks/', HTTP_X_PROFILE='sample')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(profiling.list_profiles(), [])
+        self.assertEqual(self.client.get('/api/profiles/').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_retention_limits(self):
+        """Test that storing a profile prunes the oldest beyond the count limit."""
+        self.authenticate(self.admin)
+        with override_settings(PROFILE_MAX_COUNT=2):
+            ids = [self.client.get('/api/projects/', HTTP_X_PROFILE='sample')['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual({meta['id'] for meta in profiling.list_profiles()}, set(ids[1:]))
+        self.assertIsNone(profiling.get(ids[0]))
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 4)
+
+
+class LoggingPipelineTests(APITestCase):
+    """
+    Test the background logging handler, request ids, sampling and lazy formatting.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin User")
+        cls.project = make_project(cls.admin, name="Logged Project")
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def capture(self, level=logging.INFO, rates=None):
+        """Route the `api` loggers through a fresh background handler into a buffer; returns (handler, buffer)."""
+        output = StringIO()
+        target = logging.StreamHandler(output)
+        target.setFormatter(logs.JsonFormatter())
+        handler = logs.BackgroundHandler([target], queue_size=100)
+        handler.addFilter(logs.RequestIdFilter())
+        handler.addFilter(logs.SamplingFilter(rates or {}))
+        api_logger = logging.getLogger('api')
+        previous = api_logger.handlers, api_logger.level
+        api_logger.handlers = [handler]
+        api_logger.setLevel(level)
+        self.addCleanup(setattr, api_logger, 'handlers', previous[0])
+        self.addCleanup(api_logger.setLevel, previous[1])
+        self.addCleanup(handler.stop)
+        return handler, output
+
+    def entries(self, handler, output):
+        handler.flush()
+        return [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_request_id_correlates_log_records(self):
+        """Test that records logged during a request carry its id, given or generated."""
+        print("\n--- Testing Logging Pipeline ---")
+        handler, output = self.capture()
+        self.authenticate(self.admin)
+        response = self.client.post('/api/comments/', {'content': 'Logged', 'project': self.project.id},
+                                    format='json', HTTP_X_REQUEST_ID='req-123')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response['X-Request-ID'], 'req-123')
+        generated = self.client.get('/api/projects/', HTTP_X_REQUEST_ID='not valid!')['X-Request-ID']
+        self.assertRegex(generated, r'^[0-9a-f]{32}$')
+
+        entries = self.entries(handler, output)
+        self.assertIn(('api.views', f"Comment {response.data['id']} created.", 'req-123'),
+                      [(entry['logger'], entry['message'], entry['request_id']) for entry in entries])
+        requests = [entry for entry in entries if entry['logger'] == 'api.requests']
+        self.assertEqual([(entry['method'], entry['path'], entry['status'], entry['request_id']) for entry in requests],
+                         [('POST', '/api/comments/', 201, 'req-123'), ('GET', '/api/projects/', 200, generated)])
+
+    def test_info_records_are_sampled(self):
+        """Test that sampled loggers keep one INFO record in 1/rate while warnings always pass."""
+        handler, output = self.capture(rates={'api.requests': 0.25})
+        request_logger = logging.getLogger('api.requests')
+        for n in range(8):
+            request_logger.info("request %d", n)
+        request_logger.warning("slow")
+        logging.getLogger('api.views').info("unsampled")
+        entries = self.entries(handler, output)
+        self.assertEqual([entry['message'] for entry in entries], ['request 0', 'request 4', 'slow', 'unsampled'])
+        self.assertEqual(entries[0]['sample_rate'], 0.25)
+        self.assertNotIn('sample_rate', entries[2])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test that records beyond the queue size are counted as dropped rather than waited for."""
+        output = StringIO()
+        handler = logs.BackgroundHandler([logging.StreamHandler(output)], queue_size=2)
+        handler.pid = os.getpid()  # As if started, but with no listener draining the queue.
+        for n in range(5):
+            handler.handle(logging.LogRecord('api.test', logging.WARNING, __file__, 0, "record %d", (n,), None))
+        self.assertEqual((handler.queue.qsize(), handler.dropped), (2, 3))
+        self.assertEqual(handler.queue.get_nowait().getMessage(), "record 0")
+
+    def test_no_eager_formatting_or_stdout(self):
+        """Test that the comment debug log is formatted lazily and the auth welcome no longer prints headers."""
+        self.authenticate(self.admin)
+        with mock.patch('sys.stdout', new_callable=StringIO) as stdout:
+            response = self.client.get('/api/auth/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(stdout.getvalue(), '')
+
+        # The comment data is passed as an argument, formatted only if DEBUG is enabled.
+        with mock.patch('api.views.logger') as view_logger:
+            response = self.client.post('/api/comments/', {'content': 'Lazy', 'project': self.project.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        view_logger.debug.assert_called_once_with("Attempting to create comment with data: %s", mock.ANY)
+
+
+class RecurringTaskTests(APITestCase):
+    """
+    Test recurring task templates: schedules, the API and the batched scheduler.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.project = make_project(cls.manager, members=[cls.developer], name="Maintenance")
+        # A Monday.
+        cls.start = datetime(2025, 6, 2, 9, 0, tzinfo=dt_timezone.utc)
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def template(self, **fields):
+        fields = {'project': self.project, 'title': 'Rotate logs', 'frequency': 'weekly', 'starts_at': self.start, **fields}
+        template = recurrence.reschedule(RecurringTask(**fields), now=self.start)
+        template.save()
+        return template
+
+    def occurrences(self, template, count, after=None):
+        moments, after = [], after or template.starts_at
+        moments.append(recurrence.following(template, after, inclusive=True))
+        while len(moments) < count:
+            moments.append(recurrence.following(template, moments[-1]))
+        return moments
+
+    def test_schedules(self):
+        """Test daily, weekly-by-day and monthly schedules and their limits."""
+        print("\n--- Testing Recurring Tasks ---")
+        day = timedelta(days=1)
+        daily = RecurringTask(frequency='daily', interval=2, starts_at=self.start)
+        self.assertEqual(self.occurrences(daily, 3), [self.start, self.start + 2 * day, self.start + 4 * day])
+        self.assertEqual(recurrence.following(daily, self.start + day), self.start + 2 * day)
+
+        weekly = RecurringTask(frequency='weekly', interval=2, weekdays='MO,FR', starts_at=self.start + 2 * day)
+        # Starts on a Wednesday: that week's Friday, then Monday and Friday every other week.
+        self.assertEqual(self.occurrences(weekly, 4), [self.start + 4 * day, self.start + 14 * day,
+                                                       self.start + 18 * day, self.start + 28 * day])
+
+        monthly = RecurringTask(frequency='monthly', starts_at=datetime(2024, 1, 31, 9, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual([moment.date().isoformat() for moment in self.occurrences(monthly, 4)],
+                         ['2024-01-31', '2024-02-29', '2024-03-31', '2024-04-30'])
+
+        ended = RecurringTask(frequency='daily', starts_at=self.start, until=self.start + day, generated=0)
+        recurrence.reschedule(ended, now=self.start + 2 * day)
+        self.assertIsNone(ended.next_run_at)
+
+    def test_api_schedules_templates(self):
+        """Test creating templates through the API, with validation and permissions."""
+        self.authenticate(self.manager)
+        starts_at = timezone.now() + timedelta(days=1)
+        response = self.client.post('/api/recurring-tasks/', {
+            'project': self.project.id, 'title': 'Weekly backup check', 'frequency': 'weekly',
+            'weekdays': ['fr', 'MO'], 'starts_at': starts_at.isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data['weekdays'], ['MO', 'FR'])
+        template = RecurringTask.objects.get(id=response.data['id'])
+        self.assertEqual(template.created_by, self.manager)
+        self.assertEqual(template.next_run_at, recurrence.following(template, starts_at, inclusive=True))
+        self.assertIn(template.next_run_at.weekday(), (0, 4))
+
+        response = self.client.patch(f'/api/recurring-tasks/{template.id}/', {'frequency': 'daily', 'weekdays': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(RecurringTask.objects.get(id=template.id).next_run_at, starts_at)
+
+        bad = self.client.post('/api/recurring-tasks/', {
+            'project': self.project.id, 'title': 'Bad', 'frequency': 'daily', 'weekdays': ['XX'], 'starts_at': starts_at.isoformat(),
+        }, format='json')
+        self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.authenticate(self.developer)
+        self.assertEqual(self.client.get('/api/recurring-tasks/').data['count'], 1)
+        response = self.client.post('/api/recurring-tasks/', {
+            'project': self.project.id, 'title': 'Mine', 'frequency': 'daily', 'starts_at': starts_at.isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_scheduler_generates_in_batches_idempotently(self):
+        """Test that due templates produce one task each, in a fixed number of queries, and reruns add nothing."""
+        weekly = [self.template(title=f'Weekly {n}', assigned_to=self.developer) for n in range(6)]
+        later = self.template(title='Later', starts_at=self.start + timedelta(days=3))
+        now = self.start + timedelta(hours=1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(recurrence.run_due(now=now, batch_size=4), 6)
+        few = len(queries)
+        tasks = Task.objects.filter(recurrence__isnull=False)
+        self.assertEqual(sorted(tasks.values_list('title', flat=True)), sorted(t.title for t in weekly))
+        task = tasks.get(title='Weekly 0')
+        self.assertEqual((task.occurrence_at, task.assigned_to, task.status), (self.start, self.developer, 'Pending'))
+        self.assertEqual(TaskStatusChange.objects.filter(task_id=task.id).count(), 1)
+        template = RecurringTask.objects.get(id=weekly[0].id)
+        self.assertEqual((template.generated, template.next_run_at), (1, self.start + timedelta(weeks=1)))
+        self.assertEqual(RecurringTask.objects.get(id=later.id).generated, 0)
+
+        # Running again at the same time finds nothing due.
+        self.assertEqual(recurrence.run_due(now=now), 0)
+        self.assertEqual(tasks.count(), 6)
+
+        # More templates due in the same batch take the same number of queries.
+        for n in range(6, 12):
+            self.template(title=f'Weekly {n}')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(recurrence.run_due(now=self.start + timedelta(weeks=1, hours=1), batch_size=100), 13)
+        self.assertLessEqual(len(queries), few)
+
+    def test_scheduler_recovers_without_duplicates(self):
+        """Test that an occurrence whose task already exists is not created again, and missed runs collapse."""
+        template = self.template()
+        # As if a previous run wrote the task but not the template's new schedule.
+        make_task(self.project, title='Rotate logs', recurrence=template, occurrence_at=template.next_run_at)
+        self.assertEqual(recurrence.run_due(now=self.start), 0)
+        template.refresh_from_db()
+        self.assertEqual((template.generated, template.next_run_at), (1, self.start + timedelta(weeks=1)))
+
+        # Three weeks without a scheduler: one task, then back on schedule after now.
+        now = self.start + timedelta(weeks=3, hours=1)
+        self.assertEqual(recurrence.run_due(now=now), 1)
+        template.refresh_from_db()
+        self.assertEqual(template.next_run_at, self.start + timedelta(weeks=4))
+        self.assertEqual(Task.objects.filter(recurrence=template).count(), 2)
+
+    def test_count_ends_schedule_and_command(self):
+        """Test that COUNT stops a schedule and that the management command runs the scheduler."""
+        template = self.template(frequency='daily', count=2, starts_at=timezone.now() - timedelta(days=5))
+        RecurringTask.objects.filter(id=template.id).update(next_run_at=timezone.now() - timedelta(days=1))
+        out = StringIO()
+        call_command('generate_recurring_tasks', stdout=out)
+        self.assertIn("Created 1 recurring task(s)", out.getvalue())
+        template.refresh_from_db()
+        self.assertEqual(template.generated, 1)
+        self.assertIsNotNone(template.next_run_at)
+        RecurringTask.objects.filter(id=template.id).update(next_run_at=timezone.now() - timedelta(seconds=1))
+        call_command('generate_recurring_tasks', stdout=StringIO())
+        template.refresh_from_db()
+        self.assertEqual((template.generated, template.next_run_at), (2, None))
+
+
+class TimeTrackingTests(APITestCase):
+    """
+    Test time entries, the rollups maintained with them and the reports read from the rollups.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin")
+        cls.manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.outsider = make_user("Developer", email="outsider@example.com", password="outpass", name="Outsider")
+        cls.project = make_project(cls.manager, members=[cls.developer], name="Billing")
+        cls.other_project = make_project(cls.manager, name="Other")
+        cls.task = make_task(cls.project, assigned_to=cls.developer)
+        cls.other_task = make_task(cls.other_project)
+        # A Wednesday and the following Monday.
+        cls.day = datetime(2025, 6, 4).date()
+        cls.next_week = cls.day + timedelta(days=5)
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def log(self, minutes, day=None, task=None, user=None):
+        return timetracking.create_entries([TimeEntry(task_id=(task or self.task).id, project_id=(task or self.task).project_id,
+                                                      user=user or self.developer, date=day or self.day, minutes=minutes)])[0]
+
+    def rollups(self):
+        return {(r.project_id, r.user_id, r.week.isoformat()): (r.minutes, r.entries) for r in TimeRollup.objects.all()}
+
+    def test_entries_maintain_rollups(self):
+        """Test that creating, changing and deleting entries through the API keeps the rollups in step."""
+        print("\n--- Testing Time Tracking ---")
+        self.authenticate(self.developer)
+        response = self.client.post('/api/time-entries/', {'task': self.task.id, 'date': self.day.isoformat(), 'minutes': 90,
+                                                          'note': 'Invoice export'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual((response.data['project'], response.data['user'], response.data['week']),
+                         (self.project.id, self.developer.id, '2025-06-02'))
+        first = response.data['id']
+        self.client.post('/api/time-entries/', {'task': self.task.id, 'date': self.day.isoformat(), 'minutes': 30}, format='json')
+        week = (self.project.id, self.developer.id, '2025-06-02')
+        self.assertEqual(self.rollups(), {week: (120, 2)})
+
+        response = self.client.patch(f'/api/time-entries/{first}/', {'minutes': 60}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(self.rollups(), {week: (90, 2)})
+
+        self.client.patch(f'/api/time-entries/{first}/', {'date': self.next_week.isoformat()}, format='json')
+        self.assertEqual(self.rollups(), {week: (30, 1), (self.project.id, self.developer.id, '2025-06-09'): (60, 1)})
+
+        self.assertEqual(self.client.delete(f'/api/time-entries/{first}/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.rollups(), {week: (30, 1)})
+
+        moved = self.client.patch(f'/api/time-entries/{TimeEntry.objects.get().id}/', {'task': self.other_task.id}, format='json')
+        self.assertEqual(moved.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/api/time-entries/').data['count'], 1)
+
+    def test_time_moves_with_its_task(self):
+        """Test that a task moved to another project takes its logged time and rollups along."""
+        self.log(60)
+        self.log(30, day=self.next_week)
+        self.log(15, user=self.manager)
+        self.log(20, task=self.other_task)
+        self.authenticate(self.manager)
+        response = self.client.patch(f'/api/tasks/{self.task.id}/', {'project': self.other_project.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+
+        self.assertFalse(TimeEntry.objects.filter(project=self.project).exists())
+        self.assertEqual(self.rollups(), {
+            (self.other_project.id, self.developer.id, '2025-06-02'): (80, 2),
+            (self.other_project.id, self.developer.id, '2025-06-09'): (30, 1),
+            (self.other_project.id, self.manager.id, '2025-06-02'): (15, 1),
+        })
+
+    def test_permissions(self):
+        """Test who may log, change and see time."""
+        self.authenticate(self.outsider)
+        response = self.client.post('/api/time-entries/', {'task': self.task.id, 'date': self.day.isoformat(), 'minutes': 15}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.post('/api/time-entries/', {'task': 999999, 'date': self.day.isoformat(), 'minutes': 15}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        entry = self.log(45)
+        self.assertEqual(self.client.patch(f'/api/time-entries/{entry.id}/', {'minutes': 1}, format='json').status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/time-entries/').data['count'], 1)
+        self.assertEqual(self.client.delete(f'/api/time-entries/{entry.id}/').status_code, status.HTTP_403_FORBIDDEN)
+        self.authenticate(self.admin)
+        self.assertEqual(self.client.delete(f'/api/time-entries/{entry.id}/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(TimeRollup.objects.count(), 0)
+
+    def test_report_reads_rollups(self):
+        """Test grouped reports, their filters and that they read no time entries."""
+        self.log(60)
+        self.log(30, day=self.next_week)
+        self.log(120, task=self.other_task, user=self.manager)
+        self.authenticate(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/time-entries/report/?by=week,project')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertFalse([q for q in queries if 'api_timeentry' in q['sql']])
+        self.assertEqual(response.data['by'], ['project', 'week'])
+        self.assertEqual(response.data['total'], {'minutes': 210, 'hours': 3.5, 'entries': 3})
+        self.assertEqual([(row['project'], str(row['week']), row['minutes']) for row in response.data['rows']],
+                         [(self.project.id, '2025-06-02', 60), (self.project.id, '2025-06-09', 30),
+                          (self.other_project.id, '2025-06-02', 120)])
+
+        response = self.client.get(f'/api/time-entries/report/?by=user&start={self.next_week}')
+        self.assertEqual(response.data['rows'], [{'user': self.developer.id, 'minutes': 30, 'hours': 0.5, 'entries': 1}])
+        response = self.client.get(f'/api/time-entries/report/?project={self.other_project.id}')
+        self.assertEqual((response.data['total']['minutes'], response.data['rows']), (120, []))
+        self.assertEqual(self.client.get('/api/time-entries/report/?by=task').status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Developers see only their own time.
+        self.authenticate(self.developer)
+        self.assertEqual(self.client.get('/api/time-entries/report/').data['total']['minutes'], 90)
+
+    def test_reconcile(self):
+        """Test that reconciliation reports drifted, missing and stale rollups and fixes them in bulk."""
+        self.log(60)
+        self.log(30, day=self.next_week)
+        self.log(15, task=self.other_task)
+        expected = self.rollups()
+        self.assertEqual(timetracking.reconcile(), [])
+
+        TimeRollup.objects.filter(week='2025-06-09').update(minutes=999)
+        TimeRollup.objects.filter(project=self.other_project).delete()
+        TimeRollup.objects.create(project=self.project, user=self.manager, week='2025-06-02', minutes=5, entries=1)
+        out = StringIO()
+        call_command('reconcile_time_rollups', stdout=out)
+        self.assertIn("3 drifted rollup(s) found", out.getvalue())
+        self.assertIn("999 min in 1 entries stored, 30 min in 1 entries logged", out.getvalue())
+        self.assertNotEqual(self.rollups(), expected)
+
+        call_command('reconcile_time_rollups', '--fix', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(self.rollups(), expected)
+        self.assertEqual(timetracking.reconcile(), [])
+
+
+class AdminTests(TestCase):
+    """
+    Test the admin changelists, filters, edit pages and status actions on tasks.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin = User.objects.create_superuser(email="admin@example.com", password="adminpass", name="Admin")
+        cls.developer = make_user("Developer", email="developer@example.com", name="Developer")
+        cls.other = make_user("Developer", email="other@example.com", name="Other")
+        cls.project = make_project(name="Platform")
+        cls.other_project = make_project(name="Website")
+        cls.tasks = [make_task(cls.project, assigned_to=cls.developer, status='Pending') for _ in range(4)]
+        cls.done = make_task(cls.other_project, status='Completed', priority='High')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelist_queries_do_not_grow(self):
+        """Test that changelist pages take the same queries for more rows and never count the whole table."""
+        print("\n--- Testing Admin ---")
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get('/admin/api/task/').status_code, 200)
+        for _ in range(10):
+            make_task(self.other_project, assigned_to=self.other)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get('/admin/api/task/')
+        self.assertEqual(len(many), len(few))
+        self.assertContains(response, "15 tasks")
+        for path in ('/admin/api/comment/', '/admin/api/project/', '/admin/api/user/'):
+            self.assertEqual(self.client.get(path).status_code, 200)
+
+        with override_settings(ADMIN_COUNT_LIMIT=5):
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/admin/api/task/')
+            self.assertContains(response, "15 tasks")
+            counts = [q['sql'] for q in queries if 'COUNT(' in q['sql'].upper()]
+            self.assertFalse([sql for sql in counts if 'api_task' in sql])
+            response = self.client.get('/admin/api/task/?status__exact=Pending')
+            self.assertContains(response, "5 tasks")
+
+    def test_filters_and_search(self):
+        """Test the status, priority and project filters, the id and title search and the filter's index."""
+        response = self.client.get(f'/admin/api/task/?status__exact=Completed&project__id__exact={self.other_project.id}')
+        self.assertEqual(list(response.context['cl'].result_list), [self.done])
+        self.assertContains(response, "Platform")
+        response = self.client.get('/admin/api/task/?priority__exact=High')
+        self.assertEqual(list(response.context['cl'].result_list), [self.done])
+        response = self.client.get(f'/admin/api/task/?q={self.tasks[0].id}')
+        self.assertEqual(list(response.context['cl'].result_list), [self.tasks[0]])
+        response = self.client.get(f'/admin/api/task/?q={self.done.title[:4]}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('task_status_idx', Task.objects.filter(status='Completed').order_by('-id').explain())
+
+    def test_edit_pages_use_autocomplete(self):
+        """Test that edit pages render only the selected related rows and search the rest on demand."""
+        response = self.client.get(f'/admin/api/task/{self.tasks[0].id}/change/')
+        self.assertContains(response, "developer@example.com")
+        self.assertNotContains(response, "other@example.com")
+        response = self.client.get(f'/admin/api/project/{self.project.id}/change/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/admin/autocomplete/', {
+            'app_label': 'api', 'model_name': 'task', 'field_name': 'assigned_to', 'term': 'other',
+        })
+        self.assertEqual([result['text'] for result in response.json()['results']], ['other@example.com'])
+
+    @override_settings(ADMIN_ACTION_BATCH_SIZE=2)
+    def test_status_actions(self):
+        """Test that the bulk status action updates the selected tasks in batches and records history."""
+        selected = [task.id for task in self.tasks[:3]] + [self.done.id]
+        response = self.client.post('/admin/api/task/', {'action': 'mark_completed', '_selected_action': selected}, follow=True)
+        self.assertContains(response, "Marked 3 task(s) as Completed.")
+        self.assertEqual(set(Task.objects.filter(status='Completed').values_list('id', flat=True)), set(selected))
+        self.assertEqual(Task.objects.get(id=self.tasks[3].id).status, 'Pending')
+        changes = TaskStatusChange.objects.filter(task_id__in=selected, from_status=0, to_status=2)
+        self.assertEqual(changes.count(), 3)
+
+        response = self.client.post(f'/admin/api/task/{self.tasks[3].id}/change/', {
+            'title': 'Renamed', 'description': 'd', 'status': 'In Progress', 'priority': 'Low',
+            'project': self.project.id, 'assigned_to': '',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(TaskStatusChange.objects.filter(task_id=self.tasks[3].id, to_status=1).count(), 1)
+
+
+class ProjectSnapshotTests(APITestCase):
+    """
+    Test project snapshot export and restore: the format, id remapping, streaming and the API.
+    """
+    databases = {'default', 'shard1'}
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin")
+        cls.manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.project = make_project(cls.manager, members=[cls.developer], name="Payments")
+        cls.tasks = [make_task(cls.project, assigned_to=cls.developer, status='In Progress') for _ in range(5)]
+        cls.tasks.append(make_task(cls.project, title="Unassigned"))
+        TaskTag.objects.create(task=cls.tasks[0], project=cls.project, name='bug')
+        make_comment(cls.developer, cls.tasks[0], content="Looking into it")
+        make_comment(cls.manager, project=cls.project, content="Kick-off notes")
+        old = timezone.now() - timedelta(days=30)
+        Task.objects.filter(id=cls.tasks[0].id).update(created_at=old, updated_at=old)
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def snapshot(self, chunk_size=None):
+        return b''.join(snapshots.export(Project.objects.get(id=self.project.id), chunk_size))
+
+    def test_round_trip_remaps_ids(self):
+        """Test that a restored snapshot recreates the project under new ids with the same content."""
+        print("\n--- Testing Project Snapshots ---")
+        data = self.snapshot(chunk_size=2)
+        records = list(snapshots.read_records(BytesIO(data)))
+        self.assertEqual([record['type'] for record in records],
+                         ['header', 'users', 'project', 'tasks', 'tasks', 'tasks', 'tags', 'comments', 'end'])
+        tasks = records[3]
+        self.assertEqual(dict(zip(tasks['columns'], tasks['codecs'])), {
+            'id': 'delta', 'title': None, 'description': None, 'status': None, 'priority': None,
+            'assigned_to_id': 'delta', 'rank': None, 'created_at': 'time', 'updated_at': 'time',
+        })
+        self.assertEqual(tasks['data'][0], [self.tasks[0].id, 1])
+        # A nullable column holding a null is stored plainly.
+        self.assertEqual(records[5]['codecs'][5], None)
+
+        users = User.objects.count()
+        project, counts = snapshots.restore(BytesIO(data), name="Payments (copy)")
+        self.assertEqual(counts, {'users': 2, 'tasks': 6, 'tags': 1, 'comments': 2})
+        self.assertEqual(User.objects.count(), users)
+        self.assertNotEqual(project.id, self.project.id)
+        self.assertEqual((project.name, project.manager, list(project.members.all())),
+                         ("Payments (copy)", self.manager, [self.developer]))
+
+        restored = list(Task.objects.filter(project=project).order_by('rank'))
+        original = list(Task.objects.filter(project=self.project).order_by('rank'))
+        self.assertFalse({task.id for task in restored} & {task.id for task in original})
+        fields = ['title', 'description', 'status', 'priority', 'assigned_to_id', 'rank', 'created_at', 'updated_at']
+        self.assertEqual([[getattr(task, field) for field in fields] for task in restored],
+                         [[getattr(task, field) for field in fields] for task in original])
+        first = restored[[task.id for task in original].index(self.tasks[0].id)]
+        self.assertEqual(list(TaskTag.objects.filter(task=first).values_list('name', 'project_id')), [('bug', project.id)])
+        self.assertEqual(list(Comment.objects.filter(task=first).values_list('content', 'author_id')),
+                         [("Looking into it", self.developer.id)])
+        self.assertEqual(list(Comment.objects.filter(project=project).values_list('content', 'author_id')),
+                         [("Kick-off notes", self.manager.id)])
+        # Restored tasks enter the status history as created, so flow reports count them.
+        self.assertEqual(sorted(TaskStatusChange.objects.filter(project=project).values_list('task_id', 'from_status', 'to_status')),
+                         sorted((task.id, None, TaskStatusChange.STATUS_CODES[task.status]) for task in restored))
+
+    def test_restore_creates_missing_users_and_rejects_bad_files(self):
+        """Test that unknown users are created without a usable password and damaged snapshots change nothing."""
+        data = self.snapshot()
+        User.objects.filter(id=self.developer.id).delete()
+        project, _ = snapshots.restore(BytesIO(data))
+        developer = User.objects.get(email="developer@example.com")
+        self.assertFalse(developer.has_usable_password())
+        self.assertEqual(set(Task.objects.filter(project=project).values_list('assigned_to_id', flat=True)), {developer.id, None})
+
+        projects = Project.objects.count()
+        for damaged in (data[:len(data) // 2], gzip.compress(b'not a snapshot'), b'garbage'):
+            with self.assertRaises(snapshots.SnapshotError):
+                snapshots.restore(BytesIO(damaged))
+        raw = gzip.decompress(data)
+        # Drop the end record: every record is complete, but the snapshot is not.
+        end = raw.rindex(snapshots.frame({'type': 'end', 'counts': {'users': 2, 'tasks': 6, 'tags': 1, 'comments': 2}}))
+        with self.assertRaisesMessage(snapshots.SnapshotError, "truncated"):
+            snapshots.restore(BytesIO(gzip.compress(raw[:end])))
+        self.assertEqual(Project.objects.count(), projects)
+
+    @override_settings(TASK_SHARDS=['shard1'])
+    def test_restore_onto_shard_is_all_or_nothing(self):
+        """Test that a restore onto a shard writes its rows there, and a failed one leaves none behind."""
+        data = self.snapshot()
+        raw = gzip.decompress(data)
+        end = raw.rindex(snapshots.frame({'type': 'end', 'counts': {'users': 2, 'tasks': 6, 'tags': 1, 'comments': 2}}))
+        with mock.patch.object(sharding, 'shard_for_project', lambda project_id: 'shard1' if project_id else 'default'):
+            with self.assertRaises(snapshots.SnapshotError):
+                snapshots.restore(BytesIO(gzip.compress(raw[:end])))
+            for model in (Task, TaskTag, Comment, Project):
+                self.assertFalse(model.objects.using('shard1').exists())
+
+            project, _ = snapshots.restore(BytesIO(data))
+        self.assertEqual(Task.objects.using('shard1').filter(project_id=project.id).count(), 6)
+        self.assertEqual(TaskTag.objects.using('shard1').filter(project_id=project.id).count(), 1)
+        self.assertEqual(Comment.objects.using('shard1').filter(task__project_id=project.id).count(), 1)
+
+    def test_export_streams_chunks(self):
+        """Test that export reads and yields one chunk at a time."""
+        for _ in range(20):
+            make_task(self.project)
+        chunks = snapshots.export(Project.objects.get(id=self.project.id), chunk_size=5)
+        with CaptureQueriesContext(connection) as queries:
+            next(chunks)
+        self.assertLess(len(queries), 10)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertGreater(len(b''.join(chunks)), 0)
+        self.assertGreaterEqual(len([q for q in queries if 'FROM "api_task"' in q['sql'] and 'LIMIT 5' in q['sql']]), 6)
+
+    def test_api_and_commands(self):
+        """Test the snapshot download and upload endpoints and the management commands."""
+        self.authenticate(self.developer)
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.id}/snapshot/').status_code, status.HTTP_403_FORBIDDEN)
+        self.project.members.add(self.manager)
+        self.authenticate(self.manager)
+        response = self.client.get(f'/api/projects/{self.project.id}/snapshot/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        data = b''.join(response.streaming_content)
+        upload = SimpleUploadedFile('payments.tmsnap.gz', data)
+        self.assertEqual(self.client.post('/api/projects/import/', {'snapshot': upload}).status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+        self.authenticate(self.admin)
+        upload = SimpleUploadedFile('payments.tmsnap.gz', data)
+        response = self.client.post('/api/projects/import/', {'snapshot': upload, 'name': 'Imported'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data['project']['name'], 'Imported')
+        self.assertEqual(response.data['restored']['tasks'], 6)
+        bad = self.client.post('/api/projects/import/', {'snapshot': SimpleUploadedFile('x', b'junk')})
+        self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'payments.tmsnap.gz')
+            out = StringIO()
+            call_command('export_project', str(self.project.id), path, stdout=out)
+            self.assertIn(f"Exported project {self.project.id}", out.getvalue())
+            out = StringIO()
+            call_command('import_project', path, '--name', 'From file', stdout=out)
+            self.assertIn("with 2 users, 6 tasks, 1 tags, 2 comments", out.getvalue())
+        self.assertTrue(Project.objects.filter(name='From file').exists())
+
+
+class WebhookReceiver:
+    """
+    Local stand-in for a subscriber's endpoint. Records every request, answers
+    with the next of `statuses` (200 once they run out) after `delay` seconds,
+    and counts connections and the most requests handled at once.
+    """
+
+    def __init__(self, statuses=(), delay=0):
+        receiver = self
+        self.requests = []
+        self.statuses = deque(statuses)
+        self.delay = delay
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with receiver.lock:
+                    receiver.connections += 1
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                with receiver.lock:
+                    receiver.in_flight += 1
+                    receiver.max_in_flight = max(receiver.max_in_flight, receiver.in_flight)
+                    code = receiver.statuses.popleft() if receiver.statuses else 200
+                time.sleep(receiver.delay)
+                with receiver.lock:
+                    receiver.in_flight -= 1
+                    receiver.requests.append((self.headers, body))
+                self.send_response(code)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}/hook'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def events(self):
+        return [event for _, body in self.requests for event in json.loads(body)['events']]
+
+
+@override_settings(WEBHOOK_BATCH_SIZE=10, WEBHOOK_RETRY_BASE_SECONDS=30, WEBHOOK_MAX_ATTEMPTS=3, WEBHOOK_ALLOW_PRIVATE_URLS=True)
+class WebhookTests(APITestCase):
+    """
+    Test the webhook outbox, batched delivery over pooled connections, retries, dead letters and the API.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the tests."""
+        cls.admin = make_user("Admin", email="admin@example.com", password="adminpass", name="Admin")
+        cls.manager = make_user("Project Manager", email="manager@example.com", password="managerpass", name="Project Manager")
+        cls.developer = make_user("Developer", email="developer@example.com", password="devpass", name="Developer")
+        cls.project = make_project(cls.manager, members=[cls.manager, cls.developer], name="Payments")
+        cls.other = make_project(cls.admin, name="Other")
+        cls.task = make_task(cls.project, assigned_to=cls.developer)
+
+    def setUp(self):
+        """Give every test its own connection pool."""
+        self.pool = webhooks.ConnectionPool(size=4, timeout=5)
+        self.addCleanup(self.pool.close)
+
+    def authenticate(self, user):
+        """Authenticate a user and set the authorization header."""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def subscribe(self, url, **fields):
+        fields.setdefault('owner', self.manager)
+        fields.setdefault('project', self.project)
+        return WebhookSubscription.objects.create(url=url, **fields)
+
+    def publish(self, count, project=None):
+        for n in range(count):
+            webhooks.publish('task', 'updated', n, (project or self.project).id, {'n': n})
+
+    def test_writes_publish_events_in_their_transaction(self):
+        """Test that API writes add outbox events, and that a failed outbox write rolls the change back."""
+        print("\n--- Testing Webhooks ---")
+        self.authenticate(self.manager)
+        response = self.client.post('/api/tasks/', {'title': 'Hooked', 'description': 'd', 'project': self.project.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        task_id = response.data['id']
+        self.client.patch(f'/api/tasks/{task_id}/', {'status': 'Completed'})
+        self.client.post('/api/comments/', {'content': 'Done', 'task': task_id})
+        self.client.delete(f'/api/tasks/{task_id}/')
+        events = list(OutboxEvent.objects.order_by('id').values_list('event', 'target_id', 'project_id'))
+        self.assertEqual([event for event, _, _ in events], ['task.created', 'task.updated', 'comment.created', 'task.deleted'])
+        self.assertEqual({project_id for _, _, project_id in events}, {self.project.id})
+        self.assertEqual(OutboxEvent.objects.get(event='task.updated').payload['status'], 'Completed')
+        self.assertEqual(OutboxEvent.objects.get(event='task.deleted').payload['title'], 'Hooked')
+
+        with mock.patch.object(webhooks, 'publish', side_effect=DatabaseError("outbox unavailable")), \
+                self.assertLogs('api.requests', level='WARNING'):
+            response = self.client.post('/api/tasks/', {'title': 'Lost', 'description': 'd', 'project': self.project.id})
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertFalse(Task.objects.filter(title='Lost').exists())
+
+    def test_dispatch_and_batched_delivery(self):
+        """Test fan-out to matching subscriptions and batched, signed requests over reused connections."""
+        with WebhookReceiver() as receiver:
+            updates = self.subscribe(receiver.url, events=['task.updated'])
+            everything = self.subscribe(receiver.url, owner=self.admin, project=None)
+            self.subscribe(receiver.url, events=['task.updated'], is_active=False)
+            self.subscribe(receiver.url, project=self.other)
+            self.publish(25)
+            webhooks.publish('comment', 'created', 1, self.project.id, {})
+            webhooks.publish('project', 'updated', self.other.id, self.other.id, {})
+
+            self.assertEqual(webhooks.dispatch(batch_size=10), 27)
+            self.assertFalse(OutboxEvent.objects.exists())
+            self.assertEqual(updates.deliveries.count(), 25)
+            self.assertEqual(everything.deliveries.count(), 27)
+            self.assertEqual(WebhookDelivery.objects.count(), 25 + 27 + 1)
+
+            self.assertEqual(webhooks.deliver(self.pool), (53, 0))
+            self.assertEqual(webhooks.deliver(self.pool), (0, 0))
+
+        # 25 events in 3 batches, 27 in 3 and 1 in 1, over at most 2 connections per subscription.
+        self.assertEqual(len(receiver.requests), 7)
+        self.assertLessEqual(receiver.connections, 5)
+        self.assertEqual(receiver.connections, self.pool.opened)
+        self.assertEqual(WebhookDelivery.objects.filter(status='delivered').count(), 53)
+        secrets = {str(subscription.id): subscription.secret for subscription in WebhookSubscription.objects.all()}
+        for headers, body in receiver.requests:
+            self.assertLessEqual(len(json.loads(body)['events']), 10)
+            self.assertEqual(headers['X-Webhook-Signature'], webhooks.sign(secrets[headers['X-Webhook-Subscription']], body))
+        events = [event for event in receiver.events() if event['event'] == 'task.updated']
+        self.assertEqual(len({event['id'] for event in events}), 25)
+        self.assertEqual(sorted(event['data']['n'] for event in events), sorted(list(range(25)) * 2))
+
+    def test_retry_backoff_and_dead_letters(self):
+        """Test that failed batches back off, are dead-lettered after the last attempt and can be redelivered."""
+        with WebhookReceiver(statuses=[500, 503, 502]) as receiver:
+            subscription = self.subscribe(receiver.url)
+            self.publish(2)
+            webhooks.dispatch()
+            now = timezone.now()
+            self.assertEqual(webhooks.deliver(self.pool, now=now), (2, 2))
+            delivery = subscription.deliveries.first()
+            self.assertEqual((delivery.status, delivery.attempts, delivery.last_error), ('pending', 1, 'HTTP 500'))
+            self.assertTrue(now + timedelta(seconds=30) <= delivery.next_attempt_at <= now + timedelta(seconds=33))
+            self.assertEqual(webhooks.deliver(self.pool, now=now), (0, 0))
+
+            later = delivery.next_attempt_at
+            webhooks.deliver(self.pool, now=later)
+            delivery.refresh_from_db()
+            self.assertTrue(later + timedelta(seconds=60) <= delivery.next_attempt_at <= later + timedelta(seconds=66))
+            webhooks.deliver(self.pool, now=delivery.next_attempt_at)
+            self.assertEqual(set(subscription.deliveries.values_list('status', 'attempts', 'last_error')), {('dead', 3, 'HTTP 502')})
+            self.assertEqual(webhooks.deliver(self.pool, now=now + timedelta(days=1)), (0, 0))
+
+            self.assertEqual(webhooks.redeliver(subscription), 2)
+            self.assertEqual(webhooks.deliver(self.pool), (2, 0))
+        self.assertEqual(set(subscription.deliveries.values_list('status', flat=True)), {'delivered'})
+        self.assertEqual(len(receiver.requests), 4)
+
+        self.pool.close()
+        unreachable = self.subscribe(receiver.url, project=self.other)  # The receiver has shut down.
+        self.publish(1, project=self.other)
+        webhooks.dispatch()
+        self.assertEqual(webhooks.deliver(self.pool), (1, 1))
+        self.assertIn("ConnectionRefusedError", unreachable.deliveries.get().last_error)
+
+    @override_settings(WEBHOOK_BATCH_SIZE=1, WEBHOOK_WORKERS=8)
+    def test_concurrency_limit(self):
+        """Test that no more than max_concurrency requests are in flight to one subscription."""
+        with WebhookReceiver(delay=0.1) as slow, WebhookReceiver(delay=0.1) as serial:
+            self.subscribe(slow.url, max_concurrency=3)
+            self.subscribe(serial.url, max_concurrency=1)
+            self.publish(8)
+            webhooks.dispatch()
+            self.assertEqual(webhooks.deliver(self.pool), (16, 0))
+        self.assertEqual((len(slow.requests), slow.max_in_flight, slow.connections), (8, 3, 3))
+        self.assertEqual((len(serial.requests), serial.max_in_flight, serial.connections), (8, 1, 1))
+
+    @override_settings(WEBHOOK_ALLOW_PRIVATE_URLS=False)
+    def test_private_addresses_are_refused(self):
+        """Test that subscriptions to non-public addresses are refused, and deliveries to them fail without connecting."""
+        self.authenticate(self.manager)
+        for url in ('http://127.0.0.1/hook', 'http://169.254.169.254/latest/meta-data/', 'http://10.0.0.5/hook',
+                    'http://[::1]/hook', 'http://[::ffff:192.168.0.1]/hook', 'ftp://93.184.216.34/hook'):
+            response = self.client.post('/api/webhooks/', {'url': url, 'project': self.project.id}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, url)
+            self.assertIn('url', response.data['message'])
+        response = self.client.post('/api/webhooks/', {'url': 'http://93.184.216.34/hook', 'project': self.project.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+
+        # Saved before the check existed, or resolving differently since: refused at connection time.
+        WebhookSubscription.objects.all().delete()
+        self.subscribe('http://127.0.0.1:9/hook')
+        self.publish(1)
+        webhooks.dispatch()
+        self.assertEqual(webhooks.deliver(self.pool), (1, 1))
+        self.assertEqual(self.pool.opened, 0)
+        self.assertIn('BlockedURL', WebhookDelivery.objects.get().last_error)
+
+    def test_api_and_command(self):
+        """Test subscription permissions, the deliveries list, redelivery and the delivery command."""
+        self.authenticate(self.developer)
+        response = self.client.post('/api/webhooks/', {'url': 'http://127.0.0.1/hook', 'project': self.project.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.authenticate(self.manager)
+        for data in ({'url': 'http://127.0.0.1/hook'}, {'url': 'http://127.0.0.1/hook', 'project': self.other.id}):
+            self.assertEqual(self.client.post('/api/webhooks/', data, format='json').status_code, status.HTTP_403_FORBIDDEN)
+        bad = self.client.post('/api/webhooks/', {'url': 'http://127.0.0.1/hook', 'project': self.project.id,
+                                                  'events': ['task.exploded']}, format='json')
+        self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with WebhookReceiver(statuses=[500]) as receiver:
+            response = self.client.post('/api/webhooks/', {'url': receiver.url, 'project': self.project.id,
+                                                           'events': ['task.updated', 'task.created']}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+            self.assertEqual(len(response.data['secret']), 64)
+            self.assertEqual(response.data['events'], ['task.created', 'task.updated'])
+            subscription_id = response.data['id']
+
+            self.client.patch(f'/api/tasks/{self.task.id}/', {'priority': 'High'})
+            with override_settings(WEBHOOK_MAX_ATTEMPTS=1):
+                out = StringIO()
+                call_command('deliver_webhooks', stdout=out)
+            self.assertIn("Dispatched 1 event(s), sent 1 delivery(ies) of which 1 failed", out.getvalue())
+
+            dead = self.client.get(f'/api/webhooks/{subscription_id}/deliveries/?status=dead')
+            self.assertEqual(dead.data['count'], 1)
+            self.assertEqual(dead.data['results'][0]['payload']['data']['priority'], 'High')
+            response = self.client.post(f'/api/webhooks/{subscription_id}/redeliver/', {'ids': [dead.data['results'][0]['id']]}, format='json')
+            self.assertEqual(response.data, {'queued': 1})
+            call_command('deliver_webhooks', stdout=StringIO())
+        self.assertEqual(len(receiver.requests), 2)
+        self.assertEqual(self.client.get(f'/api/webhooks/{subscription_id}/deliveries/?status=delivered').data['count'], 1)
+
+        self.authenticate(self.developer)
+        self.assertEqual(self.client.get(f'/api/webhooks/{subscription_id}/').status_code, status.HTTP_404_NOT_FOUND)
+        self.authenticate(self.admin)
+        self.assertEqual(self.client.get('/api/webhooks/').data['count'], 1)
+
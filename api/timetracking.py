@@ -0,0 +1,197 @@
+"""
+Time tracking.
+
+Users log minutes against tasks as TimeEntry rows. Reports never sum the
+entries: every entry write also applies its difference to the TimeRollup row
+of its (project, user, week) in the same transaction, so a report reads at
+most one row per project, user and week it covers.
+
+A rollup row is created with its first entry, updated with F() expressions
+(so concurrent writes add up instead of overwriting each other) and deleted
+with its last entry. `manage.py reconcile_time_rollups` recomputes the rollups
+from the entries with one GROUP BY per batch of projects and reports, or with
+--fix repairs, any rollup that drifted.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Project, TimeEntry, TimeRollup
+
+REPORT_FIELDS = ('project', 'user', 'week')
+
+
+def week_of(day):
+    """The Monday of the week `day` falls in."""
+    return day - timedelta(days=day.weekday())
+
+
+def rollup_key(entry):
+    return entry.project_id, entry.user_id, entry.week
+
+
+def apply(deltas):
+    """
+    Add {(project id, user id, week): (minutes, entries)} to the rollups, in
+    one UPDATE per key, and drop the rows that no longer count any entry.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    TimeRollup.objects.bulk_create(
+        [TimeRollup(project_id=project_id, user_id=user_id, week=week) for project_id, user_id, week in deltas],
+        ignore_conflicts=True,
+    )
+    emptied = Q()
+    for (project_id, user_id, week), (minutes, entries) in deltas.items():
+        key = Q(project_id=project_id, user_id=user_id, week=week)
+        TimeRollup.objects.filter(key).update(minutes=F('minutes') + minutes, entries=F('entries') + entries)
+        if entries < 0:
+            emptied |= key
+    if emptied:
+        TimeRollup.objects.filter(emptied, entries__lte=0).delete()
+
+
+def create_entries(entries):
+    """
+    Save new TimeEntry instances and add them to their rollups.
+    """
+    deltas = defaultdict(lambda: (0, 0))
+    for entry in entries:
+        entry.week = week_of(entry.date)
+        minutes, count = deltas[rollup_key(entry)]
+        deltas[rollup_key(entry)] = (minutes + entry.minutes, count + 1)
+    with transaction.atomic():
+        entries = TimeEntry.objects.bulk_create(entries)
+        apply(deltas)
+    return entries
+
+
+def update_entry(entry, **fields):
+    """
+    Change an entry and move its time between rollups if its week or minutes changed.
+    """
+    before_key, before_minutes = rollup_key(entry), entry.minutes
+    for field, value in fields.items():
+        setattr(entry, field, value)
+    entry.week = week_of(entry.date)
+    with transaction.atomic():
+        entry.save()
+        if rollup_key(entry) == before_key:
+            apply({before_key: (entry.minutes - before_minutes, 0)})
+        else:
+            apply({before_key: (-before_minutes, -1), rollup_key(entry): (entry.minutes, 1)})
+    return entry
+
+
+def delete_entry(entry):
+    with transaction.atomic():
+        entry.delete()
+        apply({rollup_key(entry): (-entry.minutes, -1)})
+
+
+def move_to_project(task):
+    """
+    Keep the time logged against a task with it when it changes project, moving
+    the minutes from the old project's rollups to the new one's.
+    """
+    deltas = defaultdict(lambda: (0, 0))
+    with transaction.atomic():
+        entries = list(TimeEntry.objects.select_for_update().filter(task_id=task.pk).exclude(project_id=task.project_id)
+                       .only('id', 'project_id', 'user_id', 'week', 'minutes'))
+        if not entries:
+            return
+        for entry in entries:
+            for key, sign in ((rollup_key(entry), -1), ((task.project_id, entry.user_id, entry.week), 1)):
+                minutes, count = deltas[key]
+                deltas[key] = (minutes + sign * entry.minutes, count + sign)
+        TimeEntry.objects.filter(id__in=[entry.id for entry in entries]).update(project_id=task.project_id)
+        apply(deltas)
+
+
+def report(rollups, group_by):
+    """
+    Total minutes and entries of `rollups` per combination of `group_by` fields
+    (a subset of REPORT_FIELDS), plus the overall total. Without `group_by`,
+    only the total.
+    """
+    columns = [f'{field}_id' if field != 'week' else field for field in group_by]
+    rows = []
+    if columns:
+        rows = rollups.values(*columns).annotate(total_minutes=Sum('minutes'), total_entries=Sum('entries')).order_by(*columns)
+    totals = rollups.aggregate(total_minutes=Sum('minutes'), total_entries=Sum('entries'))
+    return {
+        'total': _amounts(totals['total_minutes'] or 0, totals['total_entries'] or 0),
+        'rows': [
+            {**{field: row[column] for field, column in zip(group_by, columns)},
+             **_amounts(row['total_minutes'], row['total_entries'])}
+            for row in rows
+        ],
+    }
+
+
+def _amounts(minutes, entries):
+    return {'minutes': minutes, 'hours': round(minutes / 60, 2), 'entries': entries}
+
+
+def reconcile(project_ids=None, fix=False, batch_size=100):
+    """
+    Compare the rollups of `project_ids` (default: every project with time
+    logged) with totals recomputed from the entries, a batch of projects at a
+    time. Returns the drifted rollups; with `fix`, also rewrites them.
+
+    Entries written while a batch is checked may show up as drift; run again
+    to tell those apart from real drift.
+    """
+    if project_ids is None:
+        project_ids = sorted(
+            set(TimeEntry.objects.values_list('project_id', flat=True).distinct())
+            | set(TimeRollup.objects.values_list('project_id', flat=True).distinct())
+        )
+    drift = []
+    for start in range(0, len(project_ids), batch_size):
+        drift += _reconcile_batch(project_ids[start:start + batch_size], fix)
+    return drift
+
+
+def _reconcile_batch(project_ids, fix):
+    with transaction.atomic():
+        stored = {
+            rollup_key(rollup): rollup
+            for rollup in TimeRollup.objects.select_for_update().filter(project_id__in=project_ids)
+        }
+        actual = {
+            (row['project_id'], row['user_id'], row['week']): (row['total_minutes'], row['total_entries'])
+            for row in TimeEntry.objects.filter(project_id__in=project_ids)
+            .values('project_id', 'user_id', 'week')
+            .annotate(total_minutes=Sum('minutes'), total_entries=Count('id'))
+        }
+        drift, missing, changed = [], [], []
+        for key in sorted(stored.keys() | actual.keys()):
+            rollup = stored.get(key)
+            stored_amounts = (rollup.minutes, rollup.entries) if rollup else (0, 0)
+            actual_amounts = actual.get(key, (0, 0))
+            if stored_amounts == actual_amounts:
+                continue
+            project_id, user_id, week = key
+            drift.append({'project': project_id, 'user': user_id, 'week': week.isoformat(),
+                          'stored_minutes': stored_amounts[0], 'actual_minutes': actual_amounts[0],
+                          'stored_entries': stored_amounts[1], 'actual_entries': actual_amounts[1]})
+            if rollup is None:
+                missing.append(TimeRollup(project_id=project_id, user_id=user_id, week=week,
+                                          minutes=actual_amounts[0], entries=actual_amounts[1]))
+            else:
+                rollup.minutes, rollup.entries = actual_amounts
+                changed.append(rollup)
+        if fix:
+            TimeRollup.objects.filter(pk__in=[rollup.pk for rollup in changed if not rollup.entries]).delete()
+            TimeRollup.objects.bulk_update([rollup for rollup in changed if rollup.entries], ['minutes', 'entries'])
+            TimeRollup.objects.bulk_create(missing)
+    return drift
+
+
+def visible_projects(user):
+    """Ids of the projects a user manages or belongs to."""
+    return Project.objects.filter(Q(members=user) | Q(manager=user)).values('id')
@@ -0,0 +1,247 @@
+"""
+Refresh-token revocation.
+
+Revoked refresh tokens are stored by jti in the RevokedToken table until they
+expire. Each process keeps a Bloom filter of the revoked jtis, so checking a
+token that was never revoked (the usual case) needs no query; only a filter
+hit is confirmed against the database. A revocation counter in the shared
+cache tells other processes to pull newly revoked jtis into their filter, at
+most once every TOKEN_REVOCATION_SYNC_SECONDS. A sync reads the rows revoked
+since the newest one it has seen, less TOKEN_REVOCATION_SYNC_MARGIN_SECONDS:
+rows are stamped before they commit, so one stamped earlier may become visible
+after a later one has already been read.
+
+Every token also carries the user's token version; bumping the version
+(revoke_user_tokens) invalidates all of the user's refresh and access tokens
+at once without listing them.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import RevokedToken, User
+
+VERSION_CLAIM = 'ver'
+GENERATION_KEY = 'token-revocation:generation'
+EPOCH_KEY = 'token-revocation:epoch'
+
+
+def version_key(user_id):
+    return f'token-version:{user_id}'
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings, sized for `capacity` entries at the
+    given false-positive rate.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevocationList:
+    """
+    Process-local view of the revoked jtis, kept in sync with the database.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.watermark = None
+        self.generation = None
+        self.epoch = None
+        self.synced_at = 0.0
+
+    def _rebuild(self, epoch):
+        self.filter = BloomFilter(settings.TOKEN_REVOCATION_CAPACITY, settings.TOKEN_REVOCATION_ERROR_RATE)
+        self.watermark = None
+        self.epoch = epoch
+
+    def sync(self):
+        generation, epoch = cache.get(GENERATION_KEY, 0), cache.get(EPOCH_KEY, 0)
+        # A counter that went backwards means the cache was flushed; start over.
+        flushed = generation < (self.generation or 0)
+        if self.filter is not None and epoch == self.epoch and not flushed:
+            if generation == self.generation:
+                return
+            if time.monotonic() - self.synced_at < settings.TOKEN_REVOCATION_SYNC_SECONDS:
+                return
+        with self.lock:
+            if self.filter is None or epoch != self.epoch or flushed:
+                self._rebuild(epoch)
+            rows = RevokedToken.objects.filter(expires_at__gt=timezone.now())
+            if self.watermark is not None:
+                margin = timedelta(seconds=settings.TOKEN_REVOCATION_SYNC_MARGIN_SECONDS)
+                rows = rows.filter(revoked_at__gte=self.watermark - margin)
+            for jti, revoked_at in rows.values_list('jti', 'revoked_at').iterator(chunk_size=10000):
+                self.filter.add(jti)
+                self.watermark = max(self.watermark or revoked_at, revoked_at)
+            self.generation = generation
+            self.synced_at = time.monotonic()
+
+    def add(self, jti):
+        with self.lock:
+            if self.filter is not None:
+                self.filter.add(jti)
+
+    def __contains__(self, jti):
+        self.sync()
+        if jti not in self.filter:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+
+_revoked = RevocationList()
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def is_revoked(jti):
+    return jti in _revoked
+
+
+def revoke(token):
+    """
+    Revoke a single refresh token until it expires.
+    Returns False if it had already been revoked.
+    """
+    jti = token[api_settings.JTI_CLAIM]
+    expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+    except IntegrityError:
+        return False
+    _revoked.add(jti)
+    _bump(GENERATION_KEY)
+    return True
+
+
+def purge_expired(batch_size=10000):
+    """
+    Delete revoked tokens that have expired anyway, in batches. Returns the number deleted.
+    """
+    deleted = 0
+    now = timezone.now()
+    while True:
+        ids = list(RevokedToken.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted += RevokedToken.objects.filter(id__in=ids).delete()[0]
+    if deleted:
+        # Bloom filters cannot forget entries; have every process rebuild its filter.
+        _bump(EPOCH_KEY)
+    return deleted
+
+
+def token_version(user_id):
+    """
+    Current token version of an active user, or None if the user is gone or inactive.
+    """
+    key = version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = User.objects.filter(pk=user_id, is_active=True).values_list('token_version', flat=True).first()
+        version = -1 if version is None else version
+        cache.set(key, version, settings.TOKEN_VERSION_CACHE_SECONDS)
+    return None if version < 0 else version
+
+
+def forget_token_version(sender, instance, **kwargs):
+    """
+    post_save handler for users: deactivation or a version change takes effect immediately.
+    """
+    cache.delete(version_key(instance.pk))
+
+
+def revoke_user_tokens(user):
+    """
+    Invalidate every refresh and access token issued to the user so far.
+    """
+    User.objects.filter(pk=user.pk).update(token_version=F('token_version') + 1)
+    user.refresh_from_db(fields=['token_version'])
+    cache.delete(version_key(user.pk))
+
+
+class VersionedRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the user's token version; access tokens derived from it copy the claim.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[VERSION_CLAIM] = user.token_version
+        return token
+
+
+def rotate(raw_token):
+    """
+    Validate a refresh token and return new tokens as {'access': ..., 'refresh': ...}.
+    With ROTATE_REFRESH_TOKENS a new refresh token is issued, and with
+    BLACKLIST_AFTER_ROTATION the old one is revoked.
+    Raises TokenError for invalid or expired tokens and AuthenticationFailed for
+    revoked ones.
+    """
+    refresh = VersionedRefreshToken(raw_token)
+    version = token_version(refresh[api_settings.USER_ID_CLAIM])
+    if version is None:
+        raise AuthenticationFailed("No active account found for the given token.", code='no_active_account')
+    if refresh.get(VERSION_CLAIM, 0) != version or is_revoked(refresh[api_settings.JTI_CLAIM]):
+        raise AuthenticationFailed("Token has been revoked.", code='token_revoked')
+
+    data = {'access': str(refresh.access_token)}
+    if api_settings.ROTATE_REFRESH_TOKENS:
+        # Revoking is the atomic step: of two concurrent refreshes with the same token, one fails.
+        if api_settings.BLACKLIST_AFTER_ROTATION and not revoke(refresh):
+            raise AuthenticationFailed("Token has been revoked.", code='token_revoked')
+        refresh.set_jti()
+        refresh.set_exp()
+        refresh.set_iat()
+        data['refresh'] = str(refresh)
+    return data
+
+
+class VersionedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that also rejects access tokens issued before the user's
+    sessions were revoked. The user row is loaded anyway, so this costs nothing.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        if validated_token.get(VERSION_CLAIM, 0) != user.token_version:
+            raise AuthenticationFailed("Token has been revoked.", code='token_revoked')
+        return user
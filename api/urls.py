@@ -1,7 +1,7 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserViewSet, AuthViewSet, TaskViewSet, CommentViewSet, ProjectViewSet
-from api.swagger import schema_view
+from .views import UserViewSet, AuthViewSet, TaskViewSet, CommentViewSet, ProjectViewSet, TaskDependencyViewSet, NotificationViewSet, BatchViewSet, AttachmentViewSet, UploadViewSet, ProfileViewSet, RecurringTaskViewSet, TimeEntryViewSet, WebhookSubscriptionViewSet
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='users')
@@ -9,9 +9,35 @@ router.register(r'auth', AuthViewSet, basename='auth')
 router.register(r'tasks', TaskViewSet, basename='tasks')
 router.register(r'comments', CommentViewSet, basename='comments')
 router.register(r'projects', ProjectViewSet, basename='projects')
+router.register(r'dependencies', TaskDependencyViewSet, basename='dependencies')
+router.register(r'recurring-tasks', RecurringTaskViewSet, basename='recurring-tasks')
+router.register(r'time-entries', TimeEntryViewSet, basename='time-entries')
+router.register(r'webhooks', WebhookSubscriptionViewSet, basename='webhooks')
+router.register(r'notifications', NotificationViewSet, basename='notifications')
+router.register(r'batch', BatchViewSet, basename='batch')
+router.register(r'attachments', AttachmentViewSet, basename='attachments')
+router.register(r'uploads', UploadViewSet, basename='uploads')
+router.register(r'profiles', ProfileViewSet, basename='profiles')
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('swagger/', schema_view.with_ui('swagger',
-                                         cache_timeout=0), name='schema-swagger-ui'),
-]
\ No newline at end of file
+]
+
+_swagger_ui = None
+
+
+def swagger_ui(request, *args, **kwargs):
+    """
+    Swagger UI, importing drf_yasg on the first request rather than at startup.
+    """
+    global _swagger_ui
+    if _swagger_ui is None:
+        from api.swagger import document_query_parameters, schema_view
+
+        document_query_parameters(viewset for _, viewset, _ in router.registry)
+        _swagger_ui = schema_view.with_ui('swagger', cache_timeout=0)
+    return _swagger_ui(request, *args, **kwargs)
+
+
+if settings.API_DOCS_ENABLED:
+    urlpatterns.append(path('swagger/', swagger_ui, name='schema-swagger-ui'))
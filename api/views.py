@@ -1,27 +1,215 @@
 from rest_framework import status, viewsets, serializers
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework.permissions import AllowAny, IsAuthenticated, SAFE_METHODS
 from rest_framework.decorators import action
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from .serializers import UserSerializer, SignupSerializer, LoginSerializer, ProjectSerializer, TaskSerializer, CommentSerializer
+from .serializers import UserSerializer, SignupSerializer, LoginSerializer, ProjectSerializer, TaskSerializer, CommentSerializer, ArchivedTaskSerializer, ActivitySerializer, TaskDependencySerializer, NotificationSerializer, AttachmentSerializer, UploadSerializer, BulkTagSerializer, BulkUserSerializer, RecurringTaskSerializer, TimeEntrySerializer, TimeReportSerializer, WebhookSubscriptionSerializer, WebhookDeliverySerializer
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.models import User
-from .models import User, Project, Task, Comment
+from .models import User, Project, Task, Comment, ArchivedTask, Activity, TaskDependency, Notification, Attachment, Upload, RecurringTask, TimeEntry, TimeRollup, WebhookSubscription
+from . import activity as activity_log
+from . import notifications
+from . import board as task_board
+from . import profiling
+from . import ranking
+from . import tags as task_tags
+from . import timetracking
+from .filters import TaskFilter, TaskFilterBackend
+from .status_history import record_status_change, project_flow_report, parse_range
+from . import graph as task_graph
+from . import db_routers
+from . import sharding
+from . import tokens
+from .tokens import VersionedJWTAuthentication
 from .permissions import IsAdminUser  # Custom permission class
 import logging
+from django.http import FileResponse, StreamingHttpResponse
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
+from django.db import router, transaction
+from django.db.models import Value, BooleanField, Q
+from django.utils.http import parse_etags
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import OrderingFilter, SearchFilter
 from django_filters.rest_framework import DjangoFilterBackend
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
+from .docs import query_parameters, STRING, INTEGER, BOOLEAN
 
 logger = logging.getLogger(__name__)
 
-class UserViewSet(viewsets.ModelViewSet):
-    authentication_classes = [JWTAuthentication]
+
+class ProfilingMixin:
+    """
+    Let admins run a request under a profiler with `X-Profile: sample|trace`
+    (or ?profile=); see api/profiling.py. Without the flag, dispatch is unchanged.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        mode = profiling.requested_mode(request)
+        if mode is None:
+            return super().dispatch(request, *args, **kwargs)
+        return profiling.profile(self, super().dispatch, request, mode, *args, **kwargs)
+
+
+class ReplicaReadMixin:
+    """
+    Serve list and retrieve from the read replicas, except for users who wrote
+    recently and are pinned to the primary to read their own writes.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (request.method in SAFE_METHODS and self.action in self.replica_actions
+                and not db_routers.is_pinned(request.user)):
+            self._replica_token = db_routers.use_replica()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            db_routers.reset_replica(token)
+            self._replica_token = None
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            db_routers.pin_to_primary(getattr(request, 'user', None))
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ShardRoutingMixin:
+    """
+    Run the request's task and comment queries on the shard that holds them:
+    the shard of the addressed row, of the project being written to, or of the
+    ?project= filter. Lists that span projects are gathered from every shard
+    and merged on the ?ordering= the OrderingFilter resolved.
+    """
+
+    def shard_for_data(self, data):
+        return sharding.shard_for_project(data.get('project'))
+
+    def shard_for_request(self, request):
+        pk = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if pk is not None:
+            return sharding.locate(self.queryset.model, pk)
+        if request.method == 'POST':
+            return self.shard_for_data(request.data)
+        if request.query_params.get('project'):
+            return sharding.shard_for_project(request.query_params['project'])
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if sharding.enabled():
+            alias = self.shard_for_request(request)
+            if alias is not None:
+                self._shard_token = db_routers.use_shard(alias)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_shard_token', None)
+        if token is not None:
+            db_routers.reset_shard(token)
+            self._shard_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        if not sharding.enabled() or getattr(self, '_shard_token', None) is not None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            rows = sharding.ScatterGather(queryset, self.merge_ordering(request, queryset))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        page = self.paginate_queryset(rows)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    def merge_ordering(self, request, queryset):
+        """
+        The ordering the OrderingFilter resolved (id when there is none), with
+        the id as a tie-breaker so that pages are stable across shards.
+        """
+        ordering = None
+        for backend in self.filter_backends:
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, self)
+        ordering = list(ordering or ['pk'])
+        if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+            ordering.append('-pk' if ordering[0].startswith('-') else 'pk')
+        return ordering
+
+
+class ConditionalRequestMixin:
+    """
+    ETags for single objects, derived from `etag_field` (a timestamp or version
+    counter). Retrieve answers If-None-Match with 304 from a one-column query,
+    without loading or serializing the object. Update and destroy honour
+    If-Match: the row is locked, its current ETag compared, and a mismatch
+    returns 412 instead of overwriting someone else's change.
+    """
+    etag_field = 'updated_at'
+
+    def make_etag(self, pk, value):
+        if hasattr(value, 'timestamp'):
+            value = int(value.timestamp() * 1_000_000)
+        return f'"{pk}-{value}"'
+
+    def current_etag(self, lock=False):
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        queryset = self.filter_queryset(self.get_queryset())
+        if lock:
+            queryset = queryset.select_for_update()
+        value = queryset.filter(pk=pk).values_list(self.etag_field, flat=True).first()
+        return None if value is None else self.make_etag(pk, value)
+
+    def precondition_failed(self, request):
+        if_match = request.headers.get('If-Match')
+        if not if_match:
+            return None
+        current = self.current_etag(lock=True)
+        if current is None:
+            return None  # Let the view answer 404.
+        etags = parse_etags(if_match)
+        if '*' in etags or current in etags:
+            return None
+        return Response({'error': 'The object has been modified since it was fetched.'},
+                        status=status.HTTP_412_PRECONDITION_FAILED, headers={'ETag': current})
+
+    def retrieve(self, request, *args, **kwargs):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            current = self.current_etag()
+            etags = [etag.removeprefix('W/') for etag in parse_etags(if_none_match)]
+            if current is not None and ('*' in etags or current in etags):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': current})
+        response = super().retrieve(request, *args, **kwargs)
+        return self.with_etag(response)
+
+    def get_object(self):
+        self.etag_object = super().get_object()
+        return self.etag_object
+
+    def with_etag(self, response):
+        obj = getattr(self, 'etag_object', None)
+        if obj is not None and response.status_code == status.HTTP_200_OK:
+            response['ETag'] = self.make_etag(obj.pk, getattr(obj, self.etag_field))
+        return response
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic(using=router.db_for_write(self.queryset.model)):
+            failed = self.precondition_failed(request)
+            if failed is not None:
+                return failed
+            response = super().update(request, *args, **kwargs)
+        return self.with_etag(response)
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic(using=router.db_for_write(self.queryset.model)):
+            failed = self.precondition_failed(request)
+            if failed is not None:
+                return failed
+            return super().destroy(request, *args, **kwargs)
+
+
+class UserViewSet(ProfilingMixin, ReplicaReadMixin, viewsets.ModelViewSet):
+    authentication_classes = [VersionedJWTAuthentication]
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]  # Ensure only Admins can access
@@ -76,8 +264,35 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response(status=status.HTTP_404_NOT_FOUND)
 
 
-class AuthViewSet(viewsets.ViewSet):
-    authentication_classes = [JWTAuthentication]  # Add for token verification
+    @action(detail=True, methods=['post'], url_path='revoke-sessions')
+    def revoke_sessions(self, request, pk=None):
+        """
+        Revoke every refresh and access token of the user (Admins only).
+        """
+        if request.user.role != 'Admin':
+            return Response({'error': 'Sorry, you don\'t have privileges.'}, status=status.HTTP_403_FORBIDDEN)
+        tokens.revoke_user_tokens(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Provision many users at once (Admins only). Passwords are hashed in
+        parallel and the users are inserted together; the response has one
+        result per row, so a bad or duplicate row does not stop the others.
+        """
+        from . import provisioning
+        if request.user.role != 'Admin':
+            return Response({'error': 'Sorry, you don\'t have privileges.'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = BulkUserSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = provisioning.provision(serializer.validated_data['users'], serializer.validated_data.get('role'))
+        created = sum(result['status'] == 'created' for result in results)
+        return Response({'created': created, 'failed': len(results) - created, 'results': results})
+
+
+class AuthViewSet(ProfilingMixin, viewsets.ViewSet):
+    authentication_classes = [VersionedJWTAuthentication]  # Add for token verification
     permission_classes = [AllowAny]
 
    
@@ -106,7 +321,7 @@ class AuthViewSet(viewsets.ViewSet):
             try:
                 user = User.objects.get(email=email)
                 if user.check_password(password):
-                    refresh = RefreshToken.for_user(user)
+                    refresh = tokens.VersionedRefreshToken.for_user(user)
                     userA = authenticate(username=email, password=password)
                     if userA is not None:
                         login(request,userA)
@@ -126,9 +341,41 @@ class AuthViewSet(viewsets.ViewSet):
                 return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], url_path='refresh')
+    def refresh(self, request):
+        """
+        Exchange a refresh token for a new access token (and, with rotation, a new refresh token).
+        """
+        raw_token = request.data.get('refresh')
+        if not raw_token:
+            return Response({'refresh': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(tokens.rotate(raw_token))
+        except TokenError:
+            return Response({'error': 'Invalid or expired refresh token.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    @action(detail=False, methods=['post'], url_path='logout')
+    def logout(self, request):
+        """
+        Revoke the given refresh token.
+        """
+        try:
+            tokens.revoke(tokens.VersionedRefreshToken(request.data.get('refresh', '')))
+        except TokenError:
+            return Response({'error': 'Invalid or expired refresh token.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['post'], url_path='logout-all')
+    def logout_all(self, request):
+        """
+        Revoke every refresh and access token of the logged-in user.
+        """
+        if not request.user.is_authenticated:
+            return Response({'error': 'User is not authenticated. Please log in.'}, status=status.HTTP_401_UNAUTHORIZED)
+        tokens.revoke_user_tokens(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     def list(self, request):
-        # Debug the Authorization header
-        print("Authorization Header:", request.headers.get('Authorization'))
         # Check if the user is authenticated
         if request.user.is_authenticated:
             return Response({"message": "Welcome Back!"}, status=status.HTTP_200_OK)
@@ -143,12 +390,70 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ActivityLogMixin:
+    """
+    Record field-level diffs of every write into the buffered activity log, and
+    publish every write as a webhook event through the outbox (api/webhooks.py).
+    Viewsets call record_activity('created', ...) from their own perform_create;
+    updates and deletes are captured here. Each write runs in one transaction on
+    the database it writes to, so its outbox event commits or rolls back with it.
+    """
+    activity_target_type = None
+
+    def activity_project_id(self, instance):
+        return instance.project_id
+
+    def write_alias(self):
+        return router.db_for_write(self.queryset.model)
+
+    def create(self, request, *args, **kwargs):
+        with transaction.atomic(using=self.write_alias()):
+            return super().create(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic(using=self.write_alias()):
+            return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic(using=self.write_alias()):
+            return super().destroy(request, *args, **kwargs)
+
+    def record_activity(self, action, instance, before=None):
+        from . import webhooks
+        after = self.get_serializer_class()(instance).data
+        project_id = self.activity_project_id(instance)
+        activity_log.record(
+            actor=self.request.user,
+            action=action,
+            target_type=self.activity_target_type,
+            target_id=instance.pk,
+            project_id=project_id,
+            changes=activity_log.diff(before or {}, after),
+            using=self.write_alias(),
+        )
+        webhooks.publish(self.activity_target_type, action, instance.pk, project_id, after, using=self.write_alias())
+
+    def perform_update(self, serializer):
+        before = self.get_serializer_class()(serializer.instance).data
+        super().perform_update(serializer)
+        self.record_activity('updated', serializer.instance, before=before)
+
+    def perform_destroy(self, instance):
+        from . import webhooks
+        before = self.get_serializer_class()(instance).data
+        target_id, project_id = instance.pk, self.activity_project_id(instance)
+        super().perform_destroy(instance)
+        activity_log.record(self.request.user, 'deleted', self.activity_target_type, target_id, project_id,
+                            activity_log.diff(before, {}), using=self.write_alias())
+        webhooks.publish(self.activity_target_type, 'deleted', target_id, project_id, before, using=self.write_alias())
+
+
+class ProjectViewSet(ProfilingMixin, ConditionalRequestMixin, ReplicaReadMixin, ActivityLogMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing projects.
     Provides CRUD operations for projects with role-based access control.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [VersionedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
@@ -156,6 +461,11 @@ class ProjectViewSet(viewsets.ModelViewSet):
     filter_backends = [SearchFilter, DjangoFilterBackend]
     search_fields = ['name', 'description']  # Enable search by name and description
     filterset_fields = ['manager', 'members']  # Enable filtering by manager and members
+    activity_target_type = 'project'
+    etag_field = 'version'
+
+    def activity_project_id(self, instance):
+        return instance.pk
 
     def get_queryset(self):
         """
@@ -172,6 +482,7 @@ class ProjectViewSet(viewsets.ModelViewSet):
         Automatically set the manager to the logged-in user when creating a project.
         """
         serializer.save(manager=self.request.user)
+        self.record_activity('created', serializer.instance)
 
     def update(self, request, *args, **kwargs):
         """
@@ -191,13 +502,114 @@ class ProjectViewSet(viewsets.ModelViewSet):
             return Response({'error': 'You do not have permission to delete this project.'}, status=status.HTTP_403_FORBIDDEN)
         return super().destroy(request, *args, **kwargs)
 
+    @action(detail=True, methods=['get'], url_path='report')
+    def report(self, request, pk=None):
+        """
+        Burndown, cumulative flow and lead/cycle-time percentiles for a date range.
+        Defaults to the last 30 days.
+        """
+        project = self.get_object()
+        params = request.query_params
+        try:
+            start = parse_date(params['start']) if 'start' in params else None
+            end = parse_date(params['end']) if 'end' in params else None
+            if ('start' in params and start is None) or ('end' in params and end is None):
+                raise ValueError
+        except ValueError:
+            return Response({'error': 'start and end must be dates in YYYY-MM-DD format.'}, status=status.HTTP_400_BAD_REQUEST)
+        start, end = parse_range(start, end)
+        if start > end or (end - start).days >= 731:
+            return Response({'error': 'The date range must be between 1 and 731 days.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(project_flow_report(project, start, end))
+
+    @action(detail=True, methods=['get'], url_path='schedule')
+    def schedule(self, request, pk=None):
+        """
+        Topological order of the project's tasks and the critical path through its open tasks.
+        """
+        project = self.get_object()
+        return Response({'project': project.id, **task_graph.project_schedule(project.id)})
+
+    @query_parameters(
+        ('limit', "Tasks per column (default 20, at most 100)", INTEGER),
+        ('status', "Return only this column", STRING),
+        ('cursor', "Continue the column after this cursor (requires status)", STRING),
+    )
+    @action(detail=True, methods=['get'], url_path='board')
+    def board(self, request, pk=None):
+        """
+        The project's tasks grouped into status columns, with per-column totals
+        and cursors, in one query. Tasks are scoped like the task list.
+        """
+        project = self.get_object()
+        params = request.query_params
+        tasks = TaskViewSet.visible_to(request.user).using(sharding.shard_for_project(project.id)).prefetch_related('tags')
+        try:
+            columns = task_board.board(tasks.filter(project_id=project.id), task_board.parse_limit(params.get('limit')),
+                                       params.get('status'), params.get('cursor'))
+        except task_board.BoardError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        for column in columns:
+            column['tasks'] = TaskSerializer(column['tasks'], many=True).data
+        return Response({'project': project.id, 'columns': columns})
+
+    @action(detail=True, methods=['get'])
+    def tags(self, request, pk=None):
+        """
+        The project's tags with the number of tasks carrying each, most used first.
+        Counted over the tasks the user can see.
+        """
+        project = self.get_object()
+        visible = None
+        if request.user.role not in ['Admin', 'Project Manager']:
+            visible = TaskViewSet.visible_to(request.user)
+        return Response({'project': project.id, 'tags': task_tags.project_counts(project.id, visible)})
+
+    @action(detail=True, methods=['get'])
+    def snapshot(self, request, pk=None):
+        """
+        Stream a compressed snapshot of the project, its members, tasks, tags
+        and comments (see api/snapshots.py). Project manager or admin only.
+        """
+        from . import snapshots
+        project = self.get_object()
+        if request.user != project.manager and request.user.role != 'Admin':
+            return Response({'error': 'You do not have permission to export this project.'}, status=status.HTTP_403_FORBIDDEN)
+        response = StreamingHttpResponse(snapshots.export(project), content_type='application/gzip')
+        response['Content-Disposition'] = f'attachment; filename="project-{project.pk}.tmsnap.gz"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAdminUser])
+    def import_snapshot(self, request):
+        """
+        Create a new project from an uploaded snapshot (`snapshot` file field,
+        optional `name`). Admin only.
+        """
+        from . import snapshots
+        upload = request.FILES.get('snapshot')
+        if upload is None:
+            return Response({'error': 'Upload the snapshot file as "snapshot".'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            project, counts = snapshots.restore(upload, request.data.get('name') or None)
+        except snapshots.SnapshotError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'project': ProjectSerializer(project).data, 'restored': counts}, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'], url_path='activity')
+    def activity(self, request, pk=None):
+        """
+        Paginated activity feed for the project, newest first.
+        """
+        project = self.get_object()
+        queryset = Activity.objects.filter(project=project).order_by('-created_at', '-id')
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(ActivitySerializer(page, many=True).data)
+
     @method_decorator(cache_page(60 * 25))  # Cache for 15 minutes
-    @swagger_auto_schema(
-        manual_parameters=[
-            openapi.Parameter('search', openapi.IN_QUERY, description="Search query", type=openapi.TYPE_STRING),
-            openapi.Parameter('manager', openapi.IN_QUERY, description="Filter by manager ID", type=openapi.TYPE_INTEGER),
-            openapi.Parameter('members', openapi.IN_QUERY, description="Filter by member ID", type=openapi.TYPE_INTEGER),
-        ]
+    @query_parameters(
+        ('search', "Search query", STRING),
+        ('manager', "Filter by manager ID", INTEGER),
+        ('members', "Filter by member ID", INTEGER),
     )
     def list(self, request, *args, **kwargs):
         """
@@ -206,40 +618,117 @@ class ProjectViewSet(viewsets.ModelViewSet):
         return super().list(request, *args, **kwargs)
 
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(ProfilingMixin, ShardRoutingMixin, ConditionalRequestMixin, ReplicaReadMixin, ActivityLogMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing tasks.
     Provides CRUD operations for tasks with role-based access control.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [VersionedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     pagination_class = StandardResultsSetPagination
-    filter_backends = [SearchFilter, DjangoFilterBackend]
+    filter_backends = [SearchFilter, TaskFilterBackend, OrderingFilter]
     search_fields = ['title', 'description']  # Enable search by title and description
-    filterset_fields = ['status', 'priority', 'project', 'assigned_to']  # Enable filtering by status, priority, project, and assigned user
+    filterset_class = TaskFilter  # Filter by status, priority, project, assigned user and tags
+    ordering_fields = ['rank', 'id', 'created_at', 'updated_at']  # ?ordering=rank uses the (project, rank) index
+    activity_target_type = 'task'
 
     def get_queryset(self):
         """
         Restrict the queryset based on the user's role.
         Admins and project managers can see all tasks, while other roles see only their assigned tasks.
         """
-        user = self.request.user
+        return self.visible_to(self.request.user).prefetch_related('tags')
+
+    @staticmethod
+    def visible_to(user):
+        """
+        Tasks the user may see, shared with the project board.
+        """
         if user.role in ['Admin', 'Project Manager']:
             return Task.objects.all()
         return Task.objects.filter(assigned_to=user)
 
+    def get_archived_queryset(self):
+        """
+        Archived tasks visible to the user, scoped by the same role rules as get_queryset.
+        """
+        user = self.request.user
+        if user.role in ['Admin', 'Project Manager']:
+            return ArchivedTask.objects.all()
+        return ArchivedTask.objects.filter(assigned_to=user)
+
+    def include_archived(self):
+        return self.request.query_params.get('include_archived', '').lower() in ('true', '1')
+
     def perform_create(self, serializer):
         """
         Automatically set the creator as the assigned user if not provided.
         """
         serializer.save()
+        task = serializer.instance
+        record_status_change(task, None, task.status)
+        task_graph.invalidate_graph(task.project_id)
+        self.record_activity('created', task)
+        if task.assigned_to_id:
+            notifications.notify(self.request.user, 'assigned', {task.assigned_to_id}, task.project_id, task.id)
+
+    def perform_update(self, serializer):
+        """
+        Record a status transition whenever the update changes the task status,
+        and drop cached dependency schedules that depend on it. A task moved to
+        another project loses its dependencies; its tags and logged time go with it.
+        A new assignee is told about the assignment, other followers about the update.
+        """
+        old_status, old_project_id = serializer.instance.status, serializer.instance.project_id
+        old_assignee_id = serializer.instance.assigned_to_id
+        new_project = serializer.validated_data.get('project')
+        if new_project is not None and new_project.pk != old_project_id:
+            serializer.instance.rank = ''  # Re-ranked at the end of the new project on save.
+        super().perform_update(serializer)
+        task = serializer.instance
+        if task.project_id != old_project_id:
+            # Dependencies only link tasks of one project, so a moved task leaves its own behind.
+            TaskDependency.objects.filter(Q(task=task) | Q(depends_on=task)).delete()
+            task_tags.move_to_project(task)
+            timetracking.move_to_project(task)
+            sharding.move_task(task, sharding.shard_for_project(task.project_id))
+            task_graph.invalidate_graph(old_project_id)
+            task_graph.invalidate_graph(task.project_id)
+        if task.status != old_status:
+            record_status_change(task, old_status, task.status)
+            task_graph.invalidate_schedule(task.project_id)
+        followers = notifications.followers(task.project_id, task)
+        if task.assigned_to_id and task.assigned_to_id != old_assignee_id:
+            notifications.notify(self.request.user, 'assigned', {task.assigned_to_id}, task.project_id, task.id)
+            followers.discard(task.assigned_to_id)
+        notifications.notify(self.request.user, 'updated', followers, task.project_id, task.id)
+
+    def perform_destroy(self, instance):
+        from . import attachments
+        record_status_change(instance, instance.status, None)
+        attachments.detach(task=instance)
+        project_id = instance.project_id
+        super().perform_destroy(instance)
+        task_graph.invalidate_graph(project_id)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        With ?include_archived=true, fall back to the archive when the task is no longer live.
+        """
+        if self.include_archived():
+            archived = self.filter_queryset(self.get_archived_queryset()).filter(pk=kwargs['pk']).first()
+            if archived is not None:
+                return Response(ArchivedTaskSerializer(archived).data)
+        return super().retrieve(request, *args, **kwargs)
 
     def update(self, request, *args, **kwargs):
         """
         Allow only the task assignee, project manager, or admin to update the task.
+        Reopening an archived task (setting a status other than Completed) restores it first.
         """
+        self.restore_if_reopened(request, kwargs['pk'])
         task = self.get_object()
         if request.user != task.assigned_to and request.user.role not in ['Admin', 'Project Manager']:
             return Response({'error': 'You do not have permission to update this task.'}, status=status.HTTP_403_FORBIDDEN)
@@ -255,32 +744,153 @@ class TaskViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
     @method_decorator(cache_page(60 * 25))  # Cache for 15 minutes
-    @swagger_auto_schema(
-        manual_parameters=[
-            openapi.Parameter('search', openapi.IN_QUERY, description="Search query", type=openapi.TYPE_STRING),
-            openapi.Parameter('status', openapi.IN_QUERY, description="Filter by task status", type=openapi.TYPE_STRING),
-            openapi.Parameter('priority', openapi.IN_QUERY, description="Filter by task priority", type=openapi.TYPE_STRING),
-            openapi.Parameter('project', openapi.IN_QUERY, description="Filter by project ID", type=openapi.TYPE_INTEGER),
-            openapi.Parameter('assigned_to', openapi.IN_QUERY, description="Filter by assigned user ID", type=openapi.TYPE_INTEGER),
-        ]
+    @query_parameters(
+        ('search', "Search query", STRING),
+        ('status', "Filter by task status", STRING),
+        ('priority', "Filter by task priority", STRING),
+        ('project', "Filter by project ID", INTEGER),
+        ('assigned_to', "Filter by assigned user ID", INTEGER),
+        ('include_archived', "Include archived tasks", BOOLEAN),
+        ('tags', "Comma-separated tags the task must all have", STRING),
+        ('tags_any', "Comma-separated tags the task must have at least one of", STRING),
+        ('ordering', "Sort by rank, id, created_at or updated_at (prefix - to reverse)", STRING),
     )
     def list(self, request, *args, **kwargs):
         """
         Override the list method to add caching and document filter parameters.
+        With ?include_archived=true, archived tasks are listed alongside live ones.
         """
+        if self.include_archived():
+            return self.list_with_archived(request)
         return super().list(request, *args, **kwargs)
 
+    def list_with_archived(self, request):
+        """
+        Paginate over the union of live and archived task ids, then load only the rows on the page.
+        """
+        live = self.filter_queryset(self.get_queryset()).order_by().values_list(
+            'id', Value(False, output_field=BooleanField()))
+        archived = self.filter_queryset(self.get_archived_queryset()).order_by().values_list(
+            'id', Value(True, output_field=BooleanField()))
+        page = self.paginate_queryset(live.union(archived, all=True).order_by('id'))
 
-class CommentViewSet(viewsets.ModelViewSet):
+        live_ids = [pk for pk, is_archived in page if not is_archived]
+        archived_ids = [pk for pk, is_archived in page if is_archived]
+        rows = {task.id: TaskSerializer(task).data for task in Task.objects.filter(id__in=live_ids).prefetch_related('tags')}
+        rows.update({task.id: ArchivedTaskSerializer(task).data for task in ArchivedTask.objects.filter(id__in=archived_ids)})
+        return self.get_paginated_response([rows[pk] for pk, _ in page if pk in rows])
+
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        """
+        Place the task between two neighbours of the same project, optionally in
+        another status column. Only the moved task's row is updated.
+        """
+        with transaction.atomic(using=router.db_for_write(Task)):
+            failed = self.precondition_failed(request)
+            if failed is not None:
+                return failed
+            task = self.get_object()
+            if request.user != task.assigned_to and request.user.role not in ['Admin', 'Project Manager']:
+                return Response({'error': 'You do not have permission to move this task.'}, status=status.HTTP_403_FORBIDDEN)
+            new_status = request.data.get('status', task.status)
+            if new_status not in task_board.STATUSES:
+                return Response({'error': f"status must be one of: {', '.join(task_board.STATUSES)}."}, status=status.HTTP_400_BAD_REQUEST)
+            neighbours = {}
+            for side in ('after', 'before'):
+                neighbour_id = request.data.get(side)
+                if neighbour_id is None:
+                    neighbours[side] = None
+                    continue
+                neighbour = Task.objects.filter(pk=neighbour_id, project_id=task.project_id).exclude(pk=task.pk).only('id', 'rank').first()
+                if neighbour is None:
+                    return Response({'error': f"'{side}' must be another task of the same project."}, status=status.HTTP_400_BAD_REQUEST)
+                neighbours[side] = neighbour
+            rank = ranking.rank_for_move(task, **neighbours)
+            if rank is None:
+                # Tied or overlong neighbours: renumber the project once, then retry.
+                ranking.rebalance(task.project_id)
+                for neighbour in neighbours.values():
+                    if neighbour is not None:
+                        neighbour.refresh_from_db(fields=['rank'])
+                rank = ranking.rank_for_move(task, **neighbours)
+                if rank is None:
+                    return Response({'error': "'after' must come before 'before'."}, status=status.HTTP_400_BAD_REQUEST)
+
+            before = TaskSerializer(task).data
+            old_status = task.status
+            task.rank, task.status, task.updated_at = rank, new_status, timezone.now()
+            Task.objects.filter(pk=task.pk).update(rank=task.rank, status=task.status, updated_at=task.updated_at)
+            if task.status != old_status:
+                record_status_change(task, old_status, task.status)
+                task_graph.invalidate_schedule(task.project_id)
+            self.record_activity('updated', task, before=before)
+        return self.with_etag(Response(TaskSerializer(task).data))
+
+    @action(detail=False, methods=['post'], url_path='bulk-tag')
+    def bulk_tag(self, request):
+        """
+        Add and remove tags on many tasks at once. Every task must be one the
+        user may update (its assignee, a project manager or an admin).
+        """
+        serializer = BulkTagSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        task_ids = set(data['tasks'])
+        editable = self.visible_to(request.user)
+        if request.user.role not in ['Admin', 'Project Manager']:
+            editable = editable.filter(assigned_to=request.user)
+        tasks = [task for queryset in sharding.scatter(editable.filter(id__in=task_ids).only('id', 'project_id'))
+                 for task in queryset]
+        missing = task_ids - {task.id for task in tasks}
+        if missing:
+            return Response({'error': 'Tasks not found or not editable.', 'tasks': sorted(missing)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        added, removed = task_tags.change(tasks, add=data['add'], remove=data['remove'])
+        return Response({'tasks': len(tasks), 'added': added, 'removed': removed})
+
+    def restore_if_reopened(self, request, pk):
+        """
+        Move an archived task back into the task table when an update reopens it.
+        """
+        from .archive import restore_task
+        new_status = request.data.get('status')
+        if not new_status or new_status == 'Completed':
+            return
+        if Task.objects.filter(pk=pk).exists():
+            return
+        archived = self.get_archived_queryset().filter(pk=pk).first()
+        if archived is None:
+            return
+        if request.user.id != archived.assigned_to_id and request.user.role not in ['Admin', 'Project Manager']:
+            return
+        restore_task(archived.id)
+
+
+class CommentViewSet(ProfilingMixin, ShardRoutingMixin, ConditionalRequestMixin, ReplicaReadMixin, ActivityLogMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing comments.
     Provides CRUD operations for comments with role-based access control.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [VersionedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     pagination_class = StandardResultsSetPagination
+    activity_target_type = 'comment'
+
+    def activity_project_id(self, instance):
+        if instance.project_id:
+            return instance.project_id
+        return instance.task.project_id if instance.task_id else None
+
+    def shard_for_data(self, data):
+        """
+        A comment lives with its task, or with its project when it has no task.
+        """
+        if data.get('task'):
+            return sharding.locate(Task, data['task'])
+        return super().shard_for_data(data)
 
     def get_queryset(self):
         """
@@ -298,12 +908,21 @@ class CommentViewSet(viewsets.ModelViewSet):
         Ensure that either a task or a project is provided.
         Log the data being sent for debugging purposes.
         """
-        logger.debug(f"Attempting to create comment with data: {serializer.validated_data}")
+        logger.debug("Attempting to create comment with data: %s", serializer.validated_data)
         if not serializer.validated_data.get('task') and not serializer.validated_data.get('project'):
             logger.error("Validation failed: A comment must be associated with either a task or a project.")
             raise serializers.ValidationError("A comment must be associated with either a task or a project.")
         serializer.save(author=self.request.user)
-        logger.info("Comment created successfully.")
+        comment = serializer.instance
+        self.record_activity('created', comment)
+        project_id = self.activity_project_id(comment)
+        notifications.notify(self.request.user, 'commented', notifications.followers(project_id, comment.task), project_id, comment.task_id)
+        logger.info("Comment %s created.", comment.id)
+
+    def perform_destroy(self, instance):
+        from . import attachments
+        attachments.detach(comment=instance)
+        super().perform_destroy(instance)
 
     def update(self, request, *args, **kwargs):
         """
@@ -329,3 +948,534 @@ class CommentViewSet(viewsets.ModelViewSet):
         Override the list method to add caching.
         """
         return super().list(request, *args, **kwargs)
+
+
+class TaskDependencyViewSet(ProfilingMixin, viewsets.ModelViewSet):
+    """
+    ViewSet for managing task dependencies.
+    New dependencies are checked for cycles against the project's cached dependency graph.
+    """
+    authentication_classes = [VersionedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    queryset = TaskDependency.objects.all()
+    serializer_class = TaskDependencySerializer
+    pagination_class = StandardResultsSetPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['project', 'task', 'depends_on']
+    http_method_names = ['get', 'post', 'delete', 'head', 'options']
+
+    def get_queryset(self):
+        """
+        Admins and project managers see all dependencies, other roles only those in their projects.
+        """
+        user = self.request.user
+        if user.role in ['Admin', 'Project Manager']:
+            return TaskDependency.objects.all()
+        return TaskDependency.objects.filter(project__members=user)
+
+    def can_edit(self, project):
+        user = self.request.user
+        return user.role in ['Admin', 'Project Manager'] or project.manager_id == user.id
+
+    def create(self, request, *args, **kwargs):
+        """
+        Allow only the project manager, project managers or admins to add dependencies.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        project = serializer.validated_data['task'].project
+        if not self.can_edit(project):
+            return Response({'error': 'You do not have permission to change dependencies in this project.'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            task_graph.add_dependency(
+                project.id,
+                serializer.validated_data['depends_on'].id,
+                serializer.validated_data['task'].id,
+                save=lambda: serializer.save(project=project),
+            )
+        except task_graph.CycleError as exc:
+            return Response({'depends_on': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        Allow only the project manager, project managers or admins to remove dependencies.
+        """
+        dependency = self.get_object()
+        if not self.can_edit(dependency.project):
+            return Response({'error': 'You do not have permission to change dependencies in this project.'}, status=status.HTTP_403_FORBIDDEN)
+        dependency.delete()
+        task_graph.remove_dependency(dependency.project_id, dependency.depends_on_id, dependency.task_id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class RecurringTaskViewSet(ProfilingMixin, viewsets.ModelViewSet):
+    """
+    ViewSet for recurring task templates. `manage.py generate_recurring_tasks`
+    creates their tasks when they fall due; see api/recurrence.py.
+    """
+    authentication_classes = [VersionedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = RecurringTaskSerializer
+    pagination_class = StandardResultsSetPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['project', 'frequency', 'assigned_to']
+
+    def get_queryset(self):
+        """
+        Admins and project managers see every template, other roles those of their projects.
+        """
+        user = self.request.user
+        queryset = RecurringTask.objects.order_by('id')
+        if user.role in ['Admin', 'Project Manager']:
+            return queryset
+        return queryset.filter(Q(project__members=user) | Q(project__manager=user)).distinct()
+
+    def can_edit(self, project):
+        user = self.request.user
+        return user.role in ['Admin', 'Project Manager'] or project.manager_id == user.id
+
+    def create(self, request, *args, **kwargs):
+        """
+        Allow only the project's manager, project managers or admins to add templates.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not self.can_edit(serializer.validated_data['project']):
+            return Response({'error': 'You do not have permission to schedule tasks in this project.'}, status=status.HTTP_403_FORBIDDEN)
+        serializer.save(created_by=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def update(self, request, *args, **kwargs):
+        """
+        Allow only those who can edit both the template's project and, if it changes, the new one.
+        """
+        template = self.get_object()
+        serializer = self.get_serializer(template, data=request.data, partial=kwargs.get('partial', False))
+        serializer.is_valid(raise_exception=True)
+        if not self.can_edit(template.project) or not self.can_edit(serializer.validated_data.get('project', template.project)):
+            return Response({'error': 'You do not have permission to schedule tasks in this project.'}, status=status.HTTP_403_FORBIDDEN)
+        serializer.save()
+        return Response(serializer.data)
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        Stop the schedule. Tasks it already created are kept.
+        """
+        template = self.get_object()
+        if not self.can_edit(template.project):
+            return Response({'error': 'You do not have permission to schedule tasks in this project.'}, status=status.HTTP_403_FORBIDDEN)
+        return super().destroy(request, *args, **kwargs)
+
+
+class TimeEntryViewSet(ProfilingMixin, viewsets.ModelViewSet):
+    """
+    ViewSet for logging time against tasks and reporting it.
+    Reports are read from the per-week rollups; see api/timetracking.py.
+    """
+    authentication_classes = [VersionedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = TimeEntrySerializer
+    pagination_class = StandardResultsSetPagination
+
+    def is_staff(self, user):
+        return user.role in ['Admin', 'Project Manager']
+
+    def scope(self, queryset):
+        """
+        Admins see all time, project managers that of their projects and their
+        own, other users only their own.
+        """
+        user = self.request.user
+        if user.role == 'Admin':
+            return queryset
+        if user.role == 'Project Manager':
+            return queryset.filter(Q(project__in=timetracking.visible_projects(user)) | Q(user=user))
+        return queryset.filter(user=user)
+
+    @query_parameters(
+        ('task', "Entries logged on this task", INTEGER),
+        ('project', "Entries in this project", INTEGER),
+        ('user', "Entries logged by this user", INTEGER),
+        ('start', "Entries on or after this date (YYYY-MM-DD)", STRING),
+        ('end', "Entries on or before this date (YYYY-MM-DD)", STRING),
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = self.scope(TimeEntry.objects.order_by('-date', '-id'))
+        params = self.request.query_params
+        for field in ('task', 'project', 'user'):
+            value = params.get(field)
+            if value and value.isdigit():
+                queryset = queryset.filter(**{f'{field}_id': value})
+        for param, lookup in (('start', 'date__gte'), ('end', 'date__lte')):
+            day = parse_date(params.get(param) or '') if params.get(param) else None
+            if day is not None:
+                queryset = queryset.filter(**{lookup: day})
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        """
+        Log time on a task the user works on: one assigned to them or in a
+        project they belong to. Project managers and admins may log on any task.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        task_id = serializer.validated_data['task_id']
+        alias = sharding.locate(Task, task_id)
+        task = Task.objects.using(alias).filter(pk=task_id).first() if alias else None
+        if task is None:
+            return Response({'error': 'Task not found.'}, status=status.HTTP_404_NOT_FOUND)
+        user = request.user
+        if not (self.is_staff(user) or task.assigned_to_id == user.id
+                or timetracking.visible_projects(user).filter(id=task.project_id).exists()):
+            return Response({'error': 'You do not have permission to log time on this task.'}, status=status.HTTP_403_FORBIDDEN)
+        serializer.save(user=user, project_id=task.project_id)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def update(self, request, *args, **kwargs):
+        """
+        Allow only the user who logged the time, or an admin, to change it.
+        """
+        entry = self.get_object()
+        if entry.user_id != request.user.id and request.user.role != 'Admin':
+            return Response({'error': 'You do not have permission to change this time entry.'}, status=status.HTTP_403_FORBIDDEN)
+        return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        Allow only the user who logged the time, or an admin, to delete it.
+        """
+        entry = self.get_object()
+        if entry.user_id != request.user.id and request.user.role != 'Admin':
+            return Response({'error': 'You do not have permission to delete this time entry.'}, status=status.HTTP_403_FORBIDDEN)
+        timetracking.delete_entry(entry)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @query_parameters(
+        ('by', "Group by any of project, user and week, comma-separated", STRING),
+        ('project', "Only this project", INTEGER),
+        ('user', "Only this user", INTEGER),
+        ('start', "From the week containing this date (YYYY-MM-DD)", STRING),
+        ('end', "To the week containing this date (YYYY-MM-DD)", STRING),
+    )
+    @action(detail=False, methods=['get'])
+    def report(self, request):
+        """
+        Logged time per project, user and/or week, read from the weekly rollups
+        of the time the user can see.
+        """
+        params = TimeReportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+        rollups = self.scope(TimeRollup.objects.all())
+        if 'project' in params:
+            rollups = rollups.filter(project_id=params['project'])
+        if 'user' in params:
+            rollups = rollups.filter(user_id=params['user'])
+        if 'start' in params:
+            rollups = rollups.filter(week__gte=timetracking.week_of(params['start']))
+        if 'end' in params:
+            rollups = rollups.filter(week__lte=timetracking.week_of(params['end']))
+        group_by = [field for field in timetracking.REPORT_FIELDS if field in params.get('by', ())]
+        return Response({'by': group_by, **timetracking.report(rollups, group_by)})
+
+
+class WebhookSubscriptionViewSet(ProfilingMixin, viewsets.ModelViewSet):
+    """
+    ViewSet for webhook subscriptions. Events are delivered by
+    `manage.py deliver_webhooks`; see api/webhooks.py.
+    """
+    authentication_classes = [VersionedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = WebhookSubscriptionSerializer
+    pagination_class = StandardResultsSetPagination
+
+    def get_queryset(self):
+        """
+        Admins see every subscription, other users their own.
+        """
+        queryset = WebhookSubscription.objects.order_by('id')
+        if self.request.user.role == 'Admin':
+            return queryset
+        return queryset.filter(owner=self.request.user)
+
+    def can_subscribe(self, project):
+        """
+        Admins may subscribe to any project or to all of them, project managers to the projects they manage.
+        """
+        user = self.request.user
+        return user.role == 'Admin' or (project is not None and project.manager_id == user.id)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not self.can_subscribe(serializer.validated_data.get('project')):
+            return Response({'error': 'You do not have permission to subscribe to these events.'}, status=status.HTTP_403_FORBIDDEN)
+        serializer.save(owner=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def update(self, request, *args, **kwargs):
+        subscription = self.get_object()
+        serializer = self.get_serializer(subscription, data=request.data, partial=kwargs.get('partial', False))
+        serializer.is_valid(raise_exception=True)
+        if not self.can_subscribe(serializer.validated_data.get('project', subscription.project)):
+            return Response({'error': 'You do not have permission to subscribe to these events.'}, status=status.HTTP_403_FORBIDDEN)
+        serializer.save()
+        return Response(serializer.data)
+
+    @query_parameters(('status', "Only deliveries in this status: pending, delivered or dead", STRING))
+    @action(detail=True, methods=['get'])
+    def deliveries(self, request, pk=None):
+        """
+        The subscription's deliveries, newest first.
+        """
+        deliveries = self.get_object().deliveries.order_by('-id')
+        if request.query_params.get('status'):
+            deliveries = deliveries.filter(status=request.query_params['status'])
+        page = self.paginate_queryset(deliveries)
+        return self.get_paginated_response(WebhookDeliverySerializer(page, many=True).data)
+
+    @action(detail=True, methods=['post'])
+    def redeliver(self, request, pk=None):
+        """
+        Queue the subscription's dead-lettered deliveries again, or only those listed in `ids`.
+        """
+        from . import webhooks
+        subscription = self.get_object()
+        ids = request.data.get('ids')
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids)):
+            return Response({'error': '`ids` must be a list of delivery ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'queued': webhooks.redeliver(subscription, ids)})
+
+
+class NotificationViewSet(ProfilingMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet for the logged-in user's notifications, newest first.
+    """
+    authentication_classes = [VersionedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = NotificationSerializer
+    pagination_class = StandardResultsSetPagination
+
+    def get_queryset(self):
+        """
+        Only the user's own notifications; ?unread=true leaves out the ones already read.
+        """
+        queryset = Notification.objects.filter(recipient=self.request.user).order_by('-updated_at', '-id')
+        if self.request.query_params.get('unread', '').lower() in ('true', '1'):
+            queryset = queryset.filter(read_at__isnull=True)
+        return queryset
+
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        """
+        Number of unread notifications, from the user's counter row.
+        """
+        return Response({'unread': notifications.unread_count(request.user)})
+
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        """
+        Mark one notification as read.
+        """
+        notification = self.get_object()
+        notifications.mark_read(request.user, [notification.id])
+        return Response({'unread': notifications.unread_count(request.user)})
+
+    @action(detail=False, methods=['post'], url_path='read-all')
+    def read_all(self, request):
+        """
+        Mark all of the user's notifications as read.
+        """
+        marked = notifications.mark_read(request.user)
+        return Response({'marked': marked, 'unread': notifications.unread_count(request.user)})
+
+
+class BatchViewSet(ProfilingMixin, viewsets.ViewSet):
+    """
+    Run several API requests in one round trip; see api/batch.py.
+    """
+    authentication_classes = [VersionedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @staticmethod
+    def routable(view):
+        cls = getattr(view, 'cls', None)
+        return cls is not None and issubclass(cls, viewsets.ViewSetMixin) and not issubclass(cls, BatchViewSet)
+
+    def create(self, request):
+        """
+        Accept {"requests": [{"method": ..., "url": ..., "body": ..., "headers": ...}, ...]}
+        and return {"responses": [{"status": ..., "headers": ..., "body": ...}, ...]} in the same order.
+        """
+        from . import batch
+        try:
+            items = request.data.get('requests') if isinstance(request.data, dict) else None
+            parsed = batch.parse(items, self.routable)
+        except batch.BatchError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'responses': batch.run(request, parsed)})
+
+
+class AttachmentAccessMixin:
+    """
+    Admins and project managers reach every attachment; other users those in
+    projects they manage or belong to, and the ones they uploaded.
+    """
+
+    def is_staff(self, user):
+        return user.role in ['Admin', 'Project Manager']
+
+    def can_attach(self, user, project_id, task=None, comment=None):
+        if self.is_staff(user):
+            return True
+        if task is not None and task.assigned_to_id == user.id:
+            return True
+        if comment is not None and comment.author_id == user.id:
+            return True
+        return Project.objects.filter(Q(members=user) | Q(manager=user), pk=project_id).exists()
+
+
+class AttachmentViewSet(ProfilingMixin, AttachmentAccessMixin, viewsets.ModelViewSet):
+    """
+    ViewSet for listing, downloading and deleting attachments.
+    Attachments are created through /api/uploads/.
+    """
+    authentication_classes = [VersionedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = AttachmentSerializer
+    pagination_class = StandardResultsSetPagination
+    http_method_names = ['get', 'delete', 'head', 'options']
+
+    @query_parameters(
+        ('task', "Attachments of this task", INTEGER),
+        ('comment', "Attachments of this comment", INTEGER),
+        ('project', "Attachments in this project", INTEGER),
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Attachment.objects.select_related('blob').order_by('id')
+        if not self.is_staff(user):
+            queryset = queryset.filter(Q(project__members=user) | Q(project__manager=user) | Q(uploaded_by=user)).distinct()
+        for field in ('task', 'comment', 'project'):
+            value = self.request.query_params.get(field)
+            if value and value.isdigit():
+                queryset = queryset.filter(**{f'{field}_id': value})
+        return queryset
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        Allow only the uploader, project managers or admins to delete an attachment.
+        """
+        attachment = self.get_object()
+        if attachment.uploaded_by_id != request.user.id and not self.is_staff(request.user):
+            return Response({'error': 'You do not have permission to delete this attachment.'}, status=status.HTTP_403_FORBIDDEN)
+        return super().destroy(request, *args, **kwargs)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Stream the file; a single-range Range header returns 206 with just those bytes.
+        """
+        from . import attachments
+        return attachments.download(self.get_object(), request.headers.get('Range'))
+
+
+class UploadViewSet(ProfilingMixin, AttachmentAccessMixin, viewsets.GenericViewSet):
+    """
+    ViewSet for resumable uploads: POST to start, PUT each chunk with a
+    Content-Range, GET for the offset to resume from, DELETE to abandon.
+    """
+    authentication_classes = [VersionedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = UploadSerializer
+
+    def get_queryset(self):
+        return Upload.objects.filter(uploaded_by=self.request.user)
+
+    def create(self, request):
+        from . import attachments
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        target = attachments.resolve_target(data.get('task_id'), data.get('comment_id'))
+        if target is None:
+            return Response({'error': 'Task or comment not found.'}, status=status.HTTP_404_NOT_FOUND)
+        project_id, task, comment = target
+        if not self.can_attach(request.user, project_id, task, comment):
+            return Response({'error': 'You do not have permission to attach files here.'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            upload = attachments.start_upload(request.user, project_id, task, comment, data['filename'],
+                                              data['size'], data.get('content_type'))
+        except attachments.UploadError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, pk=None):
+        return Response(UploadSerializer(self.get_object()).data)
+
+    def update(self, request, pk=None):
+        """
+        Write one chunk. The body is streamed to disk, never parsed. Returns the
+        upload's new offset, or the attachment (201) once the last chunk is in.
+        """
+        from . import attachments
+        upload = self.get_object()
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+            attachment = attachments.write_chunk(upload, request.headers.get('Content-Range'), content_length, request.stream)
+        except attachments.OffsetMismatch as exc:
+            return Response({'error': str(exc), 'offset': exc.offset}, status=status.HTTP_409_CONFLICT)
+        except (attachments.UploadError, ValueError) as exc:
+            return Response({'error': str(exc), 'offset': upload.received}, status=status.HTTP_400_BAD_REQUEST)
+        if attachment is None:
+            return Response(UploadSerializer(upload).data)
+        return Response(AttachmentSerializer(attachment).data, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, pk=None):
+        from . import attachments
+        attachments.abort(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ProfileViewSet(viewsets.ViewSet):
+    """
+    Stored request profiles (Admins only): list them, read one's metadata,
+    download its data or delete it.
+    """
+    authentication_classes = [VersionedJWTAuthentication]
+    permission_classes = [IsAdminUser]
+    lookup_value_regex = r'\d{8}T\d{6}-[0-9a-f]{8}'
+
+    def list(self, request):
+        return Response(profiling.list_profiles())
+
+    def retrieve(self, request, pk=None):
+        stored = profiling.get(pk)
+        if stored is None:
+            return Response({'error': 'Profile not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(stored[0])
+
+    def destroy(self, request, pk=None):
+        if profiling.get(pk) is None:
+            return Response({'error': 'Profile not found.'}, status=status.HTTP_404_NOT_FOUND)
+        profiling.delete(pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        The profile's data: collapsed stacks (text) for `sample`, a pstats file for `trace`.
+        """
+        stored = profiling.get(pk)
+        if stored is None:
+            return Response({'error': 'Profile not found.'}, status=status.HTTP_404_NOT_FOUND)
+        meta, path = stored
+        content_type = 'text/plain; charset=utf-8' if meta['mode'] == 'sample' else 'application/octet-stream'
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=meta['file'], content_type=content_type)
@@ -0,0 +1,339 @@
+"""
+Webhooks fed by a transactional outbox.
+
+Writes through the project, task and comment endpoints call publish() inside
+the transaction of the write (see ActivityLogMixin in views.py), which adds an
+OutboxEvent on the database holding the changed row. An event therefore exists
+exactly when its change was committed, and the request itself never waits on
+a subscriber.
+
+`manage.py deliver_webhooks` does the rest, on every tick:
+
+- dispatch() reads the outbox of every database in id order, a batch at a
+  time, adds a WebhookDelivery for each active subscription an event matches
+  and deletes the events. Deliveries are unique per subscription and event, so
+  an event read twice after a crash is still delivered once.
+- deliver() takes the due deliveries of each subscription and POSTs them as
+  `{"events": [...]}`, up to WEBHOOK_BATCH_SIZE per request, from
+  WEBHOOK_WORKERS threads. At most `max_concurrency` requests go to one
+  subscription at a time. Connections are kept alive and reused per host
+  (ConnectionPool). A 2xx response marks the batch delivered. Otherwise the
+  batch is retried after an exponential, jittered backoff, and after
+  WEBHOOK_MAX_ATTEMPTS attempts its deliveries are dead-lettered (status
+  `dead`) until they are redelivered through the API.
+- purge() deletes delivered deliveries older than WEBHOOK_RETENTION_DAYS.
+
+Subscription URLs must point at public addresses (check_url), unless
+WEBHOOK_ALLOW_PRIVATE_URLS is set. The host is checked when a subscription is
+saved and again each time a connection to it is opened, since DNS may have
+changed in between; a blocked host fails the delivery like an unreachable one.
+
+Every request is signed: X-Webhook-Signature is `sha256=` and the HMAC-SHA256
+of the body keyed with the subscription's secret. Delivery is at least once;
+receivers can drop duplicates by the event `id`.
+"""
+import hashlib
+import hmac
+import http.client
+import ipaddress
+import json
+import random
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from . import sharding
+from .models import OutboxEvent, WebhookDelivery, WebhookSubscription
+
+EVENTS = WebhookSubscription.EVENTS
+USER_AGENT = 'task-management-system-webhooks/1'
+
+
+class BlockedURL(ValueError):
+    """Raised for a webhook URL the worker must not send to."""
+
+
+def check_url(url):
+    """
+    Raise BlockedURL unless `url` is an http(s) URL whose host only resolves
+    to public addresses.
+    """
+    parts = urlsplit(url)
+    try:
+        port = parts.port
+    except ValueError:
+        raise BlockedURL("The URL has an invalid port.")
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise BlockedURL("Webhook URLs must be http or https URLs with a host.")
+    check_host(parts.scheme, parts.hostname, port)
+
+
+def check_host(scheme, host, port):
+    if settings.WEBHOOK_ALLOW_PRIVATE_URLS:
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(
+            host, port or (443 if scheme == 'https' else 80), type=socket.SOCK_STREAM)}
+    except (socket.gaierror, UnicodeError):
+        raise BlockedURL(f"The host {host} cannot be resolved.")
+    for address in addresses:
+        # Scoped IPv6 addresses carry a %interface suffix.
+        address = ipaddress.ip_address(address.split('%')[0])
+        if not address.is_global or address.is_multicast:
+            raise BlockedURL(f"The host {host} resolves to a non-public address ({address}).")
+
+
+def publish(target_type, action, target_id, project_id, data, using='default'):
+    """
+    Add an event to the outbox on `using`, in the caller's transaction.
+    """
+    OutboxEvent.objects.using(using).create(
+        event=f'{target_type}.{action}', project_id=project_id, target_id=target_id, payload=data)
+
+
+def envelope(event):
+    """The event as subscribers receive it."""
+    return {'id': str(event.uid), 'event': event.event, 'project': event.project_id, 'target': event.target_id,
+            'occurred_at': event.created_at, 'data': event.payload}
+
+
+def matches(subscription, event):
+    return ((not subscription.events or event.event in subscription.events)
+            and (subscription.project_id is None or subscription.project_id == event.project_id))
+
+
+def dispatch(batch_size=None):
+    """
+    Turn the outbox events of every database into deliveries. Returns the
+    number of events dispatched.
+    """
+    batch_size = batch_size or settings.WEBHOOK_OUTBOX_BATCH_SIZE
+    subscriptions = list(WebhookSubscription.objects.filter(is_active=True).only('id', 'project_id', 'events'))
+    dispatched = 0
+    for alias in sharding.aliases():
+        outbox = OutboxEvent.objects.using(alias)
+        while True:
+            events = list(outbox.order_by('id')[:batch_size])
+            if not events:
+                break
+            WebhookDelivery.objects.bulk_create([
+                WebhookDelivery(subscription_id=subscription.id, event_id=event.uid, event=event.event,
+                                payload=envelope(event), created_at=event.created_at)
+                for event in events for subscription in subscriptions if matches(subscription, event)
+            ], ignore_conflicts=True)
+            # By id rather than up to the last one: an event with a lower id may commit after this batch was read.
+            outbox.filter(id__in=[event.id for event in events]).delete()
+            dispatched += len(events)
+    return dispatched
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP and HTTPS connections, up to `size` idle ones per host,
+    shared by the delivery threads. `opened` counts the connections made.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.opened = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        check_host(scheme, host, port)
+        with self._lock:
+            self.opened += 1
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(host, port, timeout=self.timeout), False
+
+    def _release(self, key, connection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.size:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def _discard(self, key):
+        with self._lock:
+            idle = self._idle.pop(key, [])
+        for connection in idle:
+            connection.close()
+
+    def post(self, url, body, headers):
+        """
+        POST `body` to `url` and return the response status. A reused
+        connection the server has since closed is retried once on a new one.
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        while True:
+            connection, reused = self._acquire(key)
+            try:
+                connection.request('POST', path, body, headers)
+                response = connection.getresponse()
+                response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                if not reused:
+                    raise
+                # The other idle connections to this host have most likely been closed too.
+                self._discard(key)
+                continue
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(key, connection)
+            return response.status
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(settings.WEBHOOK_POOL_SIZE, settings.WEBHOOK_TIMEOUT)
+    return _pool
+
+
+def backoff(attempt):
+    """
+    Seconds to wait after attempt number `attempt` fails: doubling from
+    WEBHOOK_RETRY_BASE_SECONDS up to WEBHOOK_RETRY_MAX_SECONDS, plus up to 10%
+    so that retries to an endpoint that was down do not all arrive at once.
+    """
+    delay = min(settings.WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempt - 1), settings.WEBHOOK_RETRY_MAX_SECONDS)
+    return delay * (1 + random.random() / 10)
+
+
+def sign(secret, body):
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def send(pool, subscription, deliveries):
+    """
+    POST one batch of deliveries. Returns None on success, else the error.
+    """
+    body = json.dumps({'events': [delivery.payload for delivery in deliveries]}, cls=DjangoJSONEncoder).encode()
+    headers = {
+        'Content-Type': 'application/json',
+        'User-Agent': USER_AGENT,
+        'X-Webhook-Subscription': str(subscription.pk),
+        'X-Webhook-Signature': sign(subscription.secret, body),
+    }
+    try:
+        status = pool.post(subscription.url, body, headers)
+    except (OSError, http.client.HTTPException, BlockedURL) as exc:
+        return f"{type(exc).__name__}: {exc}"
+    return None if 200 <= status < 300 else f"HTTP {status}"
+
+
+def claim(deliveries, now):
+    """
+    Count an attempt for each delivery and schedule its retry before sending,
+    so that deliveries in flight when the worker dies are retried too.
+    """
+    by_attempt = {}
+    for delivery in deliveries:
+        by_attempt.setdefault(delivery.attempts + 1, []).append(delivery.id)
+    for attempt, ids in by_attempt.items():
+        WebhookDelivery.objects.filter(id__in=ids).update(
+            attempts=attempt, next_attempt_at=now + timedelta(seconds=backoff(attempt)))
+
+
+def record(deliveries, error):
+    rows = WebhookDelivery.objects.filter(id__in=[delivery.id for delivery in deliveries])
+    if error is None:
+        rows.update(status='delivered', delivered_at=timezone.now(), last_error='')
+        return
+    rows.update(last_error=error[:1000])
+    rows.filter(attempts__gte=settings.WEBHOOK_MAX_ATTEMPTS).update(status='dead')
+
+
+def _lane(pool, subscription, batches):
+    """Send batches of one subscription one after another, until none are left."""
+    results = []
+    while True:
+        try:
+            batch = batches.popleft()
+        except IndexError:
+            return results
+        results.append((batch, send(pool, subscription, batch)))
+
+
+def deliver(pool=None, now=None):
+    """
+    Send the due deliveries of every active subscription, at most
+    WEBHOOK_TICK_BATCHES batches per subscription. Returns
+    (deliveries sent, deliveries that failed).
+    """
+    pool = pool or get_pool()
+    now = now or timezone.now()
+    batch_size = settings.WEBHOOK_BATCH_SIZE
+    lanes = []
+    for subscription in WebhookSubscription.objects.filter(is_active=True).order_by('id'):
+        due = list(subscription.deliveries.filter(status='pending', next_attempt_at__lte=now)
+                   .order_by('next_attempt_at', 'id').only('id', 'subscription_id', 'attempts', 'payload')
+                   [:batch_size * settings.WEBHOOK_TICK_BATCHES])
+        if not due:
+            continue
+        claim(due, now)
+        batches = deque(due[start:start + batch_size] for start in range(0, len(due), batch_size))
+        lanes += [(subscription, batches)] * min(subscription.max_concurrency, len(batches))
+    sent = failed = 0
+    if not lanes:
+        return sent, failed
+    with ThreadPoolExecutor(max_workers=min(settings.WEBHOOK_WORKERS, len(lanes))) as executor:
+        futures = [executor.submit(_lane, pool, subscription, batches) for subscription, batches in lanes]
+        for future in as_completed(futures):
+            for batch, error in future.result():
+                record(batch, error)
+                sent += len(batch)
+                failed += len(batch) if error else 0
+    return sent, failed
+
+
+def redeliver(subscription, ids=None):
+    """
+    Queue the subscription's dead deliveries (or only those in `ids`) again,
+    with a fresh set of attempts. Returns the number queued.
+    """
+    dead = subscription.deliveries.filter(status='dead')
+    if ids is not None:
+        dead = dead.filter(id__in=ids)
+    return dead.update(status='pending', attempts=0, next_attempt_at=timezone.now(), last_error='')
+
+
+def purge(now=None):
+    """Delete delivered deliveries older than WEBHOOK_RETENTION_DAYS."""
+    cutoff = (now or timezone.now()) - timedelta(days=settings.WEBHOOK_RETENTION_DAYS)
+    deleted, _ = WebhookDelivery.objects.filter(status='delivered', delivered_at__lt=cutoff).delete()
+    return deleted
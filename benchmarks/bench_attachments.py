@@ -0,0 +1,107 @@
+"""
+Benchmark attachment upload and download on a large file.
+
+Runs against a throwaway test database and attachment directory: uploads a
+--size-mb file of random data in --chunk-mb chunks through the API, downloads it
+whole and as ranges, and reports throughput and the growth of the process's
+peak RSS. Exits with status 1 when peak RSS grows by more than --rss-budget-mb,
+which would mean a chunk or the file was buffered in memory.
+
+    python benchmarks/bench_attachments.py [--size-mb 512] [--chunk-mb 8] [--rss-budget-mb 64]
+"""
+import argparse
+import gc
+import hashlib
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'task_management_system.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from rest_framework_simplejwt.tokens import RefreshToken  # noqa: E402
+
+from api.models import Project, Task, User  # noqa: E402
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timed(label, func, size_mb):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.2f} s {size_mb / elapsed:10.1f} MB/s   peak RSS {peak_rss_mb():8.1f} MB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size-mb', type=int, default=512)
+    parser.add_argument('--chunk-mb', type=int, default=8)
+    parser.add_argument('--rss-budget-mb', type=float, default=64)
+    args = parser.parse_args()
+    chunk_size, total = args.chunk_mb * 1024 ** 2, args.size_mb * 1024 ** 2
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    user = User.objects.create_user(email='bench@example.com', password='bench', name='Bench', role='Admin')
+    project = Project.objects.create(name='Bench', description='Bench', start_date='2025-04-01',
+                                     end_date='2025-04-30', manager=user)
+    task = Task.objects.create(title='Bench', description='Bench', project=project, assigned_to=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    chunk = os.urandom(chunk_size)
+    baseline = peak_rss_mb()
+    print(f"{args.size_mb} MB in {args.chunk_mb} MB chunks, baseline peak RSS {baseline:.1f} MB")
+
+    with tempfile.TemporaryDirectory() as root, override_settings(ATTACHMENT_ROOT=root, ATTACHMENT_MAX_SIZE=total):
+        upload_id = client.post('/api/uploads/', {'filename': 'big.bin', 'size': total, 'task': task.id},
+                                format='json').data['id']
+        digest = hashlib.sha256()
+
+        def upload():
+            response = None
+            for start in range(0, total, chunk_size):
+                digest.update(chunk)
+                response = client.generic('PUT', f'/api/uploads/{upload_id}/', chunk,
+                                          content_type='application/octet-stream',
+                                          HTTP_CONTENT_RANGE=f'bytes {start}-{start + chunk_size - 1}/{total}')
+                # The test client's request objects sit in reference cycles; free their payload copies.
+                gc.collect()
+            return response.data
+
+        attachment = timed("upload", upload, args.size_mb)
+        assert attachment['sha256'] == digest.hexdigest(), attachment
+        url = f"/api/attachments/{attachment['id']}/download/"
+
+        def download(**headers):
+            received = hashlib.sha256()
+            for part in client.get(url, **headers).streaming_content:
+                received.update(part)
+            return received.hexdigest()
+
+        assert timed("download", download, args.size_mb) == digest.hexdigest()
+        half = total // 2
+        timed("download second half (Range)", lambda: download(HTTP_RANGE=f'bytes={half}-'), args.size_mb / 2)
+
+    growth = peak_rss_mb() - baseline
+    print(f"{'peak RSS growth':<28} {growth:8.1f} MB (budget {args.rss_budget_mb:.0f} MB)")
+    if growth > args.rss_budget_mb:
+        print(f"FAIL: peak RSS grew by {growth:.1f} MB")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
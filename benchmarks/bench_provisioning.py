@@ -0,0 +1,62 @@
+"""
+Benchmark bulk user provisioning against creating users one by one.
+
+Runs against a throwaway test database with the configured password hasher
+(PBKDF2 by default). It creates --users users with create_user(), the way
+signup and POST /api/users/ do, then provisions the same number with
+api.provisioning.provision() for each worker count in --workers, and prints
+the time per run and per user.
+
+    python benchmarks/bench_provisioning.py [--users 100] [--workers 1,2,4,8]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'task_management_system.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.hashers import get_hasher  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from api.models import User  # noqa: E402
+from api.provisioning import provision  # noqa: E402
+
+
+def report(label, count, elapsed):
+    print(f"{label:<28} {elapsed:8.2f} s {elapsed / count * 1000:9.1f} ms/user")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--workers', default=f'1,{os.cpu_count() or 1}')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    print(f"{os.cpu_count()} cores, {get_hasher().algorithm} password hasher")
+
+    start = time.perf_counter()
+    for n in range(args.users):
+        User.objects.create_user(email=f'serial{n}@example.com', password=f'pw-{n}', name='Serial', role='Developer')
+    report("create_user() loop", args.users, time.perf_counter() - start)
+
+    for workers in sorted({int(value) for value in args.workers.split(',')}):
+        rows = [{'email': f'bulk{workers}-{n}@example.com', 'password': f'pw-{n}', 'name': 'Bulk'}
+                for n in range(args.users)]
+        start = time.perf_counter()
+        results = provision(rows, default_role='Developer', workers=workers)
+        elapsed = time.perf_counter() - start
+        assert all(result['status'] == 'created' for result in results)
+        report(f"provision(), {workers} worker(s)", args.users, elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark a recurring task scheduler tick over many templates.
+
+Runs against a throwaway test database. It creates --templates recurring
+templates spread over --projects projects, with --due of them due now and the
+rest due next week. It times one run of api.recurrence.run_due(), which
+creates a task for each due template, and then a second run, which finds
+nothing due. It also prints the SQLite plan of the due-templates query to show
+that it reads the next_run_at index instead of the whole table.
+
+    python benchmarks/bench_recurring.py [--templates 100000] [--due 10000] [--projects 100]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'task_management_system.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from api import recurrence  # noqa: E402
+from api.models import Project, RecurringTask, Task, User  # noqa: E402
+
+
+def populate(template_count, due_count, project_count, now):
+    manager = User.objects.create_user(email='manager@example.com', password='pw', name='Manager', role='Project Manager')
+    projects = Project.objects.bulk_create([
+        Project(name=f'Project {n}', description='d', manager=manager, start_date=now.date(), end_date=now.date())
+        for n in range(project_count)
+    ])
+    started = now - timedelta(days=30)
+    batch = 5000
+    for start in range(0, template_count, batch):
+        RecurringTask.objects.bulk_create([
+            RecurringTask(project=projects[n % project_count], title=f'Chore {n}', frequency='weekly',
+                          starts_at=started, next_run_at=now if n < due_count else now + timedelta(weeks=1))
+            for n in range(start, min(start + batch, template_count))
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--templates', type=int, default=100000)
+    parser.add_argument('--due', type=int, default=10000)
+    parser.add_argument('--projects', type=int, default=100)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    now = timezone.now().replace(microsecond=0)
+    populate(args.templates, args.due, args.projects, now)
+    print(f"{args.templates} templates, {args.due} due, batches of {settings.RECURRING_BATCH_SIZE}")
+
+    due = RecurringTask.objects.filter(next_run_at__lte=now).order_by('next_run_at', 'id')[:settings.RECURRING_BATCH_SIZE]
+    print("Due query plan:", due.explain())
+
+    for label in ("first tick", "second tick"):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            created = recurrence.run_due(now=now)
+            elapsed = time.perf_counter() - start
+        print(f"{label:<12} {created:7} tasks {elapsed:8.2f} s {len(queries):6} queries")
+    assert Task.objects.filter(recurrence__isnull=False).count() == args.due
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark project snapshots against dumpdata/loaddata.
+
+Runs against a throwaway test database holding a single project with --tasks
+tasks, a tag on every third task and a comment on every other one. It writes
+the project with snapshots.export() and the same rows with
+`dumpdata api.User api.Project api.Task api.TaskTag api.Comment`, both as
+plain JSON and gzipped. For each, it prints the file size, the time taken and
+the peak Python memory (tracemalloc). Then it empties the tables and restores
+each file in turn: snapshots.restore() into a new project, and loaddata.
+
+    python benchmarks/bench_snapshots.py [--tasks 20000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'task_management_system.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from api import snapshots  # noqa: E402
+from api.models import Comment, Project, Task, TaskTag, User  # noqa: E402
+
+MODELS = ['api.User', 'api.Project', 'api.Task', 'api.TaskTag', 'api.Comment']
+
+
+def populate(task_count):
+    users = User.objects.bulk_create([
+        User(email=f'user{n}@example.com', name=f'User {n}', role='Developer', password='!') for n in range(50)
+    ])
+    today = timezone.now().date()
+    project = Project.objects.create(name='Benchmark', description='d', manager=users[0], start_date=today, end_date=today)
+    project.members.add(*users)
+    batch = 5000
+    for start in range(0, task_count, batch):
+        tasks = Task.objects.bulk_create([
+            Task(title=f'Task {n}', description=f'Description of task {n}, with a sentence or two of detail.',
+                 project=project, status=('Pending', 'In Progress', 'Completed')[n % 3],
+                 assigned_to=users[n % len(users)], rank=f'{n:08d}')
+            for n in range(start, min(start + batch, task_count))
+        ])
+        TaskTag.objects.bulk_create([TaskTag(task=task, project=project, name='bug') for task in tasks[::3]])
+        Comment.objects.bulk_create([
+            Comment(task=task, author=users[task.id % len(users)], content=f'Comment on task {task.id}.')
+            for task in tasks[::2]
+        ])
+    return project
+
+
+def measure(label, function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return label, elapsed, peak, result
+
+
+def report(label, elapsed, peak, size=None):
+    size = f"{size / 1024 ** 2:9.2f} MB" if size is not None else " " * 12
+    print(f"{label:<32} {size} {elapsed:8.2f} s {peak / 1024 ** 2:8.1f} MB peak")
+
+
+def empty():
+    for model in (Comment, TaskTag, Task, Project, User):
+        model.objects.all().delete()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tasks', type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    project = populate(args.tasks)
+    print(f"{args.tasks} tasks, {TaskTag.objects.count()} tags, {Comment.objects.count()} comments")
+
+    directory = tempfile.mkdtemp()
+    paths = {
+        'snapshot': os.path.join(directory, 'project.tmsnap.gz'),
+        'dumpdata': os.path.join(directory, 'dump.json'),
+        'dumpdata (gzip)': os.path.join(directory, 'dump-gzip.json.gz'),
+    }
+
+    def write_snapshot():
+        with open(paths['snapshot'], 'wb') as target:
+            for data in snapshots.export(project):
+                target.write(data)
+
+    print("Export")
+    exports = [
+        measure("export_project", write_snapshot),
+        measure("dumpdata", lambda: call_command('dumpdata', *MODELS, output=paths['dumpdata'], verbosity=0)),
+        measure("dumpdata (gzip)", lambda: call_command('dumpdata', *MODELS, output=paths['dumpdata (gzip)'], verbosity=0)),
+    ]
+    for (label, elapsed, peak, _), path in zip(exports, paths.values()):
+        report(label, elapsed, peak, os.path.getsize(path))
+
+    print("Restore into empty tables")
+    empty()
+    with open(paths['snapshot'], 'rb') as source:
+        label, elapsed, peak, _ = measure("import_project", lambda: snapshots.restore(source))
+    report(label, elapsed, peak)
+    for label in ('dumpdata', 'dumpdata (gzip)'):
+        empty()
+        report(*measure(f"loaddata {label.replace('dumpdata', '').strip()}".strip(),
+                        lambda: call_command('loaddata', paths[label], verbosity=0))[:3])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark worker cold start and fail when it regresses.
+
+Starts fresh interpreters that load the WSGI or ASGI application and the URL
+configuration, the way a worker does before its first request, and reports the
+median wall time and the slowest imports (from `python -X importtime`). Exits
+with status 1 when the median exceeds the budget, or when modules that should
+load lazily (drf_yasg, numpy, cProfile and the API modules
+behind a single action, such as api.snapshots) were imported with the API docs disabled.
+
+    python benchmarks/bench_startup.py [--app wsgi|asgi] [--runs 5] [--budget-ms 550] [--docs]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ['drf_yasg', 'numpy', 'cProfile', 'api.provisioning', 'api.snapshots', 'api.webhooks', 'api.batch']
+
+CHILD = """
+import sys, time
+start = time.perf_counter()
+import task_management_system.{app}
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - start)
+print(','.join(name for name in {lazy!r} if name in sys.modules))
+"""
+
+
+def run(app, docs, importtime=False):
+    env = dict(os.environ, API_DOCS_ENABLED='1' if docs else '0',
+               DJANGO_SETTINGS_MODULE='task_management_system.settings')
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []),
+               '-c', CHILD.format(app=app, lazy=LAZY_MODULES)]
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    seconds, loaded = result.stdout.splitlines()[-2:]
+    return float(seconds) * 1000, [name for name in loaded.split(',') if name], result.stderr
+
+
+def slowest_imports(stderr, count):
+    """
+    Modules imported directly by the application modules (and one level below),
+    by cumulative import time, from -X importtime output.
+    """
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        if 1 <= depth <= 2:
+            totals[name.strip()] = max(totals.get(name.strip(), 0), int(cumulative) / 1000)
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--app', choices=['wsgi', 'asgi'], default='wsgi')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=550)
+    parser.add_argument('--docs', action='store_true', help="Measure with API_DOCS_ENABLED=1.")
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.runs):
+        elapsed, loaded, _ = run(args.app, args.docs)
+        timings.append(elapsed)
+    _, _, stderr = run(args.app, args.docs, importtime=True)
+
+    median = statistics.median(timings)
+    print(f"{args.app} startup, docs {'on' if args.docs else 'off'}: median {median:.1f} ms over {args.runs} runs "
+          f"(min {min(timings):.1f}, max {max(timings):.1f}), budget {args.budget_ms:.0f} ms")
+    for name, ms in slowest_imports(stderr, 10):
+        print(f"  {name:<40} {ms:8.1f} ms")
+
+    failures = []
+    if median > args.budget_ms:
+        failures.append(f"median startup {median:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    if not args.docs and loaded:
+        failures.append(f"lazily loaded modules were imported at startup: {', '.join(loaded)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark tag filters combined with status filters on a large project.
+
+Runs against a throwaway test database. It fills one project with --tasks tasks
+(100k by default) and gives them tags from a skewed vocabulary: a few common
+tags and a long tail of rare ones. It then times a page of /api/tasks/
+(including the count) for a set of tag and status filter combinations, next to
+the ?search= LIKE scan that tags replace, and prints the SQLite plan of the tag
+subqueries to show which index they use.
+
+    python benchmarks/bench_tags.py [--tasks 100000] [--tags 200] [--runs 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'task_management_system.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from rest_framework_simplejwt.tokens import RefreshToken  # noqa: E402
+
+from api import tags  # noqa: E402
+from api.models import Project, Task, TaskTag, User  # noqa: E402
+
+STATUSES = ['Pending', 'In Progress', 'Completed']
+
+
+def populate(project, task_count, tag_count, rng):
+    vocabulary = [f'tag-{n}' for n in range(tag_count)]
+    # Zipf-like weights: tag-0 is on roughly a quarter of the tasks, the tail on a handful.
+    weights = [1 / (n + 1) for n in range(tag_count)]
+    batch = 5000
+    for start in range(0, task_count, batch):
+        tasks = Task.objects.bulk_create([
+            Task(title=f'Task {n}', description='d', project=project, status=rng.choice(STATUSES), rank=f'{n:08d}')
+            for n in range(start, min(start + batch, task_count))
+        ])
+        rows = []
+        for task in tasks:
+            names = set(rng.choices(vocabulary, weights, k=rng.randint(0, 4)))
+            rows += [TaskTag(task=task, project=project, name=name) for name in names]
+        TaskTag.objects.bulk_create(rows)
+    # Titles that spell out the common tags, the way labels were encoded before.
+    Task.objects.filter(id__in=TaskTag.objects.filter(name='tag-0').values('task_id')).update(title='[tag-0] Task')
+
+
+def time_request(client, params, runs):
+    samples, count = [], None
+    for _ in range(runs):
+        cache.clear()
+        start = time.perf_counter()
+        response = client.get('/api/tasks/', params)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.data
+        count = response.data['count']
+    return statistics.median(samples), count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--tags', type=int, default=200)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    user = User.objects.create_user(email='bench@example.com', password='bench', name='Bench', role='Admin')
+    project = Project.objects.create(name='Bench', description='Bench', start_date='2025-04-01',
+                                     end_date='2025-04-30', manager=user)
+    start = time.perf_counter()
+    populate(project, args.tasks, args.tags, rng)
+    print(f"{args.tasks:,} tasks with {TaskTag.objects.count():,} tags ({args.tags} distinct) "
+          f"created in {time.perf_counter() - start:.1f} s")
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+    rare = f'tag-{args.tags - 1}'
+    cases = [
+        ("status only", {'status': 'Pending'}),
+        ("search LIKE (baseline)", {'search': '[tag-0]'}),
+        ("tags=common", {'tags': 'tag-0'}),
+        ("tags=common,common", {'tags': 'tag-0,tag-1'}),
+        ("tags=rare", {'tags': rare}),
+        ("tags=common,rare", {'tags': f'tag-0,{rare}'}),
+        ("tags_any=common,common", {'tags_any': 'tag-0,tag-1'}),
+        ("tags_any=rare,rare", {'tags_any': f'{rare},tag-{args.tags - 2}'}),
+        ("tags=common + status", {'tags': 'tag-0', 'status': 'In Progress'}),
+        ("tags=common,common + status", {'tags': 'tag-0,tag-1', 'status': 'Pending'}),
+        ("tags_any=common,rare + status", {'tags_any': f'tag-1,{rare}', 'status': 'Completed'}),
+    ]
+    print(f"{'filter':<40} {'median':>11} {'matches':>10}")
+    for label, params in cases:
+        for scope, extra in (("", {}), (" +project", {'project': project.id})):
+            median, count = time_request(client, {**params, **extra, 'ordering': 'id', 'page_size': 50}, args.runs)
+            print(f"{label + scope:<40} {median:8.1f} ms {count:10,}")
+
+    if connection.vendor == 'sqlite':
+        for label, queryset in (
+            ("all-tags subquery", tags.filter_all(Task.objects.all(), ['tag-0', 'tag-1'], project.id)),
+            ("any-tag subquery", tags.filter_any(Task.objects.all(), ['tag-0', 'tag-1'], project.id)),
+        ):
+            sql, params = queryset.values('id').query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                print(f"\n{label} plan:")
+                for row in cursor.fetchall():
+                    print(f"  {row[-1]}")
+
+
+if __name__ == '__main__':
+    main()
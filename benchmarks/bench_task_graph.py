@@ -0,0 +1,84 @@
+"""
+Benchmark the task dependency graph on a large project.
+
+Builds a random acyclic dependency graph (50k tasks and 200k edges by default)
+by inserting edges one at a time, the way the dependencies endpoint does, then
+times a full rebuild, cycle rejection, topological ordering and the critical path.
+
+    python benchmarks/bench_task_graph.py [--tasks 50000] [--edges 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'task_management_system.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from api.graph import CycleError, DependencyGraph  # noqa: E402
+
+
+def timed(label, func, count=None):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    rate = f" ({count / elapsed:,.0f}/s)" if count else ""
+    print(f"{label:<32} {elapsed * 1000:10.1f} ms{rate}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tasks', type=int, default=50000)
+    parser.add_argument('--edges', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tasks = list(range(1, args.tasks + 1))
+    # A hidden ranking keeps the graph acyclic while task ids (the initial order)
+    # disagree with it, so inserts regularly force the order to be repaired.
+    rank = dict(zip(tasks, rng.sample(range(args.tasks), args.tasks)))
+    edges = set()
+    while len(edges) < args.edges:
+        a, b = rng.sample(tasks, 2)
+        # Mostly local dependencies, as in real plans, with some long-range ones.
+        if abs(rank[a] - rank[b]) > 200 and rng.random() < 0.9:
+            continue
+        edges.add((a, b) if rank[a] < rank[b] else (b, a))
+    edges = list(edges)
+    print(f"{args.tasks:,} tasks, {len(edges):,} edges")
+
+    graph = DependencyGraph(nodes=tasks)
+
+    def insert_all():
+        for source, target in edges:
+            graph.add_edge(source, target)
+
+    timed("incremental inserts", insert_all, count=len(edges))
+
+    def reject_cycles():
+        rejected = 0
+        for source, target in rng.sample(edges, 1000):
+            try:
+                graph.add_edge(target, source)
+            except CycleError:
+                rejected += 1
+        assert rejected == 1000, rejected
+
+    timed("1,000 cyclic inserts rejected", reject_cycles, count=1000)
+    timed("full rebuild", lambda: DependencyGraph(nodes=tasks, edges=edges))
+    order = timed("topological order", graph.topological_order)
+    position = {node: index for index, node in enumerate(order)}
+    assert all(position[source] < position[target] for source, target in edges)
+    length, path = timed("critical path", lambda: graph.critical_path(dict.fromkeys(tasks, 1)))
+    print(f"critical path: {length} tasks")
+
+
+if __name__ == '__main__':
+    main()
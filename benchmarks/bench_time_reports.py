@@ -0,0 +1,109 @@
+"""
+Benchmark time reports read from rollups against summing the raw entries.
+
+Runs against a throwaway test database. It logs --entries time entries, spread
+over --projects projects, --users users and a year of days, through
+api.timetracking.create_entries() in batches, so the rollups are maintained as
+they would be in production. For a project-by-week report, a user-by-week
+report and an all-time per-project report, it then times the rollup query next
+to the same GROUP BY over the entries. Finally, it times a full reconciliation.
+
+    python benchmarks/bench_time_reports.py [--entries 200000] [--projects 20] [--users 50] [--runs 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'task_management_system.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.db.models import Count, Sum  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from api import timetracking  # noqa: E402
+from api.models import Project, Task, TimeEntry, TimeRollup, User  # noqa: E402
+
+
+def populate(entry_count, project_count, user_count, rng):
+    users = User.objects.bulk_create([
+        User(email=f'user{n}@example.com', name=f'User {n}', role='Developer', password='!') for n in range(user_count)
+    ])
+    today = date.today()
+    projects = Project.objects.bulk_create([
+        Project(name=f'Project {n}', description='d', manager=users[0], start_date=today, end_date=today)
+        for n in range(project_count)
+    ])
+    tasks = Task.objects.bulk_create([
+        Task(title=f'Task {n}', description='d', project=projects[n % project_count], rank=f'{n:06d}')
+        for n in range(project_count * 50)
+    ])
+    first = today - timedelta(days=365)
+    batch = 5000
+    for start in range(0, entry_count, batch):
+        entries = []
+        for _ in range(min(batch, entry_count - start)):
+            task = rng.choice(tasks)
+            entries.append(TimeEntry(task_id=task.id, project_id=task.project_id, user=rng.choice(users),
+                                     date=first + timedelta(days=rng.randrange(365)), minutes=rng.randint(15, 240)))
+        timetracking.create_entries(entries)
+    return projects, users
+
+
+def best(function, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return min(samples) * 1000, statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--entries', type=int, default=200000)
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    start = time.perf_counter()
+    projects, users = populate(args.entries, args.projects, args.users, random.Random(1))
+    print(f"{args.entries} entries, {TimeRollup.objects.count()} rollups, "
+          f"logged in {time.perf_counter() - start:.1f} s")
+
+    def from_rollups(queryset, columns):
+        return lambda: timetracking.report(queryset, columns)
+
+    def from_entries(queryset, columns):
+        fields = [f'{column}_id' if column != 'week' else column for column in columns]
+        return lambda: list(queryset.values(*fields).annotate(minutes=Sum('minutes'), entries=Count('id')).order_by(*fields))
+
+    cases = [
+        ("project by week", {'project_id': projects[0].id}, ['week']),
+        ("user by week", {'user_id': users[0].id}, ['week']),
+        ("all projects, all time", {}, ['project']),
+    ]
+    print(f"{'report':<24} {'rollups (best/median)':>24} {'entries (best/median)':>24}")
+    for label, filters, columns in cases:
+        rollups = best(from_rollups(TimeRollup.objects.filter(**filters), columns), args.runs)
+        entries = best(from_entries(TimeEntry.objects.filter(**filters), columns), args.runs)
+        print(f"{label:<24} {rollups[0]:9.1f} / {rollups[1]:7.1f} ms {entries[0]:9.1f} / {entries[1]:7.1f} ms")
+
+    start = time.perf_counter()
+    drift = timetracking.reconcile()
+    print(f"reconcile: {len(drift)} drifted, {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
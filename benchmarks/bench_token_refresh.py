@@ -0,0 +1,80 @@
+"""
+Benchmark refresh-token rotation and revocation lookups.
+
+Runs against a throwaway test database: revokes --revoked tokens, then times a
+chain of --refreshes rotations (each revokes the previous token) and compares
+the revocation check through the Bloom filter with a plain database lookup.
+
+    python benchmarks/bench_token_refresh.py [--refreshes 2000] [--revoked 100000]
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'task_management_system.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from api import tokens  # noqa: E402
+from api.models import RevokedToken, User  # noqa: E402
+
+
+def timed(label, func, count=None):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    rate = f" ({count / elapsed:,.0f}/s)" if count else ""
+    print(f"{label:<32} {elapsed * 1000:10.1f} ms{rate}")
+    return result
+
+
+def statements(queries):
+    """Queries captured, not counting transaction control."""
+    return sum(1 for query in queries if not query['sql'].startswith(('BEGIN', 'COMMIT', 'SAVEPOINT', 'RELEASE')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--refreshes', type=int, default=2000)
+    parser.add_argument('--revoked', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    user = User.objects.create_user(email='bench@example.com', password='bench', name='Bench', role='Developer')
+    expires_at = timezone.now() + timedelta(days=7)
+    timed(f"revoke {args.revoked:,} tokens", lambda: RevokedToken.objects.bulk_create(
+        [RevokedToken(jti=uuid.uuid4().hex, expires_at=expires_at) for _ in range(args.revoked)],
+        batch_size=5000,
+    ), args.revoked)
+    timed("build revocation filter", lambda: tokens.is_revoked('warm-up'))
+
+    def refresh_chain():
+        refresh = str(tokens.VersionedRefreshToken.for_user(user))
+        for _ in range(args.refreshes):
+            refresh = tokens.rotate(refresh)['refresh']
+
+    with CaptureQueriesContext(connection) as queries:
+        timed(f"{args.refreshes:,} refreshes", refresh_chain, args.refreshes)
+    print(f"{'queries per refresh':<32} {statements(queries) / args.refreshes:10.2f}")
+
+    jtis = [uuid.uuid4().hex for _ in range(args.lookups)]
+    with CaptureQueriesContext(connection) as queries:
+        timed("lookups via Bloom filter", lambda: [tokens.is_revoked(jti) for jti in jtis], args.lookups)
+    print(f"{'queries per lookup':<32} {statements(queries) / args.lookups:10.4f}")
+    timed("lookups via database", lambda: [RevokedToken.objects.filter(jti=jti).exists() for jti in jtis], args.lookups)
+
+
+if __name__ == '__main__':
+    main()
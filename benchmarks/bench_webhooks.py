@@ -0,0 +1,148 @@
+"""
+Benchmark webhook delivery: batched and pooled against one request per event.
+
+Runs against a throwaway test database and a local HTTP server that answers
+every request after --latency milliseconds, as a remote endpoint would. It
+publishes --events events to each of --subscriptions subscriptions and
+dispatches them from the outbox. Then it delivers the same deliveries three
+ways:
+
+- one POST per event, each on a new connection, one after another (what
+  calling the endpoints from the request would cost);
+- webhooks.deliver() with WEBHOOK_BATCH_SIZE=1: pooled connections and
+  per-subscription concurrency, but no batching;
+- webhooks.deliver() with the configured batch size.
+
+For each it prints the time taken, the number of requests and the number of
+connections opened.
+
+    python benchmarks/bench_webhooks.py [--events 2000] [--subscriptions 5] [--latency 5]
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'task_management_system.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from api import webhooks  # noqa: E402
+from api.models import Project, User, WebhookDelivery, WebhookSubscription  # noqa: E402
+
+
+class Endpoint:
+    """Local HTTP server counting requests and connections."""
+
+    def __init__(self, latency):
+        endpoint = self
+        self.requests = self.connections = 0
+        self.lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with endpoint.lock:
+                    endpoint.connections += 1
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                time.sleep(latency)
+                with endpoint.lock:
+                    endpoint.requests += 1
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}/hook'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reset(self):
+        self.requests = self.connections = 0
+
+
+def one_by_one(deliveries):
+    for delivery in deliveries:
+        parts = urlsplit(delivery.subscription.url)
+        client = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+        body = json.dumps({'events': [delivery.payload]}).encode()
+        client.request('POST', parts.path, body, {'Content-Type': 'application/json'})
+        client.getresponse().read()
+        client.close()
+
+
+def requeue():
+    WebhookDelivery.objects.update(status='pending', attempts=0, next_attempt_at=timezone.now(), delivered_at=None)
+
+
+def deliver_all(pool):
+    while WebhookDelivery.objects.filter(status='pending').exists():
+        webhooks.deliver(pool)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--subscriptions', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=5, help="Endpoint response time in milliseconds.")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    endpoint = Endpoint(args.latency / 1000)
+    owner = User.objects.create(email='owner@example.com', name='Owner', role='Admin', password='!')
+    today = timezone.now().date()
+    project = Project.objects.create(name='Benchmark', description='d', manager=owner, start_date=today, end_date=today)
+    WebhookSubscription.objects.bulk_create([
+        WebhookSubscription(owner=owner, project=project, url=endpoint.url) for _ in range(args.subscriptions)
+    ])
+    start = time.perf_counter()
+    for n in range(args.events):
+        webhooks.publish('task', 'updated', n, project.id, {'id': n, 'title': f'Task {n}', 'status': 'In Progress'})
+    published = time.perf_counter() - start
+    start = time.perf_counter()
+    webhooks.dispatch()
+    print(f"{args.events} events x {args.subscriptions} subscriptions, {args.latency:g} ms endpoint latency; "
+          f"published in {published:.2f} s, dispatched in {time.perf_counter() - start:.2f} s")
+
+    deliveries = list(WebhookDelivery.objects.select_related('subscription').order_by('id'))
+    cases = [
+        ("one request per event", lambda: one_by_one(deliveries), None),
+        ("pooled, batch size 1", lambda: deliver_all(webhooks.ConnectionPool(settings.WEBHOOK_POOL_SIZE, 10)), 1),
+        (f"pooled, batch size {settings.WEBHOOK_BATCH_SIZE}",
+         lambda: deliver_all(webhooks.ConnectionPool(settings.WEBHOOK_POOL_SIZE, 10)), settings.WEBHOOK_BATCH_SIZE),
+    ]
+    print(f"{'delivery':<28} {'time':>9} {'requests':>9} {'connections':>12}")
+    for label, function, batch_size in cases:
+        requeue()
+        endpoint.reset()
+        with override_settings(WEBHOOK_BATCH_SIZE=batch_size or settings.WEBHOOK_BATCH_SIZE,
+                               WEBHOOK_TICK_BATCHES=10 ** 6, WEBHOOK_ALLOW_PRIVATE_URLS=True):
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+        print(f"{label:<28} {elapsed:7.2f} s {endpoint.requests:9} {endpoint.connections:12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,7 +6,8 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'task_management_system.settings')
+    settings_module = 'settings_test' if sys.argv[1:2] == ['test'] else 'settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', f'task_management_system.{settings_module}')
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,10 +42,16 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'corsheaders',
     'api',  
-    'drf_yasg'
 ]
 
+# Swagger UI at /api/swagger/. Off unless DEBUG, or API_DOCS_ENABLED=1 in the
+# environment; drf_yasg is only imported when the docs are enabled and first requested.
+API_DOCS_ENABLED = os.environ.get('API_DOCS_ENABLED', '1' if DEBUG else '0') == '1'
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.append('drf_yasg')
+
 MIDDLEWARE = [
+    'api.logs.RequestLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,9 +89,40 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Local stand-in for a read replica; point it at a real replica in production.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+    },
+    # Local stand-ins for task shards; see TASK_SHARDS.
+    'shard1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_shard1.sqlite3',
+    },
+    'shard2': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_shard2.sqlite3',
+    },
 }
 
+DATABASE_ROUTERS = ['api.db_routers.ShardRouter', 'api.db_routers.ReplicaRouter']
+
+# Read replicas as {alias: weight}. List and retrieve requests are spread over
+# these aliases in proportion to their weight; empty sends every read to
+# 'default'. After a write, the user reads from 'default' for
+# REPLICA_PIN_SECONDS. Pins are kept in the cache, so use a shared cache
+# backend when running several processes.
+DATABASE_REPLICAS = {}
+REPLICA_PIN_SECONDS = 5
+
+# Database aliases, besides 'default', that can hold a project's tasks and
+# comments. Projects are placed with `manage.py rebalance_shards`; projects not
+# in the shard map stay on 'default'. Empty disables sharding. Shards need the
+# full schema (`manage.py migrate --database <alias>`), and the shard map is
+# cached, so use a shared cache backend when running several processes.
+TASK_SHARDS = []
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -130,7 +168,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.tokens.VersionedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -169,4 +207,154 @@ SIMPLE_JWT = {
     'ALGORITHM': 'HS256',                           # Algorithm used for signing the tokens
     'SIGNING_KEY': SECRET_KEY,                      # Secret key for signing tokens
     'AUTH_HEADER_TYPES': ('Bearer',),               # Authorization header prefix
-}
\ No newline at end of file
+}
+
+# Refresh-token revocation: each process keeps a Bloom filter sized for
+# TOKEN_REVOCATION_CAPACITY revoked tokens at TOKEN_REVOCATION_ERROR_RATE false
+# positives (which cost one query), and picks up tokens revoked by other
+# processes at most every TOKEN_REVOCATION_SYNC_SECONDS. Each sync re-reads the
+# tokens revoked in the last TOKEN_REVOCATION_SYNC_MARGIN_SECONDS before the newest
+# one seen, which must exceed the longest revoking transaction. User token versions are
+# cached for TOKEN_VERSION_CACHE_SECONDS. Purge expired entries with
+# `manage.py purge_revoked_tokens`.
+TOKEN_REVOCATION_CAPACITY = 1_000_000
+TOKEN_REVOCATION_ERROR_RATE = 0.001
+TOKEN_REVOCATION_SYNC_SECONDS = 1
+TOKEN_REVOCATION_SYNC_MARGIN_SECONDS = 60
+TOKEN_VERSION_CACHE_SECONDS = 300
+
+# POST /api/batch/ accepts up to BATCH_MAX_REQUESTS sub-requests. Consecutive
+# GETs in a batch run concurrently on up to BATCH_MAX_WORKERS threads, each with
+# its own database connection; 1 runs every sub-request on the request thread.
+BATCH_MAX_REQUESTS = 25
+BATCH_MAX_WORKERS = 4
+
+# Logging: the `api` loggers hand records to a background thread through a
+# bounded queue (LOG_QUEUE_SIZE; records are dropped, not waited for, when it
+# is full), which writes them to stderr as JSON lines tagged with the request
+# id. Each request logs one line on `api.requests`; INFO records of the loggers
+# in LOG_SAMPLE_RATES are sampled at the given rate. Set LOG_LEVEL in the
+# environment to change the level of the `api` loggers.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_QUEUE_SIZE = 10000
+LOG_SAMPLE_RATES = {'api.requests': 0.1}
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'api.logs.RequestIdFilter'},
+        'sampling': {'()': 'api.logs.SamplingFilter', 'rates': LOG_SAMPLE_RATES},
+    },
+    'formatters': {
+        'json': {'()': 'api.logs.JsonFormatter'},
+    },
+    'handlers': {
+        # Handlers are configured in name order: the queue's targets come first.
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+        'queue': {
+            '()': 'api.logs.BackgroundHandler',
+            'handlers': ['cfg://handlers.console'],
+            'queue_size': LOG_QUEUE_SIZE,
+            'filters': ['request_id', 'sampling'],
+        },
+    },
+    'loggers': {
+        'api': {'handlers': ['queue'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
+
+# Bulk user provisioning (POST /api/users/bulk/, `manage.py provision_users`):
+# passwords are hashed on PROVISION_HASH_WORKERS processes (None: one per
+# core). The endpoint accepts up to PROVISION_MAX_USERS users per request.
+PROVISION_HASH_WORKERS = None
+PROVISION_MAX_USERS = 5000
+
+# Request profiling: admins add `X-Profile: sample` (or `trace`) to a request
+# to profile it. Profiles are stored under PROFILE_ROOT and listed at
+# /api/profiles/. Each new profile prunes those older than
+# PROFILE_MAX_AGE_SECONDS, then the oldest beyond PROFILE_MAX_COUNT files or
+# PROFILE_MAX_BYTES in total. The sampler records the stack every
+# PROFILE_SAMPLE_INTERVAL seconds.
+PROFILE_ROOT = BASE_DIR / 'profiles'
+PROFILE_MAX_COUNT = 200
+PROFILE_MAX_BYTES = 100 * 1024 ** 2
+PROFILE_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+PROFILE_SAMPLE_INTERVAL = 0.001
+
+# Admin: changelists count exactly up to ADMIN_COUNT_LIMIT rows and show an
+# estimate (unfiltered) or the limit (filtered) beyond it. Bulk status actions
+# update ADMIN_ACTION_BATCH_SIZE tasks per transaction.
+ADMIN_COUNT_LIMIT = 10000
+ADMIN_ACTION_BATCH_SIZE = 1000
+
+# Project snapshots (`manage.py export_project` / `import_project`): rows per
+# record, which is also the batch size of reads and bulk inserts.
+SNAPSHOT_CHUNK_SIZE = 1000
+
+# Recurring tasks: `manage.py generate_recurring_tasks` creates the tasks of due
+# templates RECURRING_BATCH_SIZE templates per transaction.
+RECURRING_BATCH_SIZE = 1000
+
+# Manual task order: `manage.py rebalance_ranks` rewrites the ranks of projects
+# whose longest rank is over TASK_RANK_REBALANCE_LENGTH characters.
+TASK_RANK_REBALANCE_LENGTH = 32
+
+# Attachments are stored under ATTACHMENT_ROOT: content once per SHA-256 in
+# blobs/, uploads in progress in uploads/. Files are read and written
+# ATTACHMENT_BUFFER_SIZE bytes at a time. Uploads untouched for
+# ATTACHMENT_UPLOAD_EXPIRY_SECONDS, and blobs no attachment uses any more, are
+# removed by `manage.py purge_attachments`. Behind nginx, set
+# ATTACHMENT_ACCEL_REDIRECT to an internal location aliased to ATTACHMENT_ROOT
+# and nginx serves downloads (including ranges) itself.
+ATTACHMENT_ROOT = BASE_DIR / 'attachments'
+ATTACHMENT_MAX_SIZE = 2 * 1024 ** 3
+ATTACHMENT_BUFFER_SIZE = 1024 ** 2
+ATTACHMENT_UPLOAD_EXPIRY_SECONDS = 24 * 60 * 60
+ATTACHMENT_ACCEL_REDIRECT = None
+
+# Notifications: events of the same kind on the same task or project within
+# NOTIFICATION_DIGEST_SECONDS of the last one are folded into the recipient's
+# unread notification instead of adding a new one.
+NOTIFICATION_DIGEST_SECONDS = 600
+
+# Webhooks: `manage.py deliver_webhooks` moves outbox events into deliveries
+# WEBHOOK_OUTBOX_BATCH_SIZE at a time, then POSTs up to WEBHOOK_BATCH_SIZE
+# events per request, at most WEBHOOK_TICK_BATCHES requests per subscription
+# per tick, from WEBHOOK_WORKERS threads. Up to WEBHOOK_POOL_SIZE idle
+# connections per host are kept open, and a subscription may allow up to
+# WEBHOOK_MAX_CONCURRENCY requests at a time. Failed requests are retried after
+# WEBHOOK_RETRY_BASE_SECONDS, doubling up to WEBHOOK_RETRY_MAX_SECONDS, and
+# dead-lettered after WEBHOOK_MAX_ATTEMPTS attempts. Delivered events are kept
+# for WEBHOOK_RETENTION_DAYS.
+# Subscription URLs must resolve to public addresses only, checked when a
+# subscription is saved and again whenever a connection is opened, so the worker
+# cannot be pointed at loopback, link-local (cloud metadata) or private hosts.
+# Set WEBHOOK_ALLOW_PRIVATE_URLS=1 in the environment to allow them for local
+# receivers.
+WEBHOOK_ALLOW_PRIVATE_URLS = os.environ.get('WEBHOOK_ALLOW_PRIVATE_URLS', '0') == '1'
+WEBHOOK_OUTBOX_BATCH_SIZE = 1000
+WEBHOOK_BATCH_SIZE = 100
+WEBHOOK_TICK_BATCHES = 10
+WEBHOOK_WORKERS = 8
+WEBHOOK_POOL_SIZE = 4
+WEBHOOK_TIMEOUT = 10
+WEBHOOK_MAX_CONCURRENCY = 10
+WEBHOOK_RETRY_BASE_SECONDS = 30
+WEBHOOK_RETRY_MAX_SECONDS = 6 * 60 * 60
+WEBHOOK_MAX_ATTEMPTS = 10
+WEBHOOK_RETENTION_DAYS = 7
+
+# Task archival: completed tasks untouched for this many days are moved to the
+# archive tables by `manage.py archive_tasks`, this many tasks per transaction.
+TASK_ARCHIVE_AFTER_DAYS = 90
+TASK_ARCHIVE_BATCH_SIZE = 500
+
+
+# Activity log buffer: entries are written with bulk_create once this many are
+# queued, when the oldest has waited ACTIVITY_FLUSH_INTERVAL seconds, and at the
+# end of each request. At most ACTIVITY_BUFFER_MAX entries are held in memory;
+# anything that cannot be written is appended to the spool file and replayed.
+ACTIVITY_FLUSH_SIZE = 100
+ACTIVITY_BUFFER_MAX = 10000
+ACTIVITY_FLUSH_INTERVAL = 5
+ACTIVITY_SPOOL_PATH = BASE_DIR / 'activity_spool.jsonl'
@@ -0,0 +1,22 @@
+"""
+Settings for the test suite.
+
+`manage.py test` uses this module unless DJANGO_SETTINGS_MODULE or --settings
+names another. It only swaps out what makes tests slow; everything else comes
+from the main settings so the suite exercises the real configuration.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, LOGGING
+
+# PBKDF2 is deliberately slow, and the suite creates and logs in users for every test.
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# Every alias, including the replica and shard stand-ins, in memory.
+DATABASES = {
+    alias: {**config, 'NAME': ':memory:'}
+    for alias, config in DATABASES.items()
+}
+
+# Keep the per-request log lines out of the test runner's output; warnings and
+# errors are still logged.
+LOGGING = {**LOGGING, 'loggers': {'api': {**LOGGING['loggers']['api'], 'level': 'WARNING'}}}